@@ -1,165 +1,179 @@
 # IDT_AGENT_NATIVE/circuitmanus/agent.py
-import os
 import sys 
 import json
 import time
-import inspect 
-import logging
+import types
 import asyncio
 import traceback
-import functools 
 from uuid import uuid4
 from datetime import datetime, timezone
 from typing import List, Dict, Any, Optional, Callable, Awaitable
 
-from .utils.config_loader import ConfigLoader 
-from .utils.logging_config import setup_logging 
+from .runtime import AgentRuntime
+from .request_context import RequestContext, get_request_context, set_request_context, reset_request_context
+from .llm.parser import IncrementalResponseParser
 from .memory.manager import MemoryManager 
-from .llm.interface import LLMInterface   
-from .llm.parser import OutputParser      
-from .tools.base import register_tool     
+from .memory.context import AssembledContext
 from .tools.executor import ToolExecutor  
-from .tools import circuit_ops            
-from .tools import web_search             
+from .tools.early_dispatch import EarlyToolDispatcher
+from .analysis.dc import DCOperatingPointSolver
+from .analysis.erc import ElectricalRuleChecker
 from .prompts.templates import (          
-    get_tool_schemas_for_prompt,
-    get_planning_prompt,
-    get_response_generation_prompt
+    build_planning_prompt,
+    build_response_generation_prompt
 )
 
 class CircuitAgent:
+    """
+    一个会话的 Agent。会话只持有自己的记忆 (MemoryManager) 与分析器缓存；
+    配置、工具注册表、LLM 客户端等不变的状态由进程级的 AgentRuntime 共享，
+    因此为每个会话创建 Agent 的开销很小。
+
+    请求状态 (请求ID、模型选择等) 保存在 RequestContext 中随请求传递，同一会话的多个请求可以并发处理:
+    - state_lock: 短时间持有，保护电路与记忆不被同时读写 (工具批次执行、生成记忆上下文、写回快照)，
+      LLM 调用期间不持有。
+    - mutation_lock: 请求第一次执行会修改电路的工具批次时取得，直到请求结束才释放，
+      因此修改电路的请求依次执行，只读请求 (描述、查询、搜索、问答) 不受影响。
+    - 每个请求的消息先记入 RequestContext.turn_messages，请求结束时整轮写入短期记忆，
+      并发请求的对话历史互不交错；LLM 上下文由已写入的历史加上本请求自己的本轮消息装配。
+    """
     def __init__(self, 
                  config_yaml_path: str = "config.yaml", 
-                 dotenv_path: Optional[str] = None
+                 dotenv_path: Optional[str] = None,
+                 runtime: Optional[AgentRuntime] = None,
+                 session_id: Optional[str] = None
                  ):
-        self.config_loader = ConfigLoader(yaml_config_path=config_yaml_path, dotenv_path=dotenv_path)
-        self.api_key: str = self.config_loader.get_env_var("ZHIPUAI_API_KEY", "") 
-        # ZhipuAI API Key 的检查逻辑保持，因为它是核心功能之一
-        # DeepSeek Key 的检查将在下面模型可用性判断中进行
-
-        self.current_request_id: Optional[str] = None 
-
-        log_level_console_str: str = self.config_loader.get_config("agent_settings.logging.log_level_console", "INFO")
-        log_level_file_str: str = self.config_loader.get_config("agent_settings.logging.log_level_file", "DEBUG")
-        log_dir_cfg: Optional[str] = self.config_loader.get_config("agent_settings.logging.log_dir", None) 
-        self.verbose_mode: bool = (log_level_console_str.upper() == "DEBUG")
-        console_level_int = getattr(logging, log_level_console_str.upper(), logging.INFO)
-        file_level_int = getattr(logging, log_level_file_str.upper(), logging.DEBUG)
-        self.logger = setup_logging(
-            console_log_level=console_level_int,
-            file_log_level=file_level_int,
-            log_dir_override=log_dir_cfg
+        self.runtime: AgentRuntime = runtime if runtime is not None else AgentRuntime.get_shared(config_yaml_path, dotenv_path)
+        self.session_id: Optional[str] = session_id # Web 会话ID (用于划分会话的网表目录)；命令行使用时为 None
+
+        self.state_lock = asyncio.Lock()
+        self.mutation_lock = asyncio.Lock()
+
+        self.memory_manager = MemoryManager(**self.runtime.memory_settings)
+        # 直流工作点求解器: 缓存 MNA 方程结构与矩阵分解，电路只改值时无需重建
+        self.dc_solver = DCOperatingPointSolver()
+        # 电气规则检查器: 每批工具执行后只重新检查本批修改涉及的元件
+        self.erc_checker = ElectricalRuleChecker()
+        self.tool_executor = ToolExecutor(
+            agent_instance=self, 
+            max_tool_retries=self.runtime.max_tool_retries,
+            tool_retry_delay_seconds=self.runtime.tool_retry_delay_seconds
         )
-        
-        self.default_llm_identifier: str = self.config_loader.get_config("agent_settings.llm.default_model_identifier", "zhipu-ai")
-        self.default_enable_chinese_thinking: bool = self.config_loader.get_config("agent_settings.prompts.enable_deep_thinking_chinese_default", False)
-        self.current_llm_identifier: str = self.default_llm_identifier
-        self.current_enable_chinese_thinking: bool = self.default_enable_chinese_thinking
-
-        # 【新增】判断并存储各模型可用性
-        self.model_availability_details: List[Dict[str, Any]] = []
-        configured_llm_identifiers = self.config_loader.get_config("agent_settings.llm.available_models", [])
-        
-        for model_id in configured_llm_identifiers:
-            is_available = False
-            display_name = model_id # 默认显示名称
-            if model_id == "zhipu-ai":
-                is_available = bool(self.api_key) # ZHIPUAI_API_KEY 存储在 self.api_key
-                display_name = "智谱清言 (GLM)"
-                if not is_available:
-                    self.logger.warning("智谱AI API Key未配置，智谱模型将不可用。")
-            elif model_id == "deepseek":
-                deepseek_key = self.config_loader.get_env_var("DEEPSEEK_API_KEY")
-                is_available = bool(deepseek_key)
-                display_name = "DeepSeek 大模型"
-                if not is_available:
-                    self.logger.warning("DeepSeek API Key未配置，DeepSeek模型将不可用。")
-            # 可以为未来其他模型添加类似的检查逻辑
-            # else:
-            #     self.logger.warning(f"配置文件中存在未知模型标识符 '{model_id}'，其可用性检查未实现。")
-
-            self.model_availability_details.append({
-                "id": model_id,
-                "name": display_name, # 前端将使用这个名字作为选项文本
-                "available": is_available
-            })
-
-        self.logger.info(f"\n{'='*30} CircuitAgent 初始化开始 (V1.1.1 - 动态模型可用性) {'='*30}")
-        self.logger.info(f"Agent配置已从 '{os.path.abspath(config_yaml_path)}' 和 .env (如果存在) 加载。")
-        self.logger.info(f"Agent verbose_mode (推导自 console_log_level='{log_level_console_str}'): {self.verbose_mode}")
-        self.logger.info(f"默认LLM标识符: '{self.default_llm_identifier}', 默认中文深度思考: {self.default_enable_chinese_thinking}")
-        self.logger.info(f"模型可用性详情: {json.dumps(self.model_availability_details, ensure_ascii=False)}")
-
-
-        self.tools_registry: Dict[str, Dict[str, Any]] = {}
-        self.logger.info("[Agent Init] 正在动态发现并注册工具...")
-        tool_modules = [circuit_ops, web_search] 
-        for module in tool_modules:
-            for name, func in inspect.getmembers(module, inspect.isfunction):
-                if hasattr(func, '_is_tool') and func._is_tool:
-                    schema = getattr(func, '_tool_schema', None) 
-                    if schema and isinstance(schema, dict) and 'description' in schema and 'parameters' in schema:
-                        if inspect.iscoroutinefunction(func): 
-                            async def async_bound_method_wrapper(arguments: Dict[str, Any], agent_self=self, original_func=func):
-                                return await original_func(agent_self, arguments)
-                            functools.update_wrapper(async_bound_method_wrapper, func) 
-                            setattr(self, name, async_bound_method_wrapper) 
-                        else: 
-                            bound_method = functools.partial(func, self) 
-                            functools.update_wrapper(bound_method, func) 
-                            setattr(self, name, bound_method) 
-                        self.tools_registry[name] = schema 
-                        is_async_tool = inspect.iscoroutinefunction(func) 
-                        self.logger.info(f"[Agent Init] ✓ 已动态绑定并注册工具: '{name}' (来自模块: {module.__name__}, 原始是否异步: {is_async_tool})。")
-                    else:
-                        self.logger.warning(f"[Agent Init] 在模块 {module.__name__} 中发现函数 '{name}' 被标记为工具,但其 Schema 结构不完整或无效,已跳过注册。")
-        
-        if not self.tools_registry:
-            self.logger.warning("[Agent Init] 未发现任何通过 @register_tool 注册的工具！Agent 功能将受限。")
-        else:
-            self.logger.info(f"[Agent Init] 共动态绑定并注册了 {len(self.tools_registry)} 个工具。")
-            if self.logger.isEnabledFor(logging.DEBUG):
-                try:
-                    self.logger.debug(f"[Agent Init] 工具注册表详情:\n{json.dumps(self.tools_registry, indent=2, ensure_ascii=False)}")
-                except Exception as e_dump:
-                    self.logger.debug(f"无法序列化工具注册表进行日志记录: {e_dump}")
-
 
+    def __getattr__(self, name: str) -> Any:
+        # 只在常规属性查找失败时调用: 把运行时中的工具函数按需绑定到本会话，
+        # 使 ToolExecutor 仍可通过 getattr(agent, 工具名) 取得工具方法
+        runtime = self.__dict__.get("runtime")
+        if runtime is not None:
+            tool_function = runtime.tool_functions.get(name)
+            if tool_function is not None:
+                return types.MethodType(tool_function, self)
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    # 以下属性委托给共享的运行时，保持原有的 Agent 接口不变
+    config_loader = property(lambda self: self.runtime.config_loader)
+    api_key = property(lambda self: self.runtime.api_key)
+    logger = property(lambda self: self.runtime.logger)
+    verbose_mode = property(lambda self: self.runtime.verbose_mode)
+    default_llm_identifier = property(lambda self: self.runtime.default_llm_identifier)
+    default_enable_chinese_thinking = property(lambda self: self.runtime.default_enable_chinese_thinking)
+    model_availability_details = property(lambda self: self.runtime.model_availability_details)
+    tools_registry = property(lambda self: self.runtime.tools_registry)
+    llm_interface = property(lambda self: self.runtime.llm_interface)
+    output_parser = property(lambda self: self.runtime.output_parser)
+    planning_llm_retries = property(lambda self: self.runtime.planning_llm_retries)
+    response_generation_llm_retries = property(lambda self: self.runtime.response_generation_llm_retries)
+    max_replanning_attempts = property(lambda self: self.runtime.max_replanning_attempts)
+    rollback_failed_tool_chains = property(lambda self: self.runtime.rollback_failed_tool_chains)
+    erc_after_tool_batches = property(lambda self: self.runtime.erc_after_tool_batches)
+
+    # 当前任务所处理请求的状态 (不在请求处理中时为 None / 默认值)
+    @property
+    def current_request_id(self) -> Optional[str]:
+        request_context = get_request_context()
+        return request_context.request_id if request_context is not None else None
+
+    @property
+    def current_llm_identifier(self) -> str:
+        request_context = get_request_context()
+        return request_context.llm_identifier if request_context is not None else self.runtime.default_llm_identifier
+
+    @property
+    def current_enable_chinese_thinking(self) -> bool:
+        request_context = get_request_context()
+        return request_context.enable_chinese_thinking if request_context is not None else self.runtime.default_enable_chinese_thinking
+
+    def _create_response_parser(self, stage: str, status_callback: Callable[[Dict[str, Any]], Awaitable[None]],
+                                tool_request_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> IncrementalResponseParser:
+        """
+        为一次 LLM 调用创建增量解析器，<think> 块的内容以 thinking_stream 消息实时发给前端。
+        提供 tool_request_callback 时，计划中每个完整且通过校验的工具调用请求生成后立即传给它 (用于提前执行)。
+        """
+        request_id = self.current_request_id
+        stream_id = f"{request_id}_{stage}_{str(uuid4())[:6]}"
+        async def send_thinking_delta(thinking_delta: str) -> None:
+            await status_callback({"type": "thinking_stream", "request_id": request_id, "stream_id": stream_id, "stage": stage, "content": thinking_delta})
+        return self.output_parser.create_incremental_parser(stage, send_thinking_delta, self.runtime.thinking_stream_flush_seconds, tool_request_callback)
+
+    def _add_to_request_turn(self, message: Dict[str, Any]) -> None:
+        """把当前请求产生的消息记入请求自己的对话轮次 (请求结束时一次性写入短期记忆，见 RequestContext)。"""
+        if not isinstance(message, dict) or "role" not in message or "content" not in message:
+            self.logger.warning(f"[Orchestrator - ReqID:{self.current_request_id}] 尝试记录格式无效的消息: {message}")
+            return
+        request_context = get_request_context()
+        if request_context is None: # 不在请求处理中 (理论上不会发生)，直接写入短期记忆
+            self.memory_manager.add_to_short_term(message)
+            return
+        request_context.turn_messages.append(message)
+
+    def _assemble_llm_context(self, system_prompt: str, log_prefix: str) -> AssembledContext:
+        """
+        按当前模型的上下文 token 预算，把系统提示、短期记忆 (已结束的请求) 和当前请求的本轮消息
+        装配为发送给 LLM 的消息列表，并记录各部分的 token 估算。
+        """
+        token_budget = self.runtime.get_context_token_budget(self.current_llm_identifier)
+        request_context = get_request_context()
+        assembled_context = self.runtime.context_assembler.assemble(
+            system_prompt, self.memory_manager.short_term, token_budget,
+            current_turn=request_context.turn_messages if request_context is not None else None
+        )
+        breakdown = assembled_context.token_breakdown
+        self.logger.info(f"{log_prefix} 上下文 token 估算: 共 {breakdown['total']}/{token_budget} (系统提示 {breakdown['system_prompt']}, "
+                         f"之前的对话 {breakdown['earlier_turns']}, 本轮 {breakdown['current_turn']}, 本轮工具结果 {breakdown['current_turn_tool_results']}); "
+                         f"省略 {assembled_context.dropped_message_count} 条历史消息, 截断 {assembled_context.truncated_message_count} 条工具结果。")
+        return assembled_context
+
+    def _attach_erc_result(self, tool_results_for_llm_hist: List[Dict[str, Any]], circuit_snapshot_before_batch: int,
+                           circuit_revision_before_batch: int, log_prefix: str) -> None:
+        """
+        电路在本批工具中被修改时增量执行电气规则检查，并把新发现的问题附加到本批最后一个工具结果中供LLM参考。
+        调用方需持有 state_lock。
+        """
+        if not (self.erc_after_tool_batches and tool_results_for_llm_hist and self.memory_manager.circuit.revision != circuit_revision_before_batch):
+            return
         try:
-            max_short_term = self.config_loader.get_config("agent_settings.memory.max_short_term_items", 30)
-            max_long_term = self.config_loader.get_config("agent_settings.memory.max_long_term_items", 75)
-            self.memory_manager = MemoryManager(max_short_term_items=max_short_term, max_long_term_items=max_long_term)
-
-            self.llm_interface = LLMInterface(agent_instance=self)
-
-            self.output_parser = OutputParser(agent_tools_registry=self.tools_registry)
-
-            tool_retries_cfg = self.config_loader.get_config("agent_settings.tools.max_tool_retries", 1)
-            tool_delay_cfg = self.config_loader.get_config("agent_settings.tools.tool_retry_delay_seconds", 1.0)
-            self.tool_executor = ToolExecutor(
-                agent_instance=self, 
-                max_tool_retries=tool_retries_cfg,
-                tool_retry_delay_seconds=tool_delay_cfg
-            )
-        except (ValueError, ConnectionError, TypeError) as e: 
-            self.logger.critical(f"[Agent Init] 核心模块实例化失败: {e}", exc_info=True)
-            raise 
-
-        self.planning_llm_retries: int = self.config_loader.get_config("agent_settings.llm.planning_llm_retries", 3)
-        self.response_generation_llm_retries: int = self.config_loader.get_config("agent_settings.llm.response_generation_llm_retries", 1)
-        self.max_replanning_attempts: int = self.config_loader.get_config("agent_settings.orchestration.max_replanning_attempts", 2)
-        
-        self.logger.info(f"[Agent Init] LLM规划重试: {self.planning_llm_retries}, LLM响应生成重试: {self.response_generation_llm_retries}, 工具执行重试: {tool_retries_cfg}, 最大重规划尝试: {self.max_replanning_attempts}。")
-        self.logger.info(f"\n{'='*30} CircuitAgent 初始化成功 (V1.1.1 - 动态模型可用性) {'='*30}\n") # 版本号微调
+            erc_result = self.erc_checker.check_changes(self.memory_manager.circuit, circuit_snapshot_before_batch, circuit_revision_before_batch)
+            last_tool_msg = tool_results_for_llm_hist[-1]
+            last_tool_content = json.loads(last_tool_msg.get("content", "{}"))
+            last_tool_content["electrical_rule_check"] = erc_result
+            last_tool_msg["content"] = json.dumps(last_tool_content, ensure_ascii=False)
+            self.logger.info(f"{log_prefix} 电气规则检查 ({erc_result['mode']}): 检查 {erc_result['checked_component_count']} 个元件, 新增问题 {erc_result['new_violation_count']} 个, 未解决问题共 {erc_result['open_violation_count']} 个。")
+        except Exception as e_erc: self.logger.error(f"{log_prefix} 电气规则检查失败 (不影响工具结果): {e_erc}", exc_info=True)
 
     async def process_user_request(self, 
                                  user_request: str, 
                                  status_callback: Callable[[Dict[str, Any]], Awaitable[None]],
                                  selected_llm_identifier_from_frontend: Optional[str] = None,
-                                 enable_chinese_thinking_from_frontend: Optional[bool] = None
+                                 enable_chinese_thinking_from_frontend: Optional[bool] = None,
+                                 request_id: Optional[str] = None
                                  ) -> None:
         request_start_time = time.monotonic()
-        self.current_request_id = f"req_{str(uuid4())[:12]}" 
+        request_context = RequestContext(
+            request_id=request_id or f"req_{str(uuid4())[:12]}",
+            llm_identifier=self.default_llm_identifier,
+            enable_chinese_thinking=self.default_enable_chinese_thinking
+        )
+        request_context_token = set_request_context(request_context)
 
         final_llm_camelcase_json_for_reply: Optional[Dict[str, Any]] = None
         final_reply_for_user: str = self.config_loader.get_config(
@@ -168,6 +182,7 @@ class CircuitAgent:
         )
         final_llm_interaction_id_for_user: Optional[str] = None
         active_llm_interaction_id: Optional[str] = None 
+        early_tool_dispatcher: Optional[EarlyToolDispatcher] = None # 规划流式生成期间提前执行工具调用 (计划确认前可回滚)
 
         # --- 更新当前请求使用的模型和中文思考设置 ---
         # 1. 模型选择
@@ -179,10 +194,9 @@ class CircuitAgent:
                     is_selected_model_actually_available = True
                     break
             if is_selected_model_actually_available:
-                self.current_llm_identifier = selected_llm_identifier_from_frontend
+                request_context.llm_identifier = selected_llm_identifier_from_frontend
             else:
                 self.logger.warning(f"前端请求使用模型 '{selected_llm_identifier_from_frontend}'，但该模型当前不可用 (API Key可能未配置)。将回退到默认模型 '{self.default_llm_identifier}'。")
-                self.current_llm_identifier = self.default_llm_identifier
                 # 可以通过 status_callback 通知前端模型选择被覆盖
                 await status_callback({
                     "type": "general_status", "request_id": self.current_request_id,
@@ -190,18 +204,14 @@ class CircuitAgent:
                     "message": f"您选择的模型 '{selected_llm_identifier_from_frontend}' 当前不可用，已自动切换到默认模型 '{self.current_llm_identifier}'。",
                     "details": {"requested_model": selected_llm_identifier_from_frontend, "used_model": self.current_llm_identifier}
                 })
-        else:
-            self.current_llm_identifier = self.default_llm_identifier
         
         # 2. 中文深度思考设置
         globally_enabled_chinese_thinking = self.config_loader.get_config("agent_settings.feature_flags.enable_chinese_deep_thinking_globally", True)
         if not globally_enabled_chinese_thinking:
-            self.current_enable_chinese_thinking = False 
+            request_context.enable_chinese_thinking = False 
             self.logger.info(f"[Orchestrator - ReqID:{self.current_request_id}] 深度中文思考功能全局禁用。")
         elif enable_chinese_thinking_from_frontend is not None:
-            self.current_enable_chinese_thinking = enable_chinese_thinking_from_frontend
-        else:
-            self.current_enable_chinese_thinking = self.default_enable_chinese_thinking
+            request_context.enable_chinese_thinking = enable_chinese_thinking_from_frontend
         # --- 模型和中文思考设置更新完毕 ---
 
 
@@ -232,7 +242,7 @@ class CircuitAgent:
             await status_callback({"type": "general_status", "request_id": self.current_request_id, "stage": "input_validation", "status": "received", "message": "收到用户指令,开始处理...", "details": {"user_request_preview": user_request[:1000]}})
             
             try: 
-                self.memory_manager.add_to_short_term({"role": "user", "content": user_request})
+                self._add_to_request_turn({"role": "user", "content": user_request})
             except Exception as e_mem_user:
                 self.logger.error(f"[Orchestrator - ReqID:{self.current_request_id}] 添加用户消息到短期记忆时出错: {e_mem_user}", exc_info=True)
                 err_msg_mem = f"记录用户指令时发生内部记忆错误: {e_mem_user}"
@@ -255,18 +265,23 @@ class CircuitAgent:
                 status_msg_planning_start = "正在分析指令并制定计划..." if not is_currently_replanning else f"正在尝试第 {replanning_loop_count +1 }/{self.max_replanning_attempts +1} 次重规划..." 
                 await status_callback({"type": "general_status", "request_id": self.current_request_id, "stage": "planning", "status": "started", "message": status_msg_planning_start, "details": {"attempt_number": current_planning_attempt_num, "max_replanning_attempts": self.max_replanning_attempts}})
 
-                recent_long_term_for_prompt = self.config_loader.get_config("agent_settings.memory.recent_long_term_count_for_prompt", 7)
-                memory_context = self.memory_manager.get_memory_context_for_prompt(recent_long_term_count=recent_long_term_for_prompt)
-                tool_schemas_for_llm = get_tool_schemas_for_prompt(self.tools_registry)
+                recent_long_term_for_prompt = self.runtime.recent_long_term_count_for_prompt
+                async with self.state_lock:
+                    # 每个规划周期开始前创建电路快照 (O(1))，工具链失败时可据此回滚
+                    circuit_snapshot_before_cycle = self.memory_manager.circuit.create_snapshot()
+                    memory_context = self.memory_manager.get_memory_context_for_prompt(recent_long_term_count=recent_long_term_for_prompt, pending_messages=request_context.turn_messages)
+                tool_schemas_for_llm = self.runtime.tool_schemas_for_prompt # 工具说明文本按工具注册表指纹缓存
                 
-                system_prompt_planning = get_planning_prompt(
+                # 系统提示分为静态前缀 (规则、示例、工具说明) 和动态后缀 (请求ID、时间、电路与记忆)，连续的调用共享相同的前缀以命中提示缓存
+                planning_prompt_layout = build_planning_prompt(
                     tool_schemas_desc=tool_schemas_for_llm, 
                     memory_context=memory_context, 
                     is_replanning=is_currently_replanning, 
                     request_id=self.current_request_id,
-                    enable_deep_thinking_chinese=self.current_enable_chinese_thinking 
+                    enable_deep_thinking_chinese=self.current_enable_chinese_thinking,
+                    registry_fingerprint=self.runtime.tools_registry_fingerprint 
                 )
-                messages_for_planning = [{"role": "system", "content": system_prompt_planning}] + self.memory_manager.short_term
+                messages_for_planning = self._assemble_llm_context(planning_prompt_layout.text, log_prefix).messages
 
                 llm_call_attempt_inner = 0 
                 parsed_plan_camelcase_json_this_llm_call: Optional[Dict[str, Any]] = None
@@ -277,11 +292,16 @@ class CircuitAgent:
                 while llm_call_attempt_inner <= self.planning_llm_retries: 
                     self.logger.info(f"{log_prefix} 调用规划 LLM (模型: {self.current_llm_identifier}, LLM Call Attempt {llm_call_attempt_inner + 1} of {self.planning_llm_retries + 1})...")
                     try:
+                        early_tool_dispatcher = EarlyToolDispatcher(self, request_context, status_callback, log_prefix) if self.runtime.early_tool_dispatch else None
+                        planning_response_parser = self._create_response_parser("planning", status_callback, early_tool_dispatcher.submit if early_tool_dispatcher else None)
                         llm_response_planning_raw = await self.llm_interface.call_llm( 
                             messages=messages_for_planning, 
                             execution_phase="planning", 
                             status_callback=status_callback,
-                            selected_model_identifier=self.current_llm_identifier 
+                            selected_model_identifier=self.current_llm_identifier,
+                            request_id=self.current_request_id,
+                            stream_handler=planning_response_parser.feed,
+                            prompt_prefix_hash=planning_prompt_layout.prefix_hash
                         )
                         if not llm_response_planning_raw or not hasattr(llm_response_planning_raw, 'choices') or not llm_response_planning_raw.choices: 
                             raise ConnectionError("LLM规划响应无效或缺少choices。")
@@ -289,7 +309,7 @@ class CircuitAgent:
                         llm_msg_obj_planning = llm_response_planning_raw.choices[0].message
                         
                         parsed_plan_camelcase_json_this_llm_call, parser_error_msg_this_llm_call, parsed_failed_validation_points_this_llm_call = \
-                            self.output_parser.parse_llm_response_to_structured_json(llm_msg_obj_planning, "planning")
+                            await planning_response_parser.finish()
 
                         if parsed_plan_camelcase_json_this_llm_call:
                             active_llm_interaction_id = parsed_plan_camelcase_json_this_llm_call.get("llmInteractionId")
@@ -314,11 +334,11 @@ class CircuitAgent:
                                 current_llm_plan_camelcase_json_obj = parsed_plan_camelcase_json_this_llm_call
                                 try: 
                                     if hasattr(llm_msg_obj_planning, 'model_dump'):
-                                        self.memory_manager.add_to_short_term(llm_msg_obj_planning.model_dump(exclude_unset=True))
+                                        self._add_to_request_turn(llm_msg_obj_planning.model_dump(exclude_unset=True))
                                     elif isinstance(llm_msg_obj_planning, dict):
-                                         self.memory_manager.add_to_short_term(llm_msg_obj_planning)
+                                         self._add_to_request_turn(llm_msg_obj_planning)
                                     else: 
-                                        self.memory_manager.add_to_short_term(llm_msg_obj_planning.dict(exclude_unset=True)) # type: ignore
+                                        self._add_to_request_turn(llm_msg_obj_planning.dict(exclude_unset=True)) # type: ignore
                                 except AttributeError as e_attr:
                                     self.logger.error(f"{log_prefix} 添加LLM规划响应到记忆时，message对象缺少model_dump或dict方法: {e_attr}。对象类型: {type(llm_msg_obj_planning)}")
                                 except Exception as e_mem_add: 
@@ -331,23 +351,25 @@ class CircuitAgent:
                             if parsed_plan_camelcase_json_this_llm_call and parsed_plan_camelcase_json_this_llm_call.get("status") == "failure":
                                 try: 
                                     if hasattr(llm_msg_obj_planning, 'model_dump'):
-                                        self.memory_manager.add_to_short_term(llm_msg_obj_planning.model_dump(exclude_unset=True))
+                                        self._add_to_request_turn(llm_msg_obj_planning.model_dump(exclude_unset=True))
                                     elif isinstance(llm_msg_obj_planning, dict):
-                                        self.memory_manager.add_to_short_term(llm_msg_obj_planning)
+                                        self._add_to_request_turn(llm_msg_obj_planning)
                                     else:
-                                        self.memory_manager.add_to_short_term(llm_msg_obj_planning.dict(exclude_unset=True)) # type: ignore
+                                        self._add_to_request_turn(llm_msg_obj_planning.dict(exclude_unset=True)) # type: ignore
                                 except AttributeError as e_attr:
                                      self.logger.error(f"{log_prefix} 添加LLM失败规划到记忆时，message对象缺少model_dump或dict方法: {e_attr}。")
                                 except Exception as e_mem_add_fail: self.logger.error(f"{log_prefix} 添加LLM失败规划到记忆失败: {e_mem_add_fail}")
                             elif parser_error_msg_this_llm_call or parsed_failed_validation_points_this_llm_call:
                                  sim_err_plan_content = { "requestId": self.current_request_id, "llmInteractionId": f"agent_parser_err_{active_llm_interaction_id or str(uuid4())[:6]}", "timestampUtc": datetime.now(timezone.utc).isoformat(), "status": "failure", "errorDetails": { "errorType": "LLM_OUTPUT_VALIDATION_ERROR", "errorCode": "V1_CAMELCASE_JSON_VALIDATION_FAILED_BY_AGENT", "technicalMessage": parser_error_msg_this_llm_call or "Agent端JSON校验失败。", "isDirectLlmFailure": False, "failedValidationPoints": parsed_failed_validation_points_this_llm_call }, "executionPhase": "planning", "thoughtProcess": "Agent在解析或验证LLM上一次规划输出时发现以下问题,将请求LLM修正。", "decision": { "isCallTools": False, "toolCallRequests": [], "responseToUser": {"contentType":"text/plain", "content":""}}}
-                                 try: self.memory_manager.add_to_short_term({"role": "assistant", "content": json.dumps(sim_err_plan_content, ensure_ascii=False)})
+                                 try: self._add_to_request_turn({"role": "assistant", "content": json.dumps(sim_err_plan_content, ensure_ascii=False)})
                                  except Exception as e_mem_add_parse_err: self.logger.error(f"{log_prefix} 添加Agent解析错误到记忆失败: {e_mem_add_parse_err}")
                     except Exception as e_llm_call_level: 
                         self.logger.error(f"{log_prefix} LLM调用或规划解析时发生严重错误 (LLM Call Attempt {llm_call_attempt_inner + 1}): {e_llm_call_level}", exc_info=True)
                         parser_error_msg_this_llm_call = f"LLM调用/解析严重错误: {str(e_llm_call_level)[:1000]}"
                         parsed_failed_validation_points_this_llm_call = [{"jsonPath":"root.llmCallOrParse", "issue_description": parser_error_msg_this_llm_call}]
                         if llm_call_attempt_inner < self.planning_llm_retries: await status_callback({"type": "general_status", "request_id": self.current_request_id, "stage": "planning", "status": "llm_error_retrying", "message": f"与大脑沟通时发生严重错误,尝试重新连接 ({parser_error_msg_this_llm_call})", "details": {"llm_call_attempt": llm_call_attempt_inner + 1}})
+                    if early_tool_dispatcher is not None and not agent_accepted_latest_plan_for_action:
+                        await early_tool_dispatcher.rollback(); early_tool_dispatcher = None # 计划未被采纳: 撤销提前执行的工具
                     llm_call_attempt_inner += 1
                     if agent_accepted_latest_plan_for_action: break 
                 
@@ -362,7 +384,7 @@ class CircuitAgent:
                         final_llm_camelcase_json_for_reply = None; break 
                     else: 
                         sim_fail_plan_content_for_replan = { "requestId": self.current_request_id, "llmInteractionId": f"agent_replan_trigger_{active_llm_interaction_id or str(uuid4())[:6]}", "timestampUtc": datetime.now(timezone.utc).isoformat(), "status": "failure", "errorDetails": {"errorType": "LLM_OUTPUT_VALIDATION_ERROR", "errorCode": "PLAN_VALIDATION_FAILED_IN_ATTEMPT", "technicalMessage": error_summary_final_planning_llm_attempt, "isDirectLlmFailure": False, "failedValidationPoints": parsed_failed_validation_points_this_llm_call }, "executionPhase": "planning", "thoughtProcess": f"Agent在第 {current_planning_attempt_num} 次规划尝试失败,将重规划。错误: {error_summary_final_planning_llm_attempt}", "decision": { "isCallTools": False, "toolCallRequests": [], "responseToUser": {"contentType":"text/plain", "content":""}}}
-                        try: self.memory_manager.add_to_short_term({"role": "assistant", "content": json.dumps(sim_fail_plan_content_for_replan, ensure_ascii=False)})
+                        try: self._add_to_request_turn({"role": "assistant", "content": json.dumps(sim_fail_plan_content_for_replan, ensure_ascii=False)})
                         except Exception as e_mem_add_replan_trigger: self.logger.error(f"{log_prefix} 添加重规划触发信息到记忆出错: {e_mem_add_replan_trigger}")
                         replanning_loop_count += 1; continue 
 
@@ -378,6 +400,8 @@ class CircuitAgent:
                 should_call_tools = decision_from_plan.get("isCallTools", False) 
                 response_user_obj_from_plan = decision_from_plan.get("responseToUser")
                 # tool_execution_results_for_llm_history: List[Dict[str, Any]] = [] # 已移到循环外
+                if early_tool_dispatcher is not None and not (should_call_tools and isinstance(tool_requests_from_plan, list) and tool_requests_from_plan):
+                    await early_tool_dispatcher.rollback(); early_tool_dispatcher = None # 采纳的计划不执行工具: 撤销提前执行的工具
 
                 if should_call_tools: 
                     tool_count_in_plan = len(tool_requests_from_plan) if isinstance(tool_requests_from_plan, list) else 0
@@ -390,17 +414,38 @@ class CircuitAgent:
                         err_msg_list_tools_critical = "内部规划错误: isCallTools为True但toolCallRequests无效或为空。"
                         self.logger.error(f"{log_prefix} {err_msg_list_tools_critical}")
                         tool_execution_results_for_llm_history = [{"role":"tool", "tool_call_id":f"plan_integrity_err_{str(uuid4())[:6]}", "name":"plan_integrity_checker", "content":json.dumps({"status":"failure", "message":err_msg_list_tools_critical, "error": {"error_type":"INTERNAL_AGENT_ERROR", "error_code":"INVALID_TOOL_REQUEST_LIST", "technical_message": err_msg_list_tools_critical}})}]
-                        try: self.memory_manager.add_to_short_term(tool_execution_results_for_llm_history[0])
+                        try: self._add_to_request_turn(tool_execution_results_for_llm_history[0])
                         except Exception as e_mem_add_integrity_err: self.logger.error(f"{log_prefix} 添加规划完整性错误到记忆失败: {e_mem_add_integrity_err}")
                         if replanning_loop_count >= self.max_replanning_attempts: final_reply_for_user = f"抱歉,系统准备执行操作时遇内部问题: {err_msg_list_tools_critical}"; final_llm_interaction_id_for_user = current_llm_plan_camelcase_json_obj.get("llmInteractionId") if current_llm_plan_camelcase_json_obj else active_llm_interaction_id; final_llm_camelcase_json_for_reply = None; break 
                         else: replanning_loop_count += 1; continue
                     
-                    current_tool_exec_results_for_llm_hist = await self.tool_executor.execute_tool_calls( tool_requests_from_plan, status_callback )
+                    current_tool_exec_results_for_llm_hist = None
+                    if early_tool_dispatcher is not None and early_tool_dispatcher.submitted_count:
+                        # 部分工具已在计划生成期间提前执行: 以最终计划确认并执行其余工具 (不一致时回滚并返回 None，按普通方式执行)
+                        current_tool_exec_results_for_llm_hist = await early_tool_dispatcher.commit(tool_requests_from_plan)
+                        if current_tool_exec_results_for_llm_hist is not None:
+                            self.logger.info(f"{log_prefix} 计划中的 {early_tool_dispatcher.submitted_count} 个工具已在计划生成期间提前执行。")
+                            if early_tool_dispatcher.acquired_mutation_lock:
+                                circuit_snapshot_before_cycle = early_tool_dispatcher.batch_snapshot
+                            async with self.state_lock:
+                                self._attach_erc_result(current_tool_exec_results_for_llm_hist, early_tool_dispatcher.batch_snapshot, early_tool_dispatcher.batch_revision, log_prefix)
+                    early_tool_dispatcher = None
+                    if current_tool_exec_results_for_llm_hist is None:
+                        if not request_context.holds_mutation_lock and self.runtime.is_modifying_tool_batch(tool_requests_from_plan):
+                            # 本批会修改电路: 等待同一会话中其它修改电路的请求结束，之后本请求一直持有修改锁直到结束
+                            await self.mutation_lock.acquire(); request_context.holds_mutation_lock = True
+                            self.logger.info(f"{log_prefix} 本批工具会修改电路,已取得会话修改锁。")
+                            # 本请求此前没有修改过电路，回滚快照移到取得锁之后，避免回滚掉其它请求的修改
+                            async with self.state_lock: circuit_snapshot_before_cycle = self.memory_manager.circuit.create_snapshot()
+                        async with self.state_lock:
+                            circuit_snapshot_before_batch = self.memory_manager.circuit.create_snapshot(); circuit_revision_before_batch = self.memory_manager.circuit.revision
+                            current_tool_exec_results_for_llm_hist = await self.tool_executor.execute_tool_calls( tool_requests_from_plan, status_callback )
+                            self._attach_erc_result(current_tool_exec_results_for_llm_hist, circuit_snapshot_before_batch, circuit_revision_before_batch, log_prefix)
                     tool_execution_results_for_llm_history.extend(current_tool_exec_results_for_llm_hist) 
                     
                     if tool_execution_results_for_llm_history: 
                         for res_msg_tool in tool_execution_results_for_llm_history:
-                            try: self.memory_manager.add_to_short_term(res_msg_tool)
+                            try: self._add_to_request_turn(res_msg_tool)
                             except Exception as e_mem_add_tool_res: self.logger.error(f"{log_prefix} 添加工具结果 {res_msg_tool.get('tool_call_id')} 到记忆失败: {e_mem_add_tool_res}")
                     
                     any_tool_failed_persistently = False; last_failed_tool_message_for_user = "一个或多个操作未能成功完成。" 
@@ -413,6 +458,15 @@ class CircuitAgent:
                     
                     if any_tool_failed_persistently:
                         self.logger.warning(f"{log_prefix} 工具执行中发生持久性失败。")
+                        if self.rollback_failed_tool_chains and request_context.holds_mutation_lock: # 未取得修改锁说明本请求没有修改过电路
+                            try:
+                                async with self.state_lock: # 长期记忆与电路一样只在 state_lock 内修改
+                                    rolled_back_count = self.memory_manager.circuit.restore_snapshot(circuit_snapshot_before_cycle)
+                                    if rolled_back_count:
+                                        self.memory_manager.add_to_long_term(f"工具链执行失败,电路已回滚到本轮规划前的状态,本轮中已成功的修改均已撤销 (请求ID: {self.current_request_id})。")
+                                if rolled_back_count:
+                                    self.logger.info(f"{log_prefix} 已将电路回滚到本轮规划前的状态 (撤销了 {rolled_back_count} 个修改)。")
+                            except ValueError as e_restore: self.logger.error(f"{log_prefix} 回滚电路到规划前快照失败: {e_restore}")
                         await status_callback({"type": "general_status", "request_id": self.current_request_id, "stage": "action_execution", "status": "tool_failure_detected", "message": "部分操作失败,准备评估是否重规划。", "details": {"last_error_message": last_failed_tool_message_for_user}})
                         if replanning_loop_count < self.max_replanning_attempts: replanning_loop_count += 1; continue 
                         else: self.logger.critical(f"{log_prefix} 已达最大重规划尝试次数,但工具执行仍失败。中止。"); final_reply_for_user = f"抱歉,执行请求时遇问题: {last_failed_tool_message_for_user} 请检查指令或稍后再试。"; final_llm_interaction_id_for_user = current_llm_plan_camelcase_json_obj.get("llmInteractionId") if current_llm_plan_camelcase_json_obj else active_llm_interaction_id; final_llm_camelcase_json_for_reply = None; break 
@@ -428,7 +482,7 @@ class CircuitAgent:
                         err_msg_direct_content_critical = "内部规划错误: isCallTools为False但responseToUser.content无效或为空。"
                         self.logger.error(f"{log_prefix} {err_msg_direct_content_critical}")
                         tool_execution_results_for_llm_history = [{"role":"tool", "tool_call_id":f"direct_reply_integrity_err_{str(uuid4())[:6]}", "name":"direct_reply_integrity_checker", "content":json.dumps({"status":"failure", "message":err_msg_direct_content_critical, "error": {"error_type":"INTERNAL_AGENT_ERROR", "error_code":"INVALID_DIRECT_RESPONSE_CONTENT", "technical_message": err_msg_direct_content_critical}})}]
-                        try: self.memory_manager.add_to_short_term(tool_execution_results_for_llm_history[0])
+                        try: self._add_to_request_turn(tool_execution_results_for_llm_history[0])
                         except Exception as e_mem_add_direct_reply_err: self.logger.error(f"{log_prefix} 添加直接回复完整性错误到记忆失败: {e_mem_add_direct_reply_err}")
                         if replanning_loop_count >= self.max_replanning_attempts: final_reply_for_user = f"抱歉,系统准备直接回复时遇内部问题: {err_msg_direct_content_critical}"; final_llm_interaction_id_for_user = current_llm_plan_camelcase_json_obj.get("llmInteractionId") if current_llm_plan_camelcase_json_obj else active_llm_interaction_id; final_llm_camelcase_json_for_reply = None; break 
                         else: replanning_loop_count += 1; continue
@@ -446,32 +500,38 @@ class CircuitAgent:
                 
                 self.logger.info(f"[Orchestrator - ReqID:{self.current_request_id}] 工具执行流程完成,开始生成最终响应 (LLM: {self.current_llm_identifier}, 中文思考: {self.current_enable_chinese_thinking}, LLM重试上限: {resp_gen_llm_retries})...")
                 await status_callback({"type": "general_status", "request_id": self.current_request_id, "stage": "response_generation", "status": "started", "message": "正在总结结果并生成最终回复...", "details": {"reason": "Tool execution phase completed."}})
-                memory_context_resp_gen = self.memory_manager.get_memory_context_for_prompt( recent_long_term_count=self.config_loader.get_config("agent_settings.memory.recent_long_term_count_for_prompt", 7) )
-                tool_schemas_resp_gen = get_tool_schemas_for_prompt(self.tools_registry) 
-                system_prompt_resp_gen = get_response_generation_prompt( 
+                async with self.state_lock:
+                    memory_context_resp_gen = self.memory_manager.get_memory_context_for_prompt( recent_long_term_count=self.runtime.recent_long_term_count_for_prompt, pending_messages=request_context.turn_messages )
+                tool_schemas_resp_gen = self.runtime.tool_schemas_for_prompt
+                resp_gen_prompt_layout = build_response_generation_prompt( 
                     memory_context=memory_context_resp_gen, 
                     tool_schemas_desc=tool_schemas_resp_gen, 
                     request_id=self.current_request_id,
-                    enable_deep_thinking_chinese=self.current_enable_chinese_thinking
+                    enable_deep_thinking_chinese=self.current_enable_chinese_thinking,
+                    registry_fingerprint=self.runtime.tools_registry_fingerprint
                 )
-                messages_for_resp_gen = [{"role": "system", "content": system_prompt_resp_gen}] + self.memory_manager.short_term
+                messages_for_resp_gen = self._assemble_llm_context(resp_gen_prompt_layout.text, f"[Orchestrator - ReqID:{self.current_request_id}]").messages
                 
                 llm_call_attempt_resp_gen = 0; parsed_final_camelcase_resp_json_this_attempt: Optional[Dict[str, Any]] = None
                 while llm_call_attempt_resp_gen <= resp_gen_llm_retries:
                     self.logger.info(f"[Orchestrator - ReqID:{self.current_request_id}] 调用响应生成 LLM (模型: {self.current_llm_identifier}, 尝试 {llm_call_attempt_resp_gen + 1}/{resp_gen_llm_retries + 1})...")
                     try:
+                        response_generation_parser = self._create_response_parser("response_generation", status_callback)
                         llm_response_final_gen_raw = await self.llm_interface.call_llm( 
                             messages=messages_for_resp_gen, 
                             execution_phase="response_generation", 
                             status_callback=status_callback,
-                            selected_model_identifier=self.current_llm_identifier
+                            selected_model_identifier=self.current_llm_identifier,
+                            request_id=self.current_request_id,
+                            stream_handler=response_generation_parser.feed,
+                            prompt_prefix_hash=resp_gen_prompt_layout.prefix_hash
                         )
                         if not llm_response_final_gen_raw or not hasattr(llm_response_final_gen_raw, 'choices') or not llm_response_final_gen_raw.choices: 
                             raise ConnectionError("LLM最终响应生成阶段响应无效。")
                         
                         llm_msg_obj_final_gen = llm_response_final_gen_raw.choices[0].message
                         parsed_final_camelcase_resp_json_this_attempt, final_parser_err_resp, final_validation_failures_resp = \
-                            self.output_parser.parse_llm_response_to_structured_json(llm_msg_obj_final_gen, "response_generation")
+                            await response_generation_parser.finish()
                         
                         if parsed_final_camelcase_resp_json_this_attempt:
                             active_llm_interaction_id = parsed_final_camelcase_resp_json_this_attempt.get("llmInteractionId")
@@ -484,11 +544,11 @@ class CircuitAgent:
                             self.logger.info(f"[Orchestrator - ReqID:{self.current_request_id}] 成功解析最终响应V1.0-JSON (LLM_ID: {final_llm_interaction_id_for_user})。")
                             try: 
                                 if hasattr(llm_msg_obj_final_gen, 'model_dump'):
-                                    self.memory_manager.add_to_short_term(llm_msg_obj_final_gen.model_dump(exclude_unset=True))
+                                    self._add_to_request_turn(llm_msg_obj_final_gen.model_dump(exclude_unset=True))
                                 elif isinstance(llm_msg_obj_final_gen, dict):
-                                     self.memory_manager.add_to_short_term(llm_msg_obj_final_gen)
+                                     self._add_to_request_turn(llm_msg_obj_final_gen)
                                 else:
-                                    self.memory_manager.add_to_short_term(llm_msg_obj_final_gen.dict(exclude_unset=True)) # type: ignore
+                                    self._add_to_request_turn(llm_msg_obj_final_gen.dict(exclude_unset=True)) # type: ignore
                             except AttributeError as e_attr:
                                 self.logger.error(f"添加最终LLM响应到记忆时，message对象缺少model_dump或dict方法: {e_attr}。")
                             except Exception as e_mem_add_final_resp: self.logger.error(f"添加最终LLM响应到记忆失败: {e_mem_add_final_resp}")
@@ -505,11 +565,11 @@ class CircuitAgent:
                                 break 
                             try: 
                                 if hasattr(llm_msg_obj_final_gen, 'model_dump'):
-                                    self.memory_manager.add_to_short_term(llm_msg_obj_final_gen.model_dump(exclude_unset=True))
+                                    self._add_to_request_turn(llm_msg_obj_final_gen.model_dump(exclude_unset=True))
                                 elif isinstance(llm_msg_obj_final_gen, dict):
-                                     self.memory_manager.add_to_short_term(llm_msg_obj_final_gen)
+                                     self._add_to_request_turn(llm_msg_obj_final_gen)
                                 else:
-                                    self.memory_manager.add_to_short_term(llm_msg_obj_final_gen.dict(exclude_unset=True)) # type: ignore
+                                    self._add_to_request_turn(llm_msg_obj_final_gen.dict(exclude_unset=True)) # type: ignore
                             except: pass 
                     except Exception as e_llm_final_gen_call: 
                         self.logger.critical(f"[Orchestrator - ReqID:{self.current_request_id}] LLM最终响应调用失败 (尝试 {llm_call_attempt_resp_gen + 1}): {e_llm_final_gen_call}", exc_info=True)
@@ -539,7 +599,7 @@ class CircuitAgent:
             
             if not (final_llm_camelcase_json_for_reply and final_llm_camelcase_json_for_reply.get("status") == "success"):
                 final_assistant_synthetic_error_message_camelcase_json = { "requestId": self.current_request_id, "llmInteractionId": final_llm_interaction_id_for_user or f"agent_synth_final_err_{str(uuid4())[:6]}", "timestampUtc": datetime.now(timezone.utc).isoformat(), "status": "failure", "errorDetails": {"errorType": "AGENT_PROCESSING_FAILURE", "errorCode": "OVERALL_REQUEST_HANDLING_FAILED", "messageToUser": final_reply_for_user, "technicalMessage": "Agent failed to complete user request.", "isDirectLlmFailure": False }, "executionPhase": "final_error_synthesis", "thoughtProcess": user_facing_thought_process_final_summary or "Agent最终处理失败。", "decision": {"isCallTools": False, "toolCallRequests": [], "responseToUser": {"contentType":"text/plain", "content": final_reply_for_user}}}
-                try: self.memory_manager.add_to_short_term({"role": "assistant", "content": json.dumps(final_assistant_synthetic_error_message_camelcase_json, ensure_ascii=False)})
+                try: self._add_to_request_turn({"role": "assistant", "content": json.dumps(final_assistant_synthetic_error_message_camelcase_json, ensure_ascii=False)})
                 except Exception as e_mem_add_synth_err: self.logger.error(f"添加Agent合成的最终错误到记忆失败: {e_mem_add_synth_err}")
         # --- END OF ORCHESTRATION LOGIC ---
         except Exception as e_process_top_level: 
@@ -558,6 +618,15 @@ class CircuitAgent:
             request_end_time = time.monotonic()
             duration_total = request_end_time - request_start_time
             self.logger.info(f"\n{'='*25} CircuitAgent 请求处理完毕 (ReqID: {self.current_request_id or 'N/A'}, 模型: {self.current_llm_identifier}, 总耗时: {duration_total:.3f} 秒) {'='*25}\n")
-            self.current_request_id = None 
-            self.current_llm_identifier = self.default_llm_identifier
-            self.current_enable_chinese_thinking = self.default_enable_chinese_thinking
+            if early_tool_dispatcher is not None: # 请求异常结束时撤销尚未确认的提前执行
+                try: await early_tool_dispatcher.rollback()
+                except Exception as e_early_rollback: self.logger.error(f"撤销提前执行的工具失败: {e_early_rollback}", exc_info=True)
+            if request_context.turn_messages: # 本轮对话整体写入短期记忆，不与同一会话的其它请求交错
+                try:
+                    async with self.state_lock:
+                        self.memory_manager.add_turn_to_short_term(request_context.turn_messages)
+                except Exception as e_mem_turn: self.logger.error(f"把本轮对话写入短期记忆失败: {e_mem_turn}", exc_info=True)
+            if request_context.holds_mutation_lock:
+                request_context.holds_mutation_lock = False
+                self.mutation_lock.release()
+            reset_request_context(request_context_token)
@@ -0,0 +1,11 @@
+# IDT_AGENT_Pro/circuitmanus/analysis/__init__.py
+"""
+Circuit Analysis.
+This sub-package contains numerical analyses that operate on the circuit model,
+such as the DC operating-point solver based on modified nodal analysis (MNA)
+and the incremental electrical rule check (ERC).
+"""
+from .dc import DCOperatingPointSolver, MNASystem, MNAError
+from .erc import ElectricalRuleChecker
+
+__all__ = ["DCOperatingPointSolver", "MNASystem", "MNAError", "ElectricalRuleChecker"]
@@ -0,0 +1,601 @@
+# IDT_AGENT_Pro/circuitmanus/analysis/dc.py
+import time
+import logging
+from typing import Dict, List, Optional, Tuple, Any, Callable, TYPE_CHECKING
+
+from ..circuit_domain.circuit import normalize_component_type
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    logging.getLogger(__name__).warning("无法导入 'numpy'。直流工作点求解功能将不可用。")
+    NUMPY_AVAILABLE = False
+
+try:
+    import scipy.sparse
+    from scipy.sparse.linalg import splu
+    SCIPY_AVAILABLE = True
+except ImportError:
+    logging.getLogger(__name__).warning("无法导入 'scipy'。直流工作点求解将退回到 numpy 稠密矩阵求解,仅适合小规模电路。")
+    SCIPY_AVAILABLE = False
+
+if TYPE_CHECKING:
+    from ..circuit_domain.circuit import Circuit
+
+logger = logging.getLogger(__name__)
+
+# 归一化元件类型 (见 normalize_component_type) -> 直流模型
+# - 电感、开关 (视为闭合)、保险丝在直流下是短路，以 0V 电压源建模，从而能给出流过它们的电流。
+# - 电容在直流下是开路，不向矩阵贡献任何项。
+# - 二极管/LED 使用分段线性模型: 导通时为 "正向压降 + 小导通电阻"，截止时为开路。
+_ELEMENT_MODELS: Dict[str, str] = {
+    "resistor": "resistor", "potentiometer": "resistor",
+    "voltage source": "voltage_source", "battery": "voltage_source",
+    "current source": "current_source",
+    "diode": "diode", "led": "diode",
+    "inductor": "short", "switch": "short", "fuse": "short",
+    "capacitor": "open",
+}
+# 本身就是一个电气节点 (网络) 的元件类型，与之相连的元件端子都处于同一网络
+_NET_TYPES = frozenset({"ground", "node", "connection point", "terminal", "header", "input", "output"})
+_GROUND_TYPE = "ground"
+# 有极性的模型: 若一个端子接地，则该端子被视为负极/阴极
+_POLARIZED_MODELS = frozenset({"voltage_source", "current_source", "diode"})
+# 各模型期望的单位，值带有其他单位时给出警告
+_EXPECTED_UNITS: Dict[str, str] = {"resistor": "Ω", "voltage_source": "V", "current_source": "A"}
+# 未指定正向压降时的默认值 (V)
+_DEFAULT_FORWARD_VOLTAGES: Dict[str, float] = {"diode": 0.7, "led": 2.0}
+_DIODE_ON_RESISTANCE = 0.1 # 二极管导通电阻 (Ω)
+_GMIN = 1e-12 # 每个节点到地的极小电导 (S)，避免只经电容相连的悬空节点使矩阵奇异
+_MAX_DIODE_ITERATIONS = 50
+# 可以做参数扫描的模型: 电阻值的变化是矩阵的秩1修改，电源值的变化只影响右端向量
+_SWEEPABLE_MODELS = frozenset({"resistor", "voltage_source", "current_source"})
+_MAX_WARNINGS = 20
+
+class MNAError(ValueError):
+    """电路无法转换为 MNA 方程或方程无解时抛出的异常。"""
+
+def _format_id_list(component_ids: List[str], limit: int = 10) -> str:
+    shown = ", ".join(component_ids[:limit])
+    return shown + (f" 等 {len(component_ids)} 个" if len(component_ids) > limit else "")
+
+def _pair_pattern(first: "np.ndarray", second: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """两端元件的导纳印记 (a,a)+ (b,b)+ (a,b)- (b,a)- 的行列下标，去掉涉及地节点 (-1) 的项。"""
+    rows = np.concatenate((first, second, first, second))
+    cols = np.concatenate((first, second, second, first))
+    keep = (rows >= 0) & (cols >= 0)
+    return rows[keep], cols[keep], keep
+
+def _scatter_add(vector: "np.ndarray", nodes: "np.ndarray", values: "np.ndarray") -> None:
+    """把 values 累加到 vector 的 nodes 位置上，忽略地节点 (-1)。"""
+    mask = nodes >= 0
+    np.add.at(vector, nodes[mask], values[mask])
+
+class MNASystem:
+    """
+    由电路结构构建的改进节点分析 (MNA) 方程。
+
+    Circuit 中的连接只记录 "哪两个元件相连"，没有引脚信息，因此按以下规则推断网络:
+    - 地线、节点、连接点、端子等类型的元件本身就是一个网络，与之相连的元件端子都在该网络上。
+    - 两端元件恰好有两个相邻元件时，两个端子分别朝向这两个相邻元件 (按ID排序)；只有一个相邻元件时，另一端悬空。
+      两个两端元件直接相连时，它们朝向彼此的端子处于同一网络。
+    - 有极性的元件 (电源、二极管) 若一端接地，则该端为负极/阴极；否则按相邻元件ID排序，第一个相邻元件一侧为正极/阳极。
+    - 相邻元件多于两个的两端元件以及不支持的元件类型 (如芯片) 不参与求解，并在警告中列出。
+    所有接地元件视为同一个参考节点 (0V)。
+
+    构建只依赖电路结构；矩阵的稀疏结构 (行列下标) 在构建时一次性确定，
+    元件值变化时只需按新值重新填充数据并重新分解 (refactor)，电源值或二极管压降变化只影响右端向量，无需分解。
+
+    Attributes:
+        topology_revision (int): 构建时电路的结构版本号。
+        node_count (int): 非地节点数。
+        size (int): 未知量总数 (节点电压 + 电压源/短路元件的支路电流)。
+        node_names (List[str]): 各非地节点的名称。
+        ground_name (str): 参考节点的名称。
+        element_ids / element_models (List[str]): 参与求解的元件ID及其直流模型。
+        terminal_nodes (np.ndarray): 形状为 (元件数, 2) 的端子节点下标，-1 表示地。
+        warnings (List[str]): 构建时产生的警告。
+    """
+    def __init__(self, circuit: 'Circuit'):
+        if not NUMPY_AVAILABLE:
+            raise MNAError("直流工作点求解需要 numpy,请先安装: pip install numpy")
+        self.topology_revision: int = circuit.topology_revision
+        self.warnings: List[str] = []
+
+        parent: List[int] = [] # 并查集: 网络元件与元件端子都是其中的 "点"
+        net_point_of: Dict[str, int] = {}
+        pin_facing: Dict[Tuple[str, str], int] = {} # (元件ID, 相邻元件ID) -> 朝向该相邻元件的端子
+        ground_points: List[int] = []
+        records: List[Tuple[str, str, str, int, int]] = [] # (元件ID, 模型, 归一化类型, 端子0, 端子1)
+        unsupported_ids: List[str] = []
+        ambiguous_ids: List[str] = []
+
+        def new_point() -> int:
+            parent.append(len(parent))
+            return len(parent) - 1
+
+        def find(point: int) -> int:
+            while parent[point] != point:
+                parent[point] = parent[parent[point]]
+                point = parent[point]
+            return point
+
+        def union(first: int, second: int) -> None:
+            first_root, second_root = find(first), find(second)
+            if first_root != second_root:
+                parent[first_root] = second_root
+
+        for component in circuit.components.values():
+            type_key = normalize_component_type(component.type)
+            if type_key in _NET_TYPES:
+                net_point_of[component.id] = new_point()
+                if type_key == _GROUND_TYPE:
+                    ground_points.append(net_point_of[component.id])
+                continue
+            model = _ELEMENT_MODELS.get(type_key)
+            neighbor_ids = sorted(circuit.get_connected_component_ids(component.id))
+            if not neighbor_ids:
+                continue # 孤立元件不影响求解
+            if model is None:
+                unsupported_ids.append(component.id)
+                continue
+            if len(neighbor_ids) > 2:
+                ambiguous_ids.append(component.id)
+                continue
+            pins = (new_point(), new_point())
+            for pin, neighbor_id in zip(pins, neighbor_ids):
+                pin_facing[(component.id, neighbor_id)] = pin
+            records.append((component.id, model, type_key, pins[0], pins[1]))
+
+        if unsupported_ids:
+            self.warnings.append(f"以下元件的类型没有直流模型,已忽略 (与其相连的端子视为悬空): {_format_id_list(sorted(unsupported_ids))}")
+        if ambiguous_ids:
+            self.warnings.append(f"以下两端元件的相邻元件多于两个,无法确定其两个端子,已忽略。请通过节点/连接点元件连接: {_format_id_list(sorted(ambiguous_ids))}")
+        if not ground_points:
+            raise MNAError("电路中没有接地 (地线/GND) 元件,无法确定参考节点。请先添加一个地线元件并连接到电路。")
+
+        def facing_point(component_id: str, neighbor_id: str) -> Optional[int]:
+            point = net_point_of.get(component_id)
+            return point if point is not None else pin_facing.get((component_id, neighbor_id))
+
+        for id1, id2 in circuit.connections:
+            point1, point2 = facing_point(id1, id2), facing_point(id2, id1)
+            if point1 is not None and point2 is not None:
+                union(point1, point2)
+        for ground_point in ground_points[1:]:
+            union(ground_points[0], ground_point)
+        ground_root = find(ground_points[0])
+
+        # 为参与求解的网络编号，并收集网络名称
+        node_of_root: Dict[int, int] = {}
+        net_members: List[List[str]] = []
+        def node_index(point: int, member_id: str) -> int:
+            root = find(point)
+            if root == ground_root:
+                return -1
+            index = node_of_root.get(root)
+            if index is None:
+                index = node_of_root[root] = len(node_of_root)
+                net_members.append([])
+            net_members[index].append(member_id)
+            return index
+
+        self.element_ids: List[str] = []
+        self.element_models: List[str] = []
+        self._element_type_keys: List[str] = []
+        terminals: List[Tuple[int, int]] = []
+        for component_id, model, type_key, pin0, pin1 in records:
+            if model in _POLARIZED_MODELS and find(pin0) == ground_root and find(pin1) != ground_root:
+                pin0, pin1 = pin1, pin0
+            terminals.append((node_index(pin0, component_id), node_index(pin1, component_id)))
+            self.element_ids.append(component_id)
+            self.element_models.append(model)
+            self._element_type_keys.append(type_key)
+
+        net_names_of_root: Dict[int, List[str]] = {}
+        for net_id, point in net_point_of.items():
+            net_names_of_root.setdefault(find(point), []).append(net_id)
+        self.ground_name: str = min(net_names_of_root[ground_root])
+        self.node_names: List[str] = [""] * len(node_of_root)
+        for root, index in node_of_root.items():
+            if root in net_names_of_root:
+                self.node_names[index] = min(net_names_of_root[root])
+            else: # 没有网络元件的隐式网络以其上的元件命名，例如 "R1/V1"
+                members = sorted(set(net_members[index]))
+                self.node_names[index] = "/".join(members[:3]) + ("/..." if len(members) > 3 else "")
+
+        self.node_count: int = len(node_of_root)
+        self.terminal_nodes = np.array(terminals, dtype=np.intp).reshape(-1, 2)
+        models = np.array(self.element_models, dtype=object)
+        self._resistors = np.flatnonzero(models == "resistor")
+        self._sources = np.flatnonzero((models == "voltage_source") | (models == "short")) # 带支路电流的元件
+        self._source_is_voltage = models[self._sources] == "voltage_source" # 其余为电压恒为 0 的短路元件
+        self._current_sources = np.flatnonzero(models == "current_source")
+        self._diodes = np.flatnonzero(models == "diode")
+        self._element_index: Dict[str, int] = {component_id: index for index, component_id in enumerate(self.element_ids)}
+        self._model_positions = np.zeros(len(self.element_ids), dtype=np.intp) # 元件在其所属模型数组中的位置
+        for model_indices in (self._resistors, self._sources, self._current_sources, self._diodes):
+            self._model_positions[model_indices] = np.arange(len(model_indices))
+        self.size: int = self.node_count + len(self._sources)
+
+        # 一次性确定矩阵的稀疏结构: [电阻 | 二极管 | 电压源/短路 | GMIN]
+        first, second = self.terminal_nodes[:, 0], self.terminal_nodes[:, 1]
+        resistor_rows, resistor_cols, self._resistor_keep = _pair_pattern(first[self._resistors], second[self._resistors])
+        diode_rows, diode_cols, self._diode_keep = _pair_pattern(first[self._diodes], second[self._diodes])
+        branches = self.node_count + np.arange(len(self._sources), dtype=np.intp)
+        positive, negative = first[self._sources], second[self._sources]
+        source_rows = np.concatenate((positive, branches, negative, branches))
+        source_cols = np.concatenate((branches, positive, branches, negative))
+        source_data = np.concatenate((np.ones(2 * len(branches)), -np.ones(2 * len(branches))))
+        source_keep = (source_rows >= 0) & (source_cols >= 0)
+        diagonal = np.arange(self.node_count, dtype=np.intp)
+        self._rows = np.concatenate((resistor_rows, diode_rows, source_rows[source_keep], diagonal))
+        self._cols = np.concatenate((resistor_cols, diode_cols, source_cols[source_keep], diagonal))
+        self._constant_data = np.concatenate((source_data[source_keep], np.full(self.node_count, _GMIN)))
+
+        # 分解缓存: 电阻电导与二极管状态不变时复用上一次的分解
+        self._factor_key: Optional[Tuple[bytes, bytes]] = None
+        self._solve_factored: Optional[Callable[["np.ndarray"], "np.ndarray"]] = None
+        self._diode_states = np.ones(len(self._diodes), dtype=bool) # 初始假设全部导通，之后沿用上次的状态
+        self.factorization_count: int = 0
+
+    def _read_values(self, circuit: 'Circuit', warnings: List[str]) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray", "np.ndarray"]:
+        """读取各元件的数值: (电阻电导, 电压源电压, 电流源电流, 二极管正向压降)。"""
+        components = circuit.components
+        missing_ids: List[str] = []
+        unit_mismatches: List[str] = []
+
+        def values_of(indices: "np.ndarray", model: str, default: Optional[float] = None) -> "np.ndarray":
+            values = np.empty(len(indices))
+            expected_unit = _EXPECTED_UNITS.get(model)
+            for position, element_index in enumerate(indices.tolist()):
+                component = components[self.element_ids[element_index]]
+                magnitude, unit = component.numeric_value, component.unit
+                if model == "diode": # 二极管的值仅在带电压单位时解释为正向压降，否则 (如 "1N4148") 使用默认值
+                    values[position] = magnitude if magnitude is not None and unit == "V" else _DEFAULT_FORWARD_VOLTAGES[self._element_type_keys[element_index]]
+                    continue
+                if magnitude is None:
+                    missing_ids.append(component.id)
+                    continue
+                if unit is not None and expected_unit is not None and unit != expected_unit:
+                    unit_mismatches.append(f"{component.id}='{component.value}'")
+                values[position] = magnitude
+            return values
+
+        resistances = values_of(self._resistors, "resistor")
+        voltages = values_of(self._sources[self._source_is_voltage], "voltage_source")
+        currents = values_of(self._current_sources, "current_source")
+        forward_voltages = values_of(self._diodes, "diode")
+        if missing_ids:
+            raise MNAError(f"以下元件缺少数值或其值无法解析 (例如 '1k', '5V', '10mA'),无法求解: {_format_id_list(missing_ids)}")
+        invalid_resistor_ids = [self.element_ids[index] for index, resistance in zip(self._resistors.tolist(), resistances.tolist()) if resistance <= 0]
+        if invalid_resistor_ids:
+            raise MNAError(f"以下电阻的阻值必须为正数: {_format_id_list(invalid_resistor_ids)}")
+        if unit_mismatches:
+            warnings.append(f"以下元件的值单位与其类型不符,已按数值本身求解: {_format_id_list(unit_mismatches)}")
+
+        source_values = np.zeros(len(self._sources))
+        source_values[self._source_is_voltage] = voltages
+        return 1.0 / resistances, source_values, currents, forward_voltages
+
+    def _factorize(self, data: "np.ndarray") -> Callable[["np.ndarray"], "np.ndarray"]:
+        """按给定的非零元数据组装矩阵并分解，返回求解函数。"""
+        self.factorization_count += 1
+        singular_message = "MNA 矩阵奇异: 电路中可能存在由电压源/短路元件 (电感、开关、保险丝) 构成的回路,或电压源被直接短路。"
+        if SCIPY_AVAILABLE:
+            matrix = scipy.sparse.csc_matrix((data, (self._rows, self._cols)), shape=(self.size, self.size))
+            try:
+                return splu(matrix).solve
+            except RuntimeError as e_factor:
+                raise MNAError(singular_message) from e_factor
+        dense = np.zeros((self.size, self.size))
+        np.add.at(dense, (self._rows, self._cols), data)
+        try:
+            inverse = np.linalg.inv(dense)
+        except np.linalg.LinAlgError as e_factor:
+            raise MNAError(singular_message) from e_factor
+        return inverse.dot
+
+    def _build_rhs(self, source_values: "np.ndarray", currents: "np.ndarray") -> "np.ndarray":
+        """组装不含二极管项的右端向量。"""
+        rhs = np.zeros(self.size)
+        _scatter_add(rhs, self.terminal_nodes[self._current_sources, 0], currents) # 电流源从正极流出，注入正极所在节点
+        _scatter_add(rhs, self.terminal_nodes[self._current_sources, 1], -currents)
+        rhs[self.node_count:] = source_values
+        return rhs
+
+    def _solve_values(self, conductances: "np.ndarray", source_values: "np.ndarray", currents: "np.ndarray",
+                      forward_voltages: "np.ndarray", states: "np.ndarray", warnings: List[str]) -> Tuple["np.ndarray", "np.ndarray", int]:
+        """
+        按给定的元件数值求解，并迭代二极管的导通状态直到一致。
+        电阻电导与二极管状态与上次分解相同时复用分解结果。
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, int]: (未知量向量, 最终的二极管导通状态, 迭代次数)。
+        """
+        anodes, cathodes = self.terminal_nodes[self._diodes, 0], self.terminal_nodes[self._diodes, 1]
+        base_rhs = self._build_rhs(source_values, currents)
+        iterations = 0
+        solution = np.zeros(self.size)
+        while self.size:
+            iterations += 1
+            diode_conductances = np.where(states, 1.0 / _DIODE_ON_RESISTANCE, _GMIN)
+            factor_key = (conductances.tobytes(), states.tobytes())
+            if factor_key != self._factor_key:
+                data = np.concatenate((np.concatenate((conductances, conductances, -conductances, -conductances))[self._resistor_keep],
+                                       np.concatenate((diode_conductances, diode_conductances, -diode_conductances, -diode_conductances))[self._diode_keep],
+                                       self._constant_data))
+                self._solve_factored = self._factorize(data)
+                self._factor_key = factor_key
+            rhs = base_rhs.copy()
+            if len(self._diodes):
+                injected = np.where(states, diode_conductances * forward_voltages, 0.0)
+                _scatter_add(rhs, anodes, injected)
+                _scatter_add(rhs, cathodes, -injected)
+            solution = self._solve_factored(rhs)
+            if not len(self._diodes):
+                break
+            node_voltages = np.append(solution[:self.node_count], 0.0) # 末尾的 0 供地节点 (-1) 取值
+            new_states = (node_voltages[anodes] - node_voltages[cathodes]) > forward_voltages
+            if np.array_equal(new_states, states):
+                break
+            if iterations >= _MAX_DIODE_ITERATIONS:
+                warnings.append(f"二极管导通状态在 {_MAX_DIODE_ITERATIONS} 次迭代后仍未收敛,结果可能不准确。")
+                break
+            states = new_states
+        return solution, states, iterations
+
+    def solve(self, circuit: 'Circuit') -> Dict[str, Any]:
+        """
+        按电路的当前元件值求解直流工作点。电路结构必须与构建时一致。
+
+        Returns:
+            Dict[str, Any]: 求解结果，包含 node_voltages (节点名 -> 电压) 与 elements (元件ID -> 端子、电压、电流、功率) 等。
+
+        Raises:
+            MNAError: 如果元件值无效或矩阵奇异。
+        """
+        warnings = list(self.warnings)
+        conductances, source_values, currents, forward_voltages = self._read_values(circuit, warnings)
+        factorizations_before = self.factorization_count
+        solution, states, iterations = self._solve_values(conductances, source_values, currents, forward_voltages, self._diode_states, warnings)
+        self._diode_states = states
+        first, second = self.terminal_nodes[:, 0], self.terminal_nodes[:, 1]
+
+        node_voltages = np.append(solution[:self.node_count], 0.0)
+        across = node_voltages[first] - node_voltages[second]
+        element_currents = np.zeros(len(self.element_ids)) # 从端子0经元件流向端子1的电流
+        element_currents[self._resistors] = conductances * across[self._resistors]
+        element_currents[self._sources] = solution[self.node_count:]
+        element_currents[self._current_sources] = -currents
+        diode_across = across[self._diodes]
+        element_currents[self._diodes] = np.where(states, (diode_across - forward_voltages) / _DIODE_ON_RESISTANCE, _GMIN * diode_across)
+        powers = across * element_currents # 元件吸收的功率，电源输出功率时为负
+
+        terminal_names = self.node_names + [self.ground_name]
+        elements: Dict[str, Dict[str, Any]] = {
+            component_id: {"model": model, "terminals": [terminal_names[node0], terminal_names[node1]],
+                           "voltage": voltage, "current": current, "power": power}
+            for component_id, model, node0, node1, voltage, current, power in zip(
+                self.element_ids, self.element_models, first.tolist(), second.tolist(),
+                across.tolist(), element_currents.tolist(), powers.tolist())
+        }
+        for diode_position, element_index in enumerate(self._diodes.tolist()):
+            elements[self.element_ids[element_index]]["conducting"] = bool(states[diode_position])
+
+        return {
+            "reference_node": self.ground_name,
+            "node_count": self.node_count,
+            "element_count": len(self.element_ids),
+            "unknown_count": self.size,
+            "node_voltages": dict(zip(self.node_names, node_voltages[:self.node_count].tolist())),
+            "elements": elements,
+            "diode_iterations": iterations if len(self._diodes) else 0,
+            "factorizations": self.factorization_count - factorizations_before,
+            "warnings": warnings[:_MAX_WARNINGS],
+        }
+
+    def sweep(self, circuit: 'Circuit', component_id: str, sweep_values: "np.ndarray", probe_ids: List[str]) -> Dict[str, Any]:
+        """
+        对一个电阻、电压源或电流源的值做参数扫描，所有扫描点共用同一次矩阵分解。
+
+        - 电阻: 改变电导 g 是矩阵的秩1修改 A + Δg·u·uᵀ (u = e_a - e_b)，
+          由 Sherman-Morrison 公式 x(g) = x₀ - Δg(uᵀx₀)/(1 + Δg·uᵀz)·z (z = A⁻¹u) 对全部扫描点一次性向量化求解。
+        - 电压源/电流源: 解关于源值线性，x(v) = x₀ + Δv·z。
+        只计算探测量需要的未知量分量，因此代价约为 O(扫描点数 × 探测量数)，与电路规模几乎无关。
+        含二极管时，先按基准工作点的导通状态批量求解，再对导通状态不一致的扫描点逐点完整求解。
+
+        Args:
+            circuit (Circuit): 电路 (结构必须与构建时一致)。
+            component_id (str): 被扫描的元件ID (大写)。
+            sweep_values (np.ndarray): 扫描点的取值 (基本单位)。
+            probe_ids (List[str]): 探测对象: 元件ID (给出其电压与电流) 或节点名 (给出节点电压)。
+
+        Returns:
+            Dict[str, Any]: 包含 model (被扫描元件的模型)、columns (列名 -> 与扫描点一一对应的数组，
+                            如 "V(R1)"、"I(R1)"、"V(N3)")、batched_points / fallback_points (批量求解与逐点求解的点数)、
+                            factorizations 与 warnings。
+
+        Raises:
+            MNAError: 如果元件不能扫描、取值无效或探测对象不存在。
+        """
+        element_index = self._element_index.get(component_id)
+        if element_index is None:
+            raise MNAError(f"元件 '{component_id}' 未参与求解 (不存在、未连接或类型不受支持),无法扫描。")
+        model = self.element_models[element_index]
+        if model not in _SWEEPABLE_MODELS:
+            raise MNAError(f"只能扫描电阻、电压源或电流源的值,元件 '{component_id}' 的直流模型是 '{model}'。")
+        if model == "resistor" and np.any(sweep_values <= 0):
+            raise MNAError("电阻的扫描值必须全部为正数。")
+        node_names = {name: index for index, name in enumerate(self.node_names)}
+        unknown_probes = [probe for probe in probe_ids if probe not in self._element_index and probe not in node_names and probe != self.ground_name]
+        if unknown_probes:
+            raise MNAError(f"以下探测对象既不是参与求解的元件,也不是节点名: {_format_id_list(unknown_probes)}")
+
+        warnings = list(self.warnings)
+        conductances, source_values, currents, forward_voltages = self._read_values(circuit, warnings)
+        factorizations_before = self.factorization_count
+        base_solution, base_states, _ = self._solve_values(conductances, source_values, currents, forward_voltages, self._diode_states, warnings)
+        self._diode_states = base_states
+
+        # 探测量与二极管状态检查所需的未知量分量 (地节点 -1 映射到末尾恒为 0 的一列)
+        terminal_nodes = self.terminal_nodes
+        probe_elements = [self._element_index[probe] for probe in probe_ids if probe in self._element_index]
+        needed = np.unique(np.concatenate((
+            terminal_nodes[probe_elements].ravel(), terminal_nodes[self._diodes].ravel(),
+            [node_names[probe] for probe in probe_ids if probe in node_names],
+            [self.node_count + self._model_positions[index] for index in probe_elements if self.element_models[index] in ("voltage_source", "short")],
+        )).astype(np.intp))
+        needed = needed[needed >= 0]
+        column_of = {unknown: column for column, unknown in enumerate(needed.tolist())}
+        column_of[-1] = len(needed)
+
+        position = self._model_positions[element_index]
+        node0, node1 = terminal_nodes[element_index]
+        direction = np.zeros(self.size)
+        if model == "voltage_source":
+            direction[self.node_count + position] = 1.0
+        else:
+            _scatter_add(direction, np.array([node0, node1]), np.array([1.0, -1.0]))
+        response = self._solve_factored(direction) if self.size else direction
+        if model == "resistor":
+            delta = 1.0 / sweep_values - conductances[position]
+            coefficients = -delta * (direction @ base_solution) / (1.0 + delta * (direction @ response))
+        elif model == "voltage_source":
+            coefficients = sweep_values - source_values[position]
+        else:
+            coefficients = sweep_values - currents[position]
+        partial = base_solution[needed][None, :] + coefficients[:, None] * response[needed][None, :]
+        partial = np.hstack((partial, np.zeros((len(sweep_values), 1))))
+        point_states = np.broadcast_to(base_states, (len(sweep_values), len(self._diodes))).copy()
+
+        fallback_points = 0
+        if len(self._diodes):
+            anode_columns = [column_of[node] for node in terminal_nodes[self._diodes, 0].tolist()]
+            cathode_columns = [column_of[node] for node in terminal_nodes[self._diodes, 1].tolist()]
+            consistent = (partial[:, anode_columns] - partial[:, cathode_columns]) > forward_voltages
+            for point in np.flatnonzero(np.any(consistent != base_states, axis=1)).tolist():
+                point_conductances, point_sources, point_currents = conductances.copy(), source_values.copy(), currents.copy()
+                if model == "resistor":
+                    point_conductances[position] = 1.0 / sweep_values[point]
+                elif model == "voltage_source":
+                    point_sources[position] = sweep_values[point]
+                else:
+                    point_currents[position] = sweep_values[point]
+                solution, states, _ = self._solve_values(point_conductances, point_sources, point_currents, forward_voltages, consistent[point], warnings)
+                partial[point, :-1] = solution[needed]
+                point_states[point] = states
+                fallback_points += 1
+
+        def node_voltage(node: int) -> "np.ndarray":
+            return partial[:, column_of[node]]
+
+        columns: Dict[str, "np.ndarray"] = {}
+        for probe in probe_ids:
+            if probe not in self._element_index:
+                columns[f"V({probe})"] = node_voltage(node_names.get(probe, -1))
+                continue
+            index = self._element_index[probe]
+            probe_model, probe_position = self.element_models[index], self._model_positions[index]
+            across = node_voltage(terminal_nodes[index, 0]) - node_voltage(terminal_nodes[index, 1])
+            if probe_model == "resistor":
+                current = across * (1.0 / sweep_values if index == element_index else conductances[probe_position])
+            elif probe_model in ("voltage_source", "short"):
+                current = node_voltage(self.node_count + probe_position)
+            elif probe_model == "current_source":
+                current = -(sweep_values if index == element_index else np.full(len(sweep_values), currents[probe_position]))
+            elif probe_model == "diode":
+                on = point_states[:, probe_position]
+                current = np.where(on, (across - forward_voltages[probe_position]) / _DIODE_ON_RESISTANCE, _GMIN * across)
+            else:
+                current = np.zeros(len(sweep_values))
+            columns[f"V({probe})"] = across
+            columns[f"I({probe})"] = current
+
+        return {
+            "model": model,
+            "columns": columns,
+            "batched_points": len(sweep_values) - fallback_points,
+            "fallback_points": fallback_points,
+            "factorizations": self.factorization_count - factorizations_before,
+            "warnings": warnings[:_MAX_WARNINGS],
+        }
+
+class DCOperatingPointSolver:
+    """
+    带缓存的直流工作点求解器。
+
+    - 电路的版本号 (revision) 未变化时直接返回上次的结果。
+    - 只有元件值变化 (结构版本号 topology_revision 未变化) 时复用已构建的 MNASystem，
+      仅重新填充矩阵数据并重新分解；若只有电源值变化，连分解也会复用。
+    - 电路结构变化时才重新构建 MNASystem。
+
+    Attributes:
+        stats (Dict[str, int]): 构建、分解、求解与缓存命中的累计次数。
+    """
+    def __init__(self):
+        self._system: Optional[MNASystem] = None
+        self._system_key: Optional[Tuple[int, int]] = None
+        self._result_key: Optional[Tuple[int, int]] = None
+        self._result: Optional[Dict[str, Any]] = None
+        self.stats: Dict[str, int] = {"builds": 0, "factorizations": 0, "solves": 0, "cache_hits": 0, "sweeps": 0}
+
+    def _get_system(self, circuit: 'Circuit') -> Tuple[MNASystem, bool]:
+        """返回与电路当前结构对应的 MNASystem，结构变化时重建。返回 (方程, 是否重建)。"""
+        system_key = (id(circuit), circuit.topology_revision)
+        rebuilt = self._system is None or system_key != self._system_key
+        if rebuilt:
+            self._system = MNASystem(circuit)
+            self._system_key = system_key
+            self.stats["builds"] += 1
+        return self._system, rebuilt
+
+    def solve(self, circuit: 'Circuit') -> Dict[str, Any]:
+        """
+        求解电路的直流工作点。
+
+        Returns:
+            Dict[str, Any]: MNASystem.solve 的结果，另含 rebuilt (是否重建了方程结构)、
+                            from_cache (是否直接复用了上次结果) 与 elapsed_ms (耗时毫秒数)。
+
+        Raises:
+            MNAError: 如果电路无法求解。
+        """
+        result_key = (id(circuit), circuit.revision)
+        if result_key == self._result_key and self._result is not None:
+            self.stats["cache_hits"] += 1
+            return {**self._result, "rebuilt": False, "from_cache": True, "factorizations": 0, "diode_iterations": 0, "elapsed_ms": 0.0}
+
+        started = time.perf_counter()
+        system, rebuilt = self._get_system(circuit)
+        result = system.solve(circuit)
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        self.stats["factorizations"] += result["factorizations"]
+        self.stats["solves"] += 1
+        result.update({"rebuilt": rebuilt, "from_cache": False, "elapsed_ms": round(elapsed_ms, 3)})
+        self._result, self._result_key = result, result_key
+        logger.debug(f"[DCSolver] 求解完成: {result['node_count']} 个节点, {result['element_count']} 个元件, "
+                     f"重建={rebuilt}, 分解 {result['factorizations']} 次, 耗时 {elapsed_ms:.2f} ms。")
+        return result
+
+    def sweep(self, circuit: 'Circuit', component_id: str, sweep_values: "np.ndarray", probe_ids: List[str]) -> Dict[str, Any]:
+        """
+        对一个元件的值做参数扫描 (见 MNASystem.sweep)，复用已构建的方程结构。电路本身不会被修改。
+
+        Returns:
+            Dict[str, Any]: MNASystem.sweep 的结果，另含 rebuilt 与 elapsed_ms。
+
+        Raises:
+            MNAError: 如果电路无法求解或扫描参数无效。
+        """
+        started = time.perf_counter()
+        system, rebuilt = self._get_system(circuit)
+        result = system.sweep(circuit, component_id, np.asarray(sweep_values, dtype=np.float64), probe_ids)
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        self.stats["factorizations"] += result["factorizations"]
+        self.stats["sweeps"] += 1
+        result.update({"rebuilt": rebuilt, "elapsed_ms": round(elapsed_ms, 3)})
+        logger.debug(f"[DCSolver] 参数扫描完成: 元件 {component_id}, {len(sweep_values)} 个点 (逐点求解 {result['fallback_points']} 个), "
+                     f"分解 {result['factorizations']} 次, 耗时 {elapsed_ms:.2f} ms。")
+        return result
@@ -0,0 +1,209 @@
+# IDT_AGENT_Pro/circuitmanus/analysis/erc.py
+import logging
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple, Any, TYPE_CHECKING
+
+from ..circuit_domain.circuit import normalize_component_type
+from .dc import _ELEMENT_MODELS, _NET_TYPES, _GROUND_TYPE
+
+if TYPE_CHECKING:
+    from ..circuit_domain.circuit import Circuit
+
+logger = logging.getLogger(__name__)
+
+# 违规记录的键: (规则名, 涉及的元件ID元组)
+ViolationKey = Tuple[str, Tuple[str, ...]]
+
+_SEVERITY_ERROR = "error"
+_SEVERITY_WARNING = "warning"
+_SOURCE_TYPES = ("voltage source", "battery")
+_MAX_SHORT_SEARCH_VISITS = 10000 # 短路检查中沿导体搜索的访问上限，防止在极端电路上退化
+_MAX_REPORTED_VIOLATIONS = 20
+
+class ElectricalRuleChecker:
+    """
+    增量电气规则检查 (ERC)。
+
+    规则 (电路连接不含引脚信息，判断方式与 MNASystem 的网络推断规则一致):
+    - missing_ground (error): 电路中已有连接，却没有任何接地元件。
+    - shorted_source (error): 电池/电压源的两端经由节点类元件或短路元件 (电感、开关、保险丝) 处于同一网络。
+    - dangling_pin (warning): 两端元件的连接少于两个，至少有一个端子悬空。
+    - conflicting_parallel_sources (error): 两个电压源并联在同一对相邻元件之间，但电压不同。
+    - duplicate_parallel (warning): 两个类型与值都相同的两端元件并联在同一对相邻元件之间，通常是重复添加。
+
+    检查器保存当前全部未解决的违规。每次检查只重新评估本批修改涉及的元件、它们的相邻元件，
+    以及与这些元件处于同一连通分组中的电源 (短路可能经由较远的导体形成)；
+    操作日志无法提供变化明细 (快照失效、清空电路) 或检查器与电路不同步时退回到全量检查。
+    """
+    def __init__(self):
+        self._violations: Dict[ViolationKey, Dict[str, Any]] = {}
+        self._synced_circuit_id: Optional[int] = None
+        self._synced_revision: Optional[int] = None
+
+    def check_all(self, circuit: 'Circuit') -> Dict[str, Any]:
+        """对整个电路做全量检查，返回与 check_changes 相同格式的结果。"""
+        return self._run(circuit, None)
+
+    def check_changes(self, circuit: 'Circuit', snapshot: int, revision_at_snapshot: int) -> Dict[str, Any]:
+        """
+        只检查快照之后发生变化的部分。
+
+        Args:
+            circuit (Circuit): 电路。
+            snapshot (int): 本批修改开始前的电路快照 (Circuit.create_snapshot())。
+            revision_at_snapshot (int): 创建快照时电路的版本号，用于确认检查器的状态与快照时的电路一致。
+
+        Returns:
+            Dict[str, Any]: mode ("incremental" / "full" / "unchanged")、checked_component_count、
+                            new_violations (本批新出现的违规，数量有上限)、resolved_count、open_violation_count。
+        """
+        if circuit.revision == revision_at_snapshot and self._is_synced(circuit, revision_at_snapshot):
+            return {"mode": "unchanged", "checked_component_count": 0, "new_violations": [], "resolved_count": 0,
+                    "open_violation_count": len(self._violations)}
+        changed_ids: Optional[Set[str]] = None
+        if self._is_synced(circuit, revision_at_snapshot):
+            changed_ids = self._changed_component_ids(circuit, snapshot)
+        return self._run(circuit, changed_ids)
+
+    def get_open_violations(self) -> List[Dict[str, Any]]:
+        """返回当前全部未解决的违规 (error 在前)。"""
+        return sorted(self._violations.values(), key=lambda violation: (violation["severity"] != _SEVERITY_ERROR, violation["rule"], violation["component_ids"]))
+
+    def _is_synced(self, circuit: 'Circuit', revision: int) -> bool:
+        return self._synced_circuit_id == id(circuit) and self._synced_revision == revision
+
+    @staticmethod
+    def _changed_component_ids(circuit: 'Circuit', snapshot: int) -> Optional[Set[str]]:
+        """由操作日志得到快照之后变化过的元件ID；无法确定时返回 None (需要全量检查)。"""
+        try:
+            entries = circuit.journal.entries_since(snapshot)
+        except ValueError:
+            return None
+        changed_ids: Set[str] = set()
+        for _, op_name, payload in entries:
+            if op_name == "add":
+                changed_ids.add(payload.id)
+            elif op_name == "remove":
+                changed_ids.add(payload[0].id)
+                changed_ids.update(payload[1])
+            elif op_name in ("connect", "disconnect"):
+                changed_ids.update(payload)
+            elif op_name in ("value", "type"):
+                changed_ids.add(payload[0])
+            else: # clear 等整体性修改
+                return None
+        return changed_ids
+
+    def _run(self, circuit: 'Circuit', changed_ids: Optional[Set[str]]) -> Dict[str, Any]:
+        previous_keys = set(self._violations)
+        components = circuit.components
+        if changed_ids is None:
+            mode = "full"
+            recheck_ids = set(components)
+            self._violations = {}
+        else:
+            mode = "incremental"
+            recheck_ids = {component_id for component_id in changed_ids if component_id in components}
+            for component_id in list(recheck_ids):
+                recheck_ids.update(circuit.get_connected_component_ids(component_id))
+            # 短路可能经由较远的导体形成: 重新检查与变化元件处于同一连通分组的电源
+            dirty_roots = {circuit.connectivity.root_of(component_id) for component_id in recheck_ids}
+            for source_type in _SOURCE_TYPES:
+                for source in circuit.get_components_by_type(source_type):
+                    if circuit.connectivity.root_of(source.id) in dirty_roots:
+                        recheck_ids.add(source.id)
+            stale_ids = recheck_ids | changed_ids # 已被移除的元件也要清掉其违规
+            self._violations = {key: violation for key, violation in self._violations.items() if not stale_ids.intersection(key[1])}
+
+        self._violations.pop(("missing_ground", ()), None)
+        if circuit.connections and not circuit.get_ground_component_ids():
+            self._add(("missing_ground", ()), _SEVERITY_ERROR, "电路中已有连接,但没有任何接地 (地线/GND) 元件,电路缺少参考点。")
+        for component_id in recheck_ids:
+            self._check_component(circuit, component_id)
+
+        self._synced_circuit_id, self._synced_revision = id(circuit), circuit.revision
+        new_keys = [key for key in self._violations if key not in previous_keys]
+        new_violations = sorted((self._violations[key] for key in new_keys), key=lambda violation: (violation["severity"] != _SEVERITY_ERROR, violation["rule"]))
+        result = {
+            "mode": mode,
+            "checked_component_count": len(recheck_ids),
+            "new_violations": new_violations[:_MAX_REPORTED_VIOLATIONS],
+            "new_violation_count": len(new_violations),
+            "resolved_count": len(previous_keys - set(self._violations)),
+            "open_violation_count": len(self._violations),
+        }
+        logger.debug(f"[ERC] {mode} 检查了 {len(recheck_ids)} 个元件: 新增违规 {len(new_violations)} 个, "
+                     f"解决 {result['resolved_count']} 个, 仍未解决 {len(self._violations)} 个。")
+        return result
+
+    def _add(self, key: ViolationKey, severity: str, message: str) -> None:
+        self._violations[key] = {"rule": key[0], "severity": severity, "component_ids": list(key[1]), "message": message}
+
+    def _check_component(self, circuit: 'Circuit', component_id: str) -> None:
+        component = circuit.components[component_id]
+        type_key = normalize_component_type(component.type)
+        model = _ELEMENT_MODELS.get(type_key)
+        if model is None:
+            return
+        neighbor_ids = sorted(circuit.get_connected_component_ids(component_id))
+        if len(neighbor_ids) < 2:
+            detail = "没有连接任何元件" if not neighbor_ids else f"只连接了 '{neighbor_ids[0]}'"
+            self._add(("dangling_pin", (component_id,)), _SEVERITY_WARNING, f"两端元件 '{component_id}' {detail},至少有一个端子悬空。")
+            return
+        if len(neighbor_ids) != 2:
+            return # 端子无法确定的元件不做进一步检查
+        if type_key in _SOURCE_TYPES and self._is_shorted(circuit, component_id, neighbor_ids[0], neighbor_ids[1]):
+            self._add(("shorted_source", (component_id,)), _SEVERITY_ERROR,
+                      f"电源 '{component_id}' 的两端 ('{neighbor_ids[0]}' 与 '{neighbor_ids[1]}') 经由导线/节点或短路元件处于同一网络,电源被短路。")
+        # 并联检查: 与本元件连接着同一对相邻元件的其他两端元件
+        for other_id in circuit.get_connected_component_ids(neighbor_ids[0]):
+            if other_id == component_id or other_id not in circuit.get_connected_component_ids(neighbor_ids[1]):
+                continue
+            if circuit.get_component_connection_count(other_id) != 2:
+                continue
+            other = circuit.components[other_id]
+            other_type_key = normalize_component_type(other.type)
+            pair = tuple(sorted((component_id, other_id)))
+            if type_key in _SOURCE_TYPES and other_type_key in _SOURCE_TYPES:
+                if component.numeric_value is not None and other.numeric_value is not None and component.numeric_value != other.numeric_value:
+                    self._add(("conflicting_parallel_sources", pair), _SEVERITY_ERROR,
+                              f"电源 '{pair[0]}' 与 '{pair[1]}' 并联在同一对元件之间,但电压不同 ({circuit.components[pair[0]].value} 与 {circuit.components[pair[1]].value}),会产生极大的环流。")
+                    continue
+            if other_type_key == type_key and other.value == component.value:
+                self._add(("duplicate_parallel", pair), _SEVERITY_WARNING,
+                          f"元件 '{pair[0]}' 与 '{pair[1]}' 类型与值都相同,并且并联在同一对元件 ('{neighbor_ids[0]}', '{neighbor_ids[1]}') 之间,可能是重复添加。")
+
+    @staticmethod
+    def _is_conductor(circuit: 'Circuit', component_id: str) -> Tuple[bool, bool]:
+        """返回 (是否是导体, 是否是网络类元件)。导体指节点类元件或恰有两个连接的短路元件。"""
+        type_key = normalize_component_type(circuit.components[component_id].type)
+        if type_key in _NET_TYPES:
+            return True, True
+        return _ELEMENT_MODELS.get(type_key) == "short" and circuit.get_component_connection_count(component_id) == 2, False
+
+    def _is_shorted(self, circuit: 'Circuit', source_id: str, first_id: str, second_id: str) -> bool:
+        """
+        从电源一侧的相邻元件出发，只穿过导体 (节点类元件、短路元件) 搜索，判断能否到达另一侧的相邻元件。
+        所有接地元件视为同一网络。
+        """
+        if not self._is_conductor(circuit, first_id)[0] or not self._is_conductor(circuit, second_id)[0]:
+            return False # 任一侧是普通元件时，两端不可能处于同一网络
+        ground_ids = circuit.get_ground_component_ids()
+        queue = deque([(first_id, source_id)])
+        visited: Set[str] = {first_id}
+        while queue and len(visited) < _MAX_SHORT_SEARCH_VISITS:
+            current_id, came_from = queue.popleft()
+            is_conductor, is_net = self._is_conductor(circuit, current_id)
+            if not is_conductor:
+                continue
+            next_ids = [neighbor_id for neighbor_id in circuit.get_connected_component_ids(current_id) if neighbor_id != came_from or is_net]
+            if is_net and normalize_component_type(circuit.components[current_id].type) == _GROUND_TYPE:
+                next_ids.extend(ground_ids)
+            for next_id in next_ids:
+                if next_id == second_id:
+                    return True
+                if next_id == source_id or next_id in visited:
+                    continue
+                visited.add(next_id)
+                queue.append((next_id, current_id))
+        return False
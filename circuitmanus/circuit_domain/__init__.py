@@ -5,6 +5,15 @@ This sub-package contains classes and concepts related to the electrical circuit
 such as components and the circuit board representation.
 """
 from .components import CircuitComponent
-from .circuit import Circuit
+from .circuit import Circuit, normalize_component_type
+from .batch import CircuitBatch, CircuitBatchError
+from .journal import CircuitJournal
+from .connectivity import ConnectivityIndex
+from .storage import ColumnarComponentStore, ColumnarConnectionStore, STORAGE_BACKENDS
+from .units import parse_engineering_value, parse_values_bulk
+from .spice import SpiceNetlistReader, import_spice_netlist, iter_spice_netlist
 
-__all__ = ["CircuitComponent", "Circuit"]
\ No newline at end of file
+__all__ = ["CircuitComponent", "Circuit", "normalize_component_type", "CircuitBatch", "CircuitBatchError", "CircuitJournal", "ConnectivityIndex",
+           "ColumnarComponentStore", "ColumnarConnectionStore", "STORAGE_BACKENDS",
+           "parse_engineering_value", "parse_values_bulk",
+           "SpiceNetlistReader", "import_spice_netlist", "iter_spice_netlist"]
\ No newline at end of file
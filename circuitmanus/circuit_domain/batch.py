@@ -0,0 +1,240 @@
+# IDT_AGENT_Pro/circuitmanus/circuit_domain/batch.py
+import logging
+from typing import Dict, Set, Tuple, Optional, Any, List, TYPE_CHECKING
+
+from .components import CircuitComponent
+
+if TYPE_CHECKING:
+    from .circuit import Circuit
+
+logger = logging.getLogger(__name__)
+
+class CircuitBatchError(ValueError):
+    """
+    批量操作校验或提交失败时抛出的异常。
+
+    Attributes:
+        operation_index (int): 出错操作在批次中的序号 (从0开始)。
+        operation (Dict[str, Any]): 出错操作的描述。
+    """
+    def __init__(self, message: str, operation_index: int, operation: Dict[str, Any]):
+        super().__init__(message)
+        self.operation_index = operation_index
+        self.operation = operation
+
+class CircuitBatch:
+    """
+    电路的事务性批量修改对象，通过 Circuit.batch() 创建。
+
+    先暂存一组添加、移除、连接、断开和改值操作，提交时在一个 "覆盖层" 上一次性校验全部操作
+    (不修改电路)，校验通过后才依次应用到电路；应用过程中若出现意外错误，会通过操作日志回滚到批次开始前的快照。
+    因此一个批次要么全部生效，要么完全不生效。
+
+    用法:
+        with circuit.batch() as batch:
+            r_id = batch.add_component("电阻", value="1k")
+            batch.connect_components(r_id, "GND")
+        # 正常退出 with 块时自动提交；块内抛出异常时丢弃暂存的操作。
+
+    注意: 自动生成的ID在暂存时即已分配 (以便同一批次内的后续操作引用)，并会跳过本批次中已暂存的显式ID；
+    批次被丢弃或回滚时这些ID不会被回收，只会在编号上留下空位。
+    """
+    def __init__(self, circuit: 'Circuit'):
+        self._circuit = circuit
+        self._operations: List[Dict[str, Any]] = []
+        self._staged_explicit_ids: Set[str] = set() # 本批次暂存的显式ID (尚未登记到电路的ID分配器)
+        self._committed = False
+
+    def __enter__(self) -> 'CircuitBatch':
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> bool:
+        if exc_type is None and not self._committed:
+            self.commit()
+        elif exc_type is not None:
+            logger.debug(f"[CircuitBatch] 批次内发生异常,丢弃 {len(self._operations)} 个暂存操作。")
+            self._operations.clear()
+        return False # 不吞掉异常
+
+    def __len__(self) -> int:
+        return len(self._operations)
+
+    def add_component(self, component_type: str, component_id: Optional[str] = None, value: Optional[str] = None) -> str:
+        """
+        暂存一个添加元件的操作。
+
+        Args:
+            component_type (str): 元件类型。
+            component_id (Optional[str]): 可选的元件ID；不提供时自动生成。
+            value (Optional[str]): 可选的元件值。
+
+        Returns:
+            str: 该元件将使用的ID (大写)，可在同一批次的后续操作中引用。
+        """
+        if component_id is not None and str(component_id).strip():
+            final_id = str(component_id).strip().upper()
+            self._staged_explicit_ids.add(final_id)
+        elif isinstance(component_type, str) and component_type.strip():
+            final_id = self._circuit.generate_component_id(component_type)
+            while final_id in self._staged_explicit_ids: # 显式ID要到提交时才登记，生成时需自行跳过
+                final_id = self._circuit.generate_component_id(component_type)
+        else:
+            final_id = "" # 类型无效，留待提交时的校验报告错误
+        self._operations.append({"op": "add_component", "component_id": final_id, "component_type": component_type, "value": value})
+        return final_id
+
+    def remove_component(self, component_id: str) -> None:
+        """暂存一个移除元件 (及其全部连接) 的操作。"""
+        self._operations.append({"op": "remove_component", "component_id": str(component_id).strip().upper()})
+
+    def connect_components(self, id1: str, id2: str) -> None:
+        """暂存一个连接两个元件的操作。连接已存在时该操作在提交时被跳过。"""
+        self._operations.append({"op": "connect_components", "comp1_id": str(id1).strip().upper(), "comp2_id": str(id2).strip().upper()})
+
+    def disconnect_components(self, id1: str, id2: str) -> None:
+        """暂存一个断开两个元件连接的操作。连接不存在时该操作在提交时被跳过。"""
+        self._operations.append({"op": "disconnect_components", "comp1_id": str(id1).strip().upper(), "comp2_id": str(id2).strip().upper()})
+
+    def update_component_value(self, component_id: str, new_value: Optional[str]) -> None:
+        """暂存一个更新元件值的操作。new_value 为 None 或空白字符串表示清除值。"""
+        self._operations.append({"op": "update_component_value", "component_id": str(component_id).strip().upper(), "new_value": new_value})
+
+    def _validate(self) -> List[bool]:
+        """
+        在覆盖层上按顺序校验全部暂存操作，不修改电路。
+
+        Returns:
+            List[bool]: 与操作一一对应的标记，False 表示该操作是无需执行的空操作
+                        (重复连接或断开不存在的连接)。
+
+        Raises:
+            CircuitBatchError: 第一个无法执行的操作。
+        """
+        circuit = self._circuit
+        added_ids: Set[str] = set()
+        removed_ids: Set[str] = set()
+        added_connections: Set[Tuple[str, str]] = set()
+        removed_connections: Set[Tuple[str, str]] = set()
+        added_adjacency: Dict[str, Set[str]] = {} # 覆盖层中新增连接的邻接关系
+
+        def exists(component_id: str) -> bool:
+            return component_id in added_ids or (component_id in circuit.components and component_id not in removed_ids)
+
+        def is_connected(connection: Tuple[str, str]) -> bool:
+            return connection in added_connections or (connection in circuit.connections and connection not in removed_connections)
+
+        effective: List[bool] = []
+        for index, operation in enumerate(self._operations):
+            op_name = operation["op"]
+            if op_name == "add_component":
+                component_id = operation["component_id"]
+                component_type = operation["component_type"]
+                if not isinstance(component_type, str) or not component_type.strip():
+                    raise CircuitBatchError("元件类型是必需的,并且必须是有效的非空字符串。", index, operation)
+                if exists(component_id):
+                    raise CircuitBatchError(f"元件 ID '{component_id}' 已被占用。", index, operation)
+                added_ids.add(component_id)
+                removed_ids.discard(component_id)
+                effective.append(True)
+            elif op_name == "remove_component":
+                component_id = operation["component_id"]
+                if not exists(component_id):
+                    raise CircuitBatchError(f"元件 '{component_id}' 在电路中不存在。", index, operation)
+                # 在覆盖层中移除该元件的全部连接 (原电路中的与本批次新增的)
+                if component_id not in added_ids:
+                    for neighbor_id in circuit.get_connected_component_ids(component_id) if component_id in circuit.components else ():
+                        removed_connections.add(tuple(sorted((component_id, neighbor_id))))
+                for neighbor_id in added_adjacency.pop(component_id, set()):
+                    added_connections.discard(tuple(sorted((component_id, neighbor_id))))
+                    added_adjacency.get(neighbor_id, set()).discard(component_id)
+                added_ids.discard(component_id)
+                if component_id in circuit.components:
+                    removed_ids.add(component_id)
+                effective.append(True)
+            elif op_name in ("connect_components", "disconnect_components"):
+                id1, id2 = operation["comp1_id"], operation["comp2_id"]
+                if id1 == id2:
+                    raise CircuitBatchError(f"不能将元件 '{id1}' 连接到它自己。" if op_name == "connect_components" else "不能断开一个元件与它自身的连接。", index, operation)
+                for component_id in (id1, id2):
+                    if not exists(component_id):
+                        raise CircuitBatchError(f"元件 '{component_id}' 在电路中不存在。", index, operation)
+                connection = tuple(sorted((id1, id2)))
+                currently_connected = is_connected(connection)
+                if op_name == "connect_components":
+                    effective.append(not currently_connected)
+                    if not currently_connected:
+                        added_connections.add(connection)
+                        removed_connections.discard(connection)
+                        added_adjacency.setdefault(id1, set()).add(id2)
+                        added_adjacency.setdefault(id2, set()).add(id1)
+                else:
+                    effective.append(currently_connected)
+                    if currently_connected:
+                        removed_connections.add(connection)
+                        added_connections.discard(connection)
+                        added_adjacency.get(id1, set()).discard(id2)
+                        added_adjacency.get(id2, set()).discard(id1)
+            elif op_name == "update_component_value":
+                component_id = operation["component_id"]
+                if not exists(component_id):
+                    raise CircuitBatchError(f"元件 '{component_id}' 在电路中不存在,无法更新其值。", index, operation)
+                if not isinstance(operation["new_value"], (str, int, float, type(None))):
+                    raise CircuitBatchError(f"元件的新值必须是字符串或 null。收到类型: {type(operation['new_value']).__name__}", index, operation)
+                effective.append(True)
+            else:
+                raise CircuitBatchError(f"未知的批量操作类型 '{op_name}'。", index, operation)
+        return effective
+
+    def commit(self) -> Dict[str, Any]:
+        """
+        校验并原子地应用全部暂存操作。
+
+        Returns:
+            Dict[str, Any]: 操作摘要，包含 added / removed / connected / disconnected / updated / skipped 列表。
+
+        Raises:
+            CircuitBatchError: 如果任一操作校验失败或在应用时出错。此时电路保持提交前的状态。
+            RuntimeError: 如果批次已经提交过。
+        """
+        if self._committed:
+            raise RuntimeError("该批次已经提交,不能重复提交。")
+        circuit = self._circuit
+        effective = self._validate()
+        logger.debug(f"[CircuitBatch] 校验通过,开始应用 {len(self._operations)} 个操作...")
+
+        summary: Dict[str, List[Any]] = {"added": [], "removed": [], "connected": [], "disconnected": [], "updated": [], "skipped": []}
+        snapshot = circuit.create_snapshot() # O(1) 快照，用于意外失败时回滚
+        index = 0
+        try:
+            with circuit.journal.group(): # 整个批次在操作日志中作为一个撤销步骤
+                for index, operation in enumerate(self._operations):
+                    op_name = operation["op"]
+                    if not effective[index]:
+                        summary["skipped"].append({"index": index, **operation})
+                        continue
+                    if op_name == "add_component":
+                        component = CircuitComponent(operation["component_id"], operation["component_type"], operation["value"])
+                        circuit.add_component(component)
+                        summary["added"].append(component.to_dict())
+                    elif op_name == "remove_component":
+                        removed_details, _ = circuit.remove_component(operation["component_id"])
+                        summary["removed"].append(removed_details)
+                    elif op_name == "connect_components":
+                        circuit.connect_components(operation["comp1_id"], operation["comp2_id"])
+                        summary["connected"].append(sorted((operation["comp1_id"], operation["comp2_id"])))
+                    elif op_name == "disconnect_components":
+                        circuit.disconnect_components(operation["comp1_id"], operation["comp2_id"])
+                        summary["disconnected"].append(sorted((operation["comp1_id"], operation["comp2_id"])))
+                    elif op_name == "update_component_value":
+                        new_value = operation["new_value"]
+                        old_value, component = circuit.update_component_value(operation["component_id"], None if new_value is None else str(new_value))
+                        summary["updated"].append({"id": component.id, "old_value": old_value, "new_value": component.value})
+        except Exception as e_apply:
+            logger.error(f"[CircuitBatch] 应用第 {index} 个操作时出错,回滚到批次开始前的快照: {e_apply}", exc_info=True)
+            circuit.restore_snapshot(snapshot)
+            raise CircuitBatchError(f"应用批量操作时出错,已回滚: {e_apply}", index, self._operations[index]) from e_apply
+
+        self._committed = True
+        logger.info(f"[CircuitBatch] 批次已提交: 添加 {len(summary['added'])}, 移除 {len(summary['removed'])}, "
+                    f"连接 {len(summary['connected'])}, 断开 {len(summary['disconnected'])}, 改值 {len(summary['updated'])}, 跳过 {len(summary['skipped'])}。")
+        return summary
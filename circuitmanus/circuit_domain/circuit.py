@@ -1,32 +1,193 @@
 # IDT_AGENT_NATIVE/circuitmanus/circuit_domain/circuit.py
 import re
+import sys
+import heapq
 import logging
-from typing import Dict, Set, Tuple, Optional, Any, List
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Set, Tuple, Optional, Any, List, Iterable, Iterator, MutableMapping, MutableSet
 
 # 从同一个子包 (circuit_domain) 中的 components.py 文件导入 CircuitComponent 类
 # 这是正确的相对导入方式，确保模块间的依赖清晰。
 from .components import CircuitComponent
+from .batch import CircuitBatch
+from .journal import CircuitJournal
+from .connectivity import ConnectivityIndex
+from .storage import create_storage, STORAGE_BACKEND_DICT, ColumnarComponentStore
+from .units import parse_values_bulk, _expand_parsed_table, NUMPY_AVAILABLE
+
+if NUMPY_AVAILABLE:
+    import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# 元件类型别名表: 规范类型名 -> 该类型的常见写法 (中英文、缩写)。
+# 用于构建类型索引的归一化键，使 "电阻"、"Resistor"、"RES" 被视为同一类型。
+_COMPONENT_TYPE_ALIAS_GROUPS: Dict[str, Tuple[str, ...]] = {
+    "resistor": ("resistor", "电阻", "res"),
+    "capacitor": ("capacitor", "电容", "cap"),
+    "battery": ("battery", "电池"),
+    "voltage source": ("voltage source", "电压源", "vsource"),
+    "led": ("led", "发光二极管"),
+    "switch": ("switch", "开关"),
+    "ground": ("ground", "地", "gnd", "地线", "接地"),
+    "ic": ("ic", "chip", "芯片", "集成电路"),
+    "inductor": ("inductor", "电感"),
+    "current source": ("current source", "电流源", "isource"),
+    "diode": ("diode", "二极管"),
+    "potentiometer": ("potentiometer", "电位器"),
+    "fuse": ("fuse", "保险丝"),
+    "header": ("header", "排针"),
+    "terminal": ("terminal", "端子"),
+    "connection point": ("connection point", "连接点"),
+    "node": ("node", "节点"),
+    "input": ("input", "输入"),
+    "output": ("output", "输出"),
+    "search_record": ("search_record", "搜索记录"),
+}
+_COMPONENT_TYPE_ALIASES: Dict[str, str] = {
+    alias: canonical
+    for canonical, aliases in _COMPONENT_TYPE_ALIAS_GROUPS.items()
+    for alias in aliases
+}
+
+def normalize_component_type(component_type: str) -> str:
+    """
+    将元件类型字符串归一化为类型索引使用的键。
+    去除首尾空格、合并连续空白并转为小写；若命中别名表，则返回其规范类型名。
+
+    Args:
+        component_type (str): 原始元件类型 (例如 "电阻", " Resistor ")。
+
+    Returns:
+        str: 归一化后的类型键 (例如 "resistor")。未知类型返回其小写形式本身。
+    """
+    cleaned_type = " ".join(component_type.split()).lower()
+    return _COMPONENT_TYPE_ALIASES.get(cleaned_type, cleaned_type)
+
+# 元件类型关键字到其ID前缀的映射表 (模块级常量，只构建一次)。
+# 键是小写关键字，值是ID前缀代码。
+_TYPE_PREFIX_MAP: Dict[str, str] = {
+    "resistor": "R", "电阻": "R",
+    "capacitor": "C", "电容": "C",
+    "battery": "B", "电池": "B",
+    "voltage source": "V", "voltage": "V", "电压源": "V", "电压": "V",
+    "led": "L", "发光二极管": "L",
+    "switch": "S", "开关": "S",
+    "ground": "G", "地": "G",
+    "ic": "U", "chip": "U", "芯片": "U", "集成电路": "U",
+    "inductor": "I", "电感": "I",
+    "current source": "A", "电流源": "A",
+    "diode": "D", "二极管": "D",
+    "potentiometer": "P", "电位器": "P",
+    "fuse": "F", "保险丝": "F",
+    "header": "H", "排针": "H",
+    "terminal": "T", "端子": "T",
+    "connection point": "P", # 与电位器 'P' 共享前缀，若要区分，需调整
+    "node": "N", "节点": "N",
+    "input": "IN", "输入": "IN",
+    "output": "OUT", "输出": "OUT",
+    "search_record": "SRCH", "搜索记录": "SRCH",
+    "component": "O", "元件": "O",
+}
+# 关键字在映射表中的顺序，用于在等长匹配时保持 "先定义者优先" 的规则。
+_TYPE_KEYWORD_RANK: Dict[str, int] = {keyword: rank for rank, keyword in enumerate(_TYPE_PREFIX_MAP)}
+# 所有关键字的单一交替正则，按长度降序排列，使每个起始位置都优先匹配最长关键字。
+# 包在零宽前瞻中，以便 finditer 能找出重叠的匹配 (例如 "voltage source" 中的 "voltage" 与 "source")。
+_TYPE_KEYWORD_PATTERN = re.compile(
+    "(?=(" + "|".join(re.escape(keyword) for keyword in sorted(_TYPE_PREFIX_MAP, key=len, reverse=True)) + "))"
+)
+
+@lru_cache(maxsize=1024)
+def _classify_component_type(cleaned_type: str) -> str:
+    """
+    将已清理 (去空格、小写) 的元件类型映射为ID前缀代码。
+    选择出现在类型字符串中的最长关键字；等长时以映射表中先定义者为准；未命中时返回 "O"。
+    结果按类型字符串缓存，批量导入同类元件时几乎不产生分类开销。
+    """
+    # 特殊关键字优先处理或有特定逻辑
+    if cleaned_type == "input": return "IN"
+    if cleaned_type == "output": return "OUT"
+    if cleaned_type == "ground" or cleaned_type == "地": return "G"
+    best_keyword = None
+    for match in _TYPE_KEYWORD_PATTERN.finditer(cleaned_type):
+        keyword = match.group(1)
+        if (best_keyword is None or len(keyword) > len(best_keyword)
+                or (len(keyword) == len(best_keyword) and _TYPE_KEYWORD_RANK[keyword] < _TYPE_KEYWORD_RANK[best_keyword])):
+            best_keyword = keyword
+    return _TYPE_PREFIX_MAP[best_keyword] if best_keyword is not None else "O"
+
+# 匹配 "前缀 + 正整数后缀" 形式的元件ID (例如 "R12", "OUT3")，用于登记已占用的后缀。
+_ID_SUFFIX_PATTERN = re.compile(r"^([A-Z]+)([1-9]\d*)$")
+
 class Circuit:
     """
     代表一个电路板，包含多个元件及其之间的连接。
 
     Attributes:
-        components (Dict[str, CircuitComponent]): 一个字典，存储电路中的所有元件。
+        components (MutableMapping[str, CircuitComponent]): 一个映射，存储电路中的所有元件。
                                                   键是元件的ID (大写)，值是 CircuitComponent 对象。
-        connections (Set[Tuple[str, str]]): 一个集合，存储元件之间的连接。
+                                                  默认是普通 dict；使用列式后端时是 ColumnarComponentStore。
+        connections (MutableSet[Tuple[str, str]]): 一个集合，存储元件之间的连接。
                                              每个连接是一个包含两个已排序元件ID的元组，
                                              以确保 (ID1, ID2) 和 (ID2, ID1) 被视为同一连接。
         _component_counters (Dict[str, int]): 一个内部字典，用于为不同类型的元件生成唯一的ID后缀。
                                               键是元件类型的前缀代码 (例如 "R", "C")，值是当前的计数。
+        _adjacency (Dict[str, Set[str]]): 与 connections 同步维护的邻接索引。
+                                          键是元件ID，值是与其直接相连的元件ID集合。
+                                          移除元件和查询连接数只需 O(度数)，而无需扫描全部连接。
+        _type_index (Dict[str, Dict[str, None]]): 类型二级索引。键是归一化后的类型
+                                                  (见 normalize_component_type)，值是按添加顺序
+                                                  排列的元件ID (以字典充当有序集合)。
+        _taken_id_suffixes (Dict[str, Set[int]]): ID分配器的占用表。键是ID前缀代码，值是电路中
+                                                  已被占用且大于该前缀当前计数的数字后缀
+                                                  (包括用户显式指定的ID)。
+        _sorted_component_ids / _sorted_connections (List): 与 components / connections 同步维护的
+                                                  有序列表，状态描述无需每次排序。新增的项先追加到末尾，
+                                                  在下一次读取前一次性排序 (见 _ensure_sorted_views)，
+                                                  批量导入大量元件时避免逐个 insort 带来的 O(n²) 数据搬移。
+        _removed_sorted_component_ids / _removed_sorted_connections (Set): 有序列表的删除标记 (墓碑)。
+                                                  删除只做标记，在下一次读取时随排序一并清除，
+                                                  使移除元件与断开连接保持 O(度数)，不必在列表中间删除元素。
+        _sorted_views_stale (bool): 有序列表末尾是否存在尚未排序的新增项。
+        _component_lines (Dict[str, str]): 每个元件在状态描述中的行文本缓存，只在元件变化时重建
+                                           (批量载入的元件在首次生成描述时补齐)。
+                                           列式后端为节省内存不使用此缓存，生成描述时按需格式化。
+        _description_cache (Optional[str]): 完整状态描述的缓存；任何修改都会使其失效。
+        _revision (int): 电路的修改版本号，每次修改都会递增，供依赖电路状态的缓存判断是否过期。
+        _topology_revision (int): 电路的结构版本号，只在元件增删、连接变化、类型变化或清空时递增 (改值不递增)，
+                                  供只依赖电路结构的缓存 (例如电路求解器的矩阵结构) 判断是否需要重建。
+        journal (CircuitJournal): 操作日志，提供 O(1) 快照、回滚以及撤销/重做。
+        connectivity (ConnectivityIndex): 增量维护的并查集连通性索引，支持近似 O(1) 的连通性查询。
     """
-    def __init__(self):
-        """初始化一个空的电路。"""
-        logger.info("[Circuit] 初始化电路实体...")
-        self.components: Dict[str, CircuitComponent] = {}
-        self.connections: Set[Tuple[str, str]] = set()
+    # 构成电路状态的内部容器。清空电路时整体替换这些容器，撤销清空时再换回，无需深拷贝。
+    _STATE_ATTRIBUTES: Tuple[str, ...] = (
+        "components", "connections", "_adjacency", "_type_index", "_component_counters",
+        "_taken_id_suffixes", "_sorted_component_ids", "_sorted_connections",
+        "_removed_sorted_component_ids", "_removed_sorted_connections", "_component_lines",
+    )
+
+    def __init__(self, max_journal_entries: int = 5000, storage_backend: str = STORAGE_BACKEND_DICT):
+        """
+        初始化一个空的电路。
+
+        Args:
+            max_journal_entries (int): 操作日志 (撤销/重做与快照) 保留的最大条目数。
+            storage_backend (str): 元件与连接的存储后端。"dict" 为普通 dict/set (默认)；
+                                   "columnar" 为列式数组存储 (见 storage.py)，适合超大电路以节省内存。
+
+        Raises:
+            ValueError: 如果存储后端名称未知。
+        """
+        logger.debug("[Circuit] 初始化电路实体...")
+        self.storage_backend: str = storage_backend
+        self.components: MutableMapping[str, CircuitComponent]
+        self.connections: MutableSet[Tuple[str, str]]
+        self.components, self.connections = create_storage(storage_backend)
+        # 邻接索引: 元件ID -> 相邻元件ID集合。只为至少有一条连接的元件保留条目。
+        self._adjacency: Dict[str, Set[str]] = {}
+        # 类型索引: 归一化类型 -> 有序的元件ID集合，按类型列出元件时只需 O(匹配数)。
+        self._type_index: Dict[str, Dict[str, None]] = {}
         # 预定义一些常见的元件类型前缀及其计数器
         # 这些前缀用于自动生成元件ID，例如 R1, R2, C1, L1 等。
         self._component_counters: Dict[str, int] = {
@@ -35,7 +196,26 @@ class Circuit:
             'T': 0, 'N': 0, 'IN': 0, 'OUT': 0,
             'SRCH': 0  # 用于搜索记录这类特殊 "元件"
         }
-        logger.info("[Circuit] 电路实体初始化完成。")
+        # ID分配器占用表: 前缀代码 -> 已被占用的数字后缀集合。
+        # _component_counters 充当单调递增的游标，游标之前的后缀不会再次分配。
+        self._taken_id_suffixes: Dict[str, Set[int]] = {}
+        # 状态描述的增量缓存: 有序的ID/连接列表、逐元件的行文本，以及整段描述文本
+        self._sorted_component_ids: List[str] = []
+        self._sorted_connections: List[Tuple[str, str]] = []
+        self._removed_sorted_component_ids: Set[str] = set()
+        self._removed_sorted_connections: Set[Tuple[str, str]] = set()
+        self._sorted_views_stale: bool = False
+        self._component_lines: Dict[str, str] = {}
+        self._cache_component_lines: bool = storage_backend == STORAGE_BACKEND_DICT
+        self._description_cache: Optional[str] = None
+        self._revision: int = 0
+        self._topology_revision: int = 0
+        # 确保所有在 _TYPE_PREFIX_MAP 中定义的前缀代码都在 _component_counters 中有初始计数
+        for code in _TYPE_PREFIX_MAP.values():
+            self._component_counters.setdefault(code, 0)
+        self.journal: CircuitJournal = CircuitJournal(self, max_entries=max_journal_entries)
+        self.connectivity: ConnectivityIndex = ConnectivityIndex(self)
+        logger.debug("[Circuit] 电路实体初始化完成。")
 
     def add_component(self, component: CircuitComponent) -> None:
         """
@@ -56,7 +236,16 @@ class Circuit:
             logger.warning(f"[Circuit] 尝试添加已存在的元件 ID '{component.id}'。")
             raise ValueError(f"元件 ID '{component.id}' 已被占用。")
         
+        # 驻留ID字符串，使连接、邻接索引与有序列表共享同一个字符串对象
+        component.id = sys.intern(component.id)
         self.components[component.id] = component
+        self._type_index.setdefault(normalize_component_type(component.type), {})[component.id] = None
+        self._register_taken_id(component.id)
+        self._add_sorted(self._sorted_component_ids, self._removed_sorted_component_ids, component.id)
+        self._refresh_component_line(component)
+        self.connectivity.on_component_added(component.id)
+        self._mark_dirty()
+        self.journal.record("add", component)
         logger.debug(f"[Circuit] 元件 '{component.id}' ({component.type}) 已添加到电路。")
 
     def remove_component(self, component_id: str) -> Tuple[Dict[str, Any], int]:
@@ -80,23 +269,27 @@ class Circuit:
             raise ValueError(f"元件 '{comp_id_upper}' 在电路中不存在。")
         
         # 获取待移除元件的字典表示，以便返回
-        removed_component_details = self.components[comp_id_upper].to_dict()
+        removed_component = self.components[comp_id_upper]
+        removed_component_details = removed_component.to_dict()
         del self.components[comp_id_upper] # 从字典中删除元件
+        self._unindex_type(normalize_component_type(removed_component.type), comp_id_upper)
+        self._release_taken_id(comp_id_upper)
+        self._removed_sorted_component_ids.add(comp_id_upper)
+        self._component_lines.pop(comp_id_upper, None)
         
-        # 查找并移除所有与该元件相关的连接
-        connections_to_remove = set() # 使用集合避免重复记录要移除的连接
-        for conn in self.connections:
-            if comp_id_upper in conn: # 检查元件ID是否在连接元组中
-                connections_to_remove.add(conn)
-        
-        removed_connections_count = len(connections_to_remove)
-        for conn_to_remove in connections_to_remove: # 遍历要移除的连接集合
-            if conn_to_remove in self.connections: # 再次确认连接存在（理论上应该存在）
-                self.connections.remove(conn_to_remove)
-                logger.debug(f"[Circuit] 移除了涉及元件 '{comp_id_upper}' 的连接 {conn_to_remove}。")
-            else: # 防御性代码，理论上不应执行
-                logger.warning(f"[Circuit] 尝试移除连接 {conn_to_remove} 时发现其已不存在。")
-
+        # 通过邻接索引直接找到与该元件相关的所有连接，代价为 O(度数)
+        neighbor_ids = sorted(self._adjacency.pop(comp_id_upper, set()))
+        removed_connections_count = len(neighbor_ids)
+        for neighbor_id in neighbor_ids:
+            conn_to_remove = tuple(sorted((comp_id_upper, neighbor_id)))
+            self.connections.discard(conn_to_remove)
+            self._removed_sorted_connections.add(conn_to_remove)
+            self._unlink_adjacency(neighbor_id, comp_id_upper)
+            logger.debug(f"[Circuit] 移除了涉及元件 '{comp_id_upper}' 的连接 {conn_to_remove}。")
+
+        self.connectivity.on_component_removed(comp_id_upper, had_connections=bool(neighbor_ids))
+        self._mark_dirty()
+        self.journal.record("remove", (removed_component, neighbor_ids))
         logger.debug(f"[Circuit] 元件 '{comp_id_upper}' 及其相关 {removed_connections_count} 个连接已从电路中移除。")
         return removed_component_details, removed_connections_count
 
@@ -114,8 +307,8 @@ class Circuit:
         Raises:
             ValueError: 如果任一元件ID不存在，或者尝试将元件连接到自身。
         """
-        id1_upper = id1.strip().upper()
-        id2_upper = id2.strip().upper()
+        id1_upper = sys.intern(id1.strip().upper())
+        id2_upper = sys.intern(id2.strip().upper())
 
         if id1_upper == id2_upper:
             logger.warning(f"[Circuit] 尝试将元件 '{id1_upper}' 连接到自身。")
@@ -134,6 +327,12 @@ class Circuit:
              return False  # 连接已存在
         
         self.connections.add(connection)
+        self._adjacency.setdefault(id1_upper, set()).add(id2_upper)
+        self._adjacency.setdefault(id2_upper, set()).add(id1_upper)
+        self._add_sorted(self._sorted_connections, self._removed_sorted_connections, connection)
+        self.connectivity.on_connected(id1_upper, id2_upper)
+        self._mark_dirty()
+        self.journal.record("connect", connection)
         logger.debug(f"[Circuit] 添加了连接: {id1_upper} <--> {id2_upper}。")
         return True # 成功添加新连接
 
@@ -161,48 +360,464 @@ class Circuit:
              return False # 连接不存在
         
         self.connections.remove(connection)
+        self._unlink_adjacency(id1_upper, id2_upper)
+        self._unlink_adjacency(id2_upper, id1_upper)
+        self._removed_sorted_connections.add(connection)
+        self.connectivity.invalidate() # 并查集不支持拆分，下一次查询时惰性重建
+        self._mark_dirty()
+        self.journal.record("disconnect", connection)
         logger.debug(f"[Circuit] 断开了连接: {id1_upper} <--> {id2_upper}。")
         return True # 成功断开连接
 
+    @property
+    def revision(self) -> int:
+        """电路的修改版本号。电路每发生一次修改，该值都会递增。"""
+        return self._revision
+
+    @property
+    def topology_revision(self) -> int:
+        """电路的结构版本号。只有改变电路结构的修改才会使该值递增，仅修改元件值时保持不变。"""
+        return self._topology_revision
+
+    def _mark_dirty(self, topology_changed: bool = True) -> None:
+        """记录一次电路修改: 递增版本号并使缓存的状态描述失效。"""
+        self._revision += 1
+        if topology_changed:
+            self._topology_revision += 1
+        self._description_cache = None
+
+    def _refresh_component_line(self, component: CircuitComponent) -> None:
+        """更新元件在状态描述中的行文本缓存 (列式后端不缓存)。"""
+        if self._cache_component_lines:
+            self._component_lines[component.id] = f"    - {component}"
+
+    def _ensure_sorted_views(self) -> None:
+        """
+        清除有序列表中带删除标记的项，并对追加了新项的列表排序
+        (Timsort 对 "有序前缀 + 少量新项" 接近线性)。代价由下一次读取 (本身即为 O(n)) 承担。
+        """
+        if self._removed_sorted_component_ids:
+            removed_ids = self._removed_sorted_component_ids
+            self._sorted_component_ids = [cid for cid in self._sorted_component_ids if cid not in removed_ids]
+            removed_ids.clear()
+        if self._removed_sorted_connections:
+            removed_connections = self._removed_sorted_connections
+            self._sorted_connections = [conn for conn in self._sorted_connections if conn not in removed_connections]
+            removed_connections.clear()
+        if self._sorted_views_stale:
+            self._sorted_component_ids.sort()
+            self._sorted_connections.sort()
+            self._sorted_views_stale = False
+
+    def _add_sorted(self, sorted_items: List[Any], removed_items: Set[Any], item: Any) -> None:
+        """
+        向有序列表登记一个新增项。该项若只是带删除标记 (删除后尚未清除又被重新添加)，
+        撤销标记即可，列表中原有的那一项重新生效；否则追加到末尾，留待下一次读取时排序。
+        """
+        if item in removed_items:
+            removed_items.discard(item)
+            return
+        sorted_items.append(item)
+        self._sorted_views_stale = True
+
+    def _unlink_adjacency(self, component_id: str, neighbor_id: str) -> None:
+        """从邻接索引中移除 component_id -> neighbor_id 这一方向的记录，并清理空条目。"""
+        neighbors = self._adjacency.get(component_id)
+        if neighbors is None:
+            return
+        neighbors.discard(neighbor_id)
+        if not neighbors:
+            del self._adjacency[component_id]
+
+    def _register_taken_id(self, component_id: str) -> None:
+        """
+        在ID分配器中登记一个已占用的ID。
+        只有 "前缀 + 正整数" 形式且后缀大于该前缀当前游标的ID需要登记，
+        游标之前的后缀本来就不会再被分配。
+        """
+        match = _ID_SUFFIX_PATTERN.match(component_id)
+        if not match:
+            return
+        prefix, suffix = match.group(1), int(match.group(2))
+        if suffix > self._component_counters.get(prefix, 0):
+            self._taken_id_suffixes.setdefault(prefix, set()).add(suffix)
+
+    def _release_taken_id(self, component_id: str) -> None:
+        """从ID分配器的占用表中移除一个ID (元件被删除时调用)。"""
+        match = _ID_SUFFIX_PATTERN.match(component_id)
+        if not match:
+            return
+        taken = self._taken_id_suffixes.get(match.group(1))
+        if taken is not None:
+            taken.discard(int(match.group(2)))
+
+    def _allocate_id_suffix(self, type_code: str) -> int:
+        """
+        为指定前缀分配下一个未被占用的数字后缀。
+        游标单调递增，每个被占用的后缀最多被跳过一次 (随即从占用表中丢弃)，因此分配的均摊代价为 O(1)。
+        """
+        taken = self._taken_id_suffixes.get(type_code)
+        suffix = self._component_counters.get(type_code, 0) + 1
+        if taken:
+            while suffix in taken:
+                taken.discard(suffix) # 游标越过后无需再记录
+                suffix += 1
+        self._component_counters[type_code] = suffix
+        return suffix
+
+    def _unindex_type(self, type_key: str, component_id: str) -> None:
+        """从类型索引中移除一个元件ID，并清理空条目。"""
+        ids_of_type = self._type_index.get(type_key)
+        if ids_of_type is None:
+            return
+        ids_of_type.pop(component_id, None)
+        if not ids_of_type:
+            del self._type_index[type_key]
+
+    def update_component_value(self, component_id: str, new_value: Optional[str]) -> Tuple[Optional[str], CircuitComponent]:
+        """
+        更新电路中一个已存在元件的值。
+
+        Args:
+            component_id (str): 元件的ID (不区分大小写)。
+            new_value (Optional[str]): 新值。None 或空白字符串表示清除该元件的值。
+
+        Returns:
+            Tuple[Optional[str], CircuitComponent]: 一个元组，包含旧值和被更新的元件对象。
+
+        Raises:
+            ValueError: 如果指定的元件ID在电路中不存在。
+        """
+        comp_id_upper = component_id.strip().upper()
+        if comp_id_upper not in self.components:
+            raise ValueError(f"元件 '{comp_id_upper}' 在电路中不存在。")
+        component = self.components[comp_id_upper]
+        old_value = component.value
+        component.value = str(new_value).strip() if new_value is not None and str(new_value).strip() else None
+        self.components[comp_id_upper] = component # 写回存储 (列式后端返回的是元件快照)
+        self._refresh_component_line(component)
+        self._mark_dirty(topology_changed=False)
+        self.journal.record("value", (comp_id_upper, old_value, component.value))
+        logger.debug(f"[Circuit] 元件 '{comp_id_upper}' 的值已从 '{old_value}' 更新为 '{component.value}'。")
+        return old_value, component
+
+    def update_component_type(self, component_id: str, new_type: str) -> Tuple[str, CircuitComponent]:
+        """
+        修改电路中一个已存在元件的类型，并同步更新类型索引。
+
+        Args:
+            component_id (str): 元件的ID (不区分大小写)。
+            new_type (str): 新的元件类型，必须是非空字符串。
+
+        Returns:
+            Tuple[str, CircuitComponent]: 一个元组，包含旧类型和被更新的元件对象。
+
+        Raises:
+            ValueError: 如果元件不存在或新类型无效。
+        """
+        comp_id_upper = component_id.strip().upper()
+        if comp_id_upper not in self.components:
+            raise ValueError(f"元件 '{comp_id_upper}' 在电路中不存在。")
+        if not isinstance(new_type, str) or not new_type.strip():
+            raise ValueError("元件类型必须是有效的非空字符串。")
+        component = self.components[comp_id_upper]
+        old_type = component.type
+        self._unindex_type(normalize_component_type(old_type), comp_id_upper)
+        component.type = new_type.strip()
+        self.components[comp_id_upper] = component # 写回存储 (列式后端返回的是元件快照)
+        self._type_index.setdefault(normalize_component_type(component.type), {})[comp_id_upper] = None
+        self._refresh_component_line(component)
+        self._mark_dirty()
+        self.journal.record("type", (comp_id_upper, old_type, component.type))
+        logger.debug(f"[Circuit] 元件 '{comp_id_upper}' 的类型已从 '{old_type}' 更新为 '{component.type}'。")
+        return old_type, component
+
+    def get_components_by_type(self, component_type: str) -> List[CircuitComponent]:
+        """
+        按类型查找元件。匹配不区分大小写，并识别常见别名 (例如 "电阻" 与 "resistor")。
+
+        Args:
+            component_type (str): 要查找的元件类型。
+
+        Returns:
+            List[CircuitComponent]: 匹配的元件列表，按添加顺序排列。代价为 O(匹配数)。
+        """
+        ids_of_type = self._type_index.get(normalize_component_type(component_type), {})
+        return [self.components[cid] for cid in ids_of_type]
+
+    def batch(self) -> CircuitBatch:
+        """
+        创建一个事务性批量修改对象 (见 CircuitBatch)。
+        暂存的操作在提交时一次性校验，要么全部生效，要么电路保持不变。
+
+        Returns:
+            CircuitBatch: 绑定到本电路的批量修改对象，可作为上下文管理器使用。
+        """
+        return CircuitBatch(self)
+
+    def iter_sorted_component_rows(self) -> Iterator[Tuple[str, str, Optional[str]]]:
+        """按ID升序遍历全部元件的 (ID, 类型, 值)，直接使用增量维护的有序列表 (供序列化使用)。"""
+        self._ensure_sorted_views()
+        components = self.components
+        for cid in self._sorted_component_ids:
+            component = components[cid]
+            yield cid, component.type, component.value
+
+    def get_sorted_connections(self) -> List[Tuple[str, str]]:
+        """返回按升序排列的全部连接 (内部有序列表的只读视图，调用方不应修改)。"""
+        self._ensure_sorted_views()
+        return self._sorted_connections
+
+    def get_id_allocator_state(self) -> Dict[str, Any]:
+        """返回ID分配器的状态 (各前缀的计数游标与占用表的副本)，可传给 load_bulk 原样恢复。"""
+        return {
+            "counters": dict(self._component_counters),
+            "taken_suffixes": {prefix: sorted(suffixes) for prefix, suffixes in self._taken_id_suffixes.items() if suffixes},
+        }
+
+    def load_bulk(self, component_rows: Iterable[Tuple[str, str, Optional[str]]], connections: Iterable[Tuple[str, str]],
+                  id_allocator_state: Optional[Dict[str, Any]] = None) -> None:
+        """
+        向空电路一次性载入元件与连接 (用于从会话快照恢复)。
+
+        直接构建内部容器与索引: 跳过逐项校验与逐项日志，不记入操作日志 (载入后没有可撤销的步骤)；
+        连通性索引在首次查询时惰性重建，状态描述的行文本在首次生成描述时才格式化。
+        调用方需保证数据来自一个合法的电路: 元件ID已规范化且互不重复，连接是两个已排序的、已存在的元件ID。
+
+        Args:
+            component_rows (Iterable[Tuple[str, str, Optional[str]]]): (ID, 类型, 值) 序列，最好已按ID升序排列。
+            connections (Iterable[Tuple[str, str]]): 连接序列，最好已按升序排列。
+            id_allocator_state (Optional[Dict[str, Any]]): get_id_allocator_state 的结果。
+                                                           None 表示保持初始游标，并由载入的ID重新登记占用表。
+
+        Raises:
+            ValueError: 如果电路不是空的。
+        """
+        if self.components or self.connections:
+            raise ValueError("只能向空电路批量载入元件与连接。")
+        self._ensure_sorted_views() # 清除之前删除留下的标记，避免与载入的同名项冲突
+        if id_allocator_state is not None:
+            self._component_counters.update(id_allocator_state.get("counters", {}))
+            self._taken_id_suffixes = {prefix: set(suffixes) for prefix, suffixes in id_allocator_state.get("taken_suffixes", {}).items()}
+        register_taken_ids = id_allocator_state is None
+        components = self.components
+        type_index = self._type_index
+        type_keys: Dict[str, str] = {} # 每种类型字符串只归一化一次
+        sorted_ids = self._sorted_component_ids
+        new_component = CircuitComponent.__new__
+        for component_id, component_type, value in component_rows:
+            component = new_component(CircuitComponent) # 数据来自合法电路，跳过构造函数中的清理逻辑
+            component.id = component_id = sys.intern(component_id)
+            component.type = component_type
+            component.value = value
+            components[component_id] = component
+            type_key = type_keys.get(component_type)
+            if type_key is None:
+                type_key = type_keys[component_type] = normalize_component_type(component_type)
+            type_index.setdefault(type_key, {})[component_id] = None
+            if register_taken_ids:
+                self._register_taken_id(component_id)
+            sorted_ids.append(component_id)
+        adjacency = self._adjacency
+        add_connection = self.connections.add
+        sorted_connections = self._sorted_connections
+        for connection in connections:
+            add_connection(connection)
+            id1, id2 = connection
+            adjacency.setdefault(id1, set()).add(id2)
+            adjacency.setdefault(id2, set()).add(id1)
+            sorted_connections.append(connection)
+        self._sorted_views_stale = True # 已有序的输入排序代价为线性
+        self.connectivity.invalidate()
+        self._mark_dirty()
+        logger.info(f"[Circuit] 批量载入了 {len(components)} 个元件, {len(self.connections)} 个连接。")
+
+    def get_numeric_value_arrays(self) -> Tuple[List[str], "np.ndarray", List[Optional[str]]]:
+        """
+        将电路中所有元件的值批量解析为 NumPy 数组，供分析类工具做向量化计算。
+        每个不同的值字符串只解析一次；列式后端直接使用其去重后的值表与值编号列。
+
+        Returns:
+            Tuple[List[str], np.ndarray, List[Optional[str]]]: (元件ID列表, 以基本单位表示的 float64 数值数组
+                (无值或无法解析处为 NaN), 对应的规范单位列表)。三者按同一顺序排列。
+
+        Raises:
+            RuntimeError: 如果 numpy 不可用。
+        """
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("批量数值解析需要 numpy,请先安装: pip install numpy")
+        if isinstance(self.components, ColumnarComponentStore):
+            component_ids, value_codes, value_strings = self.components.value_code_columns()
+            codes = np.frombuffer(value_codes, dtype=np.uint32).astype(np.intp) if len(value_codes) else np.empty(0, dtype=np.intp)
+            magnitudes, units = _expand_parsed_table([None, *value_strings], codes)
+            return component_ids, magnitudes, units
+        component_ids = list(self.components)
+        components = self.components
+        magnitudes, units = parse_values_bulk(components[cid].value for cid in component_ids)
+        return component_ids, magnitudes, units
+
+    def get_type_counts(self) -> Dict[str, int]:
+        """
+        统计电路中每种元件类型的数量 (类型已归一化，见 normalize_component_type)。
+
+        Returns:
+            Dict[str, int]: 归一化类型 -> 元件数量，按数量降序排列。代价为 O(类型数)。
+        """
+        return dict(Counter({type_key: len(ids) for type_key, ids in self._type_index.items()}).most_common())
+
+    def get_hub_components(self, limit: int) -> List[Tuple[str, int]]:
+        """
+        找出连接数最多的若干元件 (高连接度 "枢纽" 元件)。
+
+        Args:
+            limit (int): 最多返回的元件数量。
+
+        Returns:
+            List[Tuple[str, int]]: (元件ID, 连接数) 列表，按连接数降序、ID升序排列。
+        """
+        if limit <= 0:
+            return []
+        return heapq.nsmallest(limit, ((cid, len(neighbors)) for cid, neighbors in self._adjacency.items()),
+                               key=lambda item: (-item[1], item[0]))
+
+    def get_connected_groups(self) -> List[List[str]]:
+        """
+        返回电路的连通分组 (互相可达的元件集合)，基于连通性索引，无需遍历连接。
+        没有任何连接的元件各自构成一个单元素分组。
+
+        Returns:
+            List[List[str]]: 连通分组列表，按分组大小降序排列 (等大时按最小ID升序)；每个分组内的ID按升序排列。
+        """
+        groups = [sorted(members) for members in self.connectivity.groups().values()]
+        groups.sort(key=lambda group: (-len(group), group[0]))
+        return groups
+
+    def _require_component(self, component_id: str) -> str:
+        """规范化元件ID并检查其存在性，返回大写ID。"""
+        comp_id_upper = component_id.strip().upper()
+        if comp_id_upper not in self.components:
+            raise ValueError(f"元件 '{comp_id_upper}' 在电路中不存在。")
+        return comp_id_upper
+
+    def are_components_connected(self, id1: str, id2: str) -> bool:
+        """
+        判断两个元件之间是否存在 (直接或间接的) 连接路径，代价近似 O(1)。
+
+        Raises:
+            ValueError: 如果任一元件ID不存在。
+        """
+        return self.connectivity.are_connected(self._require_component(id1), self._require_component(id2))
+
+    def get_connected_group(self, component_id: str) -> List[str]:
+        """
+        返回与指定元件直接或间接相连的全部元件 (包括其自身)，按ID升序排列。
+
+        Raises:
+            ValueError: 如果元件ID不存在。
+        """
+        return self.connectivity.group_of(self._require_component(component_id))
+
+    def get_connected_group_count(self) -> int:
+        """返回连通分组的数量 (即互相隔离的子电路数，没有连接的元件各自算一个)。"""
+        return self.connectivity.group_count()
+
+    def get_ground_component_ids(self) -> List[str]:
+        """返回电路中所有接地 (地线/GND) 类型元件的ID，按添加顺序排列。"""
+        return list(self._type_index.get("ground", ()))
+
+    def get_floating_component_ids(self) -> List[str]:
+        """
+        返回所有悬空元件的ID: 即与任何接地元件都不连通的元件 (电路中没有接地元件时，全部元件都视为悬空)。
+
+        Returns:
+            List[str]: 悬空元件ID列表，按ID升序排列。
+        """
+        connectivity = self.connectivity
+        grounded_roots = {connectivity.root_of(ground_id) for ground_id in self.get_ground_component_ids()}
+        floating_ids = [component_id for root, members in connectivity.groups().items() if root not in grounded_roots for component_id in members]
+        floating_ids.sort()
+        return floating_ids
+
+    def get_component_connection_count(self, component_id: str) -> int:
+        """
+        获取指定元件当前的连接数量 (即其在电路图中的度数)。
+
+        Args:
+            component_id (str): 元件的ID (不区分大小写)。
+
+        Returns:
+            int: 与该元件直接相连的元件数量。
+
+        Raises:
+            ValueError: 如果指定的元件ID在电路中不存在。
+        """
+        comp_id_upper = component_id.strip().upper()
+        if comp_id_upper not in self.components:
+            raise ValueError(f"元件 '{comp_id_upper}' 在电路中不存在。")
+        return len(self._adjacency.get(comp_id_upper, ()))
+
+    def get_connected_component_ids(self, component_id: str) -> Set[str]:
+        """
+        获取与指定元件直接相连的所有元件ID。
+
+        Args:
+            component_id (str): 元件的ID (不区分大小写)。
+
+        Returns:
+            Set[str]: 相邻元件ID的集合 (副本，修改它不会影响电路)。
+        """
+        return set(self._adjacency.get(component_id.strip().upper(), ()))
+
     def get_state_description(self) -> str:
         """
         生成当前电路状态的文本描述。
 
+        描述文本会被缓存，电路未被修改时直接返回缓存 (O(1))；
+        修改时只更新变化元件的行文本，有序列表只需把新增项排入 (对已有序的前缀接近线性)。
+
         Returns:
             str: 多行字符串，描述电路中的所有元件和连接。
                  如果电路为空，则返回特定消息。
         """
+        if self._description_cache is not None:
+            return self._description_cache # 电路自上次生成后未被修改，直接返回缓存
+
         logger.debug("[Circuit] 正在生成电路状态描述...")
         num_components = len(self.components)
         num_connections = len(self.connections)
 
         if num_components == 0 and num_connections == 0:
-            return "【当前电路状态】: 电路为空。"
+            self._description_cache = "【当前电路状态】: 电路为空。"
+            return self._description_cache
 
+        self._ensure_sorted_views()
         desc_lines = ["【当前电路状态】:"]
         desc_lines.append(f"  - 元件 ({num_components}):")
-        if self.components:
-            # 按ID排序元件，确保输出顺序稳定
-            sorted_ids = sorted(self.components.keys())
-            for cid in sorted_ids:
-                # 调用 CircuitComponent 实例的 __str__ 方法获取其描述
-                desc_lines.append(f"    - {str(self.components[cid])}")
+        if self._sorted_component_ids:
+            # 有序ID列表与逐元件行文本均为增量维护，这里只需按序拼接
+            if self._cache_component_lines:
+                component_lines = self._component_lines
+                if len(component_lines) < num_components: # 批量载入的元件在首次生成描述时才格式化行文本
+                    components = self.components
+                    for cid in self._sorted_component_ids:
+                        if cid not in component_lines:
+                            component_lines[cid] = f"    - {components[cid]}"
+                desc_lines.extend(component_lines[cid] for cid in self._sorted_component_ids)
+            else:
+                components = self.components
+                desc_lines.extend(f"    - {components[cid]}" for cid in self._sorted_component_ids)
         else:
             desc_lines.append("    (无)")
 
         desc_lines.append(f"  - 连接 ({num_connections}):")
-        if self.connections:
-            # 按连接对排序，确保输出顺序稳定
-            # (c1, c2) 元组本身就是可比较的，可以直接排序
-            sorted_connections = sorted(list(self.connections)) 
-            for c1, c2 in sorted_connections:
-                desc_lines.append(f"    - {c1} <--> {c2}")
+        if self._sorted_connections:
+            desc_lines.extend(f"    - {c1} <--> {c2}" for c1, c2 in self._sorted_connections)
         else:
             desc_lines.append("    (无)")
 
-        description = "\n".join(desc_lines)
+        self._description_cache = "\n".join(desc_lines)
         logger.debug("[Circuit] 电路状态描述生成完毕。")
-        return description
+        return self._description_cache
 
     def generate_component_id(self, component_type: str) -> str:
         """
@@ -214,90 +829,102 @@ class Circuit:
                                   此函数会尝试将常见类型名映射到标准前缀。
 
         Returns:
-            str: 生成的唯一元件ID。
-
-        Raises:
-            RuntimeError: 如果在多次尝试后仍未能生成唯一的ID (非常罕见)。
+            str: 生成的唯一元件ID。分配均摊 O(1)，不会因已存在大量显式ID而逐个探测。
         """
         logger.debug(f"[Circuit] 正在为类型 '{component_type}' 生成唯一 ID...")
         
-        # 元件类型关键字到其ID前缀的映射表。
-        # 键是小写关键字，值是ID前缀代码。
-        type_map = {
-            "resistor": "R", "电阻": "R",
-            "capacitor": "C", "电容": "C",
-            "battery": "B", "电池": "B",
-            "voltage source": "V", "voltage": "V", "电压源": "V", "电压": "V",
-            "led": "L", "发光二极管": "L",
-            "switch": "S", "开关": "S",
-            "ground": "G", "地": "G",
-            "ic": "U", "chip": "U", "芯片": "U", "集成电路": "U",
-            "inductor": "I", "电感": "I",
-            "current source": "A", "电流源": "A",
-            "diode": "D", "二极管": "D",
-            "potentiometer": "P", "电位器": "P",
-            "fuse": "F", "保险丝": "F",
-            "header": "H", "排针": "H",
-            "terminal": "T", "端子": "T",
-            "connection point": "P", # 与电位器 'P' 共享前缀，若要区分，需调整
-            "node": "N", "节点": "N",
-            "input": "IN", "输入": "IN",
-            "output": "OUT", "输出": "OUT",
-            "search_record": "SRCH", "搜索记录": "SRCH",
-            "component": "O", "元件": "O",
-        }
-
-        # 确保所有在 type_map 中定义的前缀代码都在 _component_counters 中有初始计数
-        for code in type_map.values():
-            if code not in self._component_counters:
-                 self._component_counters[code] = 0
-
         cleaned_type = component_type.strip().lower() # 清理并转小写以便匹配
-        type_code = "O"  # 默认为通用元件前缀 "O" (Other)
-        best_match_len = 0 # 用于找到最长（最具体）的关键字匹配
-
-        # 特殊关键字优先处理或有特定逻辑
-        if cleaned_type == "input": type_code = "IN"
-        elif cleaned_type == "output": type_code = "OUT"
-        elif cleaned_type == "ground" or cleaned_type == "地": type_code = "G"
-        else:
-            # 遍历映射表，查找最长匹配的关键字来确定类型代码
-            for keyword, code in type_map.items():
-                if keyword in cleaned_type and len(keyword) > best_match_len:
-                    type_code = code
-                    best_match_len = len(keyword)
+        type_code = _classify_component_type(cleaned_type) # 预编译分类器 + LRU 缓存
 
         if type_code == "O" and cleaned_type not in ["component", "元件"]:
              logger.warning(f"[Circuit] 未找到类型 '{component_type}' 的特定前缀,将使用通用前缀 'O'。")
 
-        MAX_ID_ATTEMPTS = 10000 # 防止无限循环的保护措施
-        for attempt in range(MAX_ID_ATTEMPTS):
-            self._component_counters[type_code] += 1 # 增加对应类型代码的计数器
-            gen_id = f"{type_code}{self._component_counters[type_code]}" # 构造ID
-            if gen_id not in self.components: # 检查生成的ID是否已存在
-                logger.debug(f"[Circuit] 生成唯一 ID: '{gen_id}' (尝试 {attempt + 1})。")
-                return gen_id
-            logger.debug(f"[Circuit] ID '{gen_id}' 已存在,尝试下一个。(尝试 {attempt + 1})。")
+        gen_id = f"{type_code}{self._allocate_id_suffix(type_code)}" # 构造ID
+        logger.debug(f"[Circuit] 生成唯一 ID: '{gen_id}'。")
+        return gen_id
 
-        # 如果循环了 MAX_ID_ATTEMPTS 次仍然没有找到唯一的ID，则抛出运行时错误。
-        logger.error(f"未能为类型 '{component_type}' (代码 '{type_code}') 生成唯一 ID ({MAX_ID_ATTEMPTS} 次尝试后)。")
-        raise RuntimeError(f"未能为类型 '{component_type}' (代码 '{type_code}') 生成唯一 ID ({MAX_ID_ATTEMPTS} 次尝试后)。")
+    def reserve_component_ids(self, component_type: str, count: int) -> List[str]:
+        """
+        为指定类型的元件一次性预留 count 个唯一ID，适用于批量添加元件。
+        预留的ID不会再被 generate_component_id 分配，即使它们尚未被添加到电路中。
+
+        Args:
+            component_type (str): 元件的类型 (与 generate_component_id 的映射规则相同)。
+            count (int): 要预留的ID数量，必须是非负整数。
+
+        Returns:
+            List[str]: 按后缀递增顺序排列的唯一ID列表。
+
+        Raises:
+            ValueError: 如果 count 不是非负整数。
+        """
+        if not isinstance(count, int) or count < 0:
+            raise ValueError("预留的 ID 数量必须是非负整数。")
+        cleaned_type = component_type.strip().lower()
+        type_code = _classify_component_type(cleaned_type)
+        reserved_ids = [f"{type_code}{self._allocate_id_suffix(type_code)}" for _ in range(count)]
+        logger.debug(f"[Circuit] 为类型 '{component_type}' (代码 '{type_code}') 预留了 {count} 个 ID。")
+        return reserved_ids
+
+    def create_snapshot(self) -> int:
+        """
+        创建代表当前电路状态的快照，代价为 O(1) (不复制电路)。
+
+        Returns:
+            int: 快照标识，可传给 restore_snapshot。
+        """
+        return self.journal.create_snapshot()
+
+    def restore_snapshot(self, snapshot: int) -> int:
+        """
+        将电路回滚到快照时的状态，代价与快照之后的修改数量成正比。
+
+        Args:
+            snapshot (int): create_snapshot 返回的快照标识。
+
+        Returns:
+            int: 被回滚的修改条目数。
+
+        Raises:
+            ValueError: 如果快照对应的修改已被撤销或已超出日志保留范围。
+        """
+        return self.journal.restore_snapshot(snapshot)
+
+    def undo(self, steps: int = 1) -> int:
+        """撤销最近的若干个修改步骤 (一次顶层修改或一次批量操作为一步)，返回实际撤销的步骤数。"""
+        return self.journal.undo(steps)
+
+    def redo(self, steps: int = 1) -> int:
+        """重做最近被撤销的若干个修改步骤，返回实际重做的步骤数。"""
+        return self.journal.redo(steps)
+
+    def _swap_state(self, new_state: Dict[str, Any]) -> Dict[str, Any]:
+        """用给定的内部容器整体替换当前电路状态，并返回被换下的容器 (O(1)，不复制数据)。"""
+        old_state = {attr: getattr(self, attr) for attr in self._STATE_ATTRIBUTES}
+        for attr, container in new_state.items():
+            setattr(self, attr, container)
+        self._sorted_views_stale = True # 换入的列表可能在换出前追加过未排序的项
+        self.connectivity.invalidate()
+        self._mark_dirty()
+        return old_state
 
     def clear(self) -> None:
         """
         清空整个电路，移除所有元件和连接，并将所有元件ID计数器重置为0。
-        此操作是不可逆的。
+        旧的内部容器被整体换下并记入操作日志，因此清空可以通过 undo 撤销。
         """
         logger.info("[Circuit] 正在清空电路状态...")
         comp_count = len(self.components)
         conn_count = len(self.connections)
 
-        self.components.clear() # 清空元件字典
-        self.connections.clear() # 清空连接集合
-        
-        # 重置所有元件ID计数器
-        for key in self._component_counters:
-            self._component_counters[key] = 0
-        # 或者更简洁: self._component_counters = {k: 0 for k in self._component_counters}
-
-        logger.info(f"[Circuit] 电路状态已清空 (移除了 {comp_count} 个元件, {conn_count} 个连接,并重置了所有 ID 计数器)。")
\ No newline at end of file
+        # 用全新的空容器替换全部状态 (ID计数器与分配器占用表同时重置)
+        new_components, new_connections = create_storage(self.storage_backend)
+        old_state = self._swap_state({
+            "components": new_components, "connections": new_connections, "_adjacency": {}, "_type_index": {},
+            "_component_counters": {key: 0 for key in self._component_counters},
+            "_taken_id_suffixes": {}, "_sorted_component_ids": [], "_sorted_connections": [],
+            "_removed_sorted_component_ids": set(), "_removed_sorted_connections": set(), "_component_lines": {},
+        })
+        self.journal.record("clear", old_state)
+
+        logger.info(f"[Circuit] 电路状态已清空 (移除了 {comp_count} 个元件, {conn_count} 个连接,并重置了所有 ID 计数器)。")
@@ -1,10 +1,15 @@
 # IDT_AGENT_Pro/circuitmanus/circuit_domain/components.py
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 import logging
 
+from .units import parse_engineering_value
+
 # 使用特定于此模块的 logger，而不是根 logger，便于追踪日志来源
 logger = logging.getLogger(__name__)
 
+# 标记 "数值尚未解析" 的哨兵对象 (None 已用于表示 "无值或无法解析")
+_NOT_PARSED = object()
+
 class CircuitComponent:
     """
     代表电路中的一个基本元件。
@@ -14,10 +19,14 @@ class CircuitComponent:
         type (str): 元件的类型 (例如: "resistor", "capacitor", "led")。
         value (Optional[str]): 元件的可选值 (例如: "1kΩ", "10uF", "3V")。
                                如果元件没有特定值 (如地线、连接点)，则为 None。
+        numeric_value (Optional[float]): 由 value 解析出的、以基本单位表示的数值 (例如 "1kΩ" -> 1000.0)。
+                                         首次访问时才解析并缓存；修改 value 会使缓存失效。
+        unit (Optional[str]): 由 value 解析出的规范单位符号 (例如 "Ω", "F", "V")。
     """
     # 使用 __slots__ 可以略微优化内存使用，并限制实例的属性，防止意外添加新属性。
     # 这对于频繁创建大量此类对象的场景比较有用。
-    __slots__ = ['id', 'type', 'value']
+    # _parsed_value 缓存 (数值, 单位) 的解析结果，未解析时为 _NOT_PARSED。
+    __slots__ = ['id', 'type', '_value', '_parsed_value']
 
     def __init__(self, component_id: str, component_type: str, value: Optional[str] = None):
         """
@@ -47,10 +56,37 @@ class CircuitComponent:
         
         # 处理元件值：确保空字符串或仅包含空格的字符串也被视作 None
         processed_value = str(value).strip() if value is not None and str(value).strip() else None
-        self.value: Optional[str] = processed_value
+        self.value: Optional[str] = processed_value # 通过属性设置，同时初始化数值缓存
         
         # logger.debug(f"CircuitComponent initialized: ID='{self.id}', Type='{self.type}', Value='{self.value}'")
 
+    @property
+    def value(self) -> Optional[str]:
+        return self._value
+
+    @value.setter
+    def value(self, new_value: Optional[str]) -> None:
+        self._value = new_value
+        self._parsed_value = _NOT_PARSED # 值变化后，数值缓存失效
+
+    def _get_parsed_value(self) -> Tuple[Optional[float], Optional[str]]:
+        """惰性解析 value 并缓存结果。"""
+        parsed = self._parsed_value
+        if parsed is _NOT_PARSED:
+            parsed = parse_engineering_value(self._value) if self._value is not None else (None, None)
+            self._parsed_value = parsed
+        return parsed
+
+    @property
+    def numeric_value(self) -> Optional[float]:
+        """以基本单位表示的数值 (例如 "10uF" -> 1e-05)。无值或无法解析时为 None。"""
+        return self._get_parsed_value()[0]
+
+    @property
+    def unit(self) -> Optional[str]:
+        """规范单位符号 (例如 "10uF" -> "F")。没有单位或无法解析时为 None。"""
+        return self._get_parsed_value()[1]
+
     def __str__(self) -> str:
         """
         返回元件的字符串表示形式，方便阅读。
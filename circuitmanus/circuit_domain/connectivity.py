@@ -0,0 +1,109 @@
+# IDT_AGENT_Pro/circuitmanus/circuit_domain/connectivity.py
+import logging
+from typing import Dict, List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .circuit import Circuit
+
+logger = logging.getLogger(__name__)
+
+class ConnectivityIndex:
+    """
+    电路连通性的并查集 (disjoint-set) 索引，回答 "两个元件是否连通"、"某元件所在的连通分组" 等查询。
+
+    - 添加元件与建立连接时增量维护 (按分组大小合并 + 路径减半)，查询代价近似 O(1)。
+    - 断开连接或移除仍有连接的元件无法在并查集上增量撤销，此时只把索引标记为失效，
+      在下一次查询时按当前电路一次性重建 (O(元件数 + 连接数))。连续的多次修改只触发一次重建。
+    - 每个根节点另外维护其分组的成员列表 (合并时把小列表并入大列表)，列出分组成员时无需扫描全部元件。
+
+    Attributes:
+        rebuild_count (int): 惰性重建的累计次数 (用于观察索引的效率)。
+    """
+    def __init__(self, circuit: 'Circuit'):
+        self._circuit = circuit
+        self._parent: Dict[str, str] = {}
+        self._members: Dict[str, List[str]] = {} # 根节点 -> 该分组的全部成员
+        self._valid: bool = True # 新建的电路为空，索引天然有效
+        self.rebuild_count: int = 0
+
+    def invalidate(self) -> None:
+        """标记索引失效，下一次查询时重建。"""
+        if self._valid:
+            self._valid = False
+            self._parent, self._members = {}, {} # 立即释放旧索引占用的内存
+
+    def on_component_added(self, component_id: str) -> None:
+        if self._valid:
+            self._parent[component_id] = component_id
+            self._members[component_id] = [component_id]
+
+    def on_component_removed(self, component_id: str, had_connections: bool) -> None:
+        # 没有任何连接的元件自成一组，可以直接删除；否则只能失效后重建
+        if not self._valid:
+            return
+        if had_connections or self._parent.get(component_id) != component_id:
+            self.invalidate()
+            return
+        del self._parent[component_id]
+        del self._members[component_id]
+
+    def on_connected(self, id1: str, id2: str) -> None:
+        if self._valid:
+            self._union(id1, id2)
+
+    def _find(self, component_id: str) -> str:
+        parent = self._parent
+        while parent[component_id] != component_id:
+            parent[component_id] = parent[parent[component_id]]
+            component_id = parent[component_id]
+        return component_id
+
+    def _union(self, id1: str, id2: str) -> None:
+        root1, root2 = self._find(id1), self._find(id2)
+        if root1 == root2:
+            return
+        if len(self._members[root1]) < len(self._members[root2]):
+            root1, root2 = root2, root1
+        self._parent[root2] = root1
+        self._members[root1].extend(self._members.pop(root2))
+
+    def _ensure_valid(self) -> None:
+        if self._valid:
+            return
+        circuit = self._circuit
+        self._parent = {component_id: component_id for component_id in circuit.components}
+        self._members = {component_id: [component_id] for component_id in self._parent}
+        self._valid = True
+        for id1, id2 in circuit.connections:
+            self._union(id1, id2)
+        self.rebuild_count += 1
+        logger.debug(f"[ConnectivityIndex] 已重建连通性索引: {len(self._parent)} 个元件, {len(self._members)} 个连通分组。")
+
+    def are_connected(self, id1: str, id2: str) -> bool:
+        """两个 (已存在的) 元件之间是否存在路径。"""
+        self._ensure_valid()
+        return self._find(id1) == self._find(id2)
+
+    def root_of(self, component_id: str) -> str:
+        """返回元件所在分组的代表元素 (同一分组的元件返回同一个值，修改电路后可能变化)。"""
+        self._ensure_valid()
+        return self._find(component_id)
+
+    def group_of(self, component_id: str) -> List[str]:
+        """返回元件所在连通分组的全部成员 (按ID升序)。"""
+        self._ensure_valid()
+        return sorted(self._members[self._find(component_id)])
+
+    def group_size_of(self, component_id: str) -> int:
+        self._ensure_valid()
+        return len(self._members[self._find(component_id)])
+
+    def group_count(self) -> int:
+        """连通分组的数量 (没有连接的元件各自算一组)。"""
+        self._ensure_valid()
+        return len(self._members)
+
+    def groups(self) -> Dict[str, List[str]]:
+        """返回 根节点 -> 成员列表 的映射 (只读视图，调用方不应修改)。"""
+        self._ensure_valid()
+        return self._members
@@ -0,0 +1,205 @@
+# IDT_AGENT_Pro/circuitmanus/circuit_domain/journal.py
+import logging
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .circuit import Circuit
+
+logger = logging.getLogger(__name__)
+
+# 日志条目: (序号, 操作名, 负载)。序号全局单调递增，快照即 "某一时刻最后一个条目的序号"。
+JournalEntry = Tuple[int, str, Any]
+
+class CircuitJournal:
+    """
+    电路的操作日志，支持 O(1) 快照、回滚到快照以及按步骤撤销/重做。
+
+    每次电路修改都会记录一个可逆的条目 (添加/移除元件、连接/断开、改值/改类型、清空)。
+    - 快照只是当前最后一个条目的序号，创建代价为 O(1)，无需复制电路。
+    - 回滚到快照时按逆序执行逆操作，代价与快照之后的修改数量成正比，而与电路规模无关。
+    - 清空电路通过整体替换内部容器实现，其逆操作只需把旧容器换回来，同样无需深拷贝。
+
+    连续的条目被划分为 "撤销步骤": 默认每次顶层修改调用为一步，
+    处于 group() 上下文中的所有修改合并为一步 (例如一次批量操作)。
+
+    Attributes:
+        max_entries (int): 日志保留的最大条目数。超出时丢弃最旧的整步，早于它们的快照随之失效。
+    """
+    def __init__(self, circuit: 'Circuit', max_entries: int = 5000):
+        self._circuit = circuit
+        self.max_entries: int = max(1, max_entries)
+        self._entries: List[JournalEntry] = []
+        self._step_starts: List[int] = [] # 每个撤销步骤在 _entries 中的起始下标
+        self._redo_steps: List[List[JournalEntry]] = []
+        self._next_seq: int = 1
+        self._floor_seq: int = 0 # 日志中最旧条目之前的状态所对应的序号
+        self._suspended: bool = False # 执行撤销/重做时暂停记录
+        self._group_depth: int = 0
+        self._group_step_open: bool = False
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._step_starts)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self._redo_steps)
+
+    def record(self, op_name: str, payload: Any) -> None:
+        """记录一次已完成的电路修改。任何新的修改都会清空重做栈。"""
+        if self._suspended:
+            return
+        self._redo_steps.clear()
+        if self._group_depth == 0 or not self._group_step_open:
+            self._step_starts.append(len(self._entries))
+            self._group_step_open = self._group_depth > 0
+        self._entries.append((self._next_seq, op_name, payload))
+        self._next_seq += 1
+        if len(self._entries) > self.max_entries:
+            self._trim()
+
+    def _trim(self) -> None:
+        """丢弃最旧的若干个完整步骤，使条目数回到上限以内 (至少保留最新的一步)。"""
+        overflow = len(self._entries) - self.max_entries
+        cut_step = bisect_left(self._step_starts, overflow)
+        cut_step = min(cut_step, len(self._step_starts) - 1)
+        cut_index = self._step_starts[cut_step]
+        if cut_index <= 0:
+            return
+        self._floor_seq = self._entries[cut_index - 1][0]
+        del self._entries[:cut_index]
+        self._step_starts = [start - cut_index for start in self._step_starts[cut_step:]]
+        logger.debug(f"[CircuitJournal] 日志超出上限,丢弃了最旧的 {cut_index} 个条目。")
+
+    @contextmanager
+    def group(self) -> Iterator[None]:
+        """将上下文中的全部修改合并为一个撤销步骤 (可嵌套，以最外层为准)。"""
+        if self._group_depth == 0:
+            self._group_step_open = False
+        self._group_depth += 1
+        try:
+            yield
+        finally:
+            self._group_depth -= 1
+            if self._group_depth == 0:
+                self._group_step_open = False
+
+    @contextmanager
+    def _replaying(self) -> Iterator[None]:
+        self._suspended = True
+        try:
+            yield
+        finally:
+            self._suspended = False
+
+    def create_snapshot(self) -> int:
+        """返回代表当前电路状态的快照标识 (O(1))。"""
+        return self._entries[-1][0] if self._entries else self._floor_seq
+
+    def _entry_index_after(self, snapshot: int) -> int:
+        """返回快照之后第一个条目的下标；快照已失效时抛出 ValueError。"""
+        if snapshot == self._floor_seq:
+            return 0
+        index = bisect_left(self._entries, snapshot, key=lambda entry: entry[0])
+        if index < len(self._entries) and self._entries[index][0] == snapshot:
+            return index + 1
+        raise ValueError(f"快照 {snapshot} 已失效 (对应的修改已被撤销或已超出日志保留范围)。")
+
+    def entries_since(self, snapshot: int) -> List[JournalEntry]:
+        """
+        返回快照之后记录的全部条目 (按时间顺序)，供增量分析确定哪些元件发生了变化。
+
+        Raises:
+            ValueError: 如果快照已失效。
+        """
+        return self._entries[self._entry_index_after(snapshot):]
+
+    def restore_snapshot(self, snapshot: int) -> int:
+        """
+        将电路回滚到快照时的状态。被回滚的修改不会进入重做栈。
+
+        Returns:
+            int: 被回滚的修改条目数。
+
+        Raises:
+            ValueError: 如果快照已失效。
+        """
+        cut_index = self._entry_index_after(snapshot)
+        rolled_back = self._entries[cut_index:]
+        del self._entries[cut_index:]
+        while self._step_starts and self._step_starts[-1] >= cut_index:
+            self._step_starts.pop()
+        with self._replaying():
+            for entry in reversed(rolled_back):
+                self._apply_inverse(entry)
+        self._redo_steps.clear()
+        logger.info(f"[CircuitJournal] 已回滚到快照 {snapshot},撤销了 {len(rolled_back)} 个修改条目。")
+        return len(rolled_back)
+
+    def undo(self, steps: int = 1) -> int:
+        """撤销最近的若干个步骤，返回实际撤销的步骤数。"""
+        undone = 0
+        while undone < steps and self._step_starts:
+            start = self._step_starts.pop()
+            step_entries = self._entries[start:]
+            del self._entries[start:]
+            with self._replaying():
+                for entry in reversed(step_entries):
+                    self._apply_inverse(entry)
+            self._redo_steps.append(step_entries)
+            undone += 1
+        return undone
+
+    def redo(self, steps: int = 1) -> int:
+        """重做最近被撤销的若干个步骤，返回实际重做的步骤数。"""
+        redone = 0
+        while redone < steps and self._redo_steps:
+            step_entries = self._redo_steps.pop()
+            with self._replaying():
+                for entry in step_entries:
+                    self._apply_forward(entry)
+            self._step_starts.append(len(self._entries))
+            self._entries.extend(step_entries) # 保留原序号，使撤销前创建的快照在重做后重新有效
+            redone += 1
+        return redone
+
+    def _apply_inverse(self, entry: JournalEntry) -> None:
+        circuit = self._circuit
+        _, op_name, payload = entry
+        if op_name == "add":
+            circuit.remove_component(payload.id)
+        elif op_name == "remove":
+            component, neighbor_ids = payload
+            circuit.add_component(component)
+            for neighbor_id in neighbor_ids:
+                circuit.connect_components(component.id, neighbor_id)
+        elif op_name == "connect":
+            circuit.disconnect_components(*payload)
+        elif op_name == "disconnect":
+            circuit.connect_components(*payload)
+        elif op_name == "value":
+            circuit.update_component_value(payload[0], payload[1])
+        elif op_name == "type":
+            circuit.update_component_type(payload[0], payload[1])
+        elif op_name == "clear":
+            circuit._swap_state(payload)
+
+    def _apply_forward(self, entry: JournalEntry) -> None:
+        circuit = self._circuit
+        _, op_name, payload = entry
+        if op_name == "add":
+            circuit.add_component(payload)
+        elif op_name == "remove":
+            circuit.remove_component(payload[0].id)
+        elif op_name == "connect":
+            circuit.connect_components(*payload)
+        elif op_name == "disconnect":
+            circuit.disconnect_components(*payload)
+        elif op_name == "value":
+            circuit.update_component_value(payload[0], payload[2])
+        elif op_name == "type":
+            circuit.update_component_type(payload[0], payload[2])
+        elif op_name == "clear":
+            circuit.clear()
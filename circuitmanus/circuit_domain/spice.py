@@ -0,0 +1,481 @@
+# IDT_AGENT_Pro/circuitmanus/circuit_domain/spice.py
+import re
+import time
+import logging
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Any, TYPE_CHECKING
+
+from .circuit import normalize_component_type
+
+if TYPE_CHECKING:
+    from .circuit import Circuit
+
+logger = logging.getLogger(__name__)
+
+# SPICE 元件名首字母 -> (元件类型, 端子数, 值的规范单位)。
+# 三端/四端器件按端子顺序取前几个网络，其值为器件型号名。
+_SPICE_ELEMENT_TYPES: Dict[str, Tuple[str, int, Optional[str]]] = {
+    "R": ("resistor", 2, "Ω"),
+    "C": ("capacitor", 2, "F"),
+    "L": ("inductor", 2, "H"),
+    "V": ("voltage source", 2, "V"),
+    "I": ("current source", 2, "A"),
+    "D": ("diode", 2, None),
+    "S": ("switch", 2, None), # 压控开关的控制端 (nc+ nc-) 不导入
+    "W": ("switch", 2, None), # 流控开关的控制源不导入
+    "Q": ("transistor", 3, None),
+    "J": ("jfet", 3, None),
+    "M": ("mosfet", 4, None),
+}
+_SOURCE_PREFIXES = frozenset({"V", "I"})
+_MODEL_NAME_PREFIXES = frozenset({"D", "S", "W", "Q", "J", "M"})
+# 表示地的网络名 (大小写不敏感)
+_GROUND_NET_NAMES = frozenset({"0", "GND", "GND!"})
+GROUND_COMPONENT_ID = "GND"
+_GROUND_NET_NAME = "0" # 导出时地网络的名称
+# 导入的网络以节点元件表示，其ID为 前缀 + 网络名 (导出时去掉前缀，保证往返一致)
+NET_ID_PREFIX = "NET_"
+
+# SPICE 数值: 数字 + 可选比例后缀 + 被忽略的尾随字母 (例如 "10uF", "1kohm", "2.2MEG")。
+# 注意 SPICE 中 "M" 表示毫 (milli)，兆写作 "MEG"；本项目的值字符串中 "M" 表示兆，因此导入时需要转换。
+_SPICE_NUMBER_PATTERN = re.compile(
+    r"^(?P<number>[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)(?P<suffix>meg|mil|[tgkmunpf])?(?P<rest>[a-zµμΩ]*)$",
+    re.IGNORECASE,
+)
+# SPICE 比例后缀 (小写) -> 本项目值字符串使用的 SI 词头
+_SPICE_SUFFIX_TO_PREFIX: Dict[str, str] = {"t": "T", "g": "G", "meg": "meg", "k": "k", "m": "m", "u": "u", "n": "n", "p": "p", "f": "f"}
+# 导出时使用的 SPICE 比例后缀 (十进制指数 -> 后缀)
+_EXPONENT_TO_SPICE_SUFFIX: Dict[int, str] = {12: "T", 9: "G", 6: "MEG", 3: "K", 0: "", -3: "m", -6: "u", -9: "n", -12: "p", -15: "f"}
+
+# 本项目元件类型 (归一化后) -> (SPICE 元件首字母, 值的写法)
+_EXPORT_ELEMENT_TYPES: Dict[str, Tuple[str, str]] = {
+    "resistor": ("R", "value"), "potentiometer": ("R", "value"),
+    "capacitor": ("C", "value"),
+    "inductor": ("L", "value"),
+    "voltage source": ("V", "dc"), "battery": ("V", "dc"),
+    "current source": ("I", "dc"),
+    "diode": ("D", "model"), "led": ("D", "model"),
+    # 开关 (视为闭合) 与保险丝在直流下是短路，按 0V 电压源导出，与直流求解器的模型一致
+    "switch": ("V", "short"), "fuse": ("V", "short"),
+}
+# 本身就是一个电气节点 (网络) 的元件类型，与 analysis.dc 的网络推断规则一致
+_NET_TYPES = frozenset({"ground", "node", "connection point", "terminal", "header", "input", "output"})
+_POLARIZED_TYPES = frozenset({"voltage source", "battery", "current source", "diode", "led"})
+_DEFAULT_DIODE_MODELS: Dict[str, str] = {"diode": "D_DEFAULT", "led": "D_LED"}
+_DEFAULT_MODEL_CARDS: Dict[str, str] = {"D_DEFAULT": ".model D_DEFAULT D", "D_LED": ".model D_LED D(N=2)"}
+_DEFAULT_IMPORT_CHUNK_SIZE = 5000
+_MAX_REPORTED_ITEMS = 20
+
+class SpiceElement(NamedTuple):
+    """网表中的一个元件行。"""
+    name: str
+    component_type: str
+    nodes: Tuple[str, ...]
+    value: Optional[str]
+    line_number: int
+
+def spice_value_to_component_value(token: str, unit: Optional[str]) -> str:
+    """
+    把 SPICE 数值写法转换为本项目的值字符串，例如 ("10M", "Ω") -> "10mΩ"，("2.2MEG", "Ω") -> "2.2megΩ"。
+    无法识别的写法 (如参数表达式 "{rval}") 原样返回。
+    """
+    match = _SPICE_NUMBER_PATTERN.match(token)
+    if not match:
+        return token
+    number, suffix = match.group("number"), (match.group("suffix") or "").lower()
+    if suffix == "mil": # 1 mil = 25.4 微米
+        return f"{Decimal(number) * Decimal('25.4')}u{unit or ''}"
+    return f"{number}{_SPICE_SUFFIX_TO_PREFIX.get(suffix, '')}{unit or ''}"
+
+def format_spice_number(number: float) -> str:
+    """把数值格式化为带 SPICE 比例后缀的紧凑写法，例如 4700.0 -> "4.7K"，1e-07 -> "100n"。"""
+    if number == 0:
+        return "0"
+    exact = Decimal(repr(float(number)))
+    exponent = (exact.adjusted() // 3) * 3
+    exponent = max(min(exponent, 12), -15)
+    mantissa = exact.scaleb(-exponent).normalize()
+    mantissa_text = f"{mantissa:f}"
+    return f"{mantissa_text}{_EXPONENT_TO_SPICE_SUFFIX[exponent]}"
+
+class SpiceNetlistReader:
+    """
+    流式 SPICE 网表 (.cir/.net/.sp) 读取器。
+
+    iter_elements 是生成器: 逐行读取、拼接续行 ('+' 开头)、去掉注释 ('*' 开头的行以及 ';' / ' $' 之后的行内注释)，
+    每解析出一个受支持的元件行就立即产出，因此读取任意大小的网表只占用常数内存 (不计调用方保存的结果)。
+
+    - 首行按 SPICE 约定是标题行 (skip_title=True 时)；遇到 .end 停止。
+    - .subckt ... .ends 之间的子电路定义、.control ... .endc 控制块、X 子电路实例、受控源等不支持的行被跳过并计数。
+    - 其余点命令 (.model/.tran/.param 等) 被忽略；.include/.lib 不会被展开，会记入警告。
+
+    Attributes:
+        title (Optional[str]): 网表标题。
+        line_count (int): 已读取的物理行数。
+        element_count (int): 已产出的元件数。
+        skipped (Dict[str, int]): 按原因统计的被跳过的行数。
+        warnings (List[str]): 解析警告 (数量有上限)。
+        warning_count (int): 警告总数。
+    """
+    def __init__(self, skip_title: bool = True):
+        self.skip_title = skip_title
+        self.title: Optional[str] = None
+        self.line_count: int = 0
+        self.element_count: int = 0
+        self.skipped: Dict[str, int] = {}
+        self.warnings: List[str] = []
+        self.warning_count: int = 0 # 警告总数 (warnings 只保留前若干条)
+
+    def _skip(self, reason: str) -> None:
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+
+    def _warn(self, message: str) -> None:
+        self.warning_count += 1
+        if len(self.warnings) < _MAX_REPORTED_ITEMS:
+            self.warnings.append(message)
+
+    @staticmethod
+    def _strip_comment(line: str) -> str:
+        semicolon = line.find(";")
+        if semicolon >= 0:
+            line = line[:semicolon]
+        dollar = line.find(" $")
+        if dollar >= 0:
+            line = line[:dollar]
+        return line.strip()
+
+    def iter_logical_lines(self, lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+        """把物理行合并为逻辑行 (处理续行与注释)，产出 (起始行号, 逻辑行)。"""
+        pending: Optional[str] = None
+        pending_line_number = 0
+        for line_number, raw_line in enumerate(lines, start=1):
+            self.line_count = line_number
+            if line_number == 1:
+                raw_line = raw_line.lstrip("\ufeff") # 去掉 UTF-8 BOM
+                if self.skip_title:
+                    self.title = raw_line.strip() or None
+                    continue
+            stripped = raw_line.strip()
+            if not stripped or stripped.startswith("*"):
+                continue
+            if stripped.startswith("+"):
+                continuation = self._strip_comment(stripped[1:])
+                if pending is None:
+                    self._warn(f"第 {line_number} 行: 续行之前没有可续接的行,已忽略。")
+                elif continuation:
+                    pending = f"{pending} {continuation}"
+                continue
+            if pending:
+                yield pending_line_number, pending
+            pending, pending_line_number = self._strip_comment(stripped), line_number
+        if pending:
+            yield pending_line_number, pending
+
+    def iter_elements(self, lines: Iterable[str]) -> Iterator[SpiceElement]:
+        """逐个产出网表中受支持的元件 (生成器)。"""
+        subcircuit_depth = 0
+        in_control_block = False
+        for line_number, logical_line in self.iter_logical_lines(lines):
+            # 括号内的参数 (例如 "SIN(0 1 1k)") 与 '=' 两侧的空白不影响前面的节点字段，统一按空白切分
+            tokens = logical_line.replace("(", " ( ").replace(")", " ) ").split()
+            head = tokens[0].upper()
+            if in_control_block:
+                in_control_block = head != ".ENDC"
+                self._skip("control_block_line")
+                continue
+            if head.startswith("."):
+                if head == ".CONTROL":
+                    in_control_block = True
+                    self._skip("control_block_line")
+                elif head == ".SUBCKT":
+                    subcircuit_depth += 1
+                    self._skip("subcircuit_definition")
+                elif head == ".ENDS":
+                    subcircuit_depth = max(0, subcircuit_depth - 1)
+                elif head == ".END" and subcircuit_depth == 0:
+                    return
+                elif head == ".TITLE" and self.title is None:
+                    self.title = logical_line[len(tokens[0]):].strip() or None
+                elif head in (".INCLUDE", ".INC", ".LIB"):
+                    self._warn(f"第 {line_number} 行: 不会展开 {tokens[0]} 引用的文件 ({' '.join(tokens[1:])})。")
+                    self._skip("include")
+                else:
+                    self._skip("dot_command")
+                continue
+            if subcircuit_depth:
+                self._skip("subcircuit_definition_line")
+                continue
+            element_spec = _SPICE_ELEMENT_TYPES.get(head[0])
+            if element_spec is None:
+                self._skip(f"unsupported_element_{head[0]}")
+                continue
+            component_type, terminal_count, unit = element_spec
+            fields = [token for token in tokens[1:] if token not in ("(", ")")]
+            if len(fields) < terminal_count:
+                self._warn(f"第 {line_number} 行: 元件 '{tokens[0]}' 的节点不足 {terminal_count} 个,已跳过。")
+                self._skip("malformed_element")
+                continue
+            nodes = tuple(fields[:terminal_count])
+            value = self._element_value(head[0], fields[terminal_count:], unit)
+            if head[0] == "D" and value and "LED" in value.upper():
+                component_type = "led"
+            self.element_count += 1
+            yield SpiceElement(tokens[0].upper(), component_type, nodes, value, line_number)
+
+    @staticmethod
+    def _element_value(prefix: str, fields: List[str], unit: Optional[str]) -> Optional[str]:
+        if prefix in _SOURCE_PREFIXES:
+            # 独立源: 取直流值 ("DC 5" / "5" / "DC=5")；只有 AC/瞬态描述时按 SPICE 约定直流值为 0
+            for index, field in enumerate(fields):
+                upper_field = field.upper()
+                if upper_field.startswith("DC="):
+                    return spice_value_to_component_value(field[3:], unit)
+                if upper_field == "DC":
+                    continue
+                if _SPICE_NUMBER_PATTERN.match(field) and (index == 0 or fields[index - 1].upper() == "DC"):
+                    return spice_value_to_component_value(field, unit)
+                break
+            return f"0{unit}"
+        if prefix in _MODEL_NAME_PREFIXES:
+            # 半导体器件与开关的值是型号名 (第一个不是 key=value 形式的字段)
+            model_names = [field for field in fields if "=" not in field and not _SPICE_NUMBER_PATTERN.match(field)]
+            if prefix in ("S", "W"):
+                model_names = model_names[2:] if prefix == "S" else model_names[1:] # 跳过控制节点/控制源
+            return model_names[0].upper() if model_names else None
+        if not fields:
+            return None
+        value_field = fields[0]
+        if "=" in value_field: # 例如 "R=1k"
+            value_field = value_field.split("=", 1)[1]
+        return spice_value_to_component_value(value_field, unit) if value_field else None
+
+def _is_reversed_in_model(element_nets: List[str], ground_id: str) -> bool:
+    """网表中 (正极, 负极) 顺序的两端元件，在电路模型推断出的方向下是否反向。"""
+    if len(element_nets) != 2 or element_nets[0] == element_nets[1]:
+        return False
+    positive, negative = element_nets
+    if ground_id in element_nets:
+        return positive == ground_id
+    return positive > negative
+
+def _negate_value(value: Optional[str]) -> Optional[str]:
+    """对数值写法的值取反 ("5V" -> "-5V", "-2mA" -> "2mA")；非数值写法 (例如参数表达式) 原样返回。"""
+    if not value or not re.match(r"[+-]?(?:\d|\.\d)", value):
+        return value
+    if value[0] == "-":
+        return value[1:]
+    return f"-{value.lstrip('+')}"
+
+def import_spice_netlist(circuit: 'Circuit', lines: Iterable[str], id_prefix: str = "", skip_title: bool = True,
+                         chunk_size: int = _DEFAULT_IMPORT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    把 SPICE 网表流式导入电路。
+
+    每个 SPICE 网络导入为一个节点元件 (ID 为 "NET_" + 网络名)，地网络 (0/GND) 导入为一个地线元件 (ID "GND")，
+    每个元件与其各端子所在的网络元件相连。元件按 chunk_size 分块经 CircuitBatch 写入，整个导入在操作日志中
+    是一个撤销步骤；任一分块失败 (例如ID冲突) 时回滚到导入前的状态。
+
+    电路模型的连接不含引脚信息，有极性元件的方向由连接推断 (一端接地时该端为负极，否则按相邻元件ID排序，
+    见 analysis.dc.MNASystem)。推断方向与网表相反的独立源导入为取反的值 (二者在电路上等效)；
+    二极管无法这样等效，方向相反的二极管会在结果中列出。
+
+    Args:
+        circuit (Circuit): 目标电路。
+        lines (Iterable[str]): 网表的行 (例如打开的文件对象)，逐行读取。
+        id_prefix (str): 加在所有导入元件ID前的前缀，用于把同一网表多次导入同一电路时避免ID冲突。
+        skip_title (bool): 是否把首行当作标题行 (SPICE 约定)。
+        chunk_size (int): 每个批次包含的元件数。
+
+    Returns:
+        Dict[str, Any]: 导入摘要 (标题、元件数、网络数、连接数、跳过统计、警告等)。
+
+    Raises:
+        CircuitBatchError: 导入的元件与电路中已有元件ID冲突等校验错误 (电路保持导入前的状态)。
+    """
+    start_time = time.perf_counter()
+    prefix = id_prefix.strip().upper()
+    reader = SpiceNetlistReader(skip_title=skip_title)
+    net_ids: Dict[str, str] = {} # 网络名 -> 网络元件ID
+    ground_id = f"{prefix}{GROUND_COMPONENT_ID}"
+    connection_count = 0
+    reversed_diode_ids: List[str] = []
+    reversed_diode_count = 0
+    type_counts: Dict[str, int] = {}
+
+    snapshot = circuit.create_snapshot()
+    try:
+        with circuit.journal.group(): # 全部分块合并为一个撤销步骤
+            batch = circuit.batch()
+            for element in reader.iter_elements(lines):
+                element_nets = []
+                for node_name in element.nodes:
+                    upper_name = node_name.upper()
+                    is_ground = upper_name in _GROUND_NET_NAMES
+                    net_key = GROUND_COMPONENT_ID if is_ground else upper_name
+                    net_id = net_ids.get(net_key)
+                    if net_id is None:
+                        net_id = net_ids[net_key] = ground_id if is_ground else f"{prefix}{NET_ID_PREFIX}{upper_name}"
+                        batch.add_component("ground" if is_ground else "node", component_id=net_id)
+                    element_nets.append(net_id)
+                component_id = f"{prefix}{element.name}"
+                value = element.value
+                if element.component_type in _POLARIZED_TYPES and _is_reversed_in_model(element_nets, ground_id):
+                    if element.component_type in ("voltage source", "current source"):
+                        value = _negate_value(value)
+                    else:
+                        reversed_diode_count += 1
+                        if len(reversed_diode_ids) < _MAX_REPORTED_ITEMS:
+                            reversed_diode_ids.append(component_id)
+                batch.add_component(element.component_type, component_id=component_id, value=value)
+                for net_id in dict.fromkeys(element_nets): # 两端接在同一网络时只连接一次
+                    batch.connect_components(component_id, net_id)
+                    connection_count += 1
+                type_counts[element.component_type] = type_counts.get(element.component_type, 0) + 1
+                if len(batch) >= chunk_size:
+                    batch.commit()
+                    batch = circuit.batch()
+            if len(batch):
+                batch.commit()
+    except Exception:
+        circuit.restore_snapshot(snapshot)
+        raise
+
+    elapsed_ms = round((time.perf_counter() - start_time) * 1000, 3)
+    logger.info(f"[SPICE] 已导入网表 '{reader.title or ''}': {reader.element_count} 个元件, {len(net_ids)} 个网络, "
+                f"{connection_count} 个连接, 读取 {reader.line_count} 行, 耗时 {elapsed_ms} ms。")
+    return {
+        "title": reader.title,
+        "line_count": reader.line_count,
+        "element_count": reader.element_count,
+        "element_type_counts": type_counts,
+        "net_count": len(net_ids),
+        "connection_count": connection_count,
+        "skipped": reader.skipped,
+        "warnings": reader.warnings,
+        "warning_count": reader.warning_count,
+        "reversed_diode_count": reversed_diode_count,
+        "reversed_diode_ids": reversed_diode_ids,
+        "elapsed_ms": elapsed_ms,
+    }
+
+def _spice_name(component_id: str, spice_prefix: str) -> str:
+    name = "_".join(component_id.split())
+    return name if name[:1].upper() == spice_prefix else f"{spice_prefix}{name}"
+
+def _infer_export_nets(circuit: 'Circuit') -> Dict[Tuple[str, str], str]:
+    """
+    按与直流求解器相同的规则推断网络 (见 analysis.dc.MNASystem)，为每个可导出元件的每个端子确定网络名。
+
+    Returns:
+        Dict[Tuple[str, str], str]: (元件ID, 相邻元件ID) -> 该元件朝向此相邻元件的端子所在的网络名。
+    """
+    parent: Dict[Any, Any] = {}
+
+    def find(point: Any) -> Any:
+        parent.setdefault(point, point)
+        while parent[point] != point:
+            parent[point] = parent[parent[point]]
+            point = parent[point]
+        return point
+
+    def union(first: Any, second: Any) -> None:
+        first_root, second_root = find(first), find(second)
+        if first_root != second_root:
+            parent[first_root] = second_root
+
+    net_type_of: Dict[str, str] = {}
+    exportable: Set[str] = set()
+    for component in circuit.components.values():
+        type_key = normalize_component_type(component.type)
+        if type_key in _NET_TYPES:
+            net_type_of[component.id] = type_key
+            find(("net", component.id))
+        elif type_key in _EXPORT_ELEMENT_TYPES and 1 <= circuit.get_component_connection_count(component.id) <= 2:
+            exportable.add(component.id)
+
+    def facing_point(component_id: str, neighbor_id: str) -> Optional[Tuple[str, ...]]:
+        if component_id in net_type_of:
+            return ("net", component_id)
+        if component_id in exportable:
+            return ("pin", component_id, neighbor_id)
+        return None
+
+    ground_ids = [component_id for component_id, type_key in net_type_of.items() if type_key == "ground"]
+    for ground_id in ground_ids[1:]:
+        union(("net", ground_ids[0]), ("net", ground_id))
+    for id1, id2 in circuit.connections:
+        point1, point2 = facing_point(id1, id2), facing_point(id2, id1)
+        if point1 is not None and point2 is not None:
+            union(point1, point2)
+
+    # 网络命名: 地 -> "0"; 含网络元件的网络 -> 最小的网络元件ID (去掉导入时加的 "NET_" 前缀); 其余 -> 元件ID拼接
+    name_of_root: Dict[Any, str] = {}
+    if ground_ids:
+        name_of_root[find(("net", ground_ids[0]))] = _GROUND_NET_NAME
+    for net_id in sorted(net_type_of):
+        root = find(("net", net_id))
+        if root not in name_of_root:
+            name = net_id[len(NET_ID_PREFIX):] if net_id.startswith(NET_ID_PREFIX) and len(net_id) > len(NET_ID_PREFIX) else net_id
+            name_of_root[root] = "_".join(name.split())
+    pin_nets: Dict[Tuple[str, str], str] = {}
+    for component_id in exportable:
+        for neighbor_id in circuit.get_connected_component_ids(component_id):
+            root = find(("pin", component_id, neighbor_id))
+            if root not in name_of_root:
+                name_of_root[root] = "_".join(f"{component_id}_{neighbor_id}".split())
+            pin_nets[(component_id, neighbor_id)] = name_of_root[root]
+    return pin_nets
+
+def iter_spice_netlist(circuit: 'Circuit', title: Optional[str] = None) -> Iterator[str]:
+    """
+    把电路导出为 SPICE 网表，逐行产出 (生成器，行尾不含换行符)。
+
+    网络按与直流求解器相同的规则推断。电阻/电位器、电容、电感、电池/电压源、电流源、二极管/LED 按对应的 SPICE 元件导出；
+    开关 (视为闭合) 与保险丝导出为 0V 电压源；两端元件的相邻元件多于两个、没有连接、值无法解析，
+    或类型没有对应的 SPICE 元件 (例如芯片) 时，以注释行列出。
+    """
+    pin_nets = _infer_export_nets(circuit)
+    yield title or "CircuitManus netlist" # 标题行
+    used_models: Dict[str, None] = {}
+    skipped_lines: List[str] = []
+    for component in circuit.components.values():
+        type_key = normalize_component_type(component.type)
+        if type_key in _NET_TYPES:
+            continue
+        export_spec = _EXPORT_ELEMENT_TYPES.get(type_key)
+        neighbor_ids = sorted(circuit.get_connected_component_ids(component.id))
+        if export_spec is None:
+            skipped_lines.append(f"* {component.id} ({component.type}): 没有对应的 SPICE 元件,相连元件: {', '.join(neighbor_ids) or '无'}")
+            continue
+        if not 1 <= len(neighbor_ids) <= 2:
+            reason = "没有连接" if not neighbor_ids else f"相邻元件多于两个 ({', '.join(neighbor_ids)}),无法确定端子"
+            skipped_lines.append(f"* {component.id} ({component.type}): {reason}")
+            continue
+        nets = [pin_nets[(component.id, neighbor_id)] for neighbor_id in neighbor_ids]
+        if len(nets) == 1:
+            nets.append(f"NC_{'_'.join(component.id.split())}") # 悬空端子
+        if type_key in _POLARIZED_TYPES and nets[0] == _GROUND_NET_NAME and nets[1] != _GROUND_NET_NAME:
+            nets.reverse() # 接地端为负极/阴极
+        spice_prefix, value_style = export_spec
+        name = _spice_name(component.id, spice_prefix)
+        if value_style == "short":
+            yield f"* {component.id} ({component.type}): 直流下视为短路,导出为 0V 电压源"
+            yield f"{name} {nets[0]} {nets[1]} DC 0"
+        elif value_style == "model":
+            model_name = component.value if component.value and component.numeric_value is None else _DEFAULT_DIODE_MODELS[type_key]
+            model_name = "_".join(model_name.split())
+            used_models[model_name] = None
+            yield f"{name} {nets[0]} {nets[1]} {model_name}"
+        elif component.numeric_value is None:
+            skipped_lines.append(f"* {component.id} ({component.type}): 值 '{component.value}' 无法解析为数值")
+        elif value_style == "dc":
+            yield f"{name} {nets[0]} {nets[1]} DC {format_spice_number(component.numeric_value)}"
+        else:
+            yield f"{name} {nets[0]} {nets[1]} {format_spice_number(component.numeric_value)}"
+    for model_name in used_models:
+        # 型号参数不在电路模型中，非默认型号只输出占位的 .model 行，使网表可以直接仿真
+        yield _DEFAULT_MODEL_CARDS.get(model_name, f".model {model_name} D")
+    if skipped_lines:
+        yield "* 以下元件未导出:"
+        yield from skipped_lines
+    yield ".end"
@@ -0,0 +1,229 @@
+# IDT_AGENT_Pro/circuitmanus/circuit_domain/storage.py
+import logging
+from array import array
+from collections.abc import MutableMapping, MutableSet
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .components import CircuitComponent
+
+logger = logging.getLogger(__name__)
+
+# 可选的电路存储后端名称
+STORAGE_BACKEND_DICT = "dict"
+STORAGE_BACKEND_COLUMNAR = "columnar"
+STORAGE_BACKENDS = (STORAGE_BACKEND_DICT, STORAGE_BACKEND_COLUMNAR)
+
+class _StringTable:
+    """字符串驻留表: 字符串 <-> 从0开始的整数编号。编号一经分配就不会改变。"""
+    __slots__ = ("_codes", "strings")
+
+    def __init__(self):
+        self._codes: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def code_of(self, text: str) -> int:
+        """返回字符串的编号，不存在时分配一个新编号。"""
+        code = self._codes.get(text)
+        if code is None:
+            code = len(self.strings)
+            self._codes[text] = code
+            self.strings.append(text)
+        return code
+
+    def lookup(self, text: str) -> Optional[int]:
+        """返回字符串的编号，不存在时返回 None (不分配)。"""
+        return self._codes.get(text)
+
+class ColumnarComponentStore(MutableMapping):
+    """
+    列式元件存储，实现与 Dict[str, CircuitComponent] 相同的映射接口。
+
+    元件ID被驻留为整数下标；类型以 array('H') 中的类型编号存储，值以 array('I') 中的值表编号存储
+    (0 表示无值)。相同的类型与值字符串在整个电路中只保存一份。
+    读取元件时按需构造 CircuitComponent 对象，因此返回的对象是快照:
+    修改其属性后需要重新赋值 (store[id] = component) 才会写回存储。
+
+    Attributes:
+        ids (_StringTable): 元件ID驻留表，与 ColumnarConnectionStore 共享，使连接也能以整数表示。
+    """
+    def __init__(self, ids: Optional[_StringTable] = None):
+        self.ids: _StringTable = ids if ids is not None else _StringTable()
+        self._types = _StringTable()
+        self._values = _StringTable()
+        self._type_codes = array("H")
+        self._value_codes = array("I")
+        self._present = bytearray()
+        self._count = 0
+
+    def _ensure_capacity(self, index: int) -> None:
+        missing = index + 1 - len(self._present)
+        if missing > 0:
+            self._type_codes.extend([0] * missing)
+            self._value_codes.extend([0] * missing)
+            self._present.extend(b"\x00" * missing)
+
+    def _index_of(self, component_id: str) -> Optional[int]:
+        index = self.ids.lookup(component_id)
+        if index is None or index >= len(self._present) or not self._present[index]:
+            return None
+        return index
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, component_id: object) -> bool:
+        return isinstance(component_id, str) and self._index_of(component_id) is not None
+
+    def __getitem__(self, component_id: str) -> CircuitComponent:
+        index = self._index_of(component_id) if isinstance(component_id, str) else None
+        if index is None:
+            raise KeyError(component_id)
+        return self._materialize(index)
+
+    def _materialize(self, index: int) -> CircuitComponent:
+        value_code = self._value_codes[index]
+        component = CircuitComponent.__new__(CircuitComponent) # 数据已校验过，跳过构造函数中的清理逻辑
+        component.id = self.ids.strings[index]
+        component.type = self._types.strings[self._type_codes[index]]
+        component.value = self._values.strings[value_code - 1] if value_code else None
+        return component
+
+    def __setitem__(self, component_id: str, component: CircuitComponent) -> None:
+        if len(self._types) >= 0xFFFF and self._types.lookup(component.type) is None:
+            raise OverflowError("列式存储最多支持 65535 种不同的元件类型。")
+        index = self.ids.code_of(component_id)
+        self._ensure_capacity(index)
+        self._type_codes[index] = self._types.code_of(component.type)
+        self._value_codes[index] = self._values.code_of(component.value) + 1 if component.value is not None else 0
+        if not self._present[index]:
+            self._present[index] = 1
+            self._count += 1
+
+    def __delitem__(self, component_id: str) -> None:
+        index = self._index_of(component_id) if isinstance(component_id, str) else None
+        if index is None:
+            raise KeyError(component_id)
+        self._present[index] = 0
+        self._count -= 1
+
+    def __iter__(self) -> Iterator[str]:
+        strings = self.ids.strings
+        present = self._present
+        return (strings[index] for index in range(len(present)) if present[index])
+
+    def values(self):
+        """按需构造全部元件对象 (比 dict 后端慢；仅需ID或列数据时请使用 iter_columns)。"""
+        present = self._present
+        return [self._materialize(index) for index in range(len(present)) if present[index]]
+
+    def iter_columns(self) -> Iterator[Tuple[str, str, Optional[str]]]:
+        """不构造元件对象，直接按 (ID, 类型, 值) 遍历列数据。"""
+        ids, types, values = self.ids.strings, self._types.strings, self._values.strings
+        type_codes, value_codes, present = self._type_codes, self._value_codes, self._present
+        for index in range(len(present)):
+            if present[index]:
+                value_code = value_codes[index]
+                yield ids[index], types[type_codes[index]], (values[value_code - 1] if value_code else None)
+
+    def value_code_columns(self) -> Tuple[List[str], array, List[str]]:
+        """
+        返回值列的原始数据，供批量数值解析直接使用而无需构造元件对象。
+
+        Returns:
+            Tuple[List[str], array, List[str]]: (存在的元件ID列表, 对应的值编号数组 (0 表示无值),
+                                                 值字符串表 (编号 k 对应下标 k-1))。
+        """
+        present = self._present
+        indices = [index for index in range(len(present)) if present[index]]
+        strings, value_codes = self.ids.strings, self._value_codes
+        return [strings[index] for index in indices], array("I", (value_codes[index] for index in indices)), self._values.strings
+
+    def clear(self) -> None:
+        self._type_codes = array("H")
+        self._value_codes = array("I")
+        self._present = bytearray()
+        self._count = 0
+
+class ColumnarConnectionStore(MutableSet):
+    """
+    列式连接存储，实现与 Set[Tuple[str, str]] 相同的集合接口。
+
+    每条连接的两个端点以共享驻留表中的整数下标保存在两个 array('i') 中 (边表)；
+    另有一个 "打包的端点对 -> 边表槽位" 字典用于 O(1) 的查找与删除 (删除时把末尾的边移入空槽)。
+    """
+    def __init__(self, ids: _StringTable):
+        self.ids: _StringTable = ids
+        self._sources = array("i")
+        self._targets = array("i")
+        self._slots: Dict[int, int] = {}
+
+    def _pack(self, connection: object, allocate: bool = False) -> Optional[int]:
+        if not isinstance(connection, tuple) or len(connection) != 2:
+            return None
+        if allocate:
+            first, second = self.ids.code_of(connection[0]), self.ids.code_of(connection[1])
+        else:
+            first, second = self.ids.lookup(connection[0]), self.ids.lookup(connection[1])
+            if first is None or second is None:
+                return None
+        return (first << 32) | second
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, connection: object) -> bool:
+        key = self._pack(connection)
+        return key is not None and key in self._slots
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        strings = self.ids.strings
+        return ((strings[source], strings[target]) for source, target in zip(self._sources, self._targets))
+
+    def add(self, connection: Tuple[str, str]) -> None:
+        key = self._pack(connection, allocate=True)
+        if key in self._slots:
+            return
+        self._slots[key] = len(self._sources)
+        self._sources.append(key >> 32)
+        self._targets.append(key & 0xFFFFFFFF)
+
+    def discard(self, connection: Tuple[str, str]) -> None:
+        key = self._pack(connection)
+        slot = self._slots.pop(key, None) if key is not None else None
+        if slot is None:
+            return
+        last_slot = len(self._sources) - 1
+        if slot != last_slot: # 把末尾的边移入被删除的槽位，保持边表紧凑
+            moved_source, moved_target = self._sources[last_slot], self._targets[last_slot]
+            self._sources[slot], self._targets[slot] = moved_source, moved_target
+            self._slots[(moved_source << 32) | moved_target] = slot
+        self._sources.pop()
+        self._targets.pop()
+
+    def clear(self) -> None:
+        self._sources = array("i")
+        self._targets = array("i")
+        self._slots.clear()
+
+def create_storage(backend: str) -> Tuple[MutableMapping, MutableSet]:
+    """
+    创建一对空的元件/连接存储容器。
+
+    Args:
+        backend (str): "dict" (默认，普通 dict/set) 或 "columnar" (列式数组存储，适合超大电路)。
+
+    Returns:
+        Tuple[MutableMapping, MutableSet]: (元件存储, 连接存储)。
+
+    Raises:
+        ValueError: 如果后端名称未知。
+    """
+    if backend == STORAGE_BACKEND_DICT:
+        return {}, set()
+    if backend == STORAGE_BACKEND_COLUMNAR:
+        ids = _StringTable()
+        return ColumnarComponentStore(ids), ColumnarConnectionStore(ids)
+    raise ValueError(f"未知的电路存储后端 '{backend}'。可选值: {', '.join(STORAGE_BACKENDS)}。")
@@ -0,0 +1,114 @@
+# IDT_AGENT_Pro/circuitmanus/circuit_domain/units.py
+import re
+import logging
+from decimal import Decimal
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    logging.getLogger(__name__).warning("无法导入 'numpy'。批量数值解析功能将不可用。")
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# SI 词头 -> 十进制指数。"M" 按工程习惯表示兆 (1MΩ)；SPICE 风格的 "meg" 同样表示兆。
+# 以指数而非浮点倍率表示，配合 Decimal 缩放可避免 10 * 1e-6 = 9.999999999999999e-06 这类误差。
+_SI_PREFIXES: Dict[str, int] = {
+    "f": -15, "p": -12, "n": -9, "u": -6, "µ": -6, "μ": -6, "m": -3,
+    "k": 3, "K": 3, "M": 6, "meg": 6, "MEG": 6, "Meg": 6, "G": 9, "T": 12,
+}
+
+# 单位写法 -> 规范单位符号 (中英文、大小写变体)
+_UNIT_ALIASES: Dict[str, str] = {
+    "Ω": "Ω", "ω": "Ω", "ohm": "Ω", "ohms": "Ω", "Ohm": "Ω", "OHM": "Ω", "R": "Ω", "欧": "Ω", "欧姆": "Ω",
+    "V": "V", "v": "V", "伏": "V", "伏特": "V",
+    "A": "A", "安": "A", "安培": "A",
+    "W": "W", "w": "W", "瓦": "W", "瓦特": "W",
+    "F": "F", "f": "F", "法": "F", "法拉": "F",
+    "H": "H", "h": "H", "亨": "H", "亨利": "H",
+    "Hz": "Hz", "hz": "Hz", "HZ": "Hz", "赫": "Hz", "赫兹": "Hz",
+}
+
+def _alternation(options: Iterable[str]) -> str:
+    """按长度降序构造正则交替式，保证优先匹配较长的写法 (如 "meg" 先于 "m")。"""
+    return "|".join(re.escape(option) for option in sorted(options, key=len, reverse=True))
+
+_PREFIX_ALTERNATION = _alternation(_SI_PREFIXES)
+_UNIT_ALTERNATION = _alternation(_UNIT_ALIASES)
+
+# 常规写法: 数值 + 可选词头 + 可选单位，例如 "10uF", "4.7 kΩ", "1e3", "3.3V", "100 nF"
+_VALUE_PATTERN = re.compile(
+    rf"^\s*(?P<number>[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)\s*"
+    rf"(?P<prefix>{_PREFIX_ALTERNATION})?\s*(?P<unit>{_UNIT_ALTERNATION})?\s*$"
+)
+# 色环/贴片电阻常用的 "RKM" 写法: 词头或 R 充当小数点，例如 "4k7" = 4.7k, "0R1" = 0.1, "2M2" = 2.2M
+_RKM_PATTERN = re.compile(
+    rf"^\s*(?P<integer>\d+)(?P<marker>[pnuµμmkKMGRr])(?P<fraction>\d+)\s*(?P<unit>{_UNIT_ALTERNATION})?\s*$"
+)
+
+@lru_cache(maxsize=4096)
+def parse_engineering_value(text: str) -> Tuple[Optional[float], Optional[str]]:
+    """
+    解析带 SI 词头的工程数值字符串。
+
+    支持的写法示例: "1kΩ", "10uF", "3V", "4.7 kohm", "2.2µH", "1meg", "1e-3", "4k7", "0R1", "220欧"。
+    结果按输入字符串缓存，相同的值只解析一次。
+
+    Args:
+        text (str): 元件值字符串。
+
+    Returns:
+        Tuple[Optional[float], Optional[str]]: (以基本单位表示的数值, 规范单位符号)。
+            无法解析时返回 (None, None)；能解析数值但没有单位时单位为 None。
+    """
+    match = _VALUE_PATTERN.match(text)
+    if match:
+        prefix = match.group("prefix")
+        magnitude = float(Decimal(match.group("number")).scaleb(_SI_PREFIXES[prefix] if prefix else 0))
+        unit = match.group("unit")
+        return magnitude, (_UNIT_ALIASES[unit] if unit else None)
+
+    match = _RKM_PATTERN.match(text)
+    if match:
+        marker = match.group("marker")
+        exponent = 0 if marker in ("R", "r") else _SI_PREFIXES[marker]
+        magnitude = float(Decimal(f"{match.group('integer')}.{match.group('fraction')}").scaleb(exponent))
+        unit = match.group("unit")
+        # "R" 作小数点时本身就暗示了欧姆
+        return magnitude, (_UNIT_ALIASES[unit] if unit else ("Ω" if marker in ("R", "r") else None))
+
+    return None, None
+
+def parse_values_bulk(values: Iterable[Optional[str]]) -> Tuple["np.ndarray", List[Optional[str]]]:
+    """
+    将一组元件值批量解析为 NumPy 数组。
+    先对值字符串去重，每个不同的字符串只解析一次，再通过整数下标数组一次性展开结果，
+    因此代价约为 O(不同值的数量) 次解析加一次向量化的取值操作。
+
+    Args:
+        values (Iterable[Optional[str]]): 元件值字符串序列，None 表示无值。
+
+    Returns:
+        Tuple[np.ndarray, List[Optional[str]]]: (float64 数值数组，无值或无法解析处为 NaN; 对应的单位列表)。
+
+    Raises:
+        RuntimeError: 如果 numpy 不可用。
+    """
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("批量数值解析需要 numpy,请先安装: pip install numpy")
+    unique_codes: Dict[Optional[str], int] = {}
+    codes = [unique_codes.setdefault(value, len(unique_codes)) for value in values]
+    unique_values = list(unique_codes)
+    return _expand_parsed_table(unique_values, np.asarray(codes, dtype=np.intp))
+
+def _expand_parsed_table(unique_values: List[Optional[str]], codes: "np.ndarray") -> Tuple["np.ndarray", List[Optional[str]]]:
+    """解析去重后的值表，并按下标数组 codes 展开为逐元件的数值数组与单位列表。"""
+    parsed = [parse_engineering_value(value) if value is not None else (None, None) for value in unique_values]
+    unique_magnitudes = np.array([np.nan if magnitude is None else magnitude for magnitude, _ in parsed], dtype=np.float64)
+    unique_units = [unit for _, unit in parsed]
+    magnitudes = unique_magnitudes[codes] if len(codes) else np.empty(0, dtype=np.float64)
+    units = [unique_units[code] for code in codes.tolist()]
+    return magnitudes, units
@@ -1,13 +1,16 @@
 # IDT_AGENT_NATIVE/circuitmanus/llm/interface.py
 import time
 import json
+import types
 import asyncio
 import logging
-from typing import List, Dict, Any, Optional, Callable, Awaitable
+import importlib.util
+from typing import List, Dict, Set, Any, Optional, Callable, Awaitable
 
 try:
     from zhipuai import ZhipuAI, ZhipuAIError
     ZHIPUAI_SDK_AVAILABLE = True
+    ZhipuAIAPIError = ZhipuAIError
 except ImportError:
     logging.getLogger(__name__).warning("无法导入 'zhipuai' SDK。智谱AI模型功能将不可用。")
     ZHIPUAI_SDK_AVAILABLE = False
@@ -15,38 +18,63 @@ except ImportError:
     class ZhipuAIAPIError(Exception): pass 
 
 try:
-    from openai import OpenAI, APIError as OpenAIApiError
+    from openai import AsyncOpenAI, APIError as OpenAIApiError, APIConnectionError as OpenAIApiConnectionError
     OPENAI_SDK_AVAILABLE = True
 except ImportError:
     logging.getLogger(__name__).warning("无法导入 'openai' SDK。DeepSeek 模型功能将不可用。")
     OPENAI_SDK_AVAILABLE = False
-    class OpenAI: pass
+    class AsyncOpenAI: pass
     class OpenAIApiError(Exception): pass 
+    class OpenAIApiConnectionError(OpenAIApiError): pass
 
 import httpx 
 
+# httpx 需要安装 'h2' 包才能使用 HTTP/2
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
-    from ..agent import CircuitAgent 
+    from ..runtime import AgentRuntime
 
 logger = logging.getLogger(__name__)
 
+# 流式响应在 JSON 完整后提前停止转发时，为取得末尾的 usage 数据块最多再读取的数据块数
+_USAGE_DRAIN_MAX_CHUNKS = 32
+
+class StreamedChatMessage:
+    """流式响应拼接出的消息，与 SDK 的 message 对象接口一致 (role / content / model_dump)。"""
+    __slots__ = ("role", "content")
+
+    def __init__(self, content: str, role: str = "assistant"):
+        self.role: str = role
+        self.content: str = content
+
+    def model_dump(self, exclude_unset: bool = False) -> Dict[str, Any]:
+        return {"role": self.role, "content": self.content}
+
 class LLMInterface:
     def __init__(self, 
-                 agent_instance: 'CircuitAgent', 
+                 runtime: 'AgentRuntime', 
                  default_temperature: float = 0.01, 
                  default_max_tokens: int = 8190,
                  api_timeout_seconds: int = 120, 
                  enable_detailed_llm_message_logging: bool = False 
                  ):
         
-        self.agent_instance: 'CircuitAgent' = agent_instance
-        self.config_loader = self.agent_instance.config_loader 
+        # LLM 客户端由进程内所有会话共享，请求相关的状态 (如请求ID) 由 call_llm 的参数传入
+        self.runtime: 'AgentRuntime' = runtime
+        self.config_loader = self.runtime.config_loader 
         
         self.default_temperature: float = self.config_loader.get_config("agent_settings.llm.default_temperature", default_temperature)
         self.default_max_tokens: int = self.config_loader.get_config("agent_settings.llm.default_max_tokens", default_max_tokens)
         self.api_timeout_seconds: float = float(self.config_loader.get_config("agent_settings.llm.api_timeout_seconds", api_timeout_seconds))
         self.enable_detailed_llm_message_logging: bool = self.config_loader.get_config("agent_settings.feature_flags.enable_detailed_llm_message_logging", enable_detailed_llm_message_logging)
+        # 调用方提供 stream_handler 时是否使用流式响应 (需要异步客户端)
+        self.enable_streaming: bool = self.config_loader.get_config("agent_settings.llm.enable_streaming", True)
+        # 按系统提示静态前缀的哈希统计提示缓存命中情况 (进程内所有会话共享)
+        self._prompt_cache_stats: Dict[str, Dict[str, Any]] = {}
+        # 拒绝 stream_options 参数的模型标识符 (之后的流式调用不再请求 usage)
+        self._stream_usage_unsupported: Set[str] = set()
 
         logger.info(f"[LLMInterface V1.1.1 DynamicAvailability] 初始化LLM接口。通用设置 - 温度: {self.default_temperature}, 最大Tokens: {self.default_max_tokens}, API超时: {self.api_timeout_seconds}s。")
 
@@ -57,28 +85,37 @@ class LLMInterface:
             # 将来可以扩展更多模型
         }
 
-        # 初始化 ZhipuAI 客户端
-        self.zhipu_client: Optional[ZhipuAI] = None
-        if ZHIPUAI_SDK_AVAILABLE:
-            zhipu_api_key = self.agent_instance.api_key 
-            if zhipu_api_key:
-                try:
+        # 所有会话的 LLM 调用共用一个异步 HTTP 连接池 (keep-alive，可用时启用 HTTP/2)，
+        # 等待模型响应不占用线程，并发量只受连接池大小限制
+        self.http_client: Optional[httpx.AsyncClient] = self._create_http_client() if OPENAI_SDK_AVAILABLE else None
+
+        # 初始化智谱AI客户端: 优先通过智谱的 OpenAI 兼容接口使用异步客户端；
+        # 未安装 openai SDK 时退回同步的 zhipuai SDK (调用在线程池中执行)
+        self.zhipu_client: Optional[Any] = None
+        zhipu_api_key = self.runtime.api_key 
+        zhipu_base_url = self.config_loader.get_config("agent_settings.llm.zhipuai_settings.base_url", "https://open.bigmodel.cn/api/paas/v4/")
+        if not zhipu_api_key:
+            logger.warning("未找到ZHIPUAI_API_KEY，智谱AI模型将不可用。")
+        elif OPENAI_SDK_AVAILABLE or ZHIPUAI_SDK_AVAILABLE:
+            try:
+                if OPENAI_SDK_AVAILABLE:
+                    self.zhipu_client = AsyncOpenAI(api_key=zhipu_api_key, base_url=zhipu_base_url, timeout=self.api_timeout_seconds, http_client=self.http_client) # type: ignore
+                    logger.info(f"智谱AI异步客户端初始化成功 (Base URL: {zhipu_base_url}, Key: ...{zhipu_api_key[-4:] if len(zhipu_api_key) > 4 else '****'})。")
+                else:
                     self.zhipu_client = ZhipuAI(api_key=zhipu_api_key, timeout=self.api_timeout_seconds) # type: ignore
-                    logger.info(f"智谱AI客户端初始化成功 (Key: ...{zhipu_api_key[-4:] if len(zhipu_api_key) > 4 else '****'})。")
-                    self.model_client_availability["zhipu-ai"] = True # 标记智谱客户端可用
-                except Exception as e:
-                    logger.error(f"初始化智谱AI客户端失败: {e}", exc_info=True)
-            else:
-                logger.warning("未找到ZHIPUAI_API_KEY，智谱AI模型将不可用。")
+                    logger.warning(f"未安装 openai SDK，智谱AI将使用同步 zhipuai SDK (每个进行中的调用占用一个线程) (Key: ...{zhipu_api_key[-4:] if len(zhipu_api_key) > 4 else '****'})。")
+                self.model_client_availability["zhipu-ai"] = True # 标记智谱客户端可用
+            except Exception as e:
+                logger.error(f"初始化智谱AI客户端失败: {e}", exc_info=True)
         
-        # 初始化 DeepSeek (OpenAI) 客户端
-        self.deepseek_client: Optional[OpenAI] = None
+        # 初始化 DeepSeek (OpenAI 兼容) 异步客户端
+        self.deepseek_client: Optional[AsyncOpenAI] = None
         if OPENAI_SDK_AVAILABLE:
             deepseek_api_key = self.config_loader.get_env_var("DEEPSEEK_API_KEY")
             deepseek_base_url = self.config_loader.get_config("agent_settings.llm.deepseek_settings.base_url", "https://api.deepseek.com/v1")
             if deepseek_api_key:
                 try:
-                    self.deepseek_client = OpenAI(api_key=deepseek_api_key, base_url=deepseek_base_url, timeout=self.api_timeout_seconds) # type: ignore
+                    self.deepseek_client = AsyncOpenAI(api_key=deepseek_api_key, base_url=deepseek_base_url, timeout=self.api_timeout_seconds, http_client=self.http_client) # type: ignore
                     logger.info(f"DeepSeek客户端初始化成功 (Base URL: {deepseek_base_url}, Key: ...{deepseek_api_key[-4:] if len(deepseek_api_key) > 4 else '****'})。")
                     self.model_client_availability["deepseek"] = True # 标记DeepSeek客户端可用
                 except Exception as e:
@@ -93,12 +130,144 @@ class LLMInterface:
         """新增方法：返回各模型客户端的可用状态。"""
         return self.model_client_availability
 
+    def _create_http_client(self) -> httpx.AsyncClient:
+        """根据 agent_settings.llm.http_pool 创建共享的异步 HTTP 连接池。"""
+        pool_settings: Dict[str, Any] = self.config_loader.get_config("agent_settings.llm.http_pool", {}) or {}
+        max_connections = int(pool_settings.get("max_connections", 200))
+        max_keepalive_connections = int(pool_settings.get("max_keepalive_connections", 50))
+        keepalive_expiry_seconds = float(pool_settings.get("keepalive_expiry_seconds", 30.0))
+        use_http2 = bool(pool_settings.get("http2", True)) and HTTP2_AVAILABLE
+        if pool_settings.get("http2", True) and not HTTP2_AVAILABLE:
+            logger.info("未安装 'h2' 包，LLM 连接池将使用 HTTP/1.1。")
+        logger.info(f"[LLMInterface] LLM HTTP 连接池: 最大连接数 {max_connections}, 最大空闲连接 {max_keepalive_connections}, "
+                    f"空闲连接保持 {keepalive_expiry_seconds}s, HTTP/2: {use_http2}。")
+        return httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_keepalive_connections,
+                                keepalive_expiry=keepalive_expiry_seconds),
+            timeout=httpx.Timeout(self.api_timeout_seconds),
+            http2=use_http2,
+        )
+
+    async def _create_streamed_completion(self,
+                                          client: Any,
+                                          call_args: Dict[str, Any],
+                                          stream_handler: Callable[[str], Awaitable[bool]],
+                                          model_name: str
+                                          ) -> Any:
+        """
+        以流式方式调用 LLM，把内容片段依次交给 stream_handler，返回拼接后的 SDK 格式响应。
+        stream_handler 表示响应已完整时停止转发；若请求了 usage (stream_options)，再读取至多
+        _USAGE_DRAIN_MAX_CHUNKS 个数据块以取得末尾的 usage，仍未取得时放弃 (该次调用的 usage 记为不可用)。
+        """
+        start_time = time.monotonic()
+        stream = await client.chat.completions.create(**{**call_args, "stream": True})
+        content_parts: List[str] = []
+        finish_reason: Optional[str] = None
+        usage: Any = None
+        first_token_latency: Optional[float] = None
+        stopped_early = False
+        try:
+            async for chunk in stream:
+                usage = getattr(chunk, 'usage', None) or usage
+                if not getattr(chunk, 'choices', None):
+                    continue
+                choice = chunk.choices[0]
+                finish_reason = getattr(choice, 'finish_reason', None) or finish_reason
+                delta_content = getattr(getattr(choice, 'delta', None), 'content', None)
+                if not delta_content:
+                    continue
+                if first_token_latency is None:
+                    first_token_latency = time.monotonic() - start_time
+                    logger.info(f"[LLMInterface] LLM ({model_name}) 首个 token 延迟: {first_token_latency:.3f} 秒。")
+                content_parts.append(delta_content)
+                if await stream_handler(delta_content):
+                    stopped_early = True
+                    break
+            if stopped_early and usage is None and "stream_options" in call_args:
+                drained_chunks = 0
+                async for chunk in stream:
+                    usage = getattr(chunk, 'usage', None)
+                    drained_chunks += 1
+                    if usage is not None or drained_chunks >= _USAGE_DRAIN_MAX_CHUNKS:
+                        break
+        finally:
+            await stream.close()
+        if stopped_early:
+            logger.info(f"[LLMInterface] LLM ({model_name}) 响应的 JSON 已完整，停止转发剩余的流"
+                        f"{'' if usage is not None else ' (未取得 usage)'}。")
+            finish_reason = finish_reason or "stop"
+        message = StreamedChatMessage("".join(content_parts))
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(index=0, message=message, finish_reason=finish_reason)],
+            usage=usage,
+        )
+
+    @staticmethod
+    def _get_cached_prompt_tokens(usage: Any) -> Optional[int]:
+        """从 usage 中读取命中提示缓存的 token 数 (OpenAI 兼容接口为 prompt_tokens_details.cached_tokens，DeepSeek 为 prompt_cache_hit_tokens)。"""
+        cached_tokens = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', None)
+        if cached_tokens is None:
+            cached_tokens = getattr(usage, 'prompt_cache_hit_tokens', None)
+        return cached_tokens if isinstance(cached_tokens, int) else None
+
+    def _record_prompt_cache_usage(self, prompt_prefix_hash: str, execution_phase: str, model_name: str,
+                                   usage: Any, duration_seconds: float) -> Dict[str, Any]:
+        """记录一次调用的提示 token 数与缓存命中 token 数，返回本次调用的统计 (用于日志和状态消息)。"""
+        prompt_tokens = getattr(usage, 'prompt_tokens', None) if usage is not None else None
+        cached_tokens = self._get_cached_prompt_tokens(usage) if usage is not None else None
+        stats = self._prompt_cache_stats.setdefault(prompt_prefix_hash, {
+            "execution_phase": execution_phase, "model_name": model_name, "calls": 0, "calls_with_usage": 0,
+            "prompt_tokens": 0, "cached_prompt_tokens": 0, "total_duration_seconds": 0.0,
+        })
+        stats["calls"] += 1
+        stats["total_duration_seconds"] += duration_seconds
+        if isinstance(prompt_tokens, int):
+            stats["calls_with_usage"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["cached_prompt_tokens"] += cached_tokens or 0
+        return {"prompt_prefix_hash": prompt_prefix_hash, "prompt_tokens": prompt_tokens, "cached_prompt_tokens": cached_tokens}
+
+    def get_prompt_cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        返回按系统提示静态前缀哈希汇总的调用统计: 调用次数、提示 token 数、命中缓存的 token 数、缓存命中率和平均耗时。
+        同一个前缀哈希的命中率随调用次数上升，说明模型服务商复用了该前缀的提示缓存。
+        """
+        report: Dict[str, Dict[str, Any]] = {}
+        for prompt_prefix_hash, stats in self._prompt_cache_stats.items():
+            report[prompt_prefix_hash] = {
+                **stats,
+                "cache_hit_rate": round(stats["cached_prompt_tokens"] / stats["prompt_tokens"], 4) if stats["prompt_tokens"] else None,
+                "average_duration_seconds": round(stats["total_duration_seconds"] / stats["calls"], 3) if stats["calls"] else None,
+            }
+        return report
+
+    async def aclose(self) -> None:
+        """关闭共享的 HTTP 连接池 (进程退出前调用)。"""
+        if self.http_client is not None and not self.http_client.is_closed:
+            await self.http_client.aclose()
+            logger.info("[LLMInterface] LLM HTTP 连接池已关闭。")
+
     async def call_llm(self, 
                        messages: List[Dict[str, Any]], 
                        execution_phase: str, 
                        status_callback: Optional[Callable[[Dict], Awaitable[None]]] = None,
-                       selected_model_identifier: Optional[str] = None 
+                       selected_model_identifier: Optional[str] = None,
+                       request_id: Optional[str] = None,
+                       stream_handler: Optional[Callable[[str], Awaitable[bool]]] = None,
+                       prompt_prefix_hash: Optional[str] = None
                        ) -> Any: 
+        """
+        调用 LLM 并返回 SDK 格式的响应 (choices[0].message.content)。
+
+        提供 stream_handler 时 (通常是 IncrementalResponseParser.feed)，响应文本会以片段的形式依次传给它:
+        启用流式响应且客户端为异步客户端时边生成边传递，stream_handler 返回 True 表示已得到所需的
+        完整内容，将停止读取剩余的流；否则在收到完整响应后一次性传递。
+
+        prompt_prefix_hash 是系统提示静态前缀的哈希 (PromptLayout.prefix_hash)，提供时按该哈希统计提示缓存命中情况，
+        见 get_prompt_cache_stats。流式调用通过 stream_options 请求 usage；模型接口不支持该参数时
+        退回不带该参数的调用，此后该模型的流式调用没有 usage，统计中的 token 数记为不可用。
+        """
         
         model_id_to_use = selected_model_identifier or self.config_loader.get_config("agent_settings.llm.default_model_identifier", "zhipu-ai")
 
@@ -161,7 +330,7 @@ class LLMInterface:
                  logger.warning(f"[LLMInterface V1.1.1] 无法序列化消息列表预览进行调试日志: {e_json_preview}")
 
 
-        request_id_to_send = getattr(self.agent_instance, 'current_request_id', None)
+        request_id_to_send = request_id
         
         if status_callback:
             await status_callback({ "type": "llm_communication_status", "request_id": request_id_to_send, "llm_phase": execution_phase, "status": "started", "message": f"正在与智能大脑 ({actual_model_name_for_api}) 沟通 ({execution_phase})..." })
@@ -169,12 +338,36 @@ class LLMInterface:
         response_from_sdk = None
         try:
             start_time = time.monotonic()
-            response_from_sdk = await asyncio.to_thread(current_client.chat.completions.create, **call_args)
+            use_streaming = stream_handler is not None and self.enable_streaming and isinstance(current_client, AsyncOpenAI)
+            if use_streaming:
+                # OpenAI 兼容接口的流式响应默认不返回 usage，需显式请求 (提示缓存统计依赖 usage)
+                if model_id_to_use not in self._stream_usage_unsupported:
+                    call_args["stream_options"] = {"include_usage": True}
+                try:
+                    response_from_sdk = await self._create_streamed_completion(current_client, call_args, stream_handler, actual_model_name_for_api)
+                except OpenAIApiError as e_stream_options:
+                    if "stream_options" not in call_args or getattr(e_stream_options, 'status_code', None) != 400 or "stream_options" not in str(e_stream_options):
+                        raise
+                    # 接口不接受该参数: 记住后不带该参数重试 (此后该模型的流式调用不统计提示缓存)
+                    logger.warning(f"[LLMInterface] {actual_model_name_for_api} 的接口不支持 stream_options,流式调用将不再请求 usage: {e_stream_options}")
+                    self._stream_usage_unsupported.add(model_id_to_use)
+                    call_args.pop("stream_options")
+                    response_from_sdk = await self._create_streamed_completion(current_client, call_args, stream_handler, actual_model_name_for_api)
+            elif isinstance(current_client, AsyncOpenAI):
+                response_from_sdk = await current_client.chat.completions.create(**call_args)
+            else: # 同步 SDK 的退路
+                response_from_sdk = await asyncio.to_thread(current_client.chat.completions.create, **call_args)
             duration = time.monotonic() - start_time
             logger.info(f"[LLMInterface V1.1.1] LLM ({actual_model_name_for_api}) 异步调用成功。耗时: {duration:.3f} 秒。")
+            completion_details: Dict[str, Any] = {"duration_seconds": duration}
+            if prompt_prefix_hash:
+                completion_details.update(self._record_prompt_cache_usage(prompt_prefix_hash, execution_phase, actual_model_name_for_api,
+                                                                          getattr(response_from_sdk, 'usage', None), duration))
+                logger.info(f"[LLMInterface] 提示缓存 ({actual_model_name_for_api}, 前缀 {prompt_prefix_hash}): "
+                            f"命中 {completion_details['cached_prompt_tokens'] if completion_details['cached_prompt_tokens'] is not None else 'N/A'} / {completion_details['prompt_tokens'] or 'N/A'} 个提示 token。")
             
             if status_callback:
-                await status_callback({ "type": "llm_communication_status", "request_id": request_id_to_send, "llm_phase": execution_phase, "status": "completed", "message": f"与智能大脑 ({actual_model_name_for_api}) 沟通完成 ({execution_phase})。", "details": {"duration_seconds": duration} })
+                await status_callback({ "type": "llm_communication_status", "request_id": request_id_to_send, "llm_phase": execution_phase, "status": "completed", "message": f"与智能大脑 ({actual_model_name_for_api}) 沟通完成 ({execution_phase})。", "details": completion_details })
 
             if response_from_sdk:
                 if hasattr(response_from_sdk, 'usage') and response_from_sdk.usage:
@@ -198,6 +391,9 @@ class LLMInterface:
                 else: 
                     logger.warning(f"[LLMInterface V1.1.1] LLM ({actual_model_name_for_api}) 响应中缺少 'choices' 字段或choices为空。")
 
+                if stream_handler is not None and not use_streaming and raw_llm_content:
+                    await stream_handler(raw_llm_content)
+
                 if self.enable_detailed_llm_message_logging and logger.isEnabledFor(logging.DEBUG): 
                     logger.debug(f"[LLMInterface V1.1.1] [DETAILED_LOG] LLM ({actual_model_name_for_api}) 原始响应内容 (完整):\n{raw_llm_content}")
                 elif logger.isEnabledFor(logging.DEBUG): 
@@ -213,16 +409,17 @@ class LLMInterface:
             error_message_str = str(e)
             error_details_for_cb = {"error": error_message_str, "error_type": error_type_name}
             
-            if is_deepseek_call and OPENAI_SDK_AVAILABLE and isinstance(e, OpenAIApiError):
+            if OPENAI_SDK_AVAILABLE and isinstance(e, OpenAIApiError):
+                provider_name = "DeepSeek" if is_deepseek_call else "ZhipuAI"
                 status_code = getattr(e, 'status_code', 'N/A_SDK_STATUS_CODE')
                 sdk_error_code = getattr(e, 'code', 'N/A_SDK_ERROR_CODE') 
                 sdk_error_type = getattr(e, 'type', 'N/A_SDK_ERROR_TYPE') 
-                logger.error(f"[LLMInterface V1.1.1] DeepSeek API ({actual_model_name_for_api}) 调用失败: "
+                logger.error(f"[LLMInterface V1.1.1] {provider_name} API ({actual_model_name_for_api}) 调用失败: "
                              f"HTTP Status={status_code}, SDK Error Type='{sdk_error_type}', SDK Code='{sdk_error_code}', Message='{error_message_str}'", 
                              exc_info=False) 
                 error_details_for_cb.update({"sdk_error_code": sdk_error_code, "sdk_error_type": sdk_error_type, "http_status": status_code})
-                if sdk_error_type in ['api_connection_error', 'internal_error', 'rate_limit_error']: 
-                    raise ConnectionError(f"DeepSeek API Error ({sdk_error_type} - {sdk_error_code}): {error_message_str}") from e
+                if isinstance(e, OpenAIApiConnectionError) or sdk_error_type in ['api_connection_error', 'internal_error', 'rate_limit_error']:
+                    raise ConnectionError(f"{provider_name} API Error ({sdk_error_type} - {sdk_error_code}): {error_message_str}") from e
                 else: 
                     raise 
             elif not is_deepseek_call and ZHIPUAI_SDK_AVAILABLE and isinstance(e, ZhipuAIAPIError):
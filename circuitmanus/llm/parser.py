@@ -1,9 +1,11 @@
 # IDT_AGENT_Pro/circuitmanus/llm/parser.py
 import re
 import json
+import time
+import types
 import logging
 from uuid import uuid4
-from typing import Tuple, Optional, Dict, Any, List
+from typing import Tuple, Optional, Dict, Any, List, Callable, Awaitable
 
 logger = logging.getLogger(__name__)
 
@@ -121,6 +123,47 @@ class OutputParser:
         return validation_errors
 
 
+    def validate_tool_call_request(self, tool_req_item: Any, index: int) -> List[Dict[str, str]]:
+        """
+        校验 decision.toolCallRequests 中的一个工具调用请求 (结构、工具名与参数)。
+
+        Args:
+            tool_req_item (Any): 工具调用请求，应为包含 toolCallId、toolName、toolArguments 的对象。
+            index (int): 请求在列表中的位置，用于错误报告中的 jsonPath。
+
+        Returns:
+            List[Dict[str, str]]: 校验失败点的列表；校验通过时为空列表。
+        """
+        validation_errors: List[Dict[str, str]] = []
+        item_path_prefix = f"decision.toolCallRequests[{index}]"
+        if not isinstance(tool_req_item, dict):
+            return [{"jsonPath": item_path_prefix, "issue_description": "列表中的每个工具调用请求必须是对象。"}]
+
+        tool_call_id = tool_req_item.get("toolCallId")
+        if not isinstance(tool_call_id, str) or not tool_call_id.strip():
+            validation_errors.append({"jsonPath": f"{item_path_prefix}.toolCallId", "issue_description": "缺少有效的 'toolCallId' 字符串。"})
+
+        tool_name = tool_req_item.get("toolName")
+        if not isinstance(tool_name, str) or not tool_name.strip():
+            validation_errors.append({"jsonPath": f"{item_path_prefix}.toolName", "issue_description": "缺少有效的 'toolName' 字符串。"})
+
+        tool_arguments = tool_req_item.get("toolArguments")
+        if not isinstance(tool_arguments, dict):
+            validation_errors.append({"jsonPath": f"{item_path_prefix}.toolArguments", "issue_description": "'toolArguments' 必须是一个对象。"})
+        elif tool_name and isinstance(tool_name, str) and tool_name.strip(): # 仅当工具名有效时才校验参数
+            # 使用内部方法校验工具参数 (需要 agent_tools_registry)
+            validation_errors.extend(self._validate_tool_arguments(
+                tool_name, 
+                tool_arguments, 
+                tool_call_id if (tool_call_id and isinstance(tool_call_id, str) and tool_call_id.strip()) else f"index_{index}"
+            ))
+        
+        # uiHints 是可选的，但如果存在，必须是对象
+        ui_hints = tool_req_item.get("uiHints")
+        if ui_hints is not None and not isinstance(ui_hints, dict):
+            validation_errors.append({"jsonPath": f"{item_path_prefix}.uiHints", "issue_description": "'uiHints' 如果存在,必须是一个对象。"})
+        return validation_errors
+
     def parse_llm_response_to_structured_json(self, 
                                               llm_api_response_message: Any, # 来自 ZhipuAI SDK 的 Message 对象
                                               execution_phase: str
@@ -335,34 +378,7 @@ class OutputParser:
                     # 根据需求，这里也可以视为一个校验失败点，如果业务逻辑不允许这种情况
                 elif tool_call_requests: # 列表非空，校验每一项
                     for i, tool_req_item in enumerate(tool_call_requests):
-                        item_path_prefix = f"decision.toolCallRequests[{i}]"
-                        if not isinstance(tool_req_item, dict):
-                            failed_validation_points_list.append({"jsonPath": item_path_prefix, "issue_description": "列表中的每个工具调用请求必须是对象。"}); continue # 跳过对此项的后续校验
-
-                        tool_call_id = tool_req_item.get("toolCallId")
-                        if not isinstance(tool_call_id, str) or not tool_call_id.strip():
-                            failed_validation_points_list.append({"jsonPath": f"{item_path_prefix}.toolCallId", "issue_description": "缺少有效的 'toolCallId' 字符串。"})
-
-                        tool_name = tool_req_item.get("toolName")
-                        if not isinstance(tool_name, str) or not tool_name.strip():
-                            failed_validation_points_list.append({"jsonPath": f"{item_path_prefix}.toolName", "issue_description": "缺少有效的 'toolName' 字符串。"})
-
-                        tool_arguments = tool_req_item.get("toolArguments")
-                        if not isinstance(tool_arguments, dict):
-                            failed_validation_points_list.append({"jsonPath": f"{item_path_prefix}.toolArguments", "issue_description": "'toolArguments' 必须是一个对象。"})
-                        elif tool_name and isinstance(tool_name, str) and tool_name.strip(): # 仅当工具名有效时才校验参数
-                            # 使用内部方法校验工具参数 (需要 agent_tools_registry)
-                            arg_validation_errors = self._validate_tool_arguments(
-                                tool_name, 
-                                tool_arguments, 
-                                tool_call_id if (tool_call_id and isinstance(tool_call_id, str) and tool_call_id.strip()) else f"index_{i}"
-                            )
-                            failed_validation_points_list.extend(arg_validation_errors)
-                        
-                        # uiHints 是可选的，但如果存在，必须是对象
-                        ui_hints = tool_req_item.get("uiHints")
-                        if ui_hints is not None and not isinstance(ui_hints, dict):
-                            failed_validation_points_list.append({"jsonPath": f"{item_path_prefix}.uiHints", "issue_description": "'uiHints' 如果存在,必须是一个对象。"})
+                        failed_validation_points_list.extend(self.validate_tool_call_request(tool_req_item, i))
 
             elif is_call_tools_val_parsed is False: # 如果不调用工具
                 # toolCallRequests 应该是 null 或空列表
@@ -437,4 +453,254 @@ class OutputParser:
 
         # 如果所有校验通过
         logger.info(f"[{parser_id}-OutputParser] LLM 响应 (阶段: {execution_phase}, LLM_ID: {parsed_json_dict.get('llmInteractionId', 'N/A')}) 已成功解析并验证为 ManusLLMResponse-V1.0.0兼容结构 (思考过程来源: {'<think> block' if extracted_thought_process else 'JSON field'})！")
-        return parsed_json_dict, "", [] # 成功，无错误消息，无失败点
\ No newline at end of file
+        return parsed_json_dict, "", [] # 成功，无错误消息，无失败点
+
+    def create_incremental_parser(self,
+                                  execution_phase: str,
+                                  thinking_callback: Optional[Callable[[str], Awaitable[None]]] = None,
+                                  thinking_flush_interval_seconds: float = 0.1,
+                                  tool_request_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+                                  ) -> "IncrementalResponseParser":
+        """为一次流式 LLM 调用创建增量解析器 (见 IncrementalResponseParser)。"""
+        return IncrementalResponseParser(self, execution_phase, thinking_callback, thinking_flush_interval_seconds, tool_request_callback)
+
+ParseResult = Tuple[Optional[Dict[str, Any]], str, List[Dict[str, str]]]
+
+class IncrementalResponseParser:
+    """
+    流式 LLM 响应的增量解析器。把响应的文本片段依次传给 feed:
+    - 开头的 <think> 块内容随到随转发给 thinking_callback (按 thinking_flush_interval_seconds 合并，
+      避免每个 token 一条消息)，界面不必等整个响应生成完才看到思考过程；
+    - <think> 块之后跟踪 JSON 的嵌套结构 (忽略字符串中的括号)，顶层对象一闭合就交给
+      OutputParser 解析与校验，feed 返回 True 表示响应已完整，调用方可以不再读取剩余的流；
+    - 提供 tool_request_callback 时，decision.toolCallRequests 中的每个工具调用请求对象一闭合且通过
+      单项校验，就立即交给该回调 (同步调用，按顺序)，调用方可以在模型生成计划其余部分的同时开始执行。
+      某一项未通过校验后不再转发后续的请求。转发的请求只是预览，整个计划仍以 finish 的校验结果为准。
+
+    解析结果与 OutputParser.parse_llm_response_to_structured_json 完全一致；提前解析失败时
+    (例如 JSON 之前的说明文字里出现了括号) 退回到流结束后对整个响应的解析。
+    """
+    _THINK_OPEN = "<think>"
+    _THINK_CLOSE_PATTERN = re.compile(r"</think>", re.IGNORECASE)
+    _THINK_CLOSE_LENGTH = len("</think>")
+    _JSON_STRUCTURE_PATTERN = re.compile(r'[{}\[\]":]')
+    _JSON_STRING_END_PATTERN = re.compile(r'["\\]')
+
+    # 解析阶段
+    _PHASE_START, _PHASE_THINK, _PHASE_JSON, _PHASE_DONE = range(4)
+
+    def __init__(self,
+                 output_parser: OutputParser,
+                 execution_phase: str,
+                 thinking_callback: Optional[Callable[[str], Awaitable[None]]] = None,
+                 thinking_flush_interval_seconds: float = 0.1,
+                 tool_request_callback: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self._output_parser = output_parser
+        self.execution_phase: str = execution_phase
+        self._thinking_callback = thinking_callback
+        self._tool_request_callback = tool_request_callback
+        self._thinking_flush_interval_seconds: float = max(0.0, thinking_flush_interval_seconds)
+
+        self._text: str = ""
+        self._phase: int = self._PHASE_START
+        self._scan_position: int = 0 # _text 中已处理到的位置
+        self._think_block_end: int = 0 # </think> 之后的位置 (没有 <think> 块时为 0)
+        self._thinking_parts: List[str] = []
+        self._pending_thinking: List[str] = []
+        self._last_thinking_flush: float = time.monotonic()
+
+        # JSON 对象扫描状态: 每个未闭合的对象/数组记录 [开括号, 在父对象中的键, 起始位置]
+        self._json_start: Optional[int] = None
+        self._json_stack: List[List[Any]] = []
+        self._in_json_string: bool = False
+        self._json_string_start: int = 0
+        self._last_object_string: Optional[str] = None # 对象中最近一个字符串 (遇到 ':' 时即为键)
+        self._current_object_key: Optional[str] = None
+        self._emitted_tool_request_count: int = 0
+        self._tool_request_stream_broken: bool = False
+        self._early_parse_failed: bool = False
+        self._result: Optional[ParseResult] = None
+
+    @property
+    def text(self) -> str:
+        """目前收到的完整响应文本。"""
+        return self._text
+
+    @property
+    def thinking_text(self) -> str:
+        """目前从 <think> 块中收到的思考过程。"""
+        return "".join(self._thinking_parts)
+
+    @property
+    def is_complete(self) -> bool:
+        """JSON 对象是否已闭合并解析。"""
+        return self._result is not None
+
+    async def feed(self, text_delta: str) -> bool:
+        """
+        处理一个新的响应文本片段。
+
+        Returns:
+            bool: 响应的 JSON 对象已完整并完成解析时为 True (之后的片段会被忽略)。
+        """
+        if self._result is not None:
+            return True
+        if not text_delta:
+            return False
+        self._text += text_delta
+
+        if self._phase == self._PHASE_START:
+            stripped_text = self._text.lstrip()
+            opening = stripped_text[:len(self._THINK_OPEN)].lower()
+            if len(opening) < len(self._THINK_OPEN) and self._THINK_OPEN.startswith(opening):
+                return False # 还不能确定响应是否以 <think> 开头
+            if opening == self._THINK_OPEN:
+                self._phase = self._PHASE_THINK
+                self._scan_position = len(self._text) - len(stripped_text) + len(self._THINK_OPEN)
+            else:
+                self._phase = self._PHASE_JSON
+
+        if self._phase == self._PHASE_THINK:
+            think_close_match = self._THINK_CLOSE_PATTERN.search(self._text, self._scan_position)
+            if think_close_match:
+                await self._emit_thinking(self._text[self._scan_position:think_close_match.start()], force_flush=True)
+                self._scan_position = self._think_block_end = think_close_match.end()
+                self._phase = self._PHASE_JSON
+            else:
+                # 保留末尾可能是半个 </think> 的字符，下一个片段到达后再判断
+                safe_end = len(self._text) - (self._THINK_CLOSE_LENGTH - 1)
+                if safe_end > self._scan_position:
+                    await self._emit_thinking(self._text[self._scan_position:safe_end])
+                    self._scan_position = safe_end
+                return False
+
+        if self._phase == self._PHASE_JSON and not self._early_parse_failed:
+            json_end = self._scan_json()
+            if json_end is not None:
+                self._try_early_parse(json_end)
+        return self._result is not None
+
+    def _scan_json(self) -> Optional[int]:
+        """从上次的位置继续扫描 JSON 对象，顶层对象闭合时返回其结束位置。"""
+        text = self._text
+        position = self._scan_position
+        if self._json_start is None:
+            position = text.find("{", position)
+            if position == -1:
+                self._scan_position = len(text)
+                return None
+            self._json_start = position
+        stack = self._json_stack
+        while True:
+            if self._in_json_string:
+                match = self._JSON_STRING_END_PATTERN.search(text, position)
+                if match is None:
+                    position = len(text)
+                    break
+                if match.group() == "\\":
+                    if match.end() >= len(text):
+                        position = match.start() # 转义符在片段末尾，等待下一个片段
+                        break
+                    position = match.end() + 1
+                    continue
+                self._in_json_string = False
+                position = match.end()
+                if stack and stack[-1][0] == "{":
+                    self._last_object_string = text[self._json_string_start + 1:match.start()]
+                continue
+            match = self._JSON_STRUCTURE_PATTERN.search(text, position)
+            if match is None:
+                position = len(text)
+                break
+            position = match.end()
+            character = match.group()
+            if character == '"':
+                self._in_json_string = True
+                self._json_string_start = match.start()
+            elif character == ":":
+                if stack and stack[-1][0] == "{":
+                    self._current_object_key = self._last_object_string
+            elif character in "{[":
+                parent_key = self._current_object_key if stack and stack[-1][0] == "{" else None
+                stack.append([character, parent_key, match.start()])
+                self._current_object_key = None
+            elif stack:
+                closed_container = stack.pop()
+                if not stack:
+                    self._scan_position = position
+                    return position
+                if closed_container[0] == "{" and self._is_tool_request_container(stack):
+                    self._emit_tool_request(text[closed_container[2]:position])
+        self._scan_position = position
+        return None
+
+    @staticmethod
+    def _is_tool_request_container(stack: List[List[Any]]) -> bool:
+        """刚闭合的对象是否是 decision.toolCallRequests 数组中的一项 (stack 为其外层的容器)。"""
+        return (len(stack) == 3 and stack[1][0] == "{" and stack[1][1] == "decision"
+                and stack[2][0] == "[" and stack[2][1] == "toolCallRequests")
+
+    def _emit_tool_request(self, tool_request_text: str) -> None:
+        if self._tool_request_callback is None or self._tool_request_stream_broken:
+            return
+        try:
+            tool_request = json.loads(tool_request_text)
+        except json.JSONDecodeError:
+            tool_request = None
+        validation_errors = (self._output_parser.validate_tool_call_request(tool_request, self._emitted_tool_request_count)
+                             if tool_request is not None else [{"jsonPath": "decision.toolCallRequests", "issue_description": "工具调用请求不是有效的 JSON。"}])
+        if validation_errors:
+            # 计划最终也无法通过校验，不再提前转发后续的请求
+            self._tool_request_stream_broken = True
+            logger.debug(f"[IncrementalResponseParser] 第 {self._emitted_tool_request_count + 1} 个工具调用请求未通过校验,停止提前转发: {validation_errors[:2]}")
+            return
+        self._emitted_tool_request_count += 1
+        self._tool_request_callback(tool_request)
+
+    def _try_early_parse(self, json_end: int) -> None:
+        think_block = self._text[:self._think_block_end]
+        candidate_content = f"{think_block}\n{self._text[self._json_start:json_end]}"
+        result = self._output_parser.parse_llm_response_to_structured_json(
+            types.SimpleNamespace(content=candidate_content), self.execution_phase
+        )
+        if isinstance(result[0], dict):
+            self._result = result
+            self._phase = self._PHASE_DONE
+        else:
+            # 闭合的对象不是响应 JSON，等流结束后按原方式解析整个响应
+            self._early_parse_failed = True
+            logger.debug(f"[IncrementalResponseParser] 提前解析失败,将在响应结束后解析完整内容: {result[1]}")
+
+    async def _emit_thinking(self, thinking_delta: str, force_flush: bool = False) -> None:
+        if thinking_delta:
+            self._thinking_parts.append(thinking_delta)
+            self._pending_thinking.append(thinking_delta)
+        if not self._pending_thinking or self._thinking_callback is None:
+            self._pending_thinking.clear()
+            return
+        now = time.monotonic()
+        if not force_flush and now - self._last_thinking_flush < self._thinking_flush_interval_seconds:
+            return
+        pending_text = "".join(self._pending_thinking)
+        self._pending_thinking.clear()
+        self._last_thinking_flush = now
+        try:
+            await self._thinking_callback(pending_text)
+        except Exception as e:
+            logger.warning(f"[IncrementalResponseParser] 转发思考过程片段失败: {e}")
+
+    async def finish(self) -> ParseResult:
+        """
+        结束解析: 转发剩余的思考过程，返回与 OutputParser.parse_llm_response_to_structured_json 相同格式的结果。
+        """
+        if self._phase == self._PHASE_THINK: # 流结束时 <think> 块仍未闭合
+            await self._emit_thinking(self._text[self._scan_position:], force_flush=True)
+            self._scan_position = len(self._text)
+        else:
+            await self._emit_thinking("", force_flush=True)
+        if self._result is not None:
+            return self._result
+        self._phase = self._PHASE_DONE
+        return self._output_parser.parse_llm_response_to_structured_json(
+            types.SimpleNamespace(content=self._text), self.execution_phase
+        )
@@ -3,6 +3,8 @@
 Memory Management for the Agent.
 Handles short-term conversation history and long-term knowledge.
 """
-from .manager import MemoryManager
+from .manager import MemoryManager, estimate_token_count
+from .snapshot import MemorySnapshot, write_memory_snapshot
+from .context import ContextAssembler, AssembledContext
 
-__all__ = ["MemoryManager"]
\ No newline at end of file
+__all__ = ["MemoryManager", "estimate_token_count", "MemorySnapshot", "write_memory_snapshot", "ContextAssembler", "AssembledContext"]
\ No newline at end of file
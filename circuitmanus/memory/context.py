@@ -0,0 +1,240 @@
+# IDT_AGENT_Pro/circuitmanus/memory/context.py
+import json
+import logging
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, NamedTuple, Tuple
+
+from .manager import estimate_token_count
+
+logger = logging.getLogger(__name__)
+
+# 每条消息除内容外的格式开销 (角色、分隔符) 的估算 token 数
+_MESSAGE_OVERHEAD_TOKENS = 4
+# 截断后的工具结果中原样保留的字段
+_TOOL_RESULT_KEPT_FIELDS = ("status", "message", "error")
+
+# 消息 token 估算缓存的容量 (按缓存文本的总字符数计)，以及可被缓存的单条文本的最大字符数
+_TOKEN_ESTIMATE_CACHE_MAX_CHARS = 2_000_000
+_TOKEN_ESTIMATE_CACHE_MAX_TEXT_CHARS = 64_000
+_token_estimate_cache: "OrderedDict[str, int]" = OrderedDict()
+_token_estimate_cache_chars: int = 0
+
+def _estimate_text_tokens(text: str) -> int:
+    # 短期记忆中的消息在多次调用之间不变，按内容缓存估算结果 (字符串的哈希值由解释器缓存)。
+    # 缓存按总字符数限制容量 (LRU 淘汰)，过长的文本不缓存，避免长期运行时保留大量大字符串。
+    global _token_estimate_cache_chars
+    cached_tokens = _token_estimate_cache.get(text)
+    if cached_tokens is not None:
+        _token_estimate_cache.move_to_end(text)
+        return cached_tokens
+    token_count = estimate_token_count(text)
+    if len(text) <= _TOKEN_ESTIMATE_CACHE_MAX_TEXT_CHARS:
+        _token_estimate_cache[text] = token_count
+        _token_estimate_cache_chars += len(text)
+        while _token_estimate_cache_chars > _TOKEN_ESTIMATE_CACHE_MAX_CHARS:
+            evicted_text, _ = _token_estimate_cache.popitem(last=False)
+            _token_estimate_cache_chars -= len(evicted_text)
+    return token_count
+
+def estimate_message_tokens(message: Dict[str, Any], use_cache: bool = True) -> int:
+    """
+    估算一条对话消息的 token 数 (内容 + 格式开销)。
+    每次调用都不同的内容 (如含时间戳和请求ID的系统提示) 应传入 use_cache=False，以免挤占缓存。
+    """
+    content = message.get("content")
+    if not isinstance(content, str):
+        content = "" if content is None else json.dumps(content, ensure_ascii=False, default=str)
+    return (_estimate_text_tokens(content) if use_cache else estimate_token_count(content)) + _MESSAGE_OVERHEAD_TOKENS
+
+def truncate_text_to_tokens(text: str, max_tokens: int) -> str:
+    """把文本截断到约 max_tokens 个估算 token: 保留开头约 2/3 和结尾约 1/3，中间用省略标记代替。"""
+    total_tokens = estimate_token_count(text)
+    if total_tokens <= max_tokens:
+        return text
+    marker = f"\n…[已省略约 {total_tokens - max_tokens} tokens]…\n"
+    available_tokens = max(0, max_tokens - estimate_token_count(marker))
+    head_tokens = available_tokens * 2 // 3
+    tail_tokens = available_tokens - head_tokens
+
+    def longest_slice_within(token_limit: int, from_end: bool) -> str:
+        # 估算值随切片长度单调递增，二分查找不超过 token_limit 的最长切片
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            candidate = text[len(text) - middle:] if from_end else text[:middle]
+            if estimate_token_count(candidate) <= token_limit:
+                low = middle
+            else:
+                high = middle - 1
+        return text[len(text) - low:] if from_end and low else ("" if from_end else text[:low])
+
+    return longest_slice_within(head_tokens, False) + marker + longest_slice_within(tail_tokens, True)
+
+def truncate_tool_result_content(content: str, max_tokens: int) -> str:
+    """
+    把过长的工具结果 (JSON 字符串) 截断到约 max_tokens 个估算 token。
+    status、message、error 字段原样保留，其余字段 (如 data、搜索结果) 以截断后的 JSON 文本预览代替；
+    内容不是 JSON 对象时按普通文本截断。
+    """
+    original_tokens = estimate_token_count(content)
+    if original_tokens <= max_tokens:
+        return content
+    try:
+        payload = json.loads(content)
+    except (TypeError, ValueError):
+        payload = None
+    if not isinstance(payload, dict):
+        return truncate_text_to_tokens(content, max_tokens)
+
+    compact_payload: Dict[str, Any] = {key: payload[key] for key in _TOOL_RESULT_KEPT_FIELDS if key in payload}
+    compact_payload["context_truncation"] = {
+        "original_estimated_tokens": original_tokens,
+        "note": "工具结果过长,发送给模型时已截断;需要完整内容时请缩小查询范围后重新调用工具。",
+    }
+    remaining_fields = {key: value for key, value in payload.items() if key not in _TOOL_RESULT_KEPT_FIELDS}
+    if remaining_fields:
+        used_tokens = estimate_token_count(json.dumps(compact_payload, ensure_ascii=False, default=str))
+        preview_budget = max_tokens - used_tokens - 8
+        if preview_budget > 0:
+            remaining_json = json.dumps(remaining_fields, ensure_ascii=False, default=str)
+            compact_payload["truncated_fields_preview"] = truncate_text_to_tokens(remaining_json, preview_budget)
+    return json.dumps(compact_payload, ensure_ascii=False, default=str)
+
+class AssembledContext(NamedTuple):
+    """
+    按 token 预算装配好的 LLM 消息列表。
+
+    token_breakdown 为各部分的估算 token 数: system_prompt、earlier_turns (之前的对话轮次)、
+    current_turn (本轮的用户指令、计划等)、current_turn_tool_results (本轮的工具结果)、total 以及 budget。
+    """
+    messages: List[Dict[str, Any]]
+    token_breakdown: Dict[str, int]
+    dropped_message_count: int
+    truncated_message_count: int
+
+class ContextAssembler:
+    """
+    按 token 预算从短期记忆装配发送给 LLM 的消息列表，使提示大小 (和延迟) 可预测。
+
+    - 对话以用户消息为界分为轮次。本轮 (调用方传入的 current_turn；未传入时为最后一条用户消息及其后的
+      计划、工具结果) 总是保留；
+      之前的轮次从最近的开始放入，放不下完整轮次时退而只保留该轮的用户消息和最后的回复，
+      仍放不下时丢弃该轮及更早的所有轮次 (保证保留下来的对话是连续的)。
+    - 超过 max_tool_message_tokens 的工具结果被截断 (保留状态与消息字段)；本轮内容仍超出预算时，
+      本轮的工具结果进一步按剩余预算平均截断。
+    - 不修改短期记忆本身，截断只作用于发送给 LLM 的副本。
+
+    Attributes:
+        max_tool_message_tokens (int): 单条工具结果允许占用的估算 token 上限；0 表示不截断。
+    """
+    def __init__(self, max_tool_message_tokens: int = 1500):
+        self.max_tool_message_tokens: int = max(0, max_tool_message_tokens)
+
+    @staticmethod
+    def _split_into_turns(messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        turns: List[List[Dict[str, Any]]] = []
+        for message in messages:
+            if message.get("role") == "user" or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    def _truncate_tool_message(self, message: Dict[str, Any], max_tokens: int) -> Tuple[Dict[str, Any], bool]:
+        content = message.get("content")
+        if message.get("role") != "tool" or not isinstance(content, str) or not max_tokens:
+            return message, False
+        truncated_content = truncate_tool_result_content(content, max_tokens)
+        if truncated_content is content:
+            return message, False
+        return {**message, "content": truncated_content}, True
+
+    @staticmethod
+    def _compact_turn(turn: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # 只保留用户消息和本轮最后一条助手消息 (通常是最终回复)
+        compact_turn = [message for message in turn[:1]]
+        last_assistant_message = next((message for message in reversed(turn[1:]) if message.get("role") == "assistant"), None)
+        if last_assistant_message is not None:
+            compact_turn.append(last_assistant_message)
+        return compact_turn
+
+    def assemble(self, system_prompt: str, short_term: List[Dict[str, Any]], token_budget: int,
+                 current_turn: Optional[List[Dict[str, Any]]] = None) -> AssembledContext:
+        """
+        把系统提示和短期记忆装配为消息列表，总估算 token 数尽量不超过 token_budget。
+
+        Args:
+            system_prompt (str): 系统提示文本 (总是放在第一条)。
+            short_term (List[Dict[str, Any]]): 短期记忆中的对话消息 (按时间顺序)。
+            token_budget (int): 整个消息列表的估算 token 上限；0 或负数表示不限制 (仍会截断过长的工具结果)。
+            current_turn (Optional[List[Dict[str, Any]]]): 本轮的消息 (尚未写入短期记忆的当前请求)。
+                                                          为 None 时取 short_term 中最后一条用户消息开始的部分。
+        """
+        system_message = {"role": "system", "content": system_prompt}
+        system_tokens = estimate_message_tokens(system_message, use_cache=False) # 系统提示每次都不同，不缓存
+        unlimited = token_budget <= 0
+        history_budget = max(0, token_budget - system_tokens)
+        truncated_message_count = 0
+
+        turns = self._split_into_turns(short_term)
+        if current_turn is None:
+            current_turn = turns.pop() if turns else []
+
+        # 1. 本轮: 先按单条上限截断工具结果，仍超出预算时按剩余预算平均分配给本轮的工具结果
+        prepared_current_turn: List[Dict[str, Any]] = []
+        for message in current_turn:
+            message, truncated = self._truncate_tool_message(message, self.max_tool_message_tokens)
+            truncated_message_count += truncated
+            prepared_current_turn.append(message)
+        current_turn_tokens = sum(estimate_message_tokens(message) for message in prepared_current_turn)
+        if not unlimited and current_turn_tokens > history_budget:
+            tool_indices = [index for index, message in enumerate(prepared_current_turn) if message.get("role") == "tool"]
+            if tool_indices:
+                non_tool_tokens = sum(estimate_message_tokens(message) for index, message in enumerate(prepared_current_turn) if index not in tool_indices)
+                per_tool_budget = max(64, (history_budget - non_tool_tokens) // len(tool_indices) - _MESSAGE_OVERHEAD_TOKENS)
+                for index in tool_indices:
+                    message, truncated = self._truncate_tool_message(prepared_current_turn[index], per_tool_budget)
+                    if truncated and prepared_current_turn[index] is current_turn[index]:
+                        truncated_message_count += 1
+                    prepared_current_turn[index] = message
+                current_turn_tokens = sum(estimate_message_tokens(message) for message in prepared_current_turn)
+            if current_turn_tokens > history_budget:
+                logger.warning(f"[ContextAssembler] 本轮消息约 {current_turn_tokens} tokens,超出上下文预算 ({history_budget} tokens 可用于对话)。")
+        current_turn_tool_tokens = sum(estimate_message_tokens(message) for message in prepared_current_turn if message.get("role") == "tool")
+
+        # 2. 之前的轮次: 从最近的开始，放不下完整轮次时尝试精简形式，仍放不下则停止
+        remaining_budget = history_budget - current_turn_tokens
+        kept_turns: List[List[Dict[str, Any]]] = []
+        earlier_turns_tokens = 0
+        dropped_message_count = 0
+        for turn_index in range(len(turns) - 1, -1, -1):
+            prepared_turn: List[Dict[str, Any]] = []
+            for message in turns[turn_index]:
+                message, truncated = self._truncate_tool_message(message, self.max_tool_message_tokens)
+                truncated_message_count += truncated
+                prepared_turn.append(message)
+            turn_tokens = sum(estimate_message_tokens(message) for message in prepared_turn)
+            if not unlimited and turn_tokens > remaining_budget:
+                compact_turn = self._compact_turn(prepared_turn)
+                compact_tokens = sum(estimate_message_tokens(message) for message in compact_turn)
+                if compact_tokens > remaining_budget:
+                    dropped_message_count += sum(len(turn) for turn in turns[:turn_index + 1])
+                    break
+                dropped_message_count += len(prepared_turn) - len(compact_turn)
+                prepared_turn, turn_tokens = compact_turn, compact_tokens
+            kept_turns.append(prepared_turn)
+            earlier_turns_tokens += turn_tokens
+            remaining_budget -= turn_tokens
+
+        messages = [system_message]
+        for turn in reversed(kept_turns):
+            messages.extend(turn)
+        messages.extend(prepared_current_turn)
+        token_breakdown = {
+            "system_prompt": system_tokens,
+            "earlier_turns": earlier_turns_tokens,
+            "current_turn": current_turn_tokens - current_turn_tool_tokens,
+            "current_turn_tool_results": current_turn_tool_tokens,
+            "total": system_tokens + earlier_turns_tokens + current_turn_tokens,
+            "budget": token_budget,
+        }
+        return AssembledContext(messages, token_breakdown, dropped_message_count, truncated_message_count)
@@ -1,15 +1,40 @@
 # IDT_AGENT_Pro/circuitmanus/memory/manager.py
+import io
+import os
+import re
+import time
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set
 
 # 从 circuit_domain 导入 Circuit 类
 # 这是跨子包导入，使用相对导入 '.' 表示当前包 (circuitmanus), '..' 表示上级包
 # 如果 manager.py 直接在 circuitmanus 下，可以用 from .circuit_domain.circuit import Circuit
 # 如果此文件在 circuitmanus/memory/ 下，则需要 from ..circuit_domain.circuit import Circuit
 from ..circuit_domain.circuit import Circuit #  memory 和 circuit_domain 都是 circuitmanus 的子包
+from .snapshot import MemorySnapshot, write_memory_snapshot
 
 logger = logging.getLogger(__name__)
 
+# 从消息文本中提取可能是元件ID的标识符 (例如 "R1", "led2", "OUT3")
+_COMPONENT_ID_TOKEN_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9_]*")
+
+def estimate_token_count(text: str) -> int:
+    """
+    粗略估算一段文本的 token 数量，无需依赖具体模型的分词器。
+    经验规则: 非 ASCII 字符 (如中文) 约 1 字符/token，ASCII 字符约 4 字符/token。
+
+    Args:
+        text (str): 要估算的文本。
+
+    Returns:
+        int: 估算的 token 数量。
+    """
+    if text.isascii():
+        return (len(text) + 3) // 4
+    ascii_chars = len(text.encode("ascii", "ignore")) # 在 C 层统计 ASCII 字符数，避免逐字符的 Python 循环
+    non_ascii_chars = len(text) - ascii_chars
+    return non_ascii_chars + (ascii_chars + 3) // 4
+
 class MemoryManager:
     """
     管理 Agent 的记忆，包括短期对话历史、长期知识和当前的电路状态。
@@ -20,19 +45,31 @@ class MemoryManager:
         short_term (List[Dict[str, Any]]): 存储对话历史的列表，每条消息是一个字典 (通常包含 'role' 和 'content')。
         long_term (List[str]): 存储长期知识片段的列表，每个片段是一个字符串。
         circuit (Circuit): 一个 Circuit 类的实例，代表当前 Agent 正在操作的电路。
+                           由快照恢复时惰性物化 (见 load_snapshot)。
+        circuit_context_token_budget (Optional[int]): 电路状态在提示中的 token 预算，超出时使用摘要模式。
     """
-    def __init__(self, max_short_term_items: int = 30, max_long_term_items: int = 200):
+    def __init__(self, max_short_term_items: int = 30, max_long_term_items: int = 200,
+                 circuit_context_token_budget: Optional[int] = None,
+                 summary_recent_messages: int = 6, summary_max_hubs: int = 10, summary_max_groups: int = 10,
+                 max_undo_journal_entries: int = 5000, circuit_storage_backend: str = "dict"):
         """
         初始化 MemoryManager。
 
         Args:
             max_short_term_items (int): 短期记忆的最大条目数。必须大于1。
             max_long_term_items (int): 长期记忆的最大条目数。
+            circuit_context_token_budget (Optional[int]): 电路状态在提示中允许占用的估算 token 上限。
+                                                          完整描述超出该上限时切换为摘要模式；None 或 0 表示不限制。
+            summary_recent_messages (int): 摘要模式下，从最近多少条短期记忆中提取 "近期涉及" 的元件。
+            summary_max_hubs (int): 摘要模式下最多列出的高连接度元件数量。
+            summary_max_groups (int): 摘要模式下最多列出的连通分组数量。
+            max_undo_journal_entries (int): 电路操作日志 (撤销/重做与快照) 保留的最大条目数。
+            circuit_storage_backend (str): 电路的存储后端，"dict" (默认) 或 "columnar" (超大电路省内存)。
 
         Raises:
             ValueError: 如果 max_short_term_items 小于或等于1。
         """
-        logger.info("[MemoryManager] 初始化记忆模块...")
+        logger.debug("[MemoryManager] 初始化记忆模块...")
         if not isinstance(max_short_term_items, int) or max_short_term_items <= 1:
             # 短期记忆如果太小（比如只有1条），在LLM交互中通常没有意义，
             # 因为至少需要保留一条用户消息和一条系统消息/助手消息才能形成上下文。
@@ -45,14 +82,136 @@ class MemoryManager:
 
         self.max_short_term_items: int = max_short_term_items
         self.max_long_term_items: int = max_long_term_items
+        self.circuit_context_token_budget: Optional[int] = circuit_context_token_budget or None
+        self.summary_recent_messages: int = max(0, summary_recent_messages)
+        self.summary_max_hubs: int = max(0, summary_max_hubs)
+        self.summary_max_groups: int = max(0, summary_max_groups)
         self.short_term: List[Dict[str, Any]] = []
         self.long_term: List[str] = []
         
+        self.max_undo_journal_entries: int = max_undo_journal_entries
+        self.circuit_storage_backend: str = circuit_storage_backend
+
         # 每个 MemoryManager 实例都拥有并管理一个独立的 Circuit 实例。
         # 这是核心设计，Agent 的所有电路操作都通过其 MemoryManager 间接作用于这个 Circuit 对象。
-        self.circuit: Circuit = Circuit()
+        self._circuit: Circuit = Circuit(max_journal_entries=max_undo_journal_entries, storage_backend=circuit_storage_backend)
+        # 从快照恢复时，电路在首次访问 circuit 属性时才由快照物化 (见 load_snapshot)
+        self._pending_circuit_snapshot: Optional[MemorySnapshot] = None
+
+        logger.debug(f"[MemoryManager] 记忆模块初始化完成。短期记忆上限: {max_short_term_items} 条, 长期记忆上限: {max_long_term_items} 条。")
+
+    @property
+    def circuit(self) -> Circuit:
+        """当前 Agent 操作的电路。从快照恢复的电路在首次访问时才物化。"""
+        if self._pending_circuit_snapshot is not None:
+            snapshot, self._pending_circuit_snapshot = self._pending_circuit_snapshot, None
+            start_time = time.perf_counter()
+            try:
+                self._circuit = snapshot.build_circuit(max_journal_entries=self.max_undo_journal_entries, storage_backend=self.circuit_storage_backend)
+            finally:
+                snapshot.close()
+            logger.info(f"[MemoryManager] 已由快照 '{snapshot.source}' 物化电路 ({len(self._circuit.components)} 个元件, "
+                        f"{len(self._circuit.connections)} 个连接), 耗时 {(time.perf_counter() - start_time) * 1000:.1f} ms。")
+        return self._circuit
+
+    @property
+    def is_circuit_materialized(self) -> bool:
+        """电路是否已物化 (False 表示电路仍停留在尚未读取的快照中)。"""
+        return self._pending_circuit_snapshot is None
+
+    def save_snapshot(self, path: str) -> Dict[str, Any]:
+        """
+        把短期记忆、长期记忆与电路保存为二进制会话快照 (格式见 snapshot.py)。
+        先写入临时文件再原子替换，写入过程中崩溃不会损坏已有的快照。
+        电路的撤销/重做历史不会被保存。
+
+        Args:
+            path (str): 快照文件路径 (所在目录不存在时自动创建)。
+
+        Returns:
+            Dict[str, Any]: path、size_bytes、component_count、connection_count、elapsed_ms。
+        """
+        start_time = time.perf_counter()
+        circuit = self.circuit # 尚未物化的电路先由旧快照物化并关闭其映射，之后才能替换同一个文件
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, "wb") as snapshot_file:
+                size_bytes = write_memory_snapshot(self, snapshot_file)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        summary = {
+            "path": path, "size_bytes": size_bytes,
+            "component_count": len(circuit.components), "connection_count": len(circuit.connections),
+            "elapsed_ms": round((time.perf_counter() - start_time) * 1000, 1),
+        }
+        logger.info(f"[MemoryManager] 会话快照已保存到 '{path}' ({size_bytes} 字节, {summary['component_count']} 个元件), 耗时 {summary['elapsed_ms']} ms。")
+        return summary
+
+    def dump_snapshot_bytes(self) -> bytes:
+        """把短期记忆、长期记忆与电路序列化为内存中的二进制会话快照 (供会话存储写入数据库等场景使用)。"""
+        buffer = io.BytesIO()
+        write_memory_snapshot(self, buffer)
+        return buffer.getvalue()
+
+    def load_snapshot(self, path: str) -> Dict[str, Any]:
+        """
+        从二进制会话快照文件恢复记忆与电路，替换当前的全部记忆。
+        快照以只读内存映射打开 (见 restore_snapshot)。
+
+        Args:
+            path (str): 快照文件路径。
+
+        Returns:
+            Dict[str, Any]: 与 restore_snapshot 相同。
+
+        Raises:
+            OSError: 如果文件无法读取。
+            ValueError: 如果文件不是有效的会话快照。
+        """
+        return self.restore_snapshot(MemorySnapshot.open(path))
+
+    def restore_snapshot(self, snapshot: MemorySnapshot) -> Dict[str, Any]:
+        """
+        从一个已打开的会话快照恢复记忆与电路，替换当前的全部记忆。快照的所有权转移给 MemoryManager。
+
+        这里只解析记忆段；电路保持在快照中 (文件快照即内存映射)，直到首次访问 circuit 属性时才物化，
+        因此恢复会话的耗时与电路规模无关。恢复后的电路没有可撤销的历史。
 
-        logger.info(f"[MemoryManager] 记忆模块初始化完成。短期记忆上限: {max_short_term_items} 条, 长期记忆上限: {max_long_term_items} 条。")
+        Args:
+            snapshot (MemorySnapshot): 已打开的快照。
+
+        Returns:
+            Dict[str, Any]: source、size_bytes、short_term_count、long_term_count、component_count、connection_count、elapsed_ms。
+
+        Raises:
+            ValueError: 如果快照的记忆段已损坏 (此时快照会被关闭)。
+        """
+        start_time = time.perf_counter()
+        try:
+            short_term = snapshot.read_short_term()
+            long_term = snapshot.read_long_term()
+            component_count, connection_count = snapshot.component_count, snapshot.connection_count
+        except Exception:
+            snapshot.close()
+            raise
+        if self._pending_circuit_snapshot is not None:
+            self._pending_circuit_snapshot.close()
+        self.short_term = short_term
+        self.long_term = long_term[-self.max_long_term_items:] if self.max_long_term_items else []
+        self._pending_circuit_snapshot = snapshot
+        summary = {
+            "source": snapshot.source, "size_bytes": snapshot.size_bytes,
+            "short_term_count": len(self.short_term), "long_term_count": len(self.long_term),
+            "component_count": component_count, "connection_count": connection_count,
+            "elapsed_ms": round((time.perf_counter() - start_time) * 1000, 1),
+        }
+        logger.info(f"[MemoryManager] 已从快照 '{snapshot.source}' 恢复记忆 (短期 {summary['short_term_count']} 条, 长期 {summary['long_term_count']} 条, "
+                    f"电路 {component_count} 个元件待首次访问时物化), 耗时 {summary['elapsed_ms']} ms。")
+        return summary
 
     def add_to_short_term(self, message: Dict[str, Any]) -> None:
         """
@@ -68,7 +227,26 @@ class MemoryManager:
 
         logger.debug(f"[MemoryManager] 添加消息到短期记忆 (Role: {message.get('role', 'N/A')})。当前数量: {len(self.short_term)}。")
         self.short_term.append(message)
-        
+        self._trim_short_term()
+        logger.debug(f"[MemoryManager] 添加后短期记忆数量: {len(self.short_term)}。")
+
+    def add_turn_to_short_term(self, messages: List[Dict[str, Any]]) -> None:
+        """
+        把一次请求的整轮对话 (用户消息、计划、工具结果、回复) 一次性追加到短期记忆，之后再统一修剪。
+        格式无效的消息被跳过。调用方需持有会话的 state_lock (快照写回会在线程中读取短期记忆)。
+
+        Args:
+            messages (List[Dict[str, Any]]): 按时间顺序排列的本轮消息。
+        """
+        valid_messages = [message for message in messages if isinstance(message, dict) and "role" in message and "content" in message]
+        if len(valid_messages) != len(messages):
+            logger.warning(f"[MemoryManager] 本轮对话中有 {len(messages) - len(valid_messages)} 条格式无效的消息,已跳过。")
+        self.short_term.extend(valid_messages)
+        self._trim_short_term()
+        logger.debug(f"[MemoryManager] 已追加一轮对话 ({len(valid_messages)} 条消息)。当前短期记忆数量: {len(self.short_term)}。")
+
+    def _trim_short_term(self) -> None:
+        """修剪短期记忆使其不超过上限：移除最旧的非系统 ('system' role) 消息。"""
         current_size = len(self.short_term)
         if current_size > self.max_short_term_items:
             items_to_remove_count = current_size - self.max_short_term_items
@@ -95,8 +273,6 @@ class MemoryManager:
             elif items_to_remove_count > 0:
                  # 如果需要移除，但所有消息都是系统消息，或者非系统消息不够移除
                  logger.warning(f"[MemoryManager] 短期记忆超限 ({current_size}/{self.max_short_term_items}) 但未能找到足够的非系统消息进行移除 ({len(non_system_indices)}条非系统消息存在)。这可能表示系统消息过多或max_short_term_items设置过小。")
-        
-        logger.debug(f"[MemoryManager] 添加后短期记忆数量: {len(self.short_term)}。")
 
     def add_to_long_term(self, knowledge_snippet: str) -> None:
         """
@@ -134,19 +310,108 @@ class MemoryManager:
         """
         return self.circuit.get_state_description()
 
-    def get_memory_context_for_prompt(self, recent_long_term_count: int = 7) -> str:
+    def _get_recently_touched_component_ids(self, pending_messages: Optional[List[Dict[str, Any]]] = None) -> Set[str]:
+        """从最近的短期记忆消息 (及尚未写入短期记忆的本轮消息) 中提取出现过、且仍存在于电路中的元件ID。"""
+        touched_ids: Set[str] = set()
+        if self.summary_recent_messages <= 0:
+            return touched_ids
+        components = self.circuit.components
+        recent_messages = (self.short_term[-self.summary_recent_messages:] + list(pending_messages or []))[-self.summary_recent_messages:]
+        for message in recent_messages:
+            content = message.get("content")
+            if not isinstance(content, str):
+                continue
+            for token in _COMPONENT_ID_TOKEN_PATTERN.findall(content):
+                token_upper = token.upper()
+                if token_upper in components:
+                    touched_ids.add(token_upper)
+        return touched_ids
+
+    def get_circuit_summary_description(self, token_budget: int, pending_messages: Optional[List[Dict[str, Any]]] = None) -> str:
+        """
+        生成受 token 预算约束的电路摘要，用于超大电路无法完整放入提示的情况。
+        依次包含: 规模、按类型计数、近期涉及元件的完整信息、高连接度元件、连通分组概况。
+        各部分按上述优先级填充，预算耗尽后其余条目以省略说明代替。
+
+        Args:
+            token_budget (int): 摘要允许占用的估算 token 上限。
+            pending_messages (Optional[List[Dict[str, Any]]]): 当前请求尚未写入短期记忆的本轮消息，参与判断近期涉及的元件。
+
+        Returns:
+            str: 电路摘要描述字符串。
+        """
+        circuit = self.circuit
+        lines: List[str] = [
+            f"【当前电路状态 (摘要模式: 完整描述超出约 {token_budget} tokens 的上下文预算)】:",
+            f"  - 规模: {len(circuit.components)} 个元件, {len(circuit.connections)} 个连接",
+        ]
+        used_tokens = sum(estimate_token_count(line) for line in lines)
+
+        def append_section(title: str, items: List[str]) -> None:
+            nonlocal used_tokens
+            if not items:
+                return
+            lines.append(title)
+            used_tokens += estimate_token_count(title)
+            for index, item in enumerate(items):
+                item_tokens = estimate_token_count(item)
+                if used_tokens + item_tokens > token_budget:
+                    lines.append(f"    - ... (因上下文预算省略其余 {len(items) - index} 项)")
+                    used_tokens += 16
+                    return
+                lines.append(item)
+                used_tokens += item_tokens
+
+        append_section("  - 元件类型统计:", [f"    - {type_key}: {count}" for type_key, count in circuit.get_type_counts().items()])
+
+        touched_ids = sorted(self._get_recently_touched_component_ids(pending_messages))
+        touched_items = []
+        for cid in touched_ids:
+            neighbors = sorted(circuit.get_connected_component_ids(cid))
+            touched_items.append(f"    - {circuit.components[cid]} | 连接 ({len(neighbors)}): {', '.join(neighbors) if neighbors else '(无)'}")
+        append_section(f"  - 近期对话涉及的元件 ({len(touched_ids)}):", touched_items)
+
+        hubs = circuit.get_hub_components(self.summary_max_hubs)
+        append_section("  - 高连接度元件:", [f"    - {cid}: {degree} 个连接" for cid, degree in hubs])
+
+        groups = circuit.get_connected_groups()
+        multi_member_groups = [group for group in groups if len(group) > 1]
+        isolated_count = len(groups) - len(multi_member_groups)
+        group_items = [
+            f"    - 分组 {index + 1}: {len(group)} 个元件 (例如: {', '.join(group[:5])}{', ...' if len(group) > 5 else ''})"
+            for index, group in enumerate(multi_member_groups[:self.summary_max_groups])
+        ]
+        if len(multi_member_groups) > self.summary_max_groups:
+            group_items.append(f"    - ... 另有 {len(multi_member_groups) - self.summary_max_groups} 个分组")
+        if isolated_count:
+            group_items.append(f"    - 未连接的孤立元件: {isolated_count} 个")
+        append_section(f"  - 连通分组 ({len(multi_member_groups)} 个多元件分组):", group_items)
+
+        lines.append("  (注: 未列出的元件详情可通过 find_component_by_id_tool 等工具按需查询。)")
+        return "\n".join(lines)
+
+    def get_memory_context_for_prompt(self, recent_long_term_count: int = 7, circuit_token_budget: Optional[int] = None,
+                                      pending_messages: Optional[List[Dict[str, Any]]] = None) -> str:
         """
         格式化记忆上下文，用于构建LLM的系统提示。
         包含当前电路状态描述和最近的长期记忆片段。
+        当完整电路描述的估算 token 数超出预算时，改用 get_circuit_summary_description 生成的摘要。
 
         Args:
             recent_long_term_count (int): 要包含在上下文中的最近长期记忆条目数量。
+            circuit_token_budget (Optional[int]): 本次调用的电路描述 token 预算；
+                                                  为 None 时使用 self.circuit_context_token_budget。
+            pending_messages (Optional[List[Dict[str, Any]]]): 当前请求尚未写入短期记忆的本轮消息 (用于电路摘要)。
 
         Returns:
             str: 格式化后的记忆上下文字符串。
         """
         logger.debug("[MemoryManager] 正在格式化记忆上下文用于 Prompt...")
         circuit_desc = self.get_circuit_state_description()
+        token_budget = circuit_token_budget if circuit_token_budget is not None else self.circuit_context_token_budget
+        if token_budget and estimate_token_count(circuit_desc) > token_budget:
+            logger.info(f"[MemoryManager] 电路描述超出 {token_budget} tokens 预算,使用摘要模式。")
+            circuit_desc = self.get_circuit_summary_description(token_budget, pending_messages)
         
         long_term_str = ""
         if self.long_term:
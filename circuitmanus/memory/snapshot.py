@@ -0,0 +1,334 @@
+# IDT_AGENT_Pro/circuitmanus/memory/snapshot.py
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import logging
+from array import array
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple, Union, TYPE_CHECKING
+
+from ..circuit_domain.circuit import Circuit
+
+if TYPE_CHECKING:
+    from .manager import MemoryManager
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# 会话快照二进制格式 (所有整数均为小端序)
+#
+#   文件头:   magic (8 字节 b"CMSNAP\0\0") | version (u16) | reserved (u16) | section_count (u32)
+#   段目录:   section_count 个 (tag: 4 字节, offset: u64, length: u64)
+#   段数据:   每段起始地址按 8 字节对齐
+#
+#   "CMET" 电路元数据 (UTF-8 JSON): 存储后端、ID分配器状态、元件数、连接数。
+#   "CSTR" 电路字符串表: 前 component_count 项是按升序排列的元件ID (第 i 项即第 i 行元件的ID)，
+#          其后是去重后的类型与值字符串。
+#   "COMP" 元件列: u32 type_codes[component_count] | u32 value_codes[component_count] (0xFFFFFFFF 表示无值)。
+#   "EDGE" 边表:   u32 (row1, row2)[connection_count]，按连接升序排列，row 为元件行号。
+#   "MEMJ" 记忆数据 (UTF-8 JSON): 短期记忆消息列表。
+#   "LTMS" 长期记忆字符串表。
+#
+#   字符串表: u32 count | u32 end_offsets[count] | UTF-8 数据。
+#   每个字符串的长度由相邻两个结束偏移量之差给出，因此可以只解码需要的那几项，无需顺序扫描整张表。
+#
+# 定长的列与边表可以直接在内存映射上以 memoryview.cast("I") 读取，打开快照时只解析文件头、
+# 段目录与记忆段，电路部分直到首次访问时才物化 (见 MemoryManager.circuit)。
+# ---------------------------------------------------------------------------
+SNAPSHOT_MAGIC = b"CMSNAP\x00\x00"
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct("<8sHHI")
+_SECTION_ENTRY = struct.Struct("<4sQQ")
+_U32 = struct.Struct("<I")
+_NO_VALUE = 0xFFFFFFFF
+_SECTION_ALIGNMENT = 8
+_LITTLE_ENDIAN_HOST = sys.byteorder == "little"
+
+_SECTION_CIRCUIT_META = b"CMET"
+_SECTION_CIRCUIT_STRINGS = b"CSTR"
+_SECTION_COMPONENTS = b"COMP"
+_SECTION_EDGES = b"EDGE"
+_SECTION_MEMORY = b"MEMJ"
+_SECTION_LONG_TERM = b"LTMS"
+
+def _u32_bytes(values: Sequence[int]) -> bytes:
+    """把整数序列编码为小端序 u32 数组的字节。"""
+    packed = array("I", values)
+    if not _LITTLE_ENDIAN_HOST:
+        packed.byteswap()
+    return packed.tobytes()
+
+def _u32_view(buffer: memoryview, offset: int, count: int) -> Sequence[int]:
+    """
+    以 u32 序列的形式读取缓冲区中的一段数据。
+    小端序主机上直接返回内存映射上的零拷贝视图；大端序主机上复制并转换字节序。
+    """
+    raw = buffer[offset:offset + 4 * count]
+    if _LITTLE_ENDIAN_HOST:
+        return raw.cast("I")
+    converted = array("I", raw.tobytes())
+    converted.byteswap()
+    return converted
+
+def _encode_string_table(strings: Sequence[str]) -> bytes:
+    encoded = [text.encode("utf-8", "surrogatepass") for text in strings]
+    end_offsets: List[int] = []
+    total = 0
+    for item in encoded:
+        total += len(item)
+        end_offsets.append(total)
+    if total > _NO_VALUE:
+        raise OverflowError("快照字符串表超过 4GB 上限。")
+    return _U32.pack(len(encoded)) + _u32_bytes(end_offsets) + b"".join(encoded)
+
+class SnapshotStringTable:
+    """
+    快照中字符串表的只读视图。字符串在被访问时才从缓冲区解码，
+    因此只读取少数几项 (例如按行号查找元件ID) 时无需解码整张表。
+    """
+    __slots__ = ("_buffer", "_end_offsets", "_data_start", "_count")
+
+    def __init__(self, buffer: memoryview):
+        if len(buffer) < 4:
+            raise ValueError("快照字符串表已损坏 (长度不足)。")
+        self._count = _U32.unpack_from(buffer, 0)[0]
+        self._data_start = 4 + 4 * self._count
+        if self._data_start > len(buffer):
+            raise ValueError("快照字符串表已损坏 (偏移量表越界)。")
+        self._end_offsets = _u32_view(buffer, 4, self._count)
+        if self._count and self._data_start + self._end_offsets[-1] > len(buffer):
+            raise ValueError("快照字符串表已损坏 (数据越界)。")
+        self._buffer = buffer
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> str:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        start = self._end_offsets[index - 1] if index else 0
+        end = self._end_offsets[index]
+        return str(self._buffer[self._data_start + start:self._data_start + end], "utf-8", "surrogatepass")
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[index] for index in range(self._count))
+
+    def decode_all(self) -> List[str]:
+        """一次性解码整张表 (比逐项访问快，用于物化整个电路)。"""
+        data = bytes(self._buffer[self._data_start:self._data_start + (self._end_offsets[-1] if self._count else 0)])
+        strings: List[str] = []
+        start = 0
+        for end in self._end_offsets:
+            strings.append(data[start:end].decode("utf-8", "surrogatepass"))
+            start = end
+        return strings
+
+def write_memory_snapshot(memory_manager: 'MemoryManager', stream: BinaryIO) -> int:
+    """
+    把 MemoryManager 的短期记忆、长期记忆与电路以二进制快照格式写入一个可写的二进制流。
+    电路的操作日志 (撤销/重做历史) 不写入快照。
+
+    Returns:
+        int: 写入的字节数。
+    """
+    circuit = memory_manager.circuit
+    component_ids: List[str] = []
+    type_codes: List[int] = []
+    value_codes: List[int] = []
+    extra_strings: List[str] = [] # 类型与值字符串，编号从 component_count 开始
+    extra_codes: Dict[str, int] = {}
+    rows: Dict[str, int] = {}
+    for component_id, component_type, value in circuit.iter_sorted_component_rows():
+        rows[component_id] = len(component_ids)
+        component_ids.append(component_id)
+        for text, codes in ((component_type, type_codes), (value, value_codes)):
+            if text is None:
+                codes.append(_NO_VALUE)
+                continue
+            code = extra_codes.get(text)
+            if code is None:
+                code = extra_codes[text] = len(extra_strings)
+                extra_strings.append(text)
+            codes.append(code)
+    component_count = len(component_ids)
+    type_codes = [code + component_count for code in type_codes]
+    value_codes = [code + component_count if code != _NO_VALUE else _NO_VALUE for code in value_codes]
+    edge_rows: List[int] = []
+    for id1, id2 in circuit.get_sorted_connections():
+        edge_rows.append(rows[id1])
+        edge_rows.append(rows[id2])
+
+    circuit_meta = {
+        "storage_backend": circuit.storage_backend,
+        "id_allocator": circuit.get_id_allocator_state(),
+        "component_count": component_count,
+        "connection_count": len(edge_rows) // 2,
+    }
+    memory_data = {"short_term": memory_manager.short_term, "saved_at": time.time()}
+    sections: List[Tuple[bytes, bytes]] = [
+        (_SECTION_CIRCUIT_META, json.dumps(circuit_meta, ensure_ascii=False).encode("utf-8")),
+        (_SECTION_CIRCUIT_STRINGS, _encode_string_table(component_ids + extra_strings)),
+        (_SECTION_COMPONENTS, _u32_bytes(type_codes) + _u32_bytes(value_codes)),
+        (_SECTION_EDGES, _u32_bytes(edge_rows)),
+        (_SECTION_MEMORY, json.dumps(memory_data, ensure_ascii=False, default=str).encode("utf-8")),
+        (_SECTION_LONG_TERM, _encode_string_table(memory_manager.long_term)),
+    ]
+
+    def aligned(offset: int) -> int:
+        return (offset + _SECTION_ALIGNMENT - 1) // _SECTION_ALIGNMENT * _SECTION_ALIGNMENT
+
+    offset = aligned(_HEADER.size + _SECTION_ENTRY.size * len(sections))
+    directory: List[bytes] = []
+    for tag, payload in sections:
+        directory.append(_SECTION_ENTRY.pack(tag, offset, len(payload)))
+        offset = aligned(offset + len(payload))
+
+    written = stream.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, len(sections)) + b"".join(directory))
+    for tag, payload in sections:
+        written += stream.write(b"\x00" * (aligned(written) - written))
+        written += stream.write(payload)
+    return written
+
+class MemorySnapshot:
+    """
+    对一个会话快照的只读访问 (见模块开头的格式说明)。
+
+    打开时只校验文件头与段目录；记忆段按需解析，电路段在 build_circuit 时才物化，
+    定长的列与边表直接在内存映射上读取而不复制。使用完毕后应调用 close() (或作为上下文管理器使用)。
+
+    Attributes:
+        source (str): 快照来源的描述 (文件路径或 "<memory>")，用于日志。
+        size_bytes (int): 快照的总字节数。
+    """
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview, mmap.mmap], source: str = "<memory>"):
+        """
+        Args:
+            buffer: 快照数据 (bytes 或内存映射)。
+
+        Raises:
+            ValueError: 如果数据不是本格式的快照、版本不受支持或已损坏。
+        """
+        self.source: str = source
+        self._mmap: Optional[mmap.mmap] = buffer if isinstance(buffer, mmap.mmap) else None
+        self._buffer = memoryview(buffer)
+        self.size_bytes: int = len(self._buffer)
+        self._sections: Dict[bytes, memoryview] = {}
+        self._circuit_meta: Optional[Dict[str, Any]] = None
+        try:
+            self._parse_directory()
+        except Exception:
+            self.close()
+            raise
+
+    @classmethod
+    def open(cls, path: str) -> 'MemorySnapshot':
+        """以只读内存映射的方式打开快照文件。"""
+        with open(path, "rb") as snapshot_file:
+            if os.fstat(snapshot_file.fileno()).st_size == 0:
+                raise ValueError(f"快照文件 '{path}' 是空文件。")
+            mapped = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapped, source=path)
+
+    def _parse_directory(self) -> None:
+        buffer = self._buffer
+        if len(buffer) < _HEADER.size:
+            raise ValueError(f"快照 '{self.source}' 已损坏 (文件头不完整)。")
+        magic, version, _, section_count = _HEADER.unpack_from(buffer, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"'{self.source}' 不是 CircuitManus 会话快照。")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"不支持的快照版本 {version} (当前支持版本 {SNAPSHOT_VERSION})。")
+        if _HEADER.size + _SECTION_ENTRY.size * section_count > len(buffer):
+            raise ValueError(f"快照 '{self.source}' 已损坏 (段目录不完整)。")
+        for index in range(section_count):
+            tag, offset, length = _SECTION_ENTRY.unpack_from(buffer, _HEADER.size + _SECTION_ENTRY.size * index)
+            if offset + length > len(buffer):
+                raise ValueError(f"快照 '{self.source}' 已损坏 (段 {tag!r} 越界)。")
+            self._sections[tag] = buffer[offset:offset + length]
+        missing = [tag.decode("ascii") for tag in (_SECTION_CIRCUIT_META, _SECTION_CIRCUIT_STRINGS, _SECTION_COMPONENTS,
+                                                   _SECTION_EDGES, _SECTION_MEMORY, _SECTION_LONG_TERM) if tag not in self._sections]
+        if missing:
+            raise ValueError(f"快照 '{self.source}' 缺少数据段: {', '.join(missing)}。")
+
+    def __enter__(self) -> 'MemorySnapshot':
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """释放对快照数据的引用并关闭内存映射。"""
+        self._sections = {}
+        self._buffer.release()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError: # 仍有视图引用映射 (例如异常回溯中的局部变量)，映射在它们被回收时释放
+                logger.debug(f"[MemorySnapshot] 快照 '{self.source}' 仍有数据视图未释放,延迟关闭内存映射。")
+            self._mmap = None
+
+    @property
+    def circuit_meta(self) -> Dict[str, Any]:
+        if self._circuit_meta is None:
+            self._circuit_meta = json.loads(str(self._sections[_SECTION_CIRCUIT_META], "utf-8"))
+        return self._circuit_meta
+
+    @property
+    def component_count(self) -> int:
+        return int(self.circuit_meta["component_count"])
+
+    @property
+    def connection_count(self) -> int:
+        return int(self.circuit_meta["connection_count"])
+
+    def read_short_term(self) -> List[Dict[str, Any]]:
+        return list(json.loads(str(self._sections[_SECTION_MEMORY], "utf-8")).get("short_term", []))
+
+    def read_long_term(self) -> List[str]:
+        return SnapshotStringTable(self._sections[_SECTION_LONG_TERM]).decode_all()
+
+    def component_ids(self) -> SnapshotStringTable:
+        """
+        返回元件ID的惰性视图: 字符串表的前 component_count 项即按升序排列的元件ID。
+        可在不物化电路的情况下按行号读取少量ID。
+        """
+        return SnapshotStringTable(self._sections[_SECTION_CIRCUIT_STRINGS])
+
+    def build_circuit(self, max_journal_entries: int = 5000, storage_backend: Optional[str] = None) -> Circuit:
+        """
+        由快照物化一个新的 Circuit。
+
+        Args:
+            max_journal_entries (int): 新电路操作日志的条目上限。
+            storage_backend (Optional[str]): 存储后端；None 表示使用快照中记录的后端。
+
+        Raises:
+            ValueError: 如果电路数据段已损坏。
+        """
+        meta = self.circuit_meta
+        component_count, connection_count = self.component_count, self.connection_count
+        strings = self.component_ids().decode_all()
+        component_section = self._sections[_SECTION_COMPONENTS]
+        edge_section = self._sections[_SECTION_EDGES]
+        if (len(strings) < component_count or len(component_section) != 8 * component_count
+                or len(edge_section) != 8 * connection_count):
+            raise ValueError(f"快照 '{self.source}' 的电路数据段已损坏。")
+        type_codes = _u32_view(component_section, 0, component_count)
+        value_codes = _u32_view(component_section, 4 * component_count, component_count)
+        edge_rows = _u32_view(edge_section, 0, 2 * connection_count)
+        try:
+            component_rows = ((strings[row], strings[type_codes[row]], strings[value_codes[row]] if value_codes[row] != _NO_VALUE else None)
+                              for row in range(component_count))
+            connections = ((strings[edge_rows[index]], strings[edge_rows[index + 1]]) for index in range(0, 2 * connection_count, 2))
+            circuit = Circuit(max_journal_entries=max_journal_entries, storage_backend=storage_backend or meta.get("storage_backend", "dict"))
+            circuit.load_bulk(component_rows, connections, meta.get("id_allocator"))
+        except IndexError as e:
+            raise ValueError(f"快照 '{self.source}' 的电路数据段已损坏 (字符串编号越界)。") from e
+        finally:
+            # 释放指向内存映射的视图，之后快照才能被关闭
+            for view in (type_codes, value_codes, edge_rows):
+                if isinstance(view, memoryview):
+                    view.release()
+        return circuit
@@ -5,13 +5,31 @@ Contains helper functions or classes for generating system prompts
 for different phases of agent execution.
 """
 from .templates import (
+    PROMPT_TEMPLATE_VERSION,
+    PromptLayout,
+    compute_prompt_prefix_hash,
+    compute_tools_registry_fingerprint,
     get_tool_schemas_for_prompt,
+    get_cached_tool_schemas_for_prompt,
+    get_prompt_section_cache_stats,
+    clear_prompt_section_cache,
     get_planning_prompt,
+    build_planning_prompt,
     get_response_generation_prompt,
+    build_response_generation_prompt,
 )
 
 __all__ = [
+    "PROMPT_TEMPLATE_VERSION",
+    "PromptLayout",
+    "compute_prompt_prefix_hash",
+    "compute_tools_registry_fingerprint",
     "get_tool_schemas_for_prompt",
+    "get_cached_tool_schemas_for_prompt",
+    "get_prompt_section_cache_stats",
+    "clear_prompt_section_cache",
     "get_planning_prompt",
+    "build_planning_prompt",
     "get_response_generation_prompt",
+    "build_response_generation_prompt",
 ]
\ No newline at end of file
@@ -1,11 +1,77 @@
 # IDT_AGENT_NATIVE/circuitmanus/prompts/templates.py
+import json
 import logging
-from uuid import uuid4
+import hashlib
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, NamedTuple, Callable, Tuple
 
 logger = logging.getLogger(__name__)
 
+# 提示模板版本: 修改下列模板的文本时递增，便于区分不同版本模板的提示缓存命中情况
+PROMPT_TEMPLATE_VERSION = "1.1.0"
+
+# 示例中使用固定的ID和时间戳，使静态前缀在每次调用时逐字节相同 (可被模型服务商的提示缓存复用)
+_EXAMPLE_TIMESTAMP_UTC = "2024-07-16T12:00:00.000Z"
+_EXAMPLE_PLAN_LLM_ID_PREFIX = "plan_ex_llm_id_a1b2c3"
+_EXAMPLE_RESP_LLM_ID_PREFIX = "resp_ex_llm_id_d4e5f6"
+_EXAMPLE_PREV_TOOL_CALL_ID = "tc_ex_prev_fail_a1b2c3"
+
+class PromptLayout(NamedTuple):
+    """
+    分为静态前缀和动态后缀的系统提示。
+
+    静态前缀 (规则、输出格式、示例、工具说明) 只依赖模板版本、工具注册表和思考语言，
+    连续的调用共享逐字节相同的前缀，可以命中模型服务商的提示缓存 (prompt caching)；
+    动态后缀包含每次调用都会变化的内容 (请求ID、当前时间、电路与记忆摘要、重规划指示)。
+    prefix_hash 是静态前缀的哈希值，与 LLM 返回的缓存命中 token 数一起用于统计缓存命中率。
+    """
+    static_prefix: str
+    dynamic_suffix: str
+    prefix_hash: str
+
+    @property
+    def text(self) -> str:
+        """完整的系统提示文本。"""
+        return self.static_prefix + self.dynamic_suffix
+
+def compute_prompt_prefix_hash(static_prefix: str) -> str:
+    """返回提示静态前缀的哈希值 (SHA-256 的前16个十六进制字符)。"""
+    return hashlib.sha256(static_prefix.encode("utf-8")).hexdigest()[:16]
+
+def compute_tools_registry_fingerprint(tools_registry: Dict[str, Dict[str, Any]]) -> str:
+    """返回工具注册表内容的哈希 (工具名称与 Schema 的规范化 JSON)，用作提示缓存的键。"""
+    canonical_registry = json.dumps(tools_registry, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical_registry.encode("utf-8")).hexdigest()[:16]
+
+# 渲染好的提示片段 (工具说明、静态前缀) 的进程级缓存，键包含模板版本和工具注册表指纹:
+# 注册或移除工具后指纹改变，旧的条目不再被访问并按最近最少使用的顺序淘汰
+_PROMPT_SECTION_CACHE_MAX_ENTRIES = 64
+_prompt_section_cache: "OrderedDict[Tuple[str, ...], Any]" = OrderedDict()
+_prompt_section_cache_stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+def _get_cached_prompt_section(cache_key: Tuple[str, ...], render: Callable[[], Any]) -> Any:
+    cached_section = _prompt_section_cache.get(cache_key)
+    if cached_section is not None:
+        _prompt_section_cache.move_to_end(cache_key)
+        _prompt_section_cache_stats["hits"] += 1
+        return cached_section
+    _prompt_section_cache_stats["misses"] += 1
+    rendered_section = render()
+    _prompt_section_cache[cache_key] = rendered_section
+    if len(_prompt_section_cache) > _PROMPT_SECTION_CACHE_MAX_ENTRIES:
+        _prompt_section_cache.popitem(last=False)
+    logger.debug(f"[PromptHelper] 已渲染并缓存提示片段 {cache_key}。")
+    return rendered_section
+
+def get_prompt_section_cache_stats() -> Dict[str, int]:
+    """返回提示片段缓存的统计信息 (条目数、命中与未命中次数)。"""
+    return {"entries": len(_prompt_section_cache), **_prompt_section_cache_stats}
+
+def clear_prompt_section_cache() -> None:
+    """清空提示片段缓存 (例如在运行时修改了模板文本之后)。"""
+    _prompt_section_cache.clear()
+
 def get_tool_schemas_for_prompt(tools_registry: Dict[str, Dict[str, Any]]) -> str:
     """
     根据 Agent 的工具注册表，生成一段格式化的文本描述，供 LLM 在提示中使用。
@@ -62,22 +128,25 @@ def get_tool_schemas_for_prompt(tools_registry: Dict[str, Dict[str, Any]]) -> st
     return "\n\n".join(tool_schemas_parts)
 
 
-def get_planning_prompt(tool_schemas_desc: str,
-                             memory_context: str,
-                             is_replanning: bool = False,
-                             request_id: Optional[str] = None,
-                             # 新增参数: 是否启用中文深度思考
-                             enable_deep_thinking_chinese: bool = False 
-                             ) -> str:
-    current_timestamp_utc = datetime.now(timezone.utc).isoformat()
-    llm_interaction_id_example_plan_prefix = f"plan_ex_llm_id_{str(uuid4())[:6]}"
-    example_prev_tool_call_id = f"tc_ex_prev_fail_{str(uuid4())[:6]}"
+def get_cached_tool_schemas_for_prompt(tools_registry: Dict[str, Dict[str, Any]], registry_fingerprint: Optional[str] = None) -> str:
+    """
+    与 get_tool_schemas_for_prompt 相同，但结果按模板版本和工具注册表指纹缓存在进程内。
+    registry_fingerprint 为 None 时根据 tools_registry 计算 (调用方可以传入已算好的指纹以省去计算)。
+    """
+    fingerprint = registry_fingerprint or compute_tools_registry_fingerprint(tools_registry)
+    return _get_cached_prompt_section(("tool_schemas", PROMPT_TEMPLATE_VERSION, fingerprint),
+                                      lambda: get_tool_schemas_for_prompt(tools_registry))
+
 
+def get_planning_prompt_static_prefix(tool_schemas_desc: str, enable_deep_thinking_chinese: bool = False) -> str:
+    """
+    规划阶段系统提示的静态前缀: 角色、输出规范、JSON Schema、检查清单、示例 (固定ID) 和工具说明。
+    相同的参数总是生成逐字节相同的文本。
+    """
     # 根据 enable_deep_thinking_chinese 动态调整 <think> 块和 thoughtProcess JSON字段的语言提示后缀
     think_block_language_instruction = "并且【请使用中文进行思考和阐述此部分内容】" if enable_deep_thinking_chinese else ""
     json_thought_process_language_note = "（如果<think>块使用中文思考，此总结也建议使用中文）" if enable_deep_thinking_chinese else ""
 
-
     reasoning_model_instructions = (
         "\n【重要: Reasoning Model 输出规范 (V1.0.0)】\n"
         f"1.  **思考过程**: 您的详细思考过程、分析、逐步推理和决策逻辑【必须】包含在 `<think>...</think>` 标签内{think_block_language_instruction}，并放在您回复的最开始部分。\n"
@@ -85,22 +154,6 @@ def get_planning_prompt(tool_schemas_desc: str,
         f"3.  **`thoughtProcess` 字段 (in JSON)**: JSON对象内部的 `thoughtProcess` 字段现在是次要的。它可以是一个简短的总结或留空 ( `\"\"` ){json_thought_process_language_note}，因为您的主要思考过程已在 `<think>...</think>` 块中。Agent将优先使用 `<think>` 块中的内容作为思考日志。\n"
     )
 
-    replanning_guidance_think_instruction = f"请在您的 `<think>...</think>` 块中{think_block_language_instruction}：\n"
-    replanning_guidance = ""
-    if is_replanning:
-        replanning_guidance = (
-            "\n【重要: 重规划指示 (V1.0.0 - Reasoning Model)】\n"
-            f"您当前正在进行重规划。这意味着您之前的规划或工具执行遇到了问题。{replanning_guidance_think_instruction}"
-            "1.  **仔细分析失败原因**: 详细检查对话历史中的 `role: tool` 消息 (`content` JSON内的 `status: \"failure\"`, `message`, `errorDetails`) 和 `role: assistant` 消息中可能的Agent解析/校验错误 (`errorDetails.failedValidationPoints`)。\n"
-            "2.  **参考当前电路状态**: 【务必】仔细查阅 `memory_context` 中的【当前电路状态】。您的新计划【必须】基于当前实际存在的元件和连接。不要不必要地重新添加已存在的元件。\n"
-            "3.  **处理抽象节点**: 若涉及连接到 'INPUT', 'OUTPUT', 'GND' 等未作为元件存在的抽象节点失败,优先规划使用 `add_component_tool` (如 `component_type: 'Terminal'`) 创建它们,然后再连接。\n"
-            "4.  **制定修正计划**: 基于以上分析,制定一个【全新的、修正了先前问题的计划】。这应在您的 `<think>...</think>` 块中清晰阐述。\n"
-            "然后,在 `</think>` 之后输出符合V1.0-CamelCaseJSON规范的JSON。如果这个【新JSON本身的顶层 `status` 字段必须设置为 `'success'`】(因为您成功地为【当前这次思考和规划】输出了一个结构完整且逻辑合理的V1.0-CamelCaseJSON JSON)。\n"
-            "5.  **无法解决的情况**: 如果分析后认为无法完成用户核心请求,则在 `<think>...</think>` 中解释,并在 `</think>` 后的JSON中制定一个【直接回复用户并解释情况的计划】 (`status: 'success'`, `isCallTools: False`).\n"
-            "6.  **真正意义上的规划失败**: 只有当您在【当前这次重规划尝试中】,由于自身的理解困难、无法形成任何有效的 `<think>...</think>` 块或后续的V1.0-CamelCaseJSON JSON结构时,才应将后续JSON的顶层 `status` 字段设为 `'failure'`。\n"
-            "**核心原则**: 不要因为*过去*的工具执行失败,就将您*当前新制定*的计划的JSON标记为 `status: 'failure'`. `status` 反映的是您【当前这次生成JSON这个行为本身】的成功与否。\n"
-        )
-
     # JSON Schema 描述 (保持不变，此处不重复粘贴，确保与原文件一致)
     json_schema_description_for_prompt = """
 ```json
@@ -178,9 +231,9 @@ def get_planning_prompt(tool_schemas_desc: str,
         f"<think>\n{direct_qa_example_think_block_text}\n</think>\n"
         "```json\n"
         "{\n"
-        "  \"requestId\": \"" + (request_id or "userReqExampleId123") + "\",\n"
-        "  \"llmInteractionId\": \"" + llm_interaction_id_example_plan_prefix + "_directQaCap\",\n"
-        "  \"timestampUtc\": \"" + current_timestamp_utc + "\",\n"
+        "  \"requestId\": \"userReqExampleId123\",\n"
+        "  \"llmInteractionId\": \"" + _EXAMPLE_PLAN_LLM_ID_PREFIX + "_directQaCap\",\n"
+        "  \"timestampUtc\": \"" + _EXAMPLE_TIMESTAMP_UTC + "\",\n"
         "  \"status\": \"success\",\n"
         "  \"errorDetails\": null,\n"
         "  \"executionPhase\": \"planning\",\n"
@@ -218,9 +271,9 @@ def get_planning_prompt(tool_schemas_desc: str,
         f"<think>\n{tool_call_example_think_block_text}\n</think>\n"
         "```json\n"
         "{\n"
-        "  \"requestId\": \"" + (request_id or "userReqExampleId456") + "\",\n"
-        "  \"llmInteractionId\": \"" + llm_interaction_id_example_plan_prefix + "_multiToolSearchFix2\",\n"
-        "  \"timestampUtc\": \"" + current_timestamp_utc + "\",\n"
+        "  \"requestId\": \"userReqExampleId456\",\n"
+        "  \"llmInteractionId\": \"" + _EXAMPLE_PLAN_LLM_ID_PREFIX + "_multiToolSearchFix2\",\n"
+        "  \"timestampUtc\": \"" + _EXAMPLE_TIMESTAMP_UTC + "\",\n"
         "  \"status\": \"success\",\n"
         "  \"errorDetails\": null,\n"
         "  \"executionPhase\": \"planning\",\n"
@@ -229,25 +282,25 @@ def get_planning_prompt(tool_schemas_desc: str,
         "    \"isCallTools\": true,\n"
         "    \"toolCallRequests\": [\n"
         "      {\n"
-        "        \"toolCallId\": \"tc_add_r1_" + str(uuid4())[:8] + "\",\n"
+        "        \"toolCallId\": \"tc_add_r1_3f9a1c2e\",\n"
         "        \"toolName\": \"add_component_tool\",\n"
         "        \"toolArguments\": {\"component_type\": \"电阻\", \"component_id\": \"R1\", \"value\": \"1kΩ\"},\n"
         "        \"uiHints\": {\"displayNameForTool\": \"添加电阻 R1 (1kΩ)\"}\n"
         "      },\n"
         "      {\n"
-        "        \"toolCallId\": \"tc_search_led_" + str(uuid4())[:8] + "\",\n"
+        "        \"toolCallId\": \"tc_search_led_8b2d47e0\",\n"
         "        \"toolName\": \"duckduckgo_search_tool\",\n"
         "        \"toolArguments\": {\"query\": \"什么是LED\", \"num_results\": 2},\n"
         "        \"uiHints\": {\"displayNameForTool\": \"搜索LED定义(2条结果)\"}\n"
         "      },\n"
         "      {\n"
-        "        \"toolCallId\": \"tc_add_gnd_" + str(uuid4())[:8] + "\",\n"
+        "        \"toolCallId\": \"tc_add_gnd_c61e05fa\",\n"
         "        \"toolName\": \"add_component_tool\",\n"
         "        \"toolArguments\": {\"component_type\": \"地\", \"component_id\": \"GND\"},\n"
         "        \"uiHints\": {\"displayNameForTool\": \"添加地线 GND (如果需要)\"}\n"
         "      },\n"
         "      {\n"
-        "        \"toolCallId\": \"tc_conn_r1gnd_" + str(uuid4())[:8] + "\",\n"
+        "        \"toolCallId\": \"tc_conn_r1gnd_5d7a93b4\",\n"
         "        \"toolName\": \"connect_components_tool\",\n"
         "        \"toolArguments\": {\"comp1_id\": \"R1\", \"comp2_id\": \"GND\"},\n"
         "        \"uiHints\": {\"displayNameForTool\": \"连接 R1 与 GND\"}\n"
@@ -264,12 +317,64 @@ def get_planning_prompt(tool_schemas_desc: str,
         "}\n"
         "```\n"
     )
+
+    important_instructions_think_block_main = f"您的详细逐步推理**必须**在 `<think>...</think>` 标签内{think_block_language_instruction}，并置于回复最开始。"
+    important_instructions_json_thought_process_main = f"此JSON字段现在是次要的。它可以是简短总结或空字符串 `\"\"`{json_thought_process_language_note}。`<think>...</think>` 块中的内容是主要的思考过程。"
+
+    prompt_parts = [
+        "您是一位初版电路设计编程助理 (Agent Version V1.0.0, 11 Tools)。您的任务是理解用户指令,并据此规划行动或直接回复。\n",
+        reasoning_model_instructions,
+        "\n【核心任务: 规划阶段 (V1.0.0)】\n"
+        f"请首先在 `<think>...</think>` 标签内深入分析用户的最新指令、完整的对话历史、当前的电路状态和记忆{think_block_language_instruction}。然后,在 `</think>` 标签之后,生成一个符合V1.0-CamelCaseJSON规范的JSON对象作为您的行动计划或直接回复。JSON中所有key【必须】使用camelCase (例如: `isCallTools`, `toolCallRequests`, `requestId`).\n",
+        "【V1.0.0 输出格式规范 (在</think>之后输出, 必须严格遵守)】:\n",
+        json_schema_description_for_prompt,
+        "\n【重要指令与检查清单 (V1.0.0 - Planning)】:\n"
+        f"1.  **`<think>` Block First**: {important_instructions_think_block_main}\n"
+        "2.  **JSON After `</think>`**: V1.0.0 对象 (用 ```json ... ``` 包裹) **必须**紧跟 `</think>` 标签。此JSON中的所有键名必须是 camelCase (例如, `requestId`, `isCallTools`, `toolCallRequests`)。`toolArguments` 内部的键名 (例如, `component_type`) 应遵循下面工具 Schema 中提供的 snake_case 命名。\n"
+        f"3.  **JSON `thoughtProcess` Field**: {important_instructions_json_thought_process_main}\n"
+        "4.  **`decision.isCallTools`**: JSON中的此字段**必须**是布尔值 (`true` 或 `false`)。大小写不敏感的字符串 \"True\" 或 \"true\" 也可接受,Agent会将其解析为布尔值。\n"
+        "5.  **其他 JSON 字段**: 严格遵循V1.0-CamelCaseJSON Schema 的JSON部分。\n"
+        "6.  **电路状态感知**: 在规划涉及现有元件的工具调用前,请在 `memory_context` (当前电路状态) 中确认它们的存在。如果需要连接像 'INPUT' 这样的抽象节点而它们并非作为元件存在,请首先规划添加它们 (例如,作为 'Terminal')。\n\n",
+        direct_qa_example,
+        tool_call_example,
+        "\n【可用工具列表与参数规范 (V1.0.0 - 11 Tools)】:\n",
+        tool_schemas_desc,
+        "\n\n",
+    ]
+    return "".join(prompt_parts)
+
+
+def get_planning_prompt_dynamic_suffix(memory_context: str,
+                                       is_replanning: bool = False,
+                                       request_id: Optional[str] = None,
+                                       enable_deep_thinking_chinese: bool = False
+                                       ) -> str:
+    """规划阶段系统提示的动态后缀: 重规划指示与示例 (仅重规划时)、请求ID、当前时间、电路与记忆摘要。"""
+    current_timestamp_utc = datetime.now(timezone.utc).isoformat()
+    think_block_language_instruction = "并且【请使用中文进行思考和阐述此部分内容】" if enable_deep_thinking_chinese else ""
+
+    replanning_guidance_think_instruction = f"请在您的 `<think>...</think>` 块中{think_block_language_instruction}：\n"
+    replanning_guidance = ""
+    if is_replanning:
+        replanning_guidance = (
+            "\n【重要: 重规划指示 (V1.0.0 - Reasoning Model)】\n"
+            f"您当前正在进行重规划。这意味着您之前的规划或工具执行遇到了问题。{replanning_guidance_think_instruction}"
+            "1.  **仔细分析失败原因**: 详细检查对话历史中的 `role: tool` 消息 (`content` JSON内的 `status: \"failure\"`, `message`, `errorDetails`) 和 `role: assistant` 消息中可能的Agent解析/校验错误 (`errorDetails.failedValidationPoints`)。\n"
+            "2.  **参考当前电路状态**: 【务必】仔细查阅 `memory_context` 中的【当前电路状态】。您的新计划【必须】基于当前实际存在的元件和连接。不要不必要地重新添加已存在的元件。\n"
+            "3.  **处理抽象节点**: 若涉及连接到 'INPUT', 'OUTPUT', 'GND' 等未作为元件存在的抽象节点失败,优先规划使用 `add_component_tool` (如 `component_type: 'Terminal'`) 创建它们,然后再连接。\n"
+            "4.  **制定修正计划**: 基于以上分析,制定一个【全新的、修正了先前问题的计划】。这应在您的 `<think>...</think>` 块中清晰阐述。\n"
+            "然后,在 `</think>` 之后输出符合V1.0-CamelCaseJSON规范的JSON。如果这个【新JSON本身的顶层 `status` 字段必须设置为 `'success'`】(因为您成功地为【当前这次思考和规划】输出了一个结构完整且逻辑合理的V1.0-CamelCaseJSON JSON)。\n"
+            "5.  **无法解决的情况**: 如果分析后认为无法完成用户核心请求,则在 `<think>...</think>` 中解释,并在 `</think>` 后的JSON中制定一个【直接回复用户并解释情况的计划】 (`status: 'success'`, `isCallTools: False`).\n"
+            "6.  **真正意义上的规划失败**: 只有当您在【当前这次重规划尝试中】,由于自身的理解困难、无法形成任何有效的 `<think>...</think>` 块或后续的V1.0-CamelCaseJSON JSON结构时,才应将后续JSON的顶层 `status` 字段设为 `'failure'`。\n"
+            "**核心原则**: 不要因为*过去*的工具执行失败,就将您*当前新制定*的计划的JSON标记为 `status: 'failure'`. `status` 反映的是您【当前这次生成JSON这个行为本身】的成功与否。\n"
+        )
+
     
     replan_example_think_block_text = "重规划开始。分析历史：用户想连接R10和C5。上一个计划调用 connect_components_tool 失败，原因是元件 'R10' 不存在。当前电路状态确认R10不存在，但C5存在。因此，新计划是首先添加R10（默认为1kΩ电阻），然后再连接R10和C5。本次规划逻辑清晰，JSON状态应为 'success'。"
     if enable_deep_thinking_chinese:
-        replan_example_think_block_text = "重规划开始。分析历史: 用户想连接R10和C5。上一个计划 (llmInteractionId: " + example_prev_tool_call_id + "_plan) 中调用connect_components_tool (toolCallId: " + example_prev_tool_call_id + "_tool) 失败了,工具报告原因是元件 'R10' 在电路中不存在。当前电路状态也确认R10不在电路中，但C5存在。因此,我的新计划是首先添加R10 (用户未指定类型或值,我将默认为电阻,并提供一个常用值如1kΩ). 然后再调用connect_components_tool连接新创建的R10和已存在的C5。本次规划逻辑清晰，后续的JSON应标记为status: 'success'."
+        replan_example_think_block_text = "重规划开始。分析历史: 用户想连接R10和C5。上一个计划 (llmInteractionId: " + _EXAMPLE_PREV_TOOL_CALL_ID + "_plan) 中调用connect_components_tool (toolCallId: " + _EXAMPLE_PREV_TOOL_CALL_ID + "_tool) 失败了,工具报告原因是元件 'R10' 在电路中不存在。当前电路状态也确认R10不在电路中，但C5存在。因此,我的新计划是首先添加R10 (用户未指定类型或值,我将默认为电阻,并提供一个常用值如1kΩ). 然后再调用connect_components_tool连接新创建的R10和已存在的C5。本次规划逻辑清晰，后续的JSON应标记为status: 'success'."
     else:
-        replan_example_think_block_text = "Replanning started. Analyzing history: User wanted to connect R10 and C5. Previous plan (llmInteractionId: " + example_prev_tool_call_id + "_plan) called connect_components_tool (toolCallId: " + example_prev_tool_call_id + "_tool) which failed because component 'R10' does not exist in the circuit. Current circuit state also confirms R10 is missing, but C5 exists. Therefore, my new plan is to first add R10 (user didn't specify type/value, I'll default to resistor and a common value like 1kΩ). Then, I'll call connect_components_tool to connect the newly created R10 and existing C5. This plan is logically sound, so the subsequent JSON should be marked status: 'success'."
+        replan_example_think_block_text = "Replanning started. Analyzing history: User wanted to connect R10 and C5. Previous plan (llmInteractionId: " + _EXAMPLE_PREV_TOOL_CALL_ID + "_plan) called connect_components_tool (toolCallId: " + _EXAMPLE_PREV_TOOL_CALL_ID + "_tool) which failed because component 'R10' does not exist in the circuit. Current circuit state also confirms R10 is missing, but C5 exists. Therefore, my new plan is to first add R10 (user didn't specify type/value, I'll default to resistor and a common value like 1kΩ). Then, I'll call connect_components_tool to connect the newly created R10 and existing C5. This plan is logically sound, so the subsequent JSON should be marked status: 'success'."
 
 
     replan_example = ""
@@ -278,16 +383,16 @@ def get_planning_prompt(tool_schemas_desc: str,
             "\n【重规划示例 (V1.0.0 Reasoning Model Output): 工具失败后,成功重规划并调用新/修正的工具】\n"
             "假设历史记录中有如下用户请求和失败的工具调用: \n"
             "  User: \"连接 R10 和 C5\"\n"
-            "  Assistant (Previous Plan JSON): ... (Planned connect_components_tool for R10, C5, llmInteractionId: " + example_prev_tool_call_id + "_plan) ...\n"
-            "  Tool (connect_components_tool, toolCallId: " + example_prev_tool_call_id + "_tool, name: connect_components_tool) result (in history): { \"role\": \"tool\", ..., \"content\": \"{\\\"status\\\": \\\"failure\\\", \\\"message\\\": \\\"错误: 元件 'R10' 在电路中不存在. \\\", \\\"error\\\": { \\\"error_type\\\": \\\"CIRCUIT_OPERATION_ERROR\\\", \\\"error_code\\\": \\\"COMPONENT_NOT_FOUND_FOR_CONNECTION\\\", ... }}\" }\n"
+            "  Assistant (Previous Plan JSON): ... (Planned connect_components_tool for R10, C5, llmInteractionId: " + _EXAMPLE_PREV_TOOL_CALL_ID + "_plan) ...\n"
+            "  Tool (connect_components_tool, toolCallId: " + _EXAMPLE_PREV_TOOL_CALL_ID + "_tool, name: connect_components_tool) result (in history): { \"role\": \"tool\", ..., \"content\": \"{\\\"status\\\": \\\"failure\\\", \\\"message\\\": \\\"错误: 元件 'R10' 在电路中不存在. \\\", \\\"error\\\": { \\\"error_type\\\": \\\"CIRCUIT_OPERATION_ERROR\\\", \\\"error_code\\\": \\\"COMPONENT_NOT_FOUND_FOR_CONNECTION\\\", ... }}\" }\n"
             "  Current Circuit State (in memory_context): (R10 does not exist, C5 exists)\n"
             "您在【当前重规划】时,您的新V1.0-CamelCaseJSON 输出应类似: \n"
             f"<think>\n{replan_example_think_block_text}\n</think>\n"
             "```json\n"
             "{\n"
-            "  \"requestId\": \"" + (request_id or "userReqExampleId789Replan") + "\",\n"
-            "  \"llmInteractionId\": \"" + llm_interaction_id_example_plan_prefix + "_replanAddConnectFix2\",\n"
-            "  \"timestampUtc\": \"" + current_timestamp_utc + "\",\n"
+            "  \"requestId\": \"userReqExampleId789Replan\",\n"
+            "  \"llmInteractionId\": \"" + _EXAMPLE_PLAN_LLM_ID_PREFIX + "_replanAddConnectFix2\",\n"
+            "  \"timestampUtc\": \"" + _EXAMPLE_TIMESTAMP_UTC + "\",\n"
             "  \"status\": \"success\",\n"
             "  \"errorDetails\": null,\n"
             "  \"executionPhase\": \"planning\",\n"
@@ -296,13 +401,13 @@ def get_planning_prompt(tool_schemas_desc: str,
             "    \"isCallTools\": true,\n"
             "    \"toolCallRequests\": [\n"
             "      {\n"
-            "        \"toolCallId\": \"tc_replan_add_r10_" + str(uuid4())[:8] + "\",\n"
+            "        \"toolCallId\": \"tc_replan_add_r10_e04c2b6d\",\n"
             "        \"toolName\": \"add_component_tool\",\n"
             "        \"toolArguments\": {\"component_type\": \"电阻\", \"component_id\": \"R10\", \"value\": \"1k\"},\n"
             "        \"uiHints\": {\"displayNameForTool\": \"(修正) 添加电阻 R10 (1kΩ)\"}\n"
             "      },\n"
             "      {\n"
-            "        \"toolCallId\": \"tc_replan_connect_r10c5_" + str(uuid4())[:8] + "\",\n"
+            "        \"toolCallId\": \"tc_replan_connect_r10c5_9a1f6c38\",\n"
             "        \"toolName\": \"connect_components_tool\",\n"
             "        \"toolArguments\": {\"comp1_id\": \"R10\", \"comp2_id\": \"C5\"},\n"
             "        \"uiHints\": {\"displayNameForTool\": \"(修正) 连接 R10 与 C5\"}\n"
@@ -317,60 +422,64 @@ def get_planning_prompt(tool_schemas_desc: str,
             "      \"requiresUserClarificationForCurrentRequest\": false\n"
             "    }\n"
             "  },\n"
-            "  \"diagnostics\": {\"parsingFeedbackFromPreviousAttemptId\": \"" + example_prev_tool_call_id + "_plan\"},\n"
+            "  \"diagnostics\": {\"parsingFeedbackFromPreviousAttemptId\": \"" + _EXAMPLE_PREV_TOOL_CALL_ID + "_plan\"},\n"
             "  \"usageMetadata\": null\n"
             "}\n"
             "```\n"
         )
-    
-    important_instructions_think_block_main = f"您的详细逐步推理**必须**在 `<think>...</think>` 标签内{think_block_language_instruction}，并置于回复最开始。"
-    important_instructions_json_thought_process_main = f"此JSON字段现在是次要的。它可以是简短总结或空字符串 `\"\"`{json_thought_process_language_note}。`<think>...</think>` 块中的内容是主要的思考过程。"
-    
-    final_emphasize_think_block_main = f"您的输出【必须】以 `<think>...</think>` 块开始{think_block_language_instruction}，后跟一个被 ```json ... ``` 包围的、严格符合上述V1.0-CamelCaseJSON规范 (所有key使用camelCase) 的单个JSON对象。"
 
+    final_emphasize_think_block_main = f"您的输出【必须】以 `<think>...</think>` 块开始{think_block_language_instruction}，后跟一个被 ```json ... ``` 包围的、严格符合上述V1.0-CamelCaseJSON规范 (所有key使用camelCase) 的单个JSON对象。"
 
-    prompt_parts = [
-        "您是一位初版电路设计编程助理 (Agent Version V1.0.0, 11 Tools)。您的任务是理解用户指令,并据此规划行动或直接回复。\n",
-        reasoning_model_instructions,
-        "\n【核心任务: 规划阶段 (V1.0.0)】\n"
-        f"请首先在 `<think>...</think>` 标签内深入分析用户的最新指令、完整的对话历史、当前的电路状态和记忆{think_block_language_instruction}。然后,在 `</think>` 标签之后,生成一个符合V1.0-CamelCaseJSON规范的JSON对象作为您的行动计划或直接回复。JSON中所有key【必须】使用camelCase (例如: `isCallTools`, `toolCallRequests`, `requestId`).\n",
-        replanning_guidance if is_replanning else "",
-        "【V1.0.0 输出格式规范 (在</think>之后输出, 必须严格遵守)】:\n",
-        json_schema_description_for_prompt,
-        "\n【重要指令与检查清单 (V1.0.0 - Planning)】:\n"
-        f"1.  **`<think>` Block First**: {important_instructions_think_block_main}\n"
-        "2.  **JSON After `</think>`**: V1.0.0 对象 (用 ```json ... ``` 包裹) **必须**紧跟 `</think>` 标签。此JSON中的所有键名必须是 camelCase (例如, `requestId`, `isCallTools`, `toolCallRequests`)。`toolArguments` 内部的键名 (例如, `component_type`) 应遵循下面工具 Schema 中提供的 snake_case 命名。\n"
-        f"3.  **JSON `thoughtProcess` Field**: {important_instructions_json_thought_process_main}\n"
-        "4.  **`decision.isCallTools`**: JSON中的此字段**必须**是布尔值 (`true` 或 `false`)。大小写不敏感的字符串 \"True\" 或 \"true\" 也可接受,Agent会将其解析为布尔值。\n"
-        "5.  **其他 JSON 字段**: 严格遵循V1.0-CamelCaseJSON Schema 的JSON部分。\n"
-        "6.  **电路状态感知**: 在规划涉及现有元件的工具调用前,请在 `memory_context` (当前电路状态) 中确认它们的存在。如果需要连接像 'INPUT' 这样的抽象节点而它们并非作为元件存在,请首先规划添加它们 (例如,作为 'Terminal')。\n\n",
-        direct_qa_example,
-        tool_call_example,
-    ]
-    if is_replanning:
-        prompt_parts.append(replan_example)
-
-    prompt_parts.extend([
-        "\n【可用工具列表与参数规范 (V1.0.0 - 11 Tools)】:\n",
-        tool_schemas_desc,
-        "\n\n【当前上下文信息 (V1.0.0)】:\n"
+    return (
+        replanning_guidance +
+        replan_example +
+        "【当前上下文信息 (V1.0.0)】:\n"
         f"Current Request ID (如果可用,请在JSON的requestId字段中原样返回): {request_id or 'N/A_NOT_PROVIDED_IN_PROMPT_SET_TO_NULL'}\n"
         f"Current UTC Time (供您生成timestampUtc参考): {current_timestamp_utc}\n"
         f"当前电路与记忆摘要:\n{memory_context}\n\n"
         f"【最后再次强调】: {final_emphasize_think_block_main}JSON对象之外不应有任何其他文本。请务必仔细检查 `<think>` 块的使用以及JSON的语法和所有字段的类型及条件要求！"
-    ])
-    return "".join(prompt_parts)
+    )
 
 
-def get_response_generation_prompt(memory_context: str,
-                                        tool_schemas_desc: str,
-                                        request_id: Optional[str] = None,
-                                        # 新增参数: 是否启用中文深度思考
-                                        enable_deep_thinking_chinese: bool = False 
-                                        ) -> str:
-    current_timestamp_utc = datetime.now(timezone.utc).isoformat()
-    llm_interaction_id_example_resp_prefix = f"resp_ex_llm_id_{str(uuid4())[:6]}"
+def build_planning_prompt(tool_schemas_desc: str,
+                          memory_context: str,
+                          is_replanning: bool = False,
+                          request_id: Optional[str] = None,
+                          enable_deep_thinking_chinese: bool = False,
+                          registry_fingerprint: Optional[str] = None
+                          ) -> PromptLayout:
+    """
+    生成规划阶段的系统提示，返回静态前缀、动态后缀和前缀哈希。
+    提供 registry_fingerprint (tool_schemas_desc 所对应工具注册表的指纹) 时，静态前缀及其哈希从进程级缓存中读取。
+    """
+    def render_static_prefix() -> Tuple[str, str]:
+        static_prefix = get_planning_prompt_static_prefix(tool_schemas_desc, enable_deep_thinking_chinese)
+        return static_prefix, compute_prompt_prefix_hash(static_prefix)
+    if registry_fingerprint:
+        static_prefix, prefix_hash = _get_cached_prompt_section(
+            ("planning_prefix", PROMPT_TEMPLATE_VERSION, registry_fingerprint, str(enable_deep_thinking_chinese)), render_static_prefix)
+    else:
+        static_prefix, prefix_hash = render_static_prefix()
+    dynamic_suffix = get_planning_prompt_dynamic_suffix(memory_context, is_replanning, request_id, enable_deep_thinking_chinese)
+    return PromptLayout(static_prefix, dynamic_suffix, prefix_hash)
+
 
+def get_planning_prompt(tool_schemas_desc: str,
+                             memory_context: str,
+                             is_replanning: bool = False,
+                             request_id: Optional[str] = None,
+                             # 新增参数: 是否启用中文深度思考
+                             enable_deep_thinking_chinese: bool = False 
+                             ) -> str:
+    """生成规划阶段的完整系统提示文本 (静态前缀 + 动态后缀)。"""
+    return build_planning_prompt(tool_schemas_desc, memory_context, is_replanning, request_id, enable_deep_thinking_chinese).text
+
+
+def get_response_generation_prompt_static_prefix(tool_schemas_desc: str, enable_deep_thinking_chinese: bool = False) -> str:
+    """
+    响应生成阶段系统提示的静态前缀: 角色、输出规范、JSON Schema、检查清单、示例 (固定ID) 和工具说明。
+    相同的参数总是生成逐字节相同的文本。
+    """
     think_block_language_instruction_resp = "，并且【请使用中文进行思考和阐述此部分内容】" if enable_deep_thinking_chinese else ""
     json_thought_process_language_note_resp = "（如果<think>块使用中文思考，此总结也建议使用中文）" if enable_deep_thinking_chinese else ""
 
@@ -442,9 +551,9 @@ def get_response_generation_prompt(memory_context: str,
         f"<think>\n{response_gen_example_think_block_text}\n</think>\n"
         "```json\n"
         "{\n"
-        "  \"requestId\": \"" + (request_id or "userReqExampleIdResp123") + "\",\n"
-        "  \"llmInteractionId\": \"" + llm_interaction_id_example_resp_prefix + "_finalSummaryRSearchFix2\",\n" 
-        "  \"timestampUtc\": \"" + current_timestamp_utc + "\",\n"
+        "  \"requestId\": \"userReqExampleIdResp123\",\n"
+        "  \"llmInteractionId\": \"" + _EXAMPLE_RESP_LLM_ID_PREFIX + "_finalSummaryRSearchFix2\",\n" 
+        "  \"timestampUtc\": \"" + _EXAMPLE_TIMESTAMP_UTC + "\",\n"
         "  \"status\": \"success\",\n"
         "  \"errorDetails\": null,\n"
         "  \"executionPhase\": \"response_generation\",\n"
@@ -469,7 +578,6 @@ def get_response_generation_prompt(memory_context: str,
     )
     
     important_instructions_resp_think_block_main = f"您的详细工具结果分析和回复构思**必须**在 `<think>...</think>` 标签内{think_block_language_instruction_resp}。"
-    final_emphasize_resp_think_block_main = f"您的输出【必须】以 `<think>...</think>` 块开始{think_block_language_instruction_resp}，后跟一个被 ```json ... ``` 包围的、严格符合上述V1.0-CamelCaseJSON规范 (所有key使用camelCase) 的单个JSON对象。"
 
     return (
         "您是一位初版电路设计编程助理 (Agent Version V1.0.0, 11 Tools), 经验丰富,技术精湛,并且极其擅长清晰、准确、诚实地汇报工作结果。\n"
@@ -487,10 +595,55 @@ def get_response_generation_prompt(memory_context: str,
         "6.  **`decision.responseToUser.content`**: 这是您基于所有先前步骤生成的【最终、完整、友好】的文本回复。它【不能】为空字符串或仅包含空白。\n"
         "7.  **回顾工具结果**: 仔细检查对话历史中 `role: tool` 的消息。您的最终回复必须准确反映这些结果。\n\n"
         f"{response_gen_example}\n"
+        f"我的可用工具列表 (共11个, 仅供你参考,此阶段不应再调用它们):\n{tool_schemas_desc}\n\n"
+    )
+
+
+def get_response_generation_prompt_dynamic_suffix(memory_context: str,
+                                                  request_id: Optional[str] = None,
+                                                  enable_deep_thinking_chinese: bool = False
+                                                  ) -> str:
+    """响应生成阶段系统提示的动态后缀: 请求ID、当前时间、电路与记忆摘要。"""
+    current_timestamp_utc = datetime.now(timezone.utc).isoformat()
+    think_block_language_instruction_resp = "，并且【请使用中文进行思考和阐述此部分内容】" if enable_deep_thinking_chinese else ""
+    final_emphasize_resp_think_block_main = f"您的输出【必须】以 `<think>...</think>` 块开始{think_block_language_instruction_resp}，后跟一个被 ```json ... ``` 包围的、严格符合上述V1.0-CamelCaseJSON规范 (所有key使用camelCase) 的单个JSON对象。"
+
+    return (
         "【上下文参考信息 (仅供你回顾 - V1.0.0)】:\n"
         f"Current Request ID (如果可用,请在JSON的requestId字段中原样返回): {request_id or 'N/A_NOT_PROVIDED_IN_PROMPT_SET_TO_NULL'}\n"
         f"Current UTC Time (供您生成timestampUtc参考): {current_timestamp_utc}\n"
         f"当前电路与记忆摘要:\n{memory_context}\n"
-        f"我的可用工具列表 (共11个, 仅供你参考,此阶段不应再调用它们):\n{tool_schemas_desc}\n\n"
         f"【最后再次强调】: {final_emphasize_resp_think_block_main}在这个阶段,您【绝对不能】再请求调用任何新工具。您的任务是总结并回复。"
     )
+
+
+def build_response_generation_prompt(memory_context: str,
+                                     tool_schemas_desc: str,
+                                     request_id: Optional[str] = None,
+                                     enable_deep_thinking_chinese: bool = False,
+                                     registry_fingerprint: Optional[str] = None
+                                     ) -> PromptLayout:
+    """
+    生成响应生成阶段的系统提示，返回静态前缀、动态后缀和前缀哈希。
+    提供 registry_fingerprint 时，静态前缀及其哈希从进程级缓存中读取 (见 build_planning_prompt)。
+    """
+    def render_static_prefix() -> Tuple[str, str]:
+        static_prefix = get_response_generation_prompt_static_prefix(tool_schemas_desc, enable_deep_thinking_chinese)
+        return static_prefix, compute_prompt_prefix_hash(static_prefix)
+    if registry_fingerprint:
+        static_prefix, prefix_hash = _get_cached_prompt_section(
+            ("response_generation_prefix", PROMPT_TEMPLATE_VERSION, registry_fingerprint, str(enable_deep_thinking_chinese)), render_static_prefix)
+    else:
+        static_prefix, prefix_hash = render_static_prefix()
+    dynamic_suffix = get_response_generation_prompt_dynamic_suffix(memory_context, request_id, enable_deep_thinking_chinese)
+    return PromptLayout(static_prefix, dynamic_suffix, prefix_hash)
+
+
+def get_response_generation_prompt(memory_context: str,
+                                        tool_schemas_desc: str,
+                                        request_id: Optional[str] = None,
+                                        # 新增参数: 是否启用中文深度思考
+                                        enable_deep_thinking_chinese: bool = False 
+                                        ) -> str:
+    """生成响应生成阶段的完整系统提示文本 (静态前缀 + 动态后缀)。"""
+    return build_response_generation_prompt(memory_context, tool_schemas_desc, request_id, enable_deep_thinking_chinese).text
@@ -0,0 +1,40 @@
+# IDT_AGENT_Pro/circuitmanus/request_context.py
+import contextvars
+from typing import List, Dict, Any, Optional
+
+class RequestContext:
+    """
+    一次用户请求的状态: 请求ID、本次使用的模型与是否启用中文深度思考、本请求是否已取得
+    会话的修改锁 (见 CircuitAgent.mutation_lock)，以及本请求的对话轮次 (turn_messages)。
+
+    turn_messages 缓存本请求产生的用户消息、计划、工具结果和回复，请求结束时才一次性写入短期记忆，
+    因此同一会话中并发的请求不会把各自的消息交错写进同一段对话历史。
+
+    请求状态不再写在 Agent 实例上，而是通过 contextvars 随请求所在的任务传递
+    (asyncio.to_thread 会复制上下文，在线程中执行的同步工具同样可以读取)，
+    因此同一个 Agent 可以同时处理多个请求。
+    """
+    __slots__ = ("request_id", "llm_identifier", "enable_chinese_thinking", "holds_mutation_lock", "turn_messages")
+
+    def __init__(self, request_id: str, llm_identifier: str, enable_chinese_thinking: bool):
+        self.request_id: str = request_id
+        self.llm_identifier: str = llm_identifier
+        self.enable_chinese_thinking: bool = enable_chinese_thinking
+        self.holds_mutation_lock: bool = False
+        self.turn_messages: List[Dict[str, Any]] = []
+
+_current_request_context: contextvars.ContextVar[Optional[RequestContext]] = contextvars.ContextVar(
+    "circuitmanus_request_context", default=None
+)
+
+def get_request_context() -> Optional[RequestContext]:
+    """返回当前任务正在处理的请求的上下文；不在请求处理中时返回 None。"""
+    return _current_request_context.get()
+
+def set_request_context(request_context: Optional[RequestContext]) -> contextvars.Token:
+    """设置当前任务的请求上下文，返回用于 reset_request_context 的令牌。"""
+    return _current_request_context.set(request_context)
+
+def reset_request_context(token: contextvars.Token) -> None:
+    """恢复 set_request_context 之前的请求上下文。"""
+    _current_request_context.reset(token)
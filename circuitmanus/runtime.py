@@ -0,0 +1,245 @@
+# IDT_AGENT_Pro/circuitmanus/runtime.py
+import os
+import json
+import inspect
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Callable, Set, Tuple
+
+from .utils.config_loader import ConfigLoader
+from .utils.logging_config import setup_logging
+from .llm.interface import LLMInterface
+from .llm.parser import OutputParser
+from .memory.context import ContextAssembler
+from .tools import circuit_ops
+from .tools import web_search
+from .tools import analysis_ops
+from .tools import netlist_ops
+from .prompts.templates import compute_tools_registry_fingerprint, get_cached_tool_schemas_for_prompt
+
+# 提供工具的模块，工具函数由 @register_tool 标记
+TOOL_MODULES = (circuit_ops, web_search, analysis_ops, netlist_ops)
+
+class AgentRuntime:
+    """
+    进程级的 Agent 运行时: 保存所有会话共享、创建后不再改变的状态——配置、日志、模型可用性、
+    工具注册表与提示用的工具说明文本、输出解析器、LLM 客户端以及各项重试设置。
+    工具注册表只通过 register_tool_function / unregister_tool 修改，两者会更新注册表指纹，
+    按指纹缓存的工具说明和提示静态前缀随之失效。
+
+    每个进程 (每组配置文件) 只创建一次，通过 get_shared 获取。CircuitAgent 只持有会话自己的
+    记忆与请求状态，其余属性都委托给运行时，因此创建一个会话几乎没有开销。
+    """
+    _shared_runtimes: Dict[Tuple[str, Optional[str]], "AgentRuntime"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, config_yaml_path: str = "config.yaml", dotenv_path: Optional[str] = None):
+        self.config_loader = ConfigLoader(yaml_config_path=config_yaml_path, dotenv_path=dotenv_path)
+        self.api_key: str = self.config_loader.get_env_var("ZHIPUAI_API_KEY", "")
+
+        log_level_console_str: str = self.config_loader.get_config("agent_settings.logging.log_level_console", "INFO")
+        log_level_file_str: str = self.config_loader.get_config("agent_settings.logging.log_level_file", "DEBUG")
+        log_dir_cfg: Optional[str] = self.config_loader.get_config("agent_settings.logging.log_dir", None)
+        self.verbose_mode: bool = (log_level_console_str.upper() == "DEBUG")
+        console_level_int = getattr(logging, log_level_console_str.upper(), logging.INFO)
+        file_level_int = getattr(logging, log_level_file_str.upper(), logging.DEBUG)
+        self.logger = setup_logging(
+            console_log_level=console_level_int,
+            file_log_level=file_level_int,
+            log_dir_override=log_dir_cfg
+        )
+
+        self.default_llm_identifier: str = self.config_loader.get_config("agent_settings.llm.default_model_identifier", "zhipu-ai")
+        self.default_enable_chinese_thinking: bool = self.config_loader.get_config("agent_settings.prompts.enable_deep_thinking_chinese_default", False)
+        self.model_availability_details: List[Dict[str, Any]] = self._detect_model_availability()
+
+        self.logger.info(f"\n{'='*30} AgentRuntime 初始化开始 {'='*30}")
+        self.logger.info(f"Agent配置已从 '{os.path.abspath(config_yaml_path)}' 和 .env (如果存在) 加载。")
+        self.logger.info(f"Agent verbose_mode (推导自 console_log_level='{log_level_console_str}'): {self.verbose_mode}")
+        self.logger.info(f"默认LLM标识符: '{self.default_llm_identifier}', 默认中文深度思考: {self.default_enable_chinese_thinking}")
+        self.logger.info(f"模型可用性详情: {json.dumps(self.model_availability_details, ensure_ascii=False)}")
+
+        # 工具只在这里发现一次；会话 Agent 在被访问时才把工具函数绑定到自身 (见 CircuitAgent.__getattr__)
+        self.tool_functions: Dict[str, Callable[..., Any]] = {}
+        self.tools_registry: Dict[str, Dict[str, Any]] = {}
+        self.read_only_tools: Set[str] = set() # 不修改电路的工具 (@register_tool(read_only=True))
+        self.speculative_safe_tools: Set[str] = set() # 可在计划确认前提前执行的工具 (@register_tool(speculative_safe=True))
+        self.tools_registry_fingerprint: str = "" # 工具注册表内容的哈希，注册或移除工具时更新 (提示缓存的键)
+        self._discover_tools()
+        self._refresh_tools_registry_fingerprint()
+
+        self.memory_settings: Dict[str, Any] = {
+            "max_short_term_items": self.config_loader.get_config("agent_settings.memory.max_short_term_items", 30),
+            "max_long_term_items": self.config_loader.get_config("agent_settings.memory.max_long_term_items", 75),
+            "circuit_context_token_budget": self.config_loader.get_config("agent_settings.memory.circuit_context_token_budget", 6000),
+            "summary_recent_messages": self.config_loader.get_config("agent_settings.memory.summary_recent_messages", 6),
+            "summary_max_hubs": self.config_loader.get_config("agent_settings.memory.summary_max_hubs", 10),
+            "summary_max_groups": self.config_loader.get_config("agent_settings.memory.summary_max_groups", 10),
+            "max_undo_journal_entries": self.config_loader.get_config("agent_settings.memory.max_undo_journal_entries", 5000),
+            "circuit_storage_backend": self.config_loader.get_config("agent_settings.memory.circuit_storage_backend", "dict"),
+        }
+        self.recent_long_term_count_for_prompt: int = self.config_loader.get_config("agent_settings.memory.recent_long_term_count_for_prompt", 7)
+        # 发送给 LLM 的消息按各模型的上下文 token 预算装配 (见 ContextAssembler)
+        self.context_assembler = ContextAssembler(
+            max_tool_message_tokens=self.config_loader.get_config("agent_settings.memory.max_tool_message_tokens", 1500)
+        )
+        self.context_token_budgets: Dict[str, int] = {
+            "zhipu-ai": self.config_loader.get_config("agent_settings.llm.zhipuai_settings.context_token_budget", 24000),
+            "deepseek": self.config_loader.get_config("agent_settings.llm.deepseek_settings.context_token_budget", 48000),
+        }
+        self.max_tool_retries: int = self.config_loader.get_config("agent_settings.tools.max_tool_retries", 1)
+        self.tool_retry_delay_seconds: float = self.config_loader.get_config("agent_settings.tools.tool_retry_delay_seconds", 1.0)
+
+        try:
+            self.llm_interface = LLMInterface(runtime=self)
+            self.output_parser = OutputParser(agent_tools_registry=self.tools_registry)
+        except (ValueError, ConnectionError, TypeError) as e:
+            self.logger.critical(f"[AgentRuntime Init] 核心模块实例化失败: {e}", exc_info=True)
+            raise
+
+        self.planning_llm_retries: int = self.config_loader.get_config("agent_settings.llm.planning_llm_retries", 3)
+        self.response_generation_llm_retries: int = self.config_loader.get_config("agent_settings.llm.response_generation_llm_retries", 1)
+        self.thinking_stream_flush_seconds: float = float(self.config_loader.get_config("agent_settings.llm.thinking_stream_flush_seconds", 0.1))
+        self.max_replanning_attempts: int = self.config_loader.get_config("agent_settings.orchestration.max_replanning_attempts", 2)
+        self.rollback_failed_tool_chains: bool = self.config_loader.get_config("agent_settings.orchestration.rollback_failed_tool_chains", False)
+        self.erc_after_tool_batches: bool = self.config_loader.get_config("agent_settings.orchestration.erc_after_tool_batches", True)
+        self.early_tool_dispatch: bool = self.config_loader.get_config("agent_settings.orchestration.early_tool_dispatch", True)
+
+        self.logger.info(f"[AgentRuntime Init] LLM规划重试: {self.planning_llm_retries}, LLM响应生成重试: {self.response_generation_llm_retries}, 工具执行重试: {self.max_tool_retries}, 最大重规划尝试: {self.max_replanning_attempts}。")
+        self.logger.info(f"\n{'='*30} AgentRuntime 初始化成功 {'='*30}\n")
+
+    @classmethod
+    def get_shared(cls, config_yaml_path: str = "config.yaml", dotenv_path: Optional[str] = None) -> "AgentRuntime":
+        """返回同一组配置文件对应的共享运行时，首次调用时创建。"""
+        key = (os.path.abspath(config_yaml_path), os.path.abspath(dotenv_path) if dotenv_path else None)
+        runtime = cls._shared_runtimes.get(key)
+        if runtime is None:
+            with cls._shared_lock:
+                runtime = cls._shared_runtimes.get(key)
+                if runtime is None:
+                    runtime = cls(config_yaml_path=config_yaml_path, dotenv_path=dotenv_path)
+                    cls._shared_runtimes[key] = runtime
+        return runtime
+
+    async def aclose(self) -> None:
+        """释放运行时持有的网络资源 (LLM 客户端的连接池)。"""
+        await self.llm_interface.aclose()
+
+    @classmethod
+    async def aclose_shared(cls) -> None:
+        """关闭所有共享运行时 (进程退出前调用)。"""
+        with cls._shared_lock:
+            runtimes = list(cls._shared_runtimes.values())
+            cls._shared_runtimes.clear()
+        for runtime in runtimes:
+            await runtime.aclose()
+
+    @property
+    def tool_schemas_for_prompt(self) -> str:
+        """提示用的工具说明文本，按工具注册表指纹缓存 (注册或移除工具后自动重新生成)。"""
+        return get_cached_tool_schemas_for_prompt(self.tools_registry, self.tools_registry_fingerprint)
+
+    def _refresh_tools_registry_fingerprint(self) -> None:
+        self.tools_registry_fingerprint = compute_tools_registry_fingerprint(self.tools_registry)
+        self.logger.debug(f"[AgentRuntime] 工具注册表指纹: {self.tools_registry_fingerprint} ({len(self.tools_registry)} 个工具)。")
+
+    def register_tool_function(self, name: str, func: Callable[..., Any]) -> None:
+        """
+        注册 (或替换) 一个被 @register_tool 标记的工具函数，之后创建的提示会包含它。
+
+        Raises:
+            ValueError: 如果函数没有被 @register_tool 标记或其 Schema 无效。
+        """
+        schema = getattr(func, '_tool_schema', None)
+        if not getattr(func, '_is_tool', False) or not isinstance(schema, dict) or 'description' not in schema or 'parameters' not in schema:
+            raise ValueError(f"函数 '{name}' 没有通过 @register_tool 注册有效的工具 Schema。")
+        self.tool_functions[name] = func
+        self.tools_registry[name] = schema
+        if getattr(func, '_tool_read_only', False):
+            self.read_only_tools.add(name)
+        else:
+            self.read_only_tools.discard(name)
+        if getattr(func, '_tool_speculative_safe', False):
+            self.speculative_safe_tools.add(name)
+        else:
+            self.speculative_safe_tools.discard(name)
+        self._refresh_tools_registry_fingerprint()
+        self.logger.info(f"[AgentRuntime] ✓ 已注册工具: '{name}' (是否异步: {inspect.iscoroutinefunction(func)})。")
+
+    def unregister_tool(self, name: str) -> bool:
+        """移除一个工具，返回该工具是否存在。"""
+        if name not in self.tools_registry:
+            return False
+        self.tools_registry.pop(name, None)
+        self.tool_functions.pop(name, None)
+        self.read_only_tools.discard(name)
+        self.speculative_safe_tools.discard(name)
+        self._refresh_tools_registry_fingerprint()
+        self.logger.info(f"[AgentRuntime] 已移除工具: '{name}'。")
+        return True
+
+    def get_context_token_budget(self, llm_identifier: str) -> int:
+        """返回模型的上下文 token 预算 (系统提示 + 对话历史)，未配置的模型使用最小的已配置预算。"""
+        return self.context_token_budgets.get(llm_identifier, min(self.context_token_budgets.values()))
+
+    def is_modifying_tool_batch(self, tool_requests: List[Dict[str, Any]]) -> bool:
+        """一批工具调用中是否有可能修改电路的工具 (未知的工具名按会修改处理)。"""
+        return any(not isinstance(tool_request, dict) or tool_request.get("toolName") not in self.read_only_tools
+                   for tool_request in tool_requests)
+
+    def is_speculative_safe_tool(self, tool_request: Dict[str, Any]) -> bool:
+        """工具调用能否在计划确认前被提前执行 (未知的工具名按不可提前执行处理)。"""
+        return isinstance(tool_request, dict) and tool_request.get("toolName") in self.speculative_safe_tools
+
+    def _detect_model_availability(self) -> List[Dict[str, Any]]:
+        """根据 API Key 的配置情况判断各模型是否可用。"""
+        model_availability_details: List[Dict[str, Any]] = []
+        configured_llm_identifiers = self.config_loader.get_config("agent_settings.llm.available_models", [])
+        for model_id in configured_llm_identifiers:
+            is_available = False
+            display_name = model_id # 默认显示名称
+            if model_id == "zhipu-ai":
+                is_available = bool(self.api_key)
+                display_name = "智谱清言 (GLM)"
+                if not is_available:
+                    self.logger.warning("智谱AI API Key未配置，智谱模型将不可用。")
+            elif model_id == "deepseek":
+                is_available = bool(self.config_loader.get_env_var("DEEPSEEK_API_KEY"))
+                display_name = "DeepSeek 大模型"
+                if not is_available:
+                    self.logger.warning("DeepSeek API Key未配置，DeepSeek模型将不可用。")
+            model_availability_details.append({
+                "id": model_id,
+                "name": display_name, # 前端将使用这个名字作为选项文本
+                "available": is_available
+            })
+        return model_availability_details
+
+    def _discover_tools(self) -> None:
+        """从工具模块中收集被 @register_tool 标记的函数及其 Schema。"""
+        self.logger.info("[AgentRuntime Init] 正在发现并注册工具...")
+        for module in TOOL_MODULES:
+            for name, func in inspect.getmembers(module, inspect.isfunction):
+                if not getattr(func, '_is_tool', False):
+                    continue
+                schema = getattr(func, '_tool_schema', None)
+                if schema and isinstance(schema, dict) and 'description' in schema and 'parameters' in schema:
+                    self.tool_functions[name] = func
+                    self.tools_registry[name] = schema
+                    if getattr(func, '_tool_read_only', False):
+                        self.read_only_tools.add(name)
+                    if getattr(func, '_tool_speculative_safe', False):
+                        self.speculative_safe_tools.add(name)
+                    self.logger.info(f"[AgentRuntime Init] ✓ 已注册工具: '{name}' (来自模块: {module.__name__}, 是否异步: {inspect.iscoroutinefunction(func)})。")
+                else:
+                    self.logger.warning(f"[AgentRuntime Init] 在模块 {module.__name__} 中发现函数 '{name}' 被标记为工具,但其 Schema 结构不完整或无效,已跳过注册。")
+
+        if not self.tools_registry:
+            self.logger.warning("[AgentRuntime Init] 未发现任何通过 @register_tool 注册的工具！Agent 功能将受限。")
+        else:
+            self.logger.info(f"[AgentRuntime Init] 共注册了 {len(self.tools_registry)} 个工具 (其中只读工具 {len(self.read_only_tools)} 个)。")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                try:
+                    self.logger.debug(f"[AgentRuntime Init] 工具注册表详情:\n{json.dumps(self.tools_registry, indent=2, ensure_ascii=False)}")
+                except Exception as e_dump:
+                    self.logger.debug(f"无法序列化工具注册表进行日志记录: {e_dump}")
@@ -0,0 +1,12 @@
+# IDT_AGENT_Pro/circuitmanus/sessions/__init__.py
+"""
+Session Persistence.
+Pluggable stores for per-session memory snapshots and an in-memory LRU cache
+that hydrates agents on demand and writes modified sessions back in the background.
+"""
+from .store import (SessionStore, SQLiteSessionStore, FileSessionStore, create_session_store,
+                    is_persistable_session_id, SESSION_STORE_BACKENDS)
+from .cache import SessionCache
+
+__all__ = ["SessionStore", "SQLiteSessionStore", "FileSessionStore", "create_session_store",
+           "is_persistable_session_id", "SESSION_STORE_BACKENDS", "SessionCache"]
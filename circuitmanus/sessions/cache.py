@@ -0,0 +1,282 @@
+# IDT_AGENT_Pro/circuitmanus/sessions/cache.py
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from .store import SessionStore, is_persistable_session_id
+
+logger = logging.getLogger(__name__)
+
+class _SessionEntry:
+    """
+    缓存中的一个会话: Agent 实例、会话锁、最近使用时间、是否有未写回的修改、被占用的次数，
+    以及是否允许写回 (已有的快照读取失败且无法隔离时为 False，避免用空会话覆盖它)。
+    """
+    __slots__ = ("agent", "lock", "last_used", "dirty", "pin_count", "persistable")
+
+    def __init__(self, agent: Any):
+        self.agent = agent
+        # 使用 Agent 自己的状态锁 (工具批次执行期间持有)，写回快照时电路不会被同时修改
+        agent_state_lock = getattr(agent, "state_lock", None)
+        self.lock: asyncio.Lock = agent_state_lock if isinstance(agent_state_lock, asyncio.Lock) else asyncio.Lock()
+        self.last_used: float = time.monotonic()
+        self.dirty: bool = False
+        self.pin_count: int = 0
+        self.persistable: bool = True
+
+class SessionCache:
+    """
+    会话的内存 LRU 缓存，带写回 (write-behind) 持久化。
+
+    - 访问不在缓存中的会话时，由 agent_factory 创建 Agent，并从会话存储恢复其记忆 (按需加载)。
+    - 处理完消息后调用 mark_dirty 标记会话；后台任务每隔 flush_interval_seconds 把有修改的会话
+      序列化为快照写入存储，不阻塞消息处理。序列化在会话锁 (Agent 的 state_lock) 内进行，写入时电路不会被同时修改。
+    - 缓存超过 max_sessions 个会话，或会话闲置超过 idle_timeout_seconds 时，按最近最少使用的顺序
+      把会话写回并移出内存。被占用 (acquire/use，例如仍连接着 WebSocket、正在处理请求) 或持有会话锁的会话不会被移出。
+
+    Attributes:
+        max_sessions (int): 缓存中最多保留的会话数 (被占用的会话可以使实际数量暂时超出)。
+        idle_timeout_seconds (float): 会话闲置多久后被移出内存；0 表示不按闲置时间移出。
+        flush_interval_seconds (float): 后台写回的间隔秒数。
+    """
+    def __init__(self, agent_factory: Callable[[str], Any], store: Optional[SessionStore] = None,
+                 max_sessions: int = 200, idle_timeout_seconds: float = 900.0, flush_interval_seconds: float = 5.0):
+        """
+        Args:
+            agent_factory (Callable[[str], Any]): 以会话ID创建一个新 Agent 实例的函数 (实例需有 memory_manager 属性)。
+            store (Optional[SessionStore]): 会话存储；None 表示不持久化 (移出缓存的会话直接丢弃)。
+        """
+        self._agent_factory = agent_factory
+        self._store = store
+        self.max_sessions: int = max(1, max_sessions)
+        self.idle_timeout_seconds: float = max(0.0, idle_timeout_seconds)
+        self.flush_interval_seconds: float = max(0.1, flush_interval_seconds)
+        self._entries: "OrderedDict[str, _SessionEntry]" = OrderedDict() # 按最近使用时间排序，最旧的在前
+        self._hydrating: Dict[str, asyncio.Task] = {}
+        self._flusher_task: Optional[asyncio.Task] = None
+        self._stats: Dict[str, int] = {"created": 0, "restored": 0, "evicted": 0, "flushed": 0, "flush_failures": 0, "quarantined": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: object) -> bool:
+        return session_id in self._entries
+
+    def _can_persist(self, session_id: str, entry: _SessionEntry) -> bool:
+        return self._store is not None and entry.persistable and is_persistable_session_id(session_id)
+
+    async def get(self, session_id: str) -> Any:
+        """
+        返回会话的 Agent 实例，不在缓存中时创建并从存储恢复。
+        需要在多次 await 之间持续使用 Agent 时，请使用 acquire/use 占用会话，防止其被移出缓存。
+        """
+        entry = self._entries.get(session_id)
+        if entry is None:
+            entry = await self._hydrate(session_id)
+        entry.last_used = time.monotonic()
+        self._entries.move_to_end(session_id)
+        return entry.agent
+
+    async def _hydrate(self, session_id: str) -> _SessionEntry:
+        task = self._hydrating.get(session_id)
+        if task is None: # 同一会话的并发请求共享一次恢复
+            task = asyncio.ensure_future(self._create_entry(session_id))
+            self._hydrating[session_id] = task
+            task.add_done_callback(lambda _: self._hydrating.pop(session_id, None))
+        entry = await asyncio.shield(task)
+        await self._evict_overflow(keep_session_id=session_id)
+        return entry
+
+    async def _create_entry(self, session_id: str) -> _SessionEntry:
+        agent = self._agent_factory(session_id)
+        self._stats["created"] += 1
+        entry = _SessionEntry(agent)
+        if self._can_persist(session_id, entry):
+            try:
+                snapshot = await asyncio.to_thread(self._store.load, session_id)
+                if snapshot is not None:
+                    # 只读取记忆段，电路在首次被访问时才物化
+                    agent.memory_manager.restore_snapshot(snapshot)
+                    self._stats["restored"] += 1
+                    logger.info(f"[SessionCache] 会话 {session_id} 已从存储恢复。")
+            except ValueError as e_corrupt: # 快照已损坏: 隔离后以空会话开始，之后正常写回
+                await self._quarantine_snapshot(session_id, entry, e_corrupt)
+            except Exception as e:
+                # 读取失败 (例如 I/O 错误) 不代表快照损坏: 本次以空会话开始，但不写回，避免覆盖存储中的快照
+                entry.persistable = False
+                logger.error(f"[SessionCache] 会话 {session_id} 的快照无法读取,将以不写回的空会话开始: {e}", exc_info=True)
+        self._entries[session_id] = entry
+        return entry
+
+    async def _quarantine_snapshot(self, session_id: str, entry: _SessionEntry, error: Exception) -> None:
+        try:
+            quarantined_location = await asyncio.to_thread(self._store.quarantine, session_id)
+        except Exception as e_quarantine:
+            entry.persistable = False
+            logger.error(f"[SessionCache] 会话 {session_id} 的快照已损坏 ({error}) 且无法隔离 ({e_quarantine}),"
+                         f"将以不写回的空会话开始。", exc_info=True)
+            return
+        self._stats["quarantined"] += 1
+        logger.warning(f"[SessionCache] 会话 {session_id} 的快照已损坏,已隔离到 '{quarantined_location}',将以空会话开始: {error}")
+
+    def get_lock(self, session_id: str) -> asyncio.Lock:
+        """
+        返回会话锁，即 Agent 的 state_lock (执行工具批次、导入网表等读写电路的操作需要短时间持有)。
+
+        Raises:
+            KeyError: 如果会话不在缓存中 (应先调用 get/acquire)。
+        """
+        return self._entries[session_id].lock
+
+    async def acquire(self, session_id: str) -> Any:
+        """占用会话并返回其 Agent: 在 release 之前会话不会被移出缓存 (例如 WebSocket 连接期间)。"""
+        agent = await self.get(session_id)
+        self._entries[session_id].pin_count += 1
+        return agent
+
+    def release(self, session_id: str) -> None:
+        """解除一次 acquire 的占用。"""
+        entry = self._entries.get(session_id)
+        if entry is not None and entry.pin_count > 0:
+            entry.pin_count -= 1
+            entry.last_used = time.monotonic()
+
+    @asynccontextmanager
+    async def use(self, session_id: str) -> AsyncIterator[Any]:
+        """在上下文期间占用会话: async with cache.use(session_id) as agent: ..."""
+        agent = await self.acquire(session_id)
+        try:
+            yield agent
+        finally:
+            self.release(session_id)
+
+    def mark_dirty(self, session_id: str) -> None:
+        """标记会话的记忆或电路已被修改，由后台任务稍后写回存储。"""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            logger.warning(f"[SessionCache] 标记修改的会话 {session_id} 已不在缓存中,本次修改不会被写回。")
+            return
+        entry.dirty = True
+        entry.last_used = time.monotonic()
+
+    async def _flush_locked(self, session_id: str, entry: _SessionEntry) -> bool:
+        """在持有会话锁的情况下把会话写回存储。"""
+        if not self._can_persist(session_id, entry):
+            entry.dirty = False
+            return False
+        entry.dirty = False
+        try:
+            payload = await asyncio.to_thread(entry.agent.memory_manager.dump_snapshot_bytes)
+            await asyncio.to_thread(self._store.save, session_id, payload)
+        except Exception as e:
+            entry.dirty = True # 保留标记，下一轮重试
+            self._stats["flush_failures"] += 1
+            logger.error(f"[SessionCache] 会话 {session_id} 写回存储失败: {e}", exc_info=True)
+            return False
+        self._stats["flushed"] += 1
+        logger.debug(f"[SessionCache] 会话 {session_id} 已写回存储 ({len(payload)} 字节)。")
+        return True
+
+    async def flush(self, session_id: str) -> bool:
+        """立即把一个有修改的会话写回存储 (会等待会话锁)。返回是否写入了数据。"""
+        entry = self._entries.get(session_id)
+        if entry is None or not entry.dirty:
+            return False
+        async with entry.lock:
+            return entry.dirty and await self._flush_locked(session_id, entry)
+
+    async def flush_all(self, wait_for_busy: bool = False) -> int:
+        """
+        把所有有修改的会话写回存储，返回写入的会话数。
+        wait_for_busy 为 False 时跳过正在处理消息的会话 (它们会在下一轮写回)。
+        """
+        flushed = 0
+        for session_id, entry in list(self._entries.items()):
+            if not entry.dirty or (entry.lock.locked() and not wait_for_busy):
+                continue
+            async with entry.lock:
+                if entry.dirty and await self._flush_locked(session_id, entry):
+                    flushed += 1
+        return flushed
+
+    async def _evict(self, session_id: str, entry: _SessionEntry) -> bool:
+        """写回 (如有修改) 并移出一个会话；会话被占用或在写回期间被重新使用时放弃。"""
+        if entry.pin_count or entry.lock.locked():
+            return False
+        async with entry.lock:
+            if entry.pin_count or self._entries.get(session_id) is not entry:
+                return False
+            if entry.dirty and self._can_persist(session_id, entry) and not await self._flush_locked(session_id, entry):
+                return False # 写回失败时保留在内存中，避免丢失修改
+            if entry.dirty:
+                logger.warning(f"[SessionCache] 会话 {session_id} 无法持久化,移出缓存后其修改将丢失。")
+            del self._entries[session_id]
+        self._stats["evicted"] += 1
+        logger.info(f"[SessionCache] 会话 {session_id} 已移出内存 (缓存中还有 {len(self._entries)} 个会话)。")
+        return True
+
+    async def _evict_overflow(self, keep_session_id: Optional[str] = None) -> int:
+        evicted = 0
+        for session_id, entry in list(self._entries.items()): # 从最久未使用的会话开始
+            if len(self._entries) <= self.max_sessions:
+                break
+            if session_id != keep_session_id and await self._evict(session_id, entry):
+                evicted += 1
+        return evicted
+
+    async def evict_expired(self) -> int:
+        """移出闲置超时的会话以及超出 max_sessions 的最久未使用会话，返回移出的会话数。"""
+        evicted = 0
+        if self.idle_timeout_seconds:
+            deadline = time.monotonic() - self.idle_timeout_seconds
+            for session_id, entry in list(self._entries.items()):
+                if entry.last_used >= deadline:
+                    break # 按最近使用排序，之后的会话都更新
+                if await self._evict(session_id, entry):
+                    evicted += 1
+        return evicted + await self._evict_overflow()
+
+    async def _run_flusher(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                await self.flush_all()
+                await self.evict_expired()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[SessionCache] 后台写回任务出错: {e}", exc_info=True)
+
+    def start(self) -> None:
+        """启动后台写回任务 (需要在运行中的事件循环里调用)。"""
+        if self._flusher_task is None or self._flusher_task.done():
+            self._flusher_task = asyncio.get_running_loop().create_task(self._run_flusher())
+            logger.info(f"[SessionCache] 后台写回任务已启动 (间隔 {self.flush_interval_seconds} 秒, 最多缓存 {self.max_sessions} 个会话, "
+                        f"闲置 {self.idle_timeout_seconds} 秒后移出)。")
+
+    async def stop(self) -> None:
+        """停止后台任务，写回全部有修改的会话并关闭存储。"""
+        if self._flusher_task is not None:
+            self._flusher_task.cancel()
+            try:
+                await self._flusher_task
+            except asyncio.CancelledError:
+                pass
+            self._flusher_task = None
+        flushed = await self.flush_all(wait_for_busy=True)
+        if self._store is not None:
+            await asyncio.to_thread(self._store.close)
+        logger.info(f"[SessionCache] 已停止,关闭前写回了 {flushed} 个会话。")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """返回缓存的统计信息。"""
+        entries = self._entries.values()
+        return {
+            "cached_sessions": len(self._entries),
+            "pinned_sessions": sum(1 for entry in entries if entry.pin_count),
+            "dirty_sessions": sum(1 for entry in entries if entry.dirty),
+            **self._stats,
+        }
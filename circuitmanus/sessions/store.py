@@ -0,0 +1,196 @@
+# IDT_AGENT_Pro/circuitmanus/sessions/store.py
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from ..memory.snapshot import MemorySnapshot
+
+logger = logging.getLogger(__name__)
+
+# 可选的会话存储后端名称
+SESSION_STORE_SQLITE = "sqlite"
+SESSION_STORE_FILE = "file"
+SESSION_STORE_BACKENDS = (SESSION_STORE_SQLITE, SESSION_STORE_FILE)
+
+# 会话ID可能被用作文件名，只接受不含路径分隔符的安全字符
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+def is_persistable_session_id(session_id: str) -> bool:
+    """会话ID是否可以被持久化 (只含字母、数字、下划线与连字符，长度不超过 128)。"""
+    return isinstance(session_id, str) and bool(_SESSION_ID_PATTERN.match(session_id))
+
+class SessionStore(ABC):
+    """
+    会话持久化存储的接口。每个会话保存一份二进制会话快照 (格式见 memory/snapshot.py)。
+
+    所有方法都是同步的阻塞调用，可能在后台线程中被调用，实现需要保证线程安全。
+    子类必须实现全部抽象方法，否则在实例化时即报错；close 默认不做任何事。
+    """
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[MemorySnapshot]:
+        """读取会话快照；会话不存在时返回 None。返回的快照所有权归调用方。"""
+
+    @abstractmethod
+    def save(self, session_id: str, payload: bytes) -> None:
+        """写入 (覆盖) 会话快照。"""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """删除会话快照 (不存在时忽略)。"""
+
+    @abstractmethod
+    def list_session_ids(self) -> List[str]:
+        """返回所有已持久化的会话ID。"""
+
+    @abstractmethod
+    def quarantine(self, session_id: str) -> Optional[str]:
+        """
+        把无法读取的会话快照移到隔离区 (保留以便排查，不再被 load 读到)，返回其新位置的描述；
+        会话不存在时返回 None。之后同一会话ID可以重新写入新的快照。
+        """
+
+    def close(self) -> None:
+        """释放存储占用的资源。"""
+
+class SQLiteSessionStore(SessionStore):
+    """
+    以 SQLite 数据库保存会话快照 (默认后端)。单个数据库文件即可容纳成千上万个会话，
+    使用 WAL 日志模式，写入不阻塞并发读取。
+
+    读取时快照整体载入内存 (BLOB)，电路部分仍然在首次访问时才物化。
+    """
+    def __init__(self, database_path: str):
+        directory = os.path.dirname(os.path.abspath(database_path))
+        os.makedirs(directory, exist_ok=True)
+        self.database_path: str = database_path
+        self._lock = threading.Lock() # sqlite3 连接在多个线程间共享，需要串行化访问
+        self._connection = sqlite3.connect(database_path, check_same_thread=False)
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, snapshot BLOB NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS quarantined_sessions ("
+                "session_id TEXT NOT NULL, snapshot BLOB NOT NULL, updated_at REAL NOT NULL, quarantined_at REAL NOT NULL)"
+            )
+            self._connection.commit()
+        logger.info(f"[SQLiteSessionStore] 会话存储已打开: '{database_path}'。")
+
+    def load(self, session_id: str) -> Optional[MemorySnapshot]:
+        with self._lock:
+            row = self._connection.execute("SELECT snapshot FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        return MemorySnapshot(row[0], source=f"sqlite:{session_id}")
+
+    def save(self, session_id: str, payload: bytes) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO sessions (session_id, snapshot, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET snapshot = excluded.snapshot, updated_at = excluded.updated_at",
+                (session_id, sqlite3.Binary(payload), time.time()),
+            )
+            self._connection.commit()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._connection.commit()
+
+    def list_session_ids(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT session_id FROM sessions ORDER BY updated_at DESC")]
+
+    def quarantine(self, session_id: str) -> Optional[str]:
+        with self._lock, self._connection: # 同一事务中移动，不会出现两份或丢失
+            moved = self._connection.execute(
+                "INSERT INTO quarantined_sessions (session_id, snapshot, updated_at, quarantined_at) "
+                "SELECT session_id, snapshot, updated_at, ? FROM sessions WHERE session_id = ?",
+                (time.time(), session_id),
+            ).rowcount
+            if not moved:
+                return None
+            self._connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return f"{self.database_path}:quarantined_sessions"
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+        logger.info(f"[SQLiteSessionStore] 会话存储已关闭: '{self.database_path}'。")
+
+class FileSessionStore(SessionStore):
+    """
+    每个会话一个快照文件 (<目录>/<session_id>.cmsnap)。读取时以内存映射打开，
+    适合电路非常大的会话: 恢复时不需要把整个快照读入内存。
+    """
+    SNAPSHOT_EXTENSION = ".cmsnap"
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory: str = directory
+
+    def _path_of(self, session_id: str) -> str:
+        if not is_persistable_session_id(session_id):
+            raise ValueError(f"会话ID '{session_id}' 不能用作快照文件名。")
+        return os.path.join(self.directory, f"{session_id}{self.SNAPSHOT_EXTENSION}")
+
+    def load(self, session_id: str) -> Optional[MemorySnapshot]:
+        path = self._path_of(session_id)
+        if not os.path.exists(path):
+            return None
+        return MemorySnapshot.open(path)
+
+    def save(self, session_id: str, payload: bytes) -> None:
+        path = self._path_of(session_id)
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, "wb") as snapshot_file:
+                snapshot_file.write(payload)
+            os.replace(temp_path, path) # 原子替换; 已映射旧文件的读者仍然看到旧内容
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def delete(self, session_id: str) -> None:
+        path = self._path_of(session_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def list_session_ids(self) -> List[str]:
+        return [name[:-len(self.SNAPSHOT_EXTENSION)] for name in os.listdir(self.directory) if name.endswith(self.SNAPSHOT_EXTENSION)]
+
+    def quarantine(self, session_id: str) -> Optional[str]:
+        path = self._path_of(session_id)
+        if not os.path.exists(path):
+            return None
+        quarantined_path = f"{path}.corrupt-{time.strftime('%Y%m%d%H%M%S')}" # 不以快照扩展名结尾，不会再被列出或读取
+        os.replace(path, quarantined_path)
+        return quarantined_path
+
+def create_session_store(backend: str, location: str) -> SessionStore:
+    """
+    创建会话存储。
+
+    Args:
+        backend (str): "sqlite" (默认，location 为数据库文件路径) 或 "file" (location 为快照目录)。
+        location (str): 数据库文件路径或快照目录。
+
+    Returns:
+        SessionStore: 会话存储实例。
+
+    Raises:
+        ValueError: 如果后端名称未知。
+    """
+    if backend == SESSION_STORE_SQLITE:
+        return SQLiteSessionStore(location)
+    if backend == SESSION_STORE_FILE:
+        return FileSessionStore(location)
+    raise ValueError(f"未知的会话存储后端 '{backend}'。可选值: {', '.join(SESSION_STORE_BACKENDS)}。")
@@ -6,6 +6,7 @@ how they are registered, and how they are executed.
 """
 from .base import register_tool
 from .executor import ToolExecutor
+from .early_dispatch import EarlyToolDispatcher
 # 具体工具函数将在各自模块定义，由 Agent 类导入和使用
 
-__all__ = ["register_tool", "ToolExecutor"]
\ No newline at end of file
+__all__ = ["register_tool", "ToolExecutor", "EarlyToolDispatcher"]
\ No newline at end of file
@@ -0,0 +1,242 @@
+# IDT_AGENT_Pro/circuitmanus/tools/analysis_ops.py
+import logging
+import traceback
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
+
+from .base import register_tool
+from ..analysis.dc import MNAError, NUMPY_AVAILABLE
+from ..circuit_domain.units import parse_engineering_value
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+if TYPE_CHECKING:
+    from ..agent import CircuitAgent
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_MAX_ITEMS = 30
+_DEFAULT_MAX_SWEEP_ROWS = 21
+_MAX_SWEEP_POINTS = 100000
+
+def _round_significant(number: float, digits: int = 6) -> float:
+    """保留有效数字，避免把 1.0000000000000002 这类浮点噪声交给 LLM。"""
+    return float(f"{number:.{digits}g}") + 0.0 # + 0.0 把 -0.0 规范为 0.0
+
+@register_tool(
+    description="求解当前电路的直流工作点 (改进节点分析),返回各节点电压以及元件的电压、电流和功率。支持电阻/电位器、电池/电压源、电流源、二极管/LED (分段线性模型),电感/开关/保险丝按短路处理,电容按开路处理。电路中必须有地线元件作为参考节点;两端元件最好恰好连接两个相邻元件,多个元件汇合处请使用节点/连接点元件。",
+    parameters={"type": "object", "properties": {"component_ids": {"type": "array", "items": {"type": "string"}, "description": "可选。只返回这些元件的结果及其端子节点的电压;不提供时返回功率绝对值最大的若干元件。"}, "max_items": {"type": "integer", "description": f"可选。最多返回的元件数与节点数,默认为 {_DEFAULT_MAX_ITEMS}。"}}},
+    read_only=True,
+    speculative_safe=True
+)
+def solve_dc_operating_point_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
+    tool_call_logger_prefix = f"[Action-SolveDCOperatingPointTool-ReqID:{self.current_request_id or 'N/A'}]"
+    logger.info(f"{tool_call_logger_prefix} 执行直流工作点求解。")
+    logger.debug(f"{tool_call_logger_prefix} 收到参数: {arguments}")
+    component_ids_req = arguments.get("component_ids")
+    max_items_req = arguments.get("max_items", _DEFAULT_MAX_ITEMS)
+
+    if component_ids_req is not None and (not isinstance(component_ids_req, list) or not all(isinstance(item, str) and item.strip() for item in component_ids_req)):
+        err_msg = "'component_ids' 必须是由非空元件 ID 字符串组成的列表。"
+        logger.error(f"{tool_call_logger_prefix} 输入验证失败: {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "USER_INPUT_VALIDATION_ERROR", "error_code": "INVALID_COMPONENT_IDS_FOR_DC_SOLVE", "technical_message": err_msg}}
+    if not isinstance(max_items_req, int) or isinstance(max_items_req, bool) or max_items_req < 1:
+        err_msg = f"'max_items' 必须是正整数。收到: {max_items_req!r}"
+        logger.error(f"{tool_call_logger_prefix} 输入验证失败: {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "USER_INPUT_VALIDATION_ERROR", "error_code": "INVALID_MAX_ITEMS_FOR_DC_SOLVE", "technical_message": err_msg}}
+
+    try:
+        result = self.dc_solver.solve(self.memory_manager.circuit)
+        elements: Dict[str, Dict[str, Any]] = result["elements"]
+        not_solved_ids: List[str] = []
+        if component_ids_req is not None:
+            requested_ids = list(dict.fromkeys(item.strip().upper() for item in component_ids_req))
+            selected_ids = [cid for cid in requested_ids if cid in elements][:max_items_req]
+            not_solved_ids = [cid for cid in requested_ids if cid not in elements]
+        else:
+            selected_ids = sorted(elements, key=lambda cid: abs(elements[cid]["power"]), reverse=True)[:max_items_req]
+
+        selected_elements = {
+            cid: {**elements[cid], "voltage": _round_significant(elements[cid]["voltage"]),
+                  "current": _round_significant(elements[cid]["current"]), "power": _round_significant(elements[cid]["power"])}
+            for cid in selected_ids
+        }
+        if component_ids_req is not None: # 只返回所选元件端子上的节点
+            node_names = list(dict.fromkeys(name for cid in selected_ids for name in elements[cid]["terminals"] if name in result["node_voltages"]))
+        else:
+            node_names = list(result["node_voltages"])[:max_items_req]
+        selected_voltages = {name: _round_significant(result["node_voltages"][name]) for name in node_names}
+
+        data = {
+            "reference_node": result["reference_node"],
+            "node_count": result["node_count"],
+            "element_count": result["element_count"],
+            "node_voltages": selected_voltages,
+            "elements": selected_elements,
+            "truncated": len(selected_voltages) < result["node_count"] or len(selected_elements) < result["element_count"],
+            "warnings": result["warnings"],
+            "solver": {"rebuilt": result["rebuilt"], "from_cache": result["from_cache"], "factorizations": result["factorizations"],
+                       "diode_iterations": result["diode_iterations"], "elapsed_ms": result["elapsed_ms"]},
+        }
+        if not_solved_ids:
+            data["not_solved_component_ids"] = not_solved_ids
+        logger.info(f"{tool_call_logger_prefix} 求解成功: {result['node_count']} 个节点, {result['element_count']} 个元件, 耗时 {result['elapsed_ms']} ms。")
+        message = f"操作成功: 已求解直流工作点 ({result['node_count']} 个节点, {result['element_count']} 个元件,参考节点 '{result['reference_node']}')。"
+        if not_solved_ids:
+            message += f" 以下元件未参与求解 (不存在、未连接或不受支持): {', '.join(not_solved_ids)}。"
+        return {"status": "success", "message": message, "data": data}
+    except MNAError as mna_error:
+        err_msg = str(mna_error)
+        logger.error(f"{tool_call_logger_prefix} 电路无法求解: {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "CIRCUIT_ANALYSIS_ERROR", "error_code": "DC_OPERATING_POINT_UNSOLVABLE", "technical_message": err_msg}}
+    except Exception as e_solve:
+        err_msg = f"求解直流工作点时发生未知的内部错误: {e_solve}"
+        logger.error(f"{tool_call_logger_prefix} 未知错误: {err_msg}", exc_info=True)
+        return {"status": "failure", "message": "错误: 求解直流工作点时发生未知内部错误。", "error": {"error_type": "UNEXPECTED_TOOL_ERROR", "error_code": "SOLVE_DC_OPERATING_POINT_UNEXPECTED_FAILURE", "technical_message": str(e_solve), "exception_details": traceback.format_exc(limit=3)}}
+
+def _parse_sweep_number(raw_value: Any) -> Optional[float]:
+    """把扫描参数中的数字或工程写法字符串 (如 '4.7k') 转为浮点数，无法解析时返回 None。"""
+    if isinstance(raw_value, bool):
+        return None
+    if isinstance(raw_value, (int, float)):
+        return float(raw_value)
+    if isinstance(raw_value, str) and raw_value.strip():
+        return parse_engineering_value(raw_value.strip())[0]
+    return None
+
+@register_tool(
+    description="对电路中一个电阻、电压源或电流源的值做参数扫描 (例如 '如果 R3 是 1k、2k、5k……'),一次调用即可求解成百上千个取值下的直流工作点,返回紧凑的结果表。扫描不会修改电路本身。取值可以用 values 逐个给出,也可以用 start/stop/points (可选对数刻度) 生成。",
+    parameters={"type": "object", "properties": {
+        "component_id": {"type": "string", "description": "被扫描的元件 ID (电阻、电池/电压源或电流源)。"},
+        "values": {"type": "array", "items": {"type": ["string", "number"]}, "description": "可选。逐个给出的扫描取值,可使用工程写法 (例如 ['1k', '2k', '5k'])。"},
+        "start": {"type": ["string", "number"], "description": "可选。扫描起始值 (与 stop、points 一起使用)。"},
+        "stop": {"type": ["string", "number"], "description": "可选。扫描终止值。"},
+        "points": {"type": "integer", "description": f"可选。扫描点数 (最多 {_MAX_SWEEP_POINTS})。"},
+        "scale": {"type": "string", "enum": ["linear", "log"], "description": "可选。start/stop 之间的刻度,默认 'linear'。"},
+        "probe_ids": {"type": "array", "items": {"type": "string"}, "description": "可选。要观察的元件 ID (给出其电压与电流) 或节点名 (给出节点电压);默认为被扫描元件本身。"},
+        "max_rows": {"type": "integer", "description": f"可选。结果表最多返回的行数 (超出时均匀抽样),默认为 {_DEFAULT_MAX_SWEEP_ROWS}。每列的最小/最大值总是基于全部扫描点给出。"}
+    }, "required": ["component_id"]},
+    read_only=True,
+    speculative_safe=True
+)
+def sweep_component_value_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
+    tool_call_logger_prefix = f"[Action-SweepComponentValueTool-ReqID:{self.current_request_id or 'N/A'}]"
+    logger.info(f"{tool_call_logger_prefix} 执行元件值参数扫描。")
+    logger.debug(f"{tool_call_logger_prefix} 收到参数: {arguments}")
+    component_id_req = arguments.get("component_id")
+    values_req = arguments.get("values")
+    probe_ids_req = arguments.get("probe_ids")
+    max_rows_req = arguments.get("max_rows", _DEFAULT_MAX_SWEEP_ROWS)
+
+    def validation_failure(err_msg: str, error_code: str) -> Dict[str, Any]:
+        logger.error(f"{tool_call_logger_prefix} 输入验证失败: {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "USER_INPUT_VALIDATION_ERROR", "error_code": error_code, "technical_message": err_msg}}
+
+    if not NUMPY_AVAILABLE:
+        return validation_failure("参数扫描需要 numpy,当前环境不可用。", "SWEEP_DEPENDENCY_MISSING")
+    if not component_id_req or not isinstance(component_id_req, str) or not component_id_req.strip():
+        return validation_failure("必须提供一个有效的、非空的元件 ID 字符串。", "MISSING_OR_INVALID_COMPONENT_ID_FOR_SWEEP")
+    if probe_ids_req is not None and (not isinstance(probe_ids_req, list) or not all(isinstance(item, str) and item.strip() for item in probe_ids_req)):
+        return validation_failure("'probe_ids' 必须是由非空字符串组成的列表。", "INVALID_PROBE_IDS_FOR_SWEEP")
+    if not isinstance(max_rows_req, int) or isinstance(max_rows_req, bool) or max_rows_req < 1:
+        return validation_failure(f"'max_rows' 必须是正整数。收到: {max_rows_req!r}", "INVALID_MAX_ROWS_FOR_SWEEP")
+
+    if values_req is not None:
+        if not isinstance(values_req, list) or not values_req:
+            return validation_failure("'values' 必须是非空列表。", "INVALID_SWEEP_VALUES")
+        parsed_values = [_parse_sweep_number(item) for item in values_req]
+        invalid_values = [item for item, parsed in zip(values_req, parsed_values) if parsed is None]
+        if invalid_values:
+            return validation_failure(f"以下扫描取值无法解析为数值: {invalid_values[:10]}", "INVALID_SWEEP_VALUES")
+        sweep_values = np.array(parsed_values, dtype=np.float64)
+    else:
+        start, stop = _parse_sweep_number(arguments.get("start")), _parse_sweep_number(arguments.get("stop"))
+        points_req = arguments.get("points")
+        scale_req = arguments.get("scale", "linear")
+        if start is None or stop is None or not isinstance(points_req, int) or isinstance(points_req, bool) or points_req < 1:
+            return validation_failure("必须提供 'values',或同时提供可解析的 'start'、'stop' 与正整数 'points'。", "MISSING_SWEEP_RANGE")
+        if scale_req not in ("linear", "log"):
+            return validation_failure(f"'scale' 只能是 'linear' 或 'log'。收到: {scale_req!r}", "INVALID_SWEEP_SCALE")
+        if scale_req == "log" and (start <= 0 or stop <= 0):
+            return validation_failure("对数刻度的 'start' 与 'stop' 必须为正数。", "INVALID_SWEEP_RANGE")
+        if points_req > _MAX_SWEEP_POINTS:
+            return validation_failure(f"扫描点数不能超过 {_MAX_SWEEP_POINTS}。", "TOO_MANY_SWEEP_POINTS")
+        sweep_values = np.geomspace(start, stop, points_req) if scale_req == "log" else np.linspace(start, stop, points_req)
+    if len(sweep_values) > _MAX_SWEEP_POINTS:
+        return validation_failure(f"扫描点数不能超过 {_MAX_SWEEP_POINTS}。", "TOO_MANY_SWEEP_POINTS")
+
+    component_id = component_id_req.strip().upper()
+    probe_ids = list(dict.fromkeys(item.strip().upper() for item in probe_ids_req)) if probe_ids_req else [component_id]
+
+    try:
+        result = self.dc_solver.sweep(self.memory_manager.circuit, component_id, sweep_values, probe_ids)
+        column_names = ["value", *result["columns"]]
+        table = np.column_stack([sweep_values, *result["columns"].values()])
+        row_indices = np.unique(np.linspace(0, len(sweep_values) - 1, min(max_rows_req, len(sweep_values))).round().astype(int))
+        rows = [[_round_significant(number) for number in row] for row in table[row_indices].tolist()]
+        summary = {}
+        for column_position, column_name in enumerate(column_names[1:], start=1):
+            column = table[:, column_position]
+            min_index, max_index = int(np.argmin(column)), int(np.argmax(column))
+            summary[column_name] = {"min": _round_significant(column[min_index]), "min_at_value": _round_significant(sweep_values[min_index]),
+                                    "max": _round_significant(column[max_index]), "max_at_value": _round_significant(sweep_values[max_index])}
+        data = {
+            "component_id": component_id,
+            "model": result["model"],
+            "point_count": len(sweep_values),
+            "columns": column_names,
+            "rows": rows,
+            "rows_truncated": len(rows) < len(sweep_values),
+            "summary": summary,
+            "warnings": result["warnings"],
+            "solver": {"rebuilt": result["rebuilt"], "batched_points": result["batched_points"], "fallback_points": result["fallback_points"],
+                       "factorizations": result["factorizations"], "elapsed_ms": result["elapsed_ms"]},
+        }
+        logger.info(f"{tool_call_logger_prefix} 扫描成功: 元件 '{component_id}', {len(sweep_values)} 个点, 耗时 {result['elapsed_ms']} ms。")
+        return {"status": "success", "message": f"操作成功: 已对元件 '{component_id}' 扫描 {len(sweep_values)} 个取值,返回 {len(rows)} 行结果 (列: {', '.join(column_names)})。", "data": data}
+    except MNAError as mna_error:
+        err_msg = str(mna_error)
+        logger.error(f"{tool_call_logger_prefix} 扫描失败: {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "CIRCUIT_ANALYSIS_ERROR", "error_code": "PARAMETER_SWEEP_FAILED", "technical_message": err_msg}}
+    except Exception as e_sweep:
+        err_msg = f"参数扫描时发生未知的内部错误: {e_sweep}"
+        logger.error(f"{tool_call_logger_prefix} 未知错误: {err_msg}", exc_info=True)
+        return {"status": "failure", "message": "错误: 参数扫描时发生未知内部错误。", "error": {"error_type": "UNEXPECTED_TOOL_ERROR", "error_code": "SWEEP_COMPONENT_VALUE_UNEXPECTED_FAILURE", "technical_message": str(e_sweep), "exception_details": traceback.format_exc(limit=3)}}
+
+@register_tool(
+    description="对当前电路做一次完整的电气规则检查 (ERC),列出全部未解决的问题: 缺少接地、电源被短路、两端元件端子悬空、电压不同的电源并联、疑似重复添加的并联元件。每批修改电路的工具执行后系统会自动做增量检查并附上新发现的问题,此工具用于查看全部问题。",
+    parameters={"type": "object", "properties": {"max_items": {"type": "integer", "description": f"可选。最多返回的问题条数 (error 在前),默认为 {_DEFAULT_MAX_ITEMS}。"}}},
+    read_only=True,
+    speculative_safe=True
+)
+def run_electrical_rule_check_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
+    tool_call_logger_prefix = f"[Action-RunElectricalRuleCheckTool-ReqID:{self.current_request_id or 'N/A'}]"
+    logger.info(f"{tool_call_logger_prefix} 执行完整的电气规则检查。")
+    logger.debug(f"{tool_call_logger_prefix} 收到参数: {arguments}")
+    max_items_req = arguments.get("max_items", _DEFAULT_MAX_ITEMS)
+    if not isinstance(max_items_req, int) or isinstance(max_items_req, bool) or max_items_req < 1:
+        err_msg = f"'max_items' 必须是正整数。收到: {max_items_req!r}"
+        logger.error(f"{tool_call_logger_prefix} 输入验证失败: {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "USER_INPUT_VALIDATION_ERROR", "error_code": "INVALID_MAX_ITEMS_FOR_ERC", "technical_message": err_msg}}
+
+    try:
+        self.erc_checker.check_all(self.memory_manager.circuit)
+        violations = self.erc_checker.get_open_violations()
+        error_count = sum(1 for violation in violations if violation["severity"] == "error")
+        data = {
+            "violation_count": len(violations),
+            "error_count": error_count,
+            "warning_count": len(violations) - error_count,
+            "violations": violations[:max_items_req],
+            "truncated": len(violations) > max_items_req,
+        }
+        logger.info(f"{tool_call_logger_prefix} 检查完成: {error_count} 个错误, {len(violations) - error_count} 个警告。")
+        if not violations:
+            message = "操作成功: 电气规则检查未发现问题。"
+        else:
+            message = f"操作成功: 电气规则检查发现 {error_count} 个错误、{len(violations) - error_count} 个警告。"
+        return {"status": "success", "message": message, "data": data}
+    except Exception as e_erc:
+        err_msg = f"电气规则检查时发生未知的内部错误: {e_erc}"
+        logger.error(f"{tool_call_logger_prefix} 未知错误: {err_msg}", exc_info=True)
+        return {"status": "failure", "message": "错误: 电气规则检查时发生未知内部错误。", "error": {"error_type": "UNEXPECTED_TOOL_ERROR", "error_code": "RUN_ELECTRICAL_RULE_CHECK_UNEXPECTED_FAILURE", "technical_message": str(e_erc), "exception_details": traceback.format_exc(limit=3)}}
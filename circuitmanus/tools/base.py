@@ -6,7 +6,7 @@ from typing import Dict, Any, Callable, Awaitable, Union
 # 这个模块主要提供工具注册的装饰器
 # 未来如果需要通用的工具基类或接口，也可以放在这里
 
-def register_tool(description: str, parameters: Dict[str, Any]):
+def register_tool(description: str, parameters: Dict[str, Any], read_only: bool = False, speculative_safe: bool = False):
     """
     一个装饰器，用于将一个 Agent 的方法注册为一个可被 LLM 调用的工具。
 
@@ -21,6 +21,11 @@ def register_tool(description: str, parameters: Dict[str, Any]):
                                      - "properties": 一个字典，键是参数名 (snake_case)，
                                                      值是该参数的 schema (例如 {"type": "string", "description": "..."})。
                                      - "required": 一个可选的列表，包含所有必需参数的名称。
+        read_only (bool): 工具是否不会修改电路。只包含只读工具的请求可以与同一会话的其它请求并发处理；
+                          修改电路的请求按顺序执行 (见 CircuitAgent.mutation_lock)。
+        speculative_safe (bool): 工具能否在计划确认前被提前执行 (见 EarlyToolDispatcher)。只有副作用仅限于
+                                 电路与记忆 (计划被否决时可通过快照回滚) 的工具才能标记为 True；
+                                 写文件、调用外部服务或改变撤销历史的工具保持 False。
 
     Returns:
         Callable: 返回一个包装器函数，该函数会保留原函数的功能并添加额外的元数据。
@@ -37,6 +42,8 @@ def register_tool(description: str, parameters: Dict[str, Any]):
         # 将 schema 附加到函数对象上
         func._tool_schema = {"description": description, "parameters": parameters}
         func._is_tool = True # 标记这是一个已注册的工具
+        func._tool_read_only = read_only
+        func._tool_speculative_safe = speculative_safe
 
         # 使用 functools.wraps 来保留原函数的元数据 (如名称, docstring, 注解)，
         # 这对于 inspect.iscoroutinefunction 等内省机制正确工作非常重要。
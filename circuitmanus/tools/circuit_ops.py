@@ -19,7 +19,8 @@ logger = logging.getLogger(__name__)
 
 @register_tool(
     description="添加一个新的电路元件 (例如: 电阻, 电容, 电池, LED, 开关, 芯片, 地线, 端子/连接点等)。如果用户未指定 ID,系统会自动为其生成一个。",
-    parameters={"type": "object", "properties": {"component_type": {"type": "string", "description": "元件的类型 (例如: '电阻', 'LED', 'Terminal', 'INPUT', 'GND')。"}, "component_id": {"type": "string", "description": "可选的用户为元件指定的ID。如果提供,则使用此ID; 如果不提供或提供格式无效,则由系统自动生成。"}, "value": {"type": "string", "description": "可选的元件值 (例如: '1k', '10uF', '3V')。"}}, "required": ["component_type"]}
+    parameters={"type": "object", "properties": {"component_type": {"type": "string", "description": "元件的类型 (例如: '电阻', 'LED', 'Terminal', 'INPUT', 'GND')。"}, "component_id": {"type": "string", "description": "可选的用户为元件指定的ID。如果提供,则使用此ID; 如果不提供或提供格式无效,则由系统自动生成。"}, "value": {"type": "string", "description": "可选的元件值 (例如: '1k', '10uF', '3V')。"}}, "required": ["component_type"]},
+    speculative_safe=True
 )
 def add_component_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -125,7 +126,8 @@ def add_component_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[
 
 @register_tool(
     description="使用两个已存在元件的 ID 将它们连接起来。",
-    parameters={"type": "object", "properties": {"comp1_id": {"type": "string", "description": "第一个元件的 ID。"}, "comp2_id": {"type": "string", "description": "第二个元件的 ID。"}}, "required": ["comp1_id", "comp2_id"]}
+    parameters={"type": "object", "properties": {"comp1_id": {"type": "string", "description": "第一个元件的 ID。"}, "comp2_id": {"type": "string", "description": "第二个元件的 ID。"}}, "required": ["comp1_id", "comp2_id"]},
+    speculative_safe=True
 )
 def connect_components_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
     tool_call_logger_prefix = f"[Action-ConnectComponentsTool-ReqID:{self.current_request_id or 'N/A'}]"
@@ -169,7 +171,7 @@ def connect_components_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) ->
         logger.error(f"{tool_call_logger_prefix} 未知错误: {err_msg}", exc_info=True)
         return {"status": "failure", "message": "错误: 连接元件时发生未知内部错误。", "error": {"error_type": "UNEXPECTED_TOOL_ERROR", "error_code": "CONNECT_COMPONENTS_UNEXPECTED_FAILURE", "technical_message": str(e_connect), "exception_details": traceback.format_exc(limit=3)}}
 
-@register_tool(description="获取当前电路的详细描述,包括所有元件及其连接情况。", parameters={"type": "object", "properties": {}})
+@register_tool(description="获取当前电路的详细描述,包括所有元件及其连接情况。", parameters={"type": "object", "properties": {}}, read_only=True, speculative_safe=True)
 def describe_circuit_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
     tool_call_logger_prefix = f"[Action-DescribeCircuitTool-ReqID:{self.current_request_id or 'N/A'}]"
     logger.info(f"{tool_call_logger_prefix} 执行描述电路操作。")
@@ -183,7 +185,7 @@ def describe_circuit_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Di
         logger.error(f"{tool_call_logger_prefix} 未知错误: {err_msg}", exc_info=True)
         return {"status": "failure", "message": "错误: 获取电路描述时发生未知错误。", "error": {"error_type": "UNEXPECTED_TOOL_ERROR", "error_code": "DESCRIBE_CIRCUIT_UNEXPECTED_FAILURE", "technical_message": str(e_describe), "exception_details": traceback.format_exc(limit=3)}}
 
-@register_tool(description="彻底清空当前的电路设计,移除所有已添加的元件和它们之间的所有连接。此操作不可逆。", parameters={"type": "object", "properties": {}})
+@register_tool(description="彻底清空当前的电路设计,移除所有已添加的元件和它们之间的所有连接。如需恢复,可以使用 undo_circuit_change_tool 撤销此操作。", parameters={"type": "object", "properties": {}}, speculative_safe=True)
 def clear_circuit_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
     tool_call_logger_prefix = f"[Action-ClearCircuitTool-ReqID:{self.current_request_id or 'N/A'}]"
     logger.info(f"{tool_call_logger_prefix} 执行清空电路操作。")
@@ -200,7 +202,8 @@ def clear_circuit_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[
 
 @register_tool(
     description="从电路中移除一个指定的元件及其所有相关的连接。",
-    parameters={"type": "object", "properties": {"component_id": {"type": "string", "description": "要移除的元件的 ID。"}}, "required": ["component_id"]}
+    parameters={"type": "object", "properties": {"component_id": {"type": "string", "description": "要移除的元件的 ID。"}}, "required": ["component_id"]},
+    speculative_safe=True
 )
 def remove_component_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
     tool_call_logger_prefix = f"[Action-RemoveComponentTool-ReqID:{self.current_request_id or 'N/A'}]"
@@ -232,7 +235,8 @@ def remove_component_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Di
 
 @register_tool(
     description="断开两个指定元件之间的连接。如果它们之间原本就没有连接,则不执行任何操作。",
-    parameters={"type": "object", "properties": {"comp1_id": {"type": "string", "description": "第一个元件的 ID。"}, "comp2_id": {"type": "string", "description": "第二个元件的 ID。"}}, "required": ["comp1_id", "comp2_id"]}
+    parameters={"type": "object", "properties": {"comp1_id": {"type": "string", "description": "第一个元件的 ID。"}, "comp2_id": {"type": "string", "description": "第二个元件的 ID。"}}, "required": ["comp1_id", "comp2_id"]},
+    speculative_safe=True
 )
 def disconnect_components_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
     tool_call_logger_prefix = f"[Action-DisconnectComponentsTool-ReqID:{self.current_request_id or 'N/A'}]"
@@ -283,7 +287,8 @@ def disconnect_components_tool(self: 'CircuitAgent', arguments: Dict[str, Any])
 
 @register_tool(
     description="更新电路中一个已存在元件的值 (例如电阻的欧姆值, 电容的法拉值, 电池的电压等)。",
-    parameters={"type": "object", "properties": {"component_id": {"type": "string", "description": "要更新值的元件的 ID。"}, "new_value": {"type": "string", "description": "元件的新值。如果想要清除该元件的值,可以传入 null 或一个空字符串。"}}, "required": ["component_id", "new_value"]}
+    parameters={"type": "object", "properties": {"component_id": {"type": "string", "description": "要更新值的元件的 ID。"}, "new_value": {"type": "string", "description": "元件的新值。如果想要清除该元件的值,可以传入 null 或一个空字符串。"}}, "required": ["component_id", "new_value"]},
+    speculative_safe=True
 )
 def update_component_value_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
     tool_call_logger_prefix = f"[Action-UpdateComponentValueTool-ReqID:{self.current_request_id or 'N/A'}]"
@@ -311,9 +316,8 @@ def update_component_value_tool(self: 'CircuitAgent', arguments: Dict[str, Any])
         if id_cleaned not in self.memory_manager.circuit.components:
             raise ValueError(f"元件 '{id_cleaned}' 在电路中不存在,无法更新其值。")
         
-        component_to_update = self.memory_manager.circuit.components[id_cleaned]
-        old_value = component_to_update.value # 记录旧值用于消息反馈
-        component_to_update.value = final_new_value # 直接更新 CircuitComponent 对象的 value 属性
+        # 通过 Circuit 更新值 (而不是直接改写元件属性)，以便其内部索引与缓存保持一致
+        old_value, component_to_update = self.memory_manager.circuit.update_component_value(id_cleaned, final_new_value)
         
         logger.info(f"{tool_call_logger_prefix} 成功更新元件 '{id_cleaned}' 的值从 '{old_value}' 到 '{final_new_value}'。")
         self.memory_manager.add_to_long_term(f"更新了元件 '{id_cleaned}' 的值: 旧值 '{old_value}', 新值 '{final_new_value}' (请求ID: {self.current_request_id or 'N/A'})")
@@ -331,7 +335,9 @@ def update_component_value_tool(self: 'CircuitAgent', arguments: Dict[str, Any])
 
 @register_tool(
     description="根据提供的 ID 查找电路中的一个特定元件,并返回其详细信息 (类型、ID、值)。",
-    parameters={"type": "object", "properties": {"component_id": {"type": "string", "description": "要查找的元件的 ID。"}}, "required": ["component_id"]}
+    parameters={"type": "object", "properties": {"component_id": {"type": "string", "description": "要查找的元件的 ID。"}}, "required": ["component_id"]},
+    read_only=True,
+    speculative_safe=True
 )
 def find_component_by_id_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
     tool_call_logger_prefix = f"[Action-FindComponentByIdTool-ReqID:{self.current_request_id or 'N/A'}]"
@@ -364,7 +370,9 @@ def find_component_by_id_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -
 
 @register_tool(
     description="列出电路中所有属于指定类型的元件及其详细信息。",
-    parameters={"type": "object", "properties": {"component_type": {"type": "string", "description": "要筛选的元件类型 (例如: '电阻', 'LED', '电池')。此匹配不区分大小写。"}}, "required": ["component_type"]}
+    parameters={"type": "object", "properties": {"component_type": {"type": "string", "description": "要筛选的元件类型 (例如: '电阻', 'LED', '电池')。此匹配不区分大小写,并识别中英文别名 (例如 '电阻' 与 'resistor' 等价)。"}}, "required": ["component_type"]},
+    read_only=True,
+    speculative_safe=True
 )
 def list_components_by_type_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
     tool_call_logger_prefix = f"[Action-ListComponentsByTypeTool-ReqID:{self.current_request_id or 'N/A'}]"
@@ -377,14 +385,9 @@ def list_components_by_type_tool(self: 'CircuitAgent', arguments: Dict[str, Any]
         logger.error(f"{tool_call_logger_prefix} 输入验证失败: {err_msg}")
         return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "USER_INPUT_VALIDATION_ERROR", "error_code": "MISSING_OR_INVALID_COMPONENT_TYPE_FOR_LIST", "technical_message": err_msg}}
     
-    type_cleaned = component_type_req.strip().lower() # 类型匹配不区分大小写
-    
     try:
-        found_components = []
-        for comp_id in self.memory_manager.circuit.components: # 遍历字典的键
-            comp = self.memory_manager.circuit.components[comp_id]
-            if comp.type.lower() == type_cleaned:
-                found_components.append(comp.to_dict())
+        # 通过 Circuit 的类型索引查找 (不区分大小写，识别 "电阻"/"resistor" 等别名)，代价为 O(匹配数)
+        found_components = [comp.to_dict() for comp in self.memory_manager.circuit.get_components_by_type(component_type_req)]
         
         if found_components:
             logger.info(f"{tool_call_logger_prefix} 成功找到 {len(found_components)} 个类型为 '{component_type_req}' 的元件。")
@@ -400,7 +403,9 @@ def list_components_by_type_tool(self: 'CircuitAgent', arguments: Dict[str, Any]
 
 @register_tool(
     description="获取指定元件当前连接到其他元件的数量。",
-    parameters={"type": "object", "properties": {"component_id": {"type": "string", "description": "要查询连接数量的元件的 ID。"}}, "required": ["component_id"]}
+    parameters={"type": "object", "properties": {"component_id": {"type": "string", "description": "要查询连接数量的元件的 ID。"}}, "required": ["component_id"]},
+    read_only=True,
+    speculative_safe=True
 )
 def get_component_connection_count_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
     tool_call_logger_prefix = f"[Action-GetComponentConnectionCountTool-ReqID:{self.current_request_id or 'N/A'}]"
@@ -418,12 +423,8 @@ def get_component_connection_count_tool(self: 'CircuitAgent', arguments: Dict[st
         if id_cleaned not in self.memory_manager.circuit.components:
             raise ValueError(f"元件 '{id_cleaned}' 在电路中不存在,无法查询其连接数。")
         
-        connection_count = 0
-        # 遍历电路中的所有连接
-        for conn_pair_tuple in self.memory_manager.circuit.connections:
-            # conn_pair_tuple 是一个排序后的ID元组，例如 ('ID1', 'ID2')
-            if id_cleaned in conn_pair_tuple:
-                connection_count += 1
+        # 直接读取 Circuit 维护的邻接索引，无需遍历所有连接
+        connection_count = self.memory_manager.circuit.get_component_connection_count(id_cleaned)
         
         logger.info(f"{tool_call_logger_prefix} 元件 '{id_cleaned}' 有 {connection_count} 个连接。")
         return {"status": "success", "message": f"操作成功: 元件 '{id_cleaned}' 当前有 {connection_count} 个连接。", "data": {"component_id": id_cleaned, "connection_count": connection_count}}
@@ -434,4 +435,254 @@ def get_component_connection_count_tool(self: 'CircuitAgent', arguments: Dict[st
     except Exception as e_count:
         err_msg = f"获取元件连接数时发生未知的内部错误: {e_count}"
         logger.error(f"{tool_call_logger_prefix} 未知错误: {err_msg}", exc_info=True)
-        return {"status": "failure", "message": "错误: 获取元件连接数时发生未知内部错误。", "error": {"error_type": "UNEXPECTED_TOOL_ERROR", "error_code": "GET_CONNECTION_COUNT_UNEXPECTED_FAILURE", "technical_message": str(e_count), "exception_details": traceback.format_exc(limit=3)}}
\ No newline at end of file
+        return {"status": "failure", "message": "错误: 获取元件连接数时发生未知内部错误。", "error": {"error_type": "UNEXPECTED_TOOL_ERROR", "error_code": "GET_CONNECTION_COUNT_UNEXPECTED_FAILURE", "technical_message": str(e_count), "exception_details": traceback.format_exc(limit=3)}}
+
+@register_tool(
+    description="判断两个元件之间是否存在 (直接或间接的) 连接路径,例如 'LED 是否接到了地线?'。",
+    parameters={"type": "object", "properties": {"comp1_id": {"type": "string", "description": "第一个元件的 ID。"}, "comp2_id": {"type": "string", "description": "第二个元件的 ID。"}}, "required": ["comp1_id", "comp2_id"]},
+    read_only=True,
+    speculative_safe=True
+)
+def check_components_connected_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
+    tool_call_logger_prefix = f"[Action-CheckComponentsConnectedTool-ReqID:{self.current_request_id or 'N/A'}]"
+    logger.info(f"{tool_call_logger_prefix} 执行连通性查询操作。")
+    logger.debug(f"{tool_call_logger_prefix} 收到参数: {arguments}")
+    comp1_id_req, comp2_id_req = arguments.get("comp1_id"), arguments.get("comp2_id")
+
+    if not all(isinstance(item, str) and item.strip() for item in (comp1_id_req, comp2_id_req)):
+        err_msg = "必须提供两个有效的、非空的元件 ID 字符串。"
+        logger.error(f"{tool_call_logger_prefix} 输入验证失败: {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "USER_INPUT_VALIDATION_ERROR", "error_code": "MISSING_OR_INVALID_COMPONENT_IDS_FOR_PATH_CHECK", "technical_message": err_msg}}
+
+    id1_cleaned, id2_cleaned = comp1_id_req.strip().upper(), comp2_id_req.strip().upper()
+    try:
+        circuit = self.memory_manager.circuit
+        # 基于 Circuit 维护的并查集索引，查询代价近似 O(1)，无需对连接做 BFS
+        connected = circuit.are_components_connected(id1_cleaned, id2_cleaned)
+        directly_connected = id2_cleaned in circuit.get_connected_component_ids(id1_cleaned)
+        group_size = circuit.connectivity.group_size_of(id1_cleaned)
+        logger.info(f"{tool_call_logger_prefix} '{id1_cleaned}' 与 '{id2_cleaned}' 连通: {connected}。")
+        message = (f"操作成功: 元件 '{id1_cleaned}' 与 '{id2_cleaned}' {'直接相连' if directly_connected else ('通过其他元件间接连通' if connected else '之间不存在连接路径')}。")
+        return {"status": "success", "message": message, "data": {"comp1_id": id1_cleaned, "comp2_id": id2_cleaned, "connected": connected, "directly_connected": directly_connected, "comp1_group_size": group_size}}
+    except ValueError as ve_path: # 来自元件存在性检查
+        err_msg_val = str(ve_path)
+        logger.error(f"{tool_call_logger_prefix} 连通性查询验证错误: {err_msg_val}")
+        return {"status": "failure", "message": f"错误: {err_msg_val}", "error": {"error_type": "CIRCUIT_QUERY_ERROR", "error_code": "COMPONENT_NOT_FOUND_FOR_PATH_CHECK", "technical_message": err_msg_val}}
+    except Exception as e_path:
+        err_msg = f"查询元件连通性时发生未知的内部错误: {e_path}"
+        logger.error(f"{tool_call_logger_prefix} 未知错误: {err_msg}", exc_info=True)
+        return {"status": "failure", "message": "错误: 查询元件连通性时发生未知内部错误。", "error": {"error_type": "UNEXPECTED_TOOL_ERROR", "error_code": "CHECK_COMPONENTS_CONNECTED_UNEXPECTED_FAILURE", "technical_message": str(e_path), "exception_details": traceback.format_exc(limit=3)}}
+
+@register_tool(
+    description="列出与指定元件直接或间接相连的全部元件 (即该元件所在的连通网络/子电路的成员)。",
+    parameters={"type": "object", "properties": {"component_id": {"type": "string", "description": "要查询的元件的 ID。"}, "max_items": {"type": "integer", "description": "可选。最多返回的成员数,默认为 100。"}}, "required": ["component_id"]},
+    read_only=True,
+    speculative_safe=True
+)
+def get_net_members_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
+    tool_call_logger_prefix = f"[Action-GetNetMembersTool-ReqID:{self.current_request_id or 'N/A'}]"
+    logger.info(f"{tool_call_logger_prefix} 执行连通网络成员查询操作。")
+    logger.debug(f"{tool_call_logger_prefix} 收到参数: {arguments}")
+    component_id_req = arguments.get("component_id")
+    max_items_req = arguments.get("max_items", 100)
+
+    if not component_id_req or not isinstance(component_id_req, str) or not component_id_req.strip():
+        err_msg = "必须提供一个有效的、非空的元件 ID 字符串。"
+        logger.error(f"{tool_call_logger_prefix} 输入验证失败: {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "USER_INPUT_VALIDATION_ERROR", "error_code": "MISSING_OR_INVALID_COMPONENT_ID_FOR_NET_MEMBERS", "technical_message": err_msg}}
+    if not isinstance(max_items_req, int) or isinstance(max_items_req, bool) or max_items_req < 1:
+        err_msg = f"'max_items' 必须是正整数。收到: {max_items_req!r}"
+        logger.error(f"{tool_call_logger_prefix} 输入验证失败: {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "USER_INPUT_VALIDATION_ERROR", "error_code": "INVALID_MAX_ITEMS_FOR_NET_MEMBERS", "technical_message": err_msg}}
+
+    id_cleaned = component_id_req.strip().upper()
+    try:
+        circuit = self.memory_manager.circuit
+        members = circuit.get_connected_group(id_cleaned)
+        ground_ids = set(circuit.get_ground_component_ids())
+        grounded = any(member in ground_ids for member in members)
+        logger.info(f"{tool_call_logger_prefix} 元件 '{id_cleaned}' 所在连通网络共有 {len(members)} 个元件。")
+        return {"status": "success", "message": f"操作成功: 元件 '{id_cleaned}' 所在的连通网络共有 {len(members)} 个元件{',已接地' if grounded else ',未接地'}。",
+                "data": {"component_id": id_cleaned, "member_count": len(members), "members": members[:max_items_req], "truncated": len(members) > max_items_req, "grounded": grounded}}
+    except ValueError as ve_net:
+        err_msg_val = str(ve_net)
+        logger.error(f"{tool_call_logger_prefix} 连通网络查询验证错误: {err_msg_val}")
+        return {"status": "failure", "message": f"错误: {err_msg_val}", "error": {"error_type": "CIRCUIT_QUERY_ERROR", "error_code": "COMPONENT_NOT_FOUND_FOR_NET_MEMBERS", "technical_message": err_msg_val}}
+    except Exception as e_net:
+        err_msg = f"查询连通网络成员时发生未知的内部错误: {e_net}"
+        logger.error(f"{tool_call_logger_prefix} 未知错误: {err_msg}", exc_info=True)
+        return {"status": "failure", "message": "错误: 查询连通网络成员时发生未知内部错误。", "error": {"error_type": "UNEXPECTED_TOOL_ERROR", "error_code": "GET_NET_MEMBERS_UNEXPECTED_FAILURE", "technical_message": str(e_net), "exception_details": traceback.format_exc(limit=3)}}
+
+@register_tool(
+    description="检查电路的整体连通性: 列出悬空元件 (与任何地线元件都不连通的元件)、完全没有连接的孤立元件,以及互相隔离的子电路数量。",
+    parameters={"type": "object", "properties": {"max_items": {"type": "integer", "description": "可选。每个列表最多返回的元件数,默认为 100。"}}},
+    read_only=True,
+    speculative_safe=True
+)
+def list_floating_components_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
+    tool_call_logger_prefix = f"[Action-ListFloatingComponentsTool-ReqID:{self.current_request_id or 'N/A'}]"
+    logger.info(f"{tool_call_logger_prefix} 执行悬空元件检查操作。")
+    logger.debug(f"{tool_call_logger_prefix} 收到参数: {arguments}")
+    max_items_req = arguments.get("max_items", 100)
+
+    if not isinstance(max_items_req, int) or isinstance(max_items_req, bool) or max_items_req < 1:
+        err_msg = f"'max_items' 必须是正整数。收到: {max_items_req!r}"
+        logger.error(f"{tool_call_logger_prefix} 输入验证失败: {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "USER_INPUT_VALIDATION_ERROR", "error_code": "INVALID_MAX_ITEMS_FOR_FLOATING_CHECK", "technical_message": err_msg}}
+
+    try:
+        circuit = self.memory_manager.circuit
+        ground_ids = circuit.get_ground_component_ids()
+        floating_ids = circuit.get_floating_component_ids()
+        isolated_ids = [component_id for component_id in floating_ids if circuit.get_component_connection_count(component_id) == 0]
+        group_count = circuit.get_connected_group_count()
+        logger.info(f"{tool_call_logger_prefix} 悬空元件 {len(floating_ids)} 个, 孤立元件 {len(isolated_ids)} 个, 连通分组 {group_count} 个。")
+        if not ground_ids and circuit.components:
+            message = f"注意: 电路中没有地线元件,全部 {len(floating_ids)} 个元件都视为悬空。电路共有 {group_count} 个互相隔离的子电路。"
+        else:
+            message = f"操作成功: 发现 {len(floating_ids)} 个悬空元件 (其中 {len(isolated_ids)} 个没有任何连接),电路共有 {group_count} 个互相隔离的子电路。"
+        return {"status": "success", "message": message, "data": {
+            "ground_component_ids": ground_ids, "connected_group_count": group_count,
+            "floating_count": len(floating_ids), "floating_component_ids": floating_ids[:max_items_req],
+            "isolated_count": len(isolated_ids), "isolated_component_ids": isolated_ids[:max_items_req],
+            "truncated": len(floating_ids) > max_items_req}}
+    except Exception as e_floating:
+        err_msg = f"检查悬空元件时发生未知的内部错误: {e_floating}"
+        logger.error(f"{tool_call_logger_prefix} 未知错误: {err_msg}", exc_info=True)
+        return {"status": "failure", "message": "错误: 检查悬空元件时发生未知内部错误。", "error": {"error_type": "UNEXPECTED_TOOL_ERROR", "error_code": "LIST_FLOATING_COMPONENTS_UNEXPECTED_FAILURE", "technical_message": str(e_floating), "exception_details": traceback.format_exc(limit=3)}}
+
+@register_tool(
+    description="在一次调用中批量修改电路 (适合一次性搭建整段子电路)。按顺序执行 operations 中的操作,全部校验通过后原子地应用;任一操作无效则整个批次都不生效。批次内新添加的元件可以在后续操作中通过其 component_id 引用,因此需要互相连接的新元件应显式指定 component_id。",
+    parameters={"type": "object", "properties": {"operations": {"type": "array", "description": "按顺序执行的操作列表。每个操作是一个对象, 'op' 字段取值: 'add_component' (参数 component_type, 可选 component_id, 可选 value)、'remove_component' (参数 component_id)、'connect_components' (参数 comp1_id, comp2_id)、'disconnect_components' (参数 comp1_id, comp2_id)、'update_component_value' (参数 component_id, new_value)。", "items": {"type": "object"}}}, "required": ["operations"]},
+    speculative_safe=True
+)
+def apply_circuit_batch_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Agent工具：通过 Circuit.batch() 事务性地应用一组电路修改操作。
+    一次校验、一次提交、一条长期记忆，替代数百次单独的工具调用。
+    """
+    tool_call_logger_prefix = f"[Action-ApplyCircuitBatchTool-ReqID:{self.current_request_id or 'N/A'}]"
+    logger.info(f"{tool_call_logger_prefix} 执行批量修改电路操作。")
+    logger.debug(f"{tool_call_logger_prefix} 收到参数: {arguments}")
+    operations = arguments.get("operations")
+
+    if not isinstance(operations, list) or not operations:
+        err_msg = "'operations' 必须是一个非空的操作列表。"
+        logger.error(f"{tool_call_logger_prefix} 输入验证失败: {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "USER_INPUT_VALIDATION_ERROR", "error_code": "MISSING_OR_INVALID_BATCH_OPERATIONS", "technical_message": err_msg}}
+
+    from ..circuit_domain.batch import CircuitBatchError
+    circuit = self.memory_manager.circuit
+    batch = circuit.batch()
+    try:
+        # 1. 将每个操作暂存到批次中 (参数的基本类型校验在此完成，电路状态相关的校验在提交时统一进行)
+        for index, operation in enumerate(operations):
+            if not isinstance(operation, dict):
+                raise CircuitBatchError(f"第 {index} 个操作必须是一个对象。", index, {"op": None})
+            op_name = operation.get("op")
+            if op_name == "add_component":
+                component_id_req = operation.get("component_id")
+                # 与 add_component_tool 相同的ID格式规则: 格式无效的ID改为自动生成
+                if isinstance(component_id_req, str) and component_id_req.strip() and \
+                   not re.match(r'^[a-zA-Z0-9_][a-zA-Z0-9_-]*$', component_id_req.strip()):
+                    logger.warning(f"{tool_call_logger_prefix} 第 {index} 个操作提供的 ID '{component_id_req}' 格式无效。将自动生成 ID。")
+                    component_id_req = None
+                batch.add_component(operation.get("component_type"), component_id_req if isinstance(component_id_req, str) else None, operation.get("value"))
+            elif op_name in ("remove_component", "update_component_value"):
+                component_id_req = operation.get("component_id")
+                if not isinstance(component_id_req, str) or not component_id_req.strip():
+                    raise CircuitBatchError(f"第 {index} 个操作 ('{op_name}') 必须提供有效的、非空的 component_id。", index, operation)
+                if op_name == "remove_component":
+                    batch.remove_component(component_id_req)
+                else:
+                    batch.update_component_value(component_id_req, operation.get("new_value"))
+            elif op_name in ("connect_components", "disconnect_components"):
+                comp1_id_req, comp2_id_req = operation.get("comp1_id"), operation.get("comp2_id")
+                if not isinstance(comp1_id_req, str) or not comp1_id_req.strip() or \
+                   not isinstance(comp2_id_req, str) or not comp2_id_req.strip():
+                    raise CircuitBatchError(f"第 {index} 个操作 ('{op_name}') 必须提供两个有效的、非空的元件 ID (comp1_id, comp2_id)。", index, operation)
+                if op_name == "connect_components":
+                    batch.connect_components(comp1_id_req, comp2_id_req)
+                else:
+                    batch.disconnect_components(comp1_id_req, comp2_id_req)
+            else:
+                raise CircuitBatchError(f"第 {index} 个操作的类型 '{op_name}' 无效。", index, operation)
+
+        # 2. 统一校验并原子提交
+        summary = batch.commit()
+    except CircuitBatchError as e_batch:
+        err_msg_val = str(e_batch)
+        logger.error(f"{tool_call_logger_prefix} 批量操作验证失败 (第 {e_batch.operation_index} 个操作): {err_msg_val}")
+        return {"status": "failure", "message": f"错误: 批量操作未生效,第 {e_batch.operation_index} 个操作无效: {err_msg_val}", "error": {"error_type": "CIRCUIT_OPERATION_ERROR", "error_code": "BATCH_OPERATION_VALIDATION_FAILED", "technical_message": err_msg_val, "failed_operation_index": e_batch.operation_index, "failed_operation": e_batch.operation}}
+    except Exception as e_batch_unexpected:
+        err_msg = f"批量修改电路时发生未知的内部错误: {e_batch_unexpected}"
+        logger.error(f"{tool_call_logger_prefix} 未知错误: {err_msg}", exc_info=True)
+        return {"status": "failure", "message": "错误: 批量修改电路时发生未知内部错误。", "error": {"error_type": "UNEXPECTED_TOOL_ERROR", "error_code": "APPLY_CIRCUIT_BATCH_UNEXPECTED_FAILURE", "technical_message": str(e_batch_unexpected), "exception_details": traceback.format_exc(limit=3)}}
+
+    counts_desc = (f"添加 {len(summary['added'])} 个元件, 移除 {len(summary['removed'])} 个元件, "
+                   f"新增 {len(summary['connected'])} 个连接, 断开 {len(summary['disconnected'])} 个连接, "
+                   f"更新 {len(summary['updated'])} 个元件值")
+    if summary["skipped"]:
+        counts_desc += f", 跳过 {len(summary['skipped'])} 个无需执行的操作 (重复连接或本就不存在的连接)"
+    logger.info(f"{tool_call_logger_prefix} 批量操作成功: {counts_desc}。")
+    # 整个批次只写入一条长期记忆
+    self.memory_manager.add_to_long_term(f"批量修改了电路: {counts_desc} (请求ID: {self.current_request_id or 'N/A'})")
+    return {"status": "success", "message": f"操作成功: 批量修改已应用 ({counts_desc})。", "data": summary}
+
+@register_tool(
+    description="撤销最近对电路所做的修改。每次修改类工具调用 (包括一次批量操作或一次清空电路) 算作一步。",
+    parameters={"type": "object", "properties": {"steps": {"type": "integer", "description": "要撤销的步骤数,默认为 1。"}}}
+)
+def undo_circuit_change_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
+    tool_call_logger_prefix = f"[Action-UndoCircuitChangeTool-ReqID:{self.current_request_id or 'N/A'}]"
+    logger.info(f"{tool_call_logger_prefix} 执行撤销电路修改操作。")
+    logger.debug(f"{tool_call_logger_prefix} 收到参数: {arguments}")
+    steps_req = arguments.get("steps", 1)
+
+    if not isinstance(steps_req, int) or isinstance(steps_req, bool) or steps_req < 1:
+        err_msg = f"'steps' 必须是正整数。收到: {steps_req!r}"
+        logger.error(f"{tool_call_logger_prefix} 输入验证失败: {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "USER_INPUT_VALIDATION_ERROR", "error_code": "INVALID_UNDO_STEPS", "technical_message": err_msg}}
+
+    try:
+        undone_steps = self.memory_manager.circuit.undo(steps_req)
+        if undone_steps == 0:
+            msg_nothing = "没有可以撤销的电路修改。"
+            logger.info(f"{tool_call_logger_prefix} {msg_nothing}")
+            return {"status": "success", "message": f"注意: {msg_nothing}", "data": {"undone_steps": 0, "can_undo": False, "can_redo": self.memory_manager.circuit.journal.can_redo}}
+        logger.info(f"{tool_call_logger_prefix} 成功撤销 {undone_steps} 步电路修改。")
+        self.memory_manager.add_to_long_term(f"撤销了最近 {undone_steps} 步电路修改 (请求ID: {self.current_request_id or 'N/A'})")
+        return {"status": "success", "message": f"操作成功: 已撤销最近 {undone_steps} 步电路修改{'(可撤销的步骤不足 ' + str(steps_req) + ' 步)' if undone_steps < steps_req else ''}。", "data": {"undone_steps": undone_steps, "can_undo": self.memory_manager.circuit.journal.can_undo, "can_redo": True}}
+    except Exception as e_undo:
+        err_msg = f"撤销电路修改时发生未知的内部错误: {e_undo}"
+        logger.error(f"{tool_call_logger_prefix} 未知错误: {err_msg}", exc_info=True)
+        return {"status": "failure", "message": "错误: 撤销电路修改时发生未知内部错误。", "error": {"error_type": "UNEXPECTED_TOOL_ERROR", "error_code": "UNDO_CIRCUIT_CHANGE_UNEXPECTED_FAILURE", "technical_message": str(e_undo), "exception_details": traceback.format_exc(limit=3)}}
+
+@register_tool(
+    description="重做最近被撤销的电路修改。在撤销之后如果又对电路做了新的修改,则无法再重做。",
+    parameters={"type": "object", "properties": {"steps": {"type": "integer", "description": "要重做的步骤数,默认为 1。"}}}
+)
+def redo_circuit_change_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
+    tool_call_logger_prefix = f"[Action-RedoCircuitChangeTool-ReqID:{self.current_request_id or 'N/A'}]"
+    logger.info(f"{tool_call_logger_prefix} 执行重做电路修改操作。")
+    logger.debug(f"{tool_call_logger_prefix} 收到参数: {arguments}")
+    steps_req = arguments.get("steps", 1)
+
+    if not isinstance(steps_req, int) or isinstance(steps_req, bool) or steps_req < 1:
+        err_msg = f"'steps' 必须是正整数。收到: {steps_req!r}"
+        logger.error(f"{tool_call_logger_prefix} 输入验证失败: {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "USER_INPUT_VALIDATION_ERROR", "error_code": "INVALID_REDO_STEPS", "technical_message": err_msg}}
+
+    try:
+        redone_steps = self.memory_manager.circuit.redo(steps_req)
+        if redone_steps == 0:
+            msg_nothing = "没有可以重做的电路修改。"
+            logger.info(f"{tool_call_logger_prefix} {msg_nothing}")
+            return {"status": "success", "message": f"注意: {msg_nothing}", "data": {"redone_steps": 0, "can_undo": self.memory_manager.circuit.journal.can_undo, "can_redo": False}}
+        logger.info(f"{tool_call_logger_prefix} 成功重做 {redone_steps} 步电路修改。")
+        self.memory_manager.add_to_long_term(f"重做了 {redone_steps} 步电路修改 (请求ID: {self.current_request_id or 'N/A'})")
+        return {"status": "success", "message": f"操作成功: 已重做 {redone_steps} 步电路修改{'(可重做的步骤不足 ' + str(steps_req) + ' 步)' if redone_steps < steps_req else ''}。", "data": {"redone_steps": redone_steps, "can_undo": True, "can_redo": self.memory_manager.circuit.journal.can_redo}}
+    except Exception as e_redo:
+        err_msg = f"重做电路修改时发生未知的内部错误: {e_redo}"
+        logger.error(f"{tool_call_logger_prefix} 未知错误: {err_msg}", exc_info=True)
+        return {"status": "failure", "message": "错误: 重做电路修改时发生未知内部错误。", "error": {"error_type": "UNEXPECTED_TOOL_ERROR", "error_code": "REDO_CIRCUIT_CHANGE_UNEXPECTED_FAILURE", "technical_message": str(e_redo), "exception_details": traceback.format_exc(limit=3)}}
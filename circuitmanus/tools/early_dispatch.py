@@ -0,0 +1,184 @@
+# IDT_AGENT_Pro/circuitmanus/tools/early_dispatch.py
+import asyncio
+import logging
+from uuid import uuid4
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
+
+from ..request_context import RequestContext
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from ..agent import CircuitAgent
+
+logger = logging.getLogger(__name__)
+
+class EarlyToolDispatcher:
+    """
+    规划 LLM 仍在流式生成时，提前执行计划中已经完整的工具调用 (流水线模式)。
+
+    增量解析器每解析出一个完整且通过单项校验的工具调用请求就调用 submit，请求在后台任务中按顺序执行，
+    与模型生成计划其余部分的时间重叠。只有标记为可推测执行 (@register_tool(speculative_safe=True)，
+    副作用仅限电路与记忆、可被回滚) 的工具会被提前执行；遇到其它工具 (写文件、调用外部服务等) 时，
+    它和之后的全部请求都留到 commit 时再按顺序执行。提前执行是推测性的，以整个计划的最终校验为准:
+    - commit: 计划被采纳且其工具列表以已提交的请求开头时，补交其余请求，等待全部执行完毕并返回结果；
+    - rollback: 计划未被采纳或与已执行的请求不一致时，等待正在执行的工具结束，把电路回滚到
+      提前执行之前的快照，并删除这些工具写入的长期记忆。
+
+    commit 之前工具状态更新先缓存起来，被撤销的操作不会显示给用户。与普通的工具批次一样，
+    第一个会修改电路的工具执行前取得会话的修改锁 (直到请求结束才释放)，每个工具执行期间持有 state_lock；
+    某个工具失败后，之后的请求按失败中止处理。
+    """
+    def __init__(self,
+                 agent: 'CircuitAgent',
+                 request_context: RequestContext,
+                 status_callback: Callable[[Dict[str, Any]], Awaitable[None]],
+                 log_prefix: str = ""):
+        self._agent = agent
+        self._request_context = request_context
+        self._status_callback = status_callback
+        self._log_prefix = log_prefix or f"[EarlyToolDispatcher - ReqID:{request_context.request_id}]"
+        self._executor_id = f"early_{str(uuid4())[:8]}"
+        self._queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._submitted_requests: List[Dict[str, Any]] = []
+        self._results: List[Dict[str, Any]] = []
+        self._failed_tool: Optional[Tuple[Dict[str, Any], Dict[str, Any]]] = None # (失败的请求, 其结果消息)
+        self._buffered_status_updates: List[Dict[str, Any]] = []
+        self._buffering_status_updates: bool = True
+        self._stopping: bool = False
+        self._finished: bool = False
+        self._holding_back: bool = False # 已遇到不可推测执行的工具，之后的请求留到 commit
+
+        self.acquired_mutation_lock: bool = False # 是否由本调度器为请求取得了修改锁
+        self.batch_snapshot: Optional[int] = None # 提前执行前的电路快照与版本号 (用于回滚与电气规则检查)
+        self.batch_revision: Optional[int] = None
+        self._snapshot_under_mutation_lock: bool = False
+        self._long_term_before: Optional[List[str]] = None
+
+    @property
+    def submitted_count(self) -> int:
+        """已提交提前执行的工具调用请求数。"""
+        return len(self._submitted_requests)
+
+    def submit(self, tool_request: Dict[str, Any]) -> None:
+        """提交一个完整的工具调用请求 (增量解析器的 tool_request_callback)。不会阻塞。"""
+        if self._finished or self._stopping or self._holding_back:
+            return
+        if not self._agent.runtime.is_speculative_safe_tool(tool_request):
+            self._holding_back = True
+            logger.info(f"{self._log_prefix} 工具 '{tool_request.get('toolName')}' 不可推测执行,它及之后的工具调用留到计划确认后执行。")
+            return
+        self._enqueue(tool_request)
+
+    def _enqueue(self, tool_request: Dict[str, Any]) -> None:
+        self._submitted_requests.append(tool_request)
+        self._queue.put_nowait(tool_request)
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"{self._log_prefix} 计划仍在生成,开始提前执行已完整的工具调用。")
+
+    async def _forward_status_update(self, status_update: Dict[str, Any]) -> None:
+        if self._buffering_status_updates:
+            self._buffered_status_updates.append(status_update)
+            return
+        await self._status_callback(status_update)
+
+    async def _run(self) -> None:
+        agent = self._agent
+        tool_executor = agent.tool_executor
+        tool_index = 0
+        while True:
+            tool_request = await self._queue.get()
+            if tool_request is None:
+                break
+            if self._stopping:
+                continue # 回滚中: 丢弃尚未开始的请求
+            if self._failed_tool is not None:
+                failed_tool_request, failed_tool_result_message = self._failed_tool
+                self._results.append(await tool_executor.abort_tool_call(
+                    self._executor_id, tool_request, failed_tool_request, failed_tool_result_message, self._forward_status_update
+                ))
+                continue
+            await self._prepare_for_tool(tool_request)
+            async with agent.state_lock:
+                tool_result_message, tool_succeeded = await tool_executor.execute_tool_call(
+                    self._executor_id, tool_index, len(self._submitted_requests), tool_request, self._forward_status_update
+                )
+            self._results.append(tool_result_message)
+            tool_index += 1
+            if not tool_succeeded:
+                logger.warning(f"{self._log_prefix} 提前执行的工具 '{tool_result_message['name']}' 失败,之后的工具将被中止。")
+                self._failed_tool = (tool_request, tool_result_message)
+
+    async def _prepare_for_tool(self, tool_request: Dict[str, Any]) -> None:
+        """执行工具前按需取得修改锁，并在第一次执行 (或取得修改锁) 时创建电路快照。"""
+        agent = self._agent
+        if not self._request_context.holds_mutation_lock and agent.runtime.is_modifying_tool_batch([tool_request]):
+            await agent.mutation_lock.acquire()
+            self._request_context.holds_mutation_lock = True
+            self.acquired_mutation_lock = True
+            self.batch_snapshot = None # 之前执行的都是只读工具，快照移到取得锁之后，避免回滚掉其它请求的修改
+            logger.info(f"{self._log_prefix} 提前执行的工具会修改电路,已取得会话修改锁。")
+        if self.batch_snapshot is None:
+            async with agent.state_lock:
+                circuit = agent.memory_manager.circuit
+                self.batch_snapshot = circuit.create_snapshot()
+                self.batch_revision = circuit.revision
+                self._snapshot_under_mutation_lock = self._request_context.holds_mutation_lock
+                if self._long_term_before is None:
+                    self._long_term_before = list(agent.memory_manager.long_term)
+
+    async def commit(self, final_tool_requests: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        以最终采纳的计划确认提前执行: 执行其余的工具调用并返回全部结果 (用于LLM历史记录的工具结果消息列表)。
+        最终计划的工具列表不以已提交的请求开头时回滚提前执行的工具并返回 None，由调用方按普通方式执行。
+        """
+        if self._finished:
+            return None
+        if final_tool_requests[:len(self._submitted_requests)] != self._submitted_requests:
+            logger.warning(f"{self._log_prefix} 最终计划与提前执行的工具调用不一致,撤销提前执行的结果。")
+            await self.rollback()
+            return None
+        for tool_request in final_tool_requests[len(self._submitted_requests):]:
+            self._enqueue(tool_request) # 计划已确认，包括不可推测执行的工具
+        self._queue.put_nowait(None)
+        while self._buffered_status_updates: # 先补发缓存的状态更新，之后的更新直接发送
+            await self._status_callback(self._buffered_status_updates.pop(0))
+        self._buffering_status_updates = False
+        if self._task is not None:
+            await self._task
+        self._finished = True
+        logger.info(f"{self._log_prefix} 计划已确认,提前执行的工具调用已提交 (共 {len(self._results)} 个结果)。")
+        return list(self._results)
+
+    async def rollback(self) -> int:
+        """撤销提前执行的工具调用 (计划未被采纳时)，返回被回滚的电路修改条目数。"""
+        if self._finished:
+            return 0
+        self._finished = True
+        self._stopping = True
+        self._queue.put_nowait(None)
+        if self._task is not None:
+            try:
+                await self._task # 正在执行的工具无法中断，等待其结束后再回滚
+            except Exception as e:
+                logger.error(f"{self._log_prefix} 提前执行工具的任务出错: {e}", exc_info=True)
+        self._buffered_status_updates.clear()
+        if self.batch_snapshot is None:
+            return 0
+
+        rolled_back_count = 0
+        agent = self._agent
+        async with agent.state_lock:
+            if self._snapshot_under_mutation_lock: # 未持有修改锁说明只执行了只读工具，电路没有被本请求修改
+                try:
+                    rolled_back_count = agent.memory_manager.circuit.restore_snapshot(self.batch_snapshot)
+                except ValueError as e:
+                    logger.error(f"{self._log_prefix} 回滚提前执行的工具失败: {e}")
+            if self._long_term_before is not None:
+                request_tag = f"(请求ID: {self._request_context.request_id})"
+                entries_before = set(self._long_term_before)
+                agent.memory_manager.long_term = [entry for entry in agent.memory_manager.long_term
+                                                  if entry in entries_before or request_tag not in entry]
+        logger.info(f"{self._log_prefix} 计划未被采纳,已撤销 {len(self._results)} 个提前执行的工具调用 (回滚电路修改 {rolled_back_count} 条)。")
+        return rolled_back_count
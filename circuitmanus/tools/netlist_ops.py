@@ -0,0 +1,193 @@
+# IDT_AGENT_Pro/circuitmanus/tools/netlist_ops.py
+import os
+import logging
+import traceback
+from itertools import islice
+from typing import Dict, Any, TYPE_CHECKING
+
+from .base import register_tool
+from ..circuit_domain.batch import CircuitBatchError
+from ..circuit_domain.spice import import_spice_netlist, iter_spice_netlist
+from ..sessions.store import is_persistable_session_id
+
+if TYPE_CHECKING:
+    from ..agent import CircuitAgent
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_NETLIST_DIRECTORY = "netlists"
+_MAX_INLINE_EXPORT_LINES = 200
+_NETLIST_EXTENSIONS = (".cir", ".net", ".sp", ".spice", ".ckt")
+
+def get_netlist_directory(agent: 'CircuitAgent') -> str:
+    """
+    返回 Agent 的网表文件存放目录，不存在时创建。Web 会话使用
+    agent_settings.tools.netlist_directory 下以会话ID命名的子目录，各会话互相看不到对方的网表；
+    没有会话ID的 Agent (命令行) 直接使用网表目录。
+
+    Raises:
+        ValueError: 如果会话ID不能用作目录名。
+    """
+    directory = os.path.abspath(agent.config_loader.get_config("agent_settings.tools.netlist_directory", _DEFAULT_NETLIST_DIRECTORY))
+    if agent.session_id is not None:
+        if not is_persistable_session_id(agent.session_id):
+            raise ValueError(f"会话ID '{agent.session_id}' 不能用作网表目录名。")
+        directory = os.path.join(directory, agent.session_id)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def resolve_netlist_path(agent: 'CircuitAgent', file_name: str) -> str:
+    """
+    把文件名解析为网表目录下的绝对路径。
+
+    Raises:
+        ValueError: 如果文件名为空、扩展名不是网表格式、解析后的路径位于网表目录之外，或会话ID不能用作目录名。
+    """
+    directory = get_netlist_directory(agent)
+    path = os.path.realpath(os.path.join(directory, file_name.strip()))
+    if os.path.commonpath([path, os.path.realpath(directory)]) != os.path.realpath(directory) or path == os.path.realpath(directory):
+        raise ValueError(f"文件名 '{file_name}' 无效,网表文件只能位于网表目录之内。")
+    if not path.lower().endswith(_NETLIST_EXTENSIONS):
+        raise ValueError(f"文件名 '{file_name}' 的扩展名无效,支持: {', '.join(_NETLIST_EXTENSIONS)}。")
+    return path
+
+def import_spice_file(agent: 'CircuitAgent', path: str, id_prefix: str = "", skip_title: bool = True) -> Dict[str, Any]:
+    """
+    把网表文件流式导入 Agent 的电路 (逐行读取，不把文件整体载入内存)，并写入一条长期记忆。
+    供导入工具与 Web 上传接口共用。
+
+    Raises:
+        OSError: 文件无法读取。
+        CircuitBatchError: 导入的元件与电路中已有元件冲突 (电路保持导入前的状态)。
+    """
+    with open(path, "r", encoding="utf-8", errors="replace") as netlist_file:
+        summary = import_spice_netlist(agent.memory_manager.circuit, netlist_file, id_prefix=id_prefix, skip_title=skip_title)
+    summary["file_name"] = os.path.basename(path)
+    agent.memory_manager.add_to_long_term(
+        f"从 SPICE 网表 '{summary['file_name']}' 导入了 {summary['element_count']} 个元件与 {summary['net_count']} 个网络节点 "
+        f"(请求ID: {agent.current_request_id or 'N/A'})"
+    )
+    return summary
+
+@register_tool(
+    description="从 SPICE 网表 (.cir/.net/.sp) 一次性导入整个电路,适合加载已有设计,远快于逐个添加元件。每个 SPICE 网络导入为一个节点元件 (ID 为 'NET_' + 网络名),地网络 (0/GND) 导入为地线元件 'GND',元件按网表中的名称作为 ID。网表可以是网表目录中的文件 (用户通过界面上传的网表也在其中),也可以直接给出网表文本。整个导入可以一步撤销。",
+    parameters={"type": "object", "properties": {
+        "file_name": {"type": "string", "description": "可选。网表目录中的文件名 (例如 'amp.cir')。与 netlist_text 二选一。"},
+        "netlist_text": {"type": "string", "description": "可选。网表文本 (首行为标题行)。与 file_name 二选一。"},
+        "id_prefix": {"type": "string", "description": "可选。加在所有导入元件 ID 前的前缀,用于避免与电路中已有元件的 ID 冲突 (例如 'U2_')。"},
+        "skip_title": {"type": "boolean", "description": "可选。是否把首行当作标题行 (SPICE 约定),默认为 true。"}
+    }},
+    speculative_safe=True
+)
+def import_spice_netlist_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
+    tool_call_logger_prefix = f"[Action-ImportSpiceNetlistTool-ReqID:{self.current_request_id or 'N/A'}]"
+    logger.info(f"{tool_call_logger_prefix} 执行 SPICE 网表导入。")
+    logger.debug(f"{tool_call_logger_prefix} 收到参数: { {key: (value[:200] if isinstance(value, str) else value) for key, value in arguments.items()} }")
+    file_name_req = arguments.get("file_name")
+    netlist_text_req = arguments.get("netlist_text")
+    id_prefix_req = arguments.get("id_prefix", "")
+    skip_title_req = arguments.get("skip_title", True)
+
+    def validation_failure(err_msg: str, error_code: str) -> Dict[str, Any]:
+        logger.error(f"{tool_call_logger_prefix} 输入验证失败: {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "USER_INPUT_VALIDATION_ERROR", "error_code": error_code, "technical_message": err_msg}}
+
+    has_file = isinstance(file_name_req, str) and bool(file_name_req.strip())
+    has_text = isinstance(netlist_text_req, str) and bool(netlist_text_req.strip())
+    if has_file == has_text:
+        return validation_failure("必须且只能提供 'file_name' 与 'netlist_text' 之一。", "INVALID_NETLIST_SOURCE")
+    if not isinstance(id_prefix_req, str) or (id_prefix_req.strip() and not id_prefix_req.strip().replace("_", "").replace("-", "").isalnum()):
+        return validation_failure(f"'id_prefix' 只能包含字母、数字、下划线和连字符。收到: {id_prefix_req!r}", "INVALID_ID_PREFIX_FOR_NETLIST_IMPORT")
+    if not isinstance(skip_title_req, bool):
+        return validation_failure(f"'skip_title' 必须是布尔值。收到: {skip_title_req!r}", "INVALID_SKIP_TITLE_FOR_NETLIST_IMPORT")
+
+    try:
+        if has_file:
+            try:
+                netlist_path = resolve_netlist_path(self, file_name_req)
+            except ValueError as e_path:
+                return validation_failure(str(e_path), "INVALID_NETLIST_FILE_NAME")
+            if not os.path.isfile(netlist_path):
+                err_msg = f"网表文件 '{file_name_req.strip()}' 不存在。"
+                logger.error(f"{tool_call_logger_prefix} {err_msg}")
+                return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "USER_INPUT_VALIDATION_ERROR", "error_code": "NETLIST_FILE_NOT_FOUND", "technical_message": err_msg}}
+            summary = import_spice_file(self, netlist_path, id_prefix=id_prefix_req, skip_title=skip_title_req)
+        else:
+            summary = import_spice_netlist(self.memory_manager.circuit, netlist_text_req.splitlines(), id_prefix=id_prefix_req, skip_title=skip_title_req)
+            self.memory_manager.add_to_long_term(f"从 SPICE 网表文本导入了 {summary['element_count']} 个元件与 {summary['net_count']} 个网络节点 (请求ID: {self.current_request_id or 'N/A'})")
+    except CircuitBatchError as e_batch:
+        err_msg = str(e_batch)
+        logger.error(f"{tool_call_logger_prefix} 导入未生效: {err_msg}")
+        return {"status": "failure", "message": f"错误: 网表导入未生效 (电路未被修改): {err_msg} 可以通过 'id_prefix' 为导入的元件加前缀以避免 ID 冲突。", "error": {"error_type": "CIRCUIT_OPERATION_ERROR", "error_code": "NETLIST_IMPORT_CONFLICT", "technical_message": err_msg, "failed_operation": e_batch.operation}}
+    except OSError as e_io:
+        err_msg = f"读取网表文件失败: {e_io}"
+        logger.error(f"{tool_call_logger_prefix} {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "TOOL_EXECUTION_ERROR", "error_code": "NETLIST_FILE_READ_FAILED", "technical_message": str(e_io)}}
+    except Exception as e_import:
+        err_msg = f"导入 SPICE 网表时发生未知的内部错误: {e_import}"
+        logger.error(f"{tool_call_logger_prefix} 未知错误: {err_msg}", exc_info=True)
+        return {"status": "failure", "message": "错误: 导入 SPICE 网表时发生未知内部错误。", "error": {"error_type": "UNEXPECTED_TOOL_ERROR", "error_code": "IMPORT_SPICE_NETLIST_UNEXPECTED_FAILURE", "technical_message": str(e_import), "exception_details": traceback.format_exc(limit=3)}}
+
+    logger.info(f"{tool_call_logger_prefix} 导入成功: {summary['element_count']} 个元件, {summary['net_count']} 个网络。")
+    message = f"操作成功: 已从网表{' ' + repr(summary['title']) + ' ' if summary['title'] else ''}导入 {summary['element_count']} 个元件、{summary['net_count']} 个网络节点、{summary['connection_count']} 个连接。"
+    skipped_total = sum(summary["skipped"].values())
+    if skipped_total:
+        message += f" 跳过了 {skipped_total} 行不支持的内容 (子电路、受控源、点命令等)。"
+    if summary["reversed_diode_count"]:
+        message += f" 注意: {summary['reversed_diode_count']} 个二极管的方向无法在电路模型中保持 (见 reversed_diode_ids)。"
+    return {"status": "success", "message": message, "data": summary}
+
+@register_tool(
+    description="把当前电路导出为 SPICE 网表。提供 file_name 时写入网表目录中的文件 (可用于下载或外部仿真);不提供时直接返回网表文本 (仅限较小的电路)。网络按电路连接推断,节点元件导出为网络名,地线导出为 0。",
+    parameters={"type": "object", "properties": {
+        "file_name": {"type": "string", "description": "可选。写入网表目录中的文件名 (例如 'design.cir'),已存在时覆盖。"},
+        "title": {"type": "string", "description": "可选。网表标题行。"}
+    }}
+) # 会写文件，不标记为只读: 与修改电路的请求一样按顺序执行，避免并发请求同时写同一个网表文件
+def export_spice_netlist_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
+    tool_call_logger_prefix = f"[Action-ExportSpiceNetlistTool-ReqID:{self.current_request_id or 'N/A'}]"
+    logger.info(f"{tool_call_logger_prefix} 执行 SPICE 网表导出。")
+    logger.debug(f"{tool_call_logger_prefix} 收到参数: {arguments}")
+    file_name_req = arguments.get("file_name")
+    title_req = arguments.get("title")
+
+    def validation_failure(err_msg: str, error_code: str) -> Dict[str, Any]:
+        logger.error(f"{tool_call_logger_prefix} 输入验证失败: {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "USER_INPUT_VALIDATION_ERROR", "error_code": error_code, "technical_message": err_msg}}
+
+    if title_req is not None and (not isinstance(title_req, str) or "\n" in title_req):
+        return validation_failure("'title' 必须是单行字符串。", "INVALID_NETLIST_TITLE")
+    if file_name_req is not None and (not isinstance(file_name_req, str) or not file_name_req.strip()):
+        return validation_failure("'file_name' 必须是非空字符串。", "INVALID_NETLIST_FILE_NAME")
+
+    circuit = self.memory_manager.circuit
+    try:
+        netlist_lines = iter_spice_netlist(circuit, title=title_req)
+        if file_name_req is None:
+            head_lines = list(islice(netlist_lines, _MAX_INLINE_EXPORT_LINES + 1))
+            if len(head_lines) > _MAX_INLINE_EXPORT_LINES:
+                return validation_failure(f"电路较大,网表超过 {_MAX_INLINE_EXPORT_LINES} 行,请提供 'file_name' 导出到文件。", "NETLIST_TOO_LARGE_FOR_INLINE_EXPORT")
+            logger.info(f"{tool_call_logger_prefix} 导出成功: {len(head_lines)} 行 (内联返回)。")
+            return {"status": "success", "message": f"操作成功: 已将电路导出为 SPICE 网表 ({len(head_lines)} 行)。", "data": {"netlist": "\n".join(head_lines), "line_count": len(head_lines)}}
+        try:
+            netlist_path = resolve_netlist_path(self, file_name_req)
+        except ValueError as e_path:
+            return validation_failure(str(e_path), "INVALID_NETLIST_FILE_NAME")
+        line_count = 0
+        with open(netlist_path, "w", encoding="utf-8", newline="\n") as netlist_file:
+            for line in netlist_lines: # 逐行写出，不在内存中拼接整个网表
+                netlist_file.write(line)
+                netlist_file.write("\n")
+                line_count += 1
+    except OSError as e_io:
+        err_msg = f"写入网表文件失败: {e_io}"
+        logger.error(f"{tool_call_logger_prefix} {err_msg}")
+        return {"status": "failure", "message": f"错误: {err_msg}", "error": {"error_type": "TOOL_EXECUTION_ERROR", "error_code": "NETLIST_FILE_WRITE_FAILED", "technical_message": str(e_io)}}
+    except Exception as e_export:
+        err_msg = f"导出 SPICE 网表时发生未知的内部错误: {e_export}"
+        logger.error(f"{tool_call_logger_prefix} 未知错误: {err_msg}", exc_info=True)
+        return {"status": "failure", "message": "错误: 导出 SPICE 网表时发生未知内部错误。", "error": {"error_type": "UNEXPECTED_TOOL_ERROR", "error_code": "EXPORT_SPICE_NETLIST_UNEXPECTED_FAILURE", "technical_message": str(e_export), "exception_details": traceback.format_exc(limit=3)}}
+
+    file_name = os.path.basename(netlist_path)
+    logger.info(f"{tool_call_logger_prefix} 导出成功: {line_count} 行 -> {netlist_path}")
+    return {"status": "success", "message": f"操作成功: 已将电路导出为 SPICE 网表文件 '{file_name}' ({line_count} 行)。", "data": {"file_name": file_name, "line_count": line_count}}
@@ -43,7 +43,8 @@ logger = logging.getLogger(__name__) # 模块级 logger
             "num_results": {"type": "integer", "description": "期望返回的搜索结果数量 (例如: 1 到 10)。如果未提供或无效,将使用配置文件中的默认值 (通常是3)。"}
         },
         "required": ["query"]
-    }
+    },
+    read_only=True
 )
 async def duckduckgo_search_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -182,7 +183,8 @@ async def duckduckgo_search_tool(self: 'CircuitAgent', arguments: Dict[str, Any]
             "num_results": {"type": "integer", "description": "期望返回的搜索结果数量 (例如: 1 到 10)。如果未提供或无效,默认为5。SerpApi的 'num' 参数控制返回结果。"}
         },
         "required": ["query"]
-    }
+    },
+    read_only=True
 )
 async def serpapi_google_search_tool(self: 'CircuitAgent', arguments: Dict[str, Any]) -> Dict[str, Any]:
     tool_call_logger_prefix = f"[Action-SerpApiGoogleSearchTool-ReqID:{self.current_request_id or 'N/A'}]"
@@ -4,15 +4,21 @@ import uuid
 import asyncio
 import logging
 import json 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
-from typing import Dict, Callable, Awaitable, Any, Optional, Union
+from typing import Dict, Set, Callable, Awaitable, Any, AsyncIterator, Optional, Union
+from circuitmanus.sessions import SessionCache, SessionStore, create_session_store
 import time
 import traceback 
 
 try:
     from circuitmanus.agent import CircuitAgent
+    from circuitmanus.runtime import AgentRuntime
+    from circuitmanus.circuit_domain.batch import CircuitBatchError
+    from circuitmanus.tools.netlist_ops import import_spice_file, resolve_netlist_path
+    from circuitmanus.utils.config_loader import ConfigLoader
     AGENT_AVAILABLE = True 
     logger = logging.getLogger("server") 
     logger.info("CircuitAgent 模块从 'circuitmanus.agent' 导入成功.")
@@ -42,12 +48,13 @@ except ImportError as e:
                                      user_request: str, 
                                      status_callback: Callable[[Dict[str, Any]], Awaitable[None]],
                                      selected_llm_identifier_from_frontend: Optional[str] = None,
-                                     enable_chinese_thinking_from_frontend: Optional[bool] = None
+                                     enable_chinese_thinking_from_frontend: Optional[bool] = None,
+                                     request_id: Optional[str] = None
                                      ) -> None:
             error_msg_content = "错误: 后端Agent核心模块未能加载,无法处理您的请求. 请联系管理员检查服务器日志 (V1.1.1-Fallback)." # 版本更新
             logger.error("假的Agent (server.py fallback): 收到请求,返回错误信息.")
             if status_callback:
-                 request_id_fallback = f"fallback_req_{str(uuid.uuid4())[:6]}"
+                 request_id_fallback = request_id or f"fallback_req_{str(uuid.uuid4())[:6]}"
                  llm_interaction_id_fallback = f"fallback_llm_interaction_id_{str(uuid.uuid4())[:6]}"
                  
                  await status_callback({
@@ -74,7 +81,16 @@ except ImportError as e:
                     })
 
 
-app = FastAPI(title="CircuitManus Agent API - V1.1.1 (Dynamic Model Availability)", version="1.4.1_dyn_model") # 版本更新
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """应用生命周期: 启动时开始会话缓存的后台写回；关闭时写回全部有修改的会话，并关闭共享的 LLM 连接池。"""
+    session_cache.start()
+    yield
+    await session_cache.stop()
+    if AGENT_AVAILABLE:
+        await AgentRuntime.aclose_shared()
+
+app = FastAPI(title="CircuitManus Agent API - V1.1.1 (Dynamic Model Availability)", version="1.4.1_dyn_model", lifespan=lifespan) # 版本更新
 
 STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
 if not os.path.isdir(STATIC_DIR):
@@ -92,44 +108,101 @@ except RuntimeError as e:
     logger.error(f"挂载静态文件目录 '{STATIC_DIR}' 失败: {e}. 请确保 'static' 目录存在于正确的位置.", exc_info=True)
 
 
-agent_sessions: Dict[str, CircuitAgent] = {} 
-agent_locks: Dict[str, asyncio.Lock] = {}   
-active_websockets: Dict[str, WebSocket] = {} 
+def create_session_agent(session_id: str) -> CircuitAgent:
+    """
+    为一个新会话创建 Agent 实例 (由会话缓存调用，之后会话的记忆由会话存储恢复)。
+    配置、工具与 LLM 客户端由进程级的 AgentRuntime 共享，只在第一个会话创建时初始化。
+    """
+    if not AGENT_AVAILABLE:
+        logger.warning("Agent 核心代码不可用,为会话创建了一个假的 Agent 实例 (create_session_agent).")
+        return CircuitAgent(config_yaml_path="dummy_config.yaml", dotenv_path=None)
+    logger.debug("为会话创建新的 Agent 实例 (共享 AgentRuntime)...")
+    try:
+        return CircuitAgent(config_yaml_path="config.yaml", dotenv_path=".env", session_id=session_id)
+    except ValueError as ve: 
+        logger.error(f"创建真实的 Agent 实例因配置问题失败: {ve}", exc_info=True)
+        raise RuntimeError(f"无法创建真实的 Agent 实例: {ve}") from ve
+    except Exception as e: 
+        logger.error(f"创建真实的 Agent 实例发生未知错误: {e}", exc_info=True)
+        raise RuntimeError(f"无法创建真实的 Agent 实例: {e}") from e
 
+def create_session_cache() -> SessionCache:
+    """按 config.yaml 中 agent_settings.sessions 的配置创建会话缓存与会话存储。"""
+    if not AGENT_AVAILABLE:
+        return SessionCache(create_session_agent) # 假 Agent 没有记忆可持久化
+    config_loader = ConfigLoader(yaml_config_path="config.yaml", dotenv_path=".env")
+    store_backend = config_loader.get_config("agent_settings.sessions.store_backend", "sqlite")
+    store: Optional[SessionStore] = None
+    if store_backend:
+        store_location = (config_loader.get_config("agent_settings.sessions.sqlite_path", "sessions.db") if store_backend == "sqlite"
+                          else config_loader.get_config("agent_settings.sessions.snapshot_directory", "session_snapshots"))
+        try:
+            store = create_session_store(store_backend, store_location)
+        except Exception as e_store:
+            logger.error(f"创建会话存储失败 (后端: {store_backend}, 位置: {store_location}),会话将不会被持久化: {e_store}", exc_info=True)
+    return SessionCache(
+        create_session_agent, store,
+        max_sessions=int(config_loader.get_config("agent_settings.sessions.max_cached_sessions", 200)),
+        idle_timeout_seconds=float(config_loader.get_config("agent_settings.sessions.idle_timeout_seconds", 900)),
+        flush_interval_seconds=float(config_loader.get_config("agent_settings.sessions.flush_interval_seconds", 5)),
+    )
+
+# 会话缓存取代了原先无限增长的 agent_sessions / agent_locks 字典: 内存中只保留有限个会话，
+# 其余会话保存在会话存储中，再次访问时按需恢复。
+session_cache: SessionCache = create_session_cache()
+active_websockets: Dict[str, WebSocket] = {} 
 
 async def get_agent_instance(session_id: str) -> CircuitAgent:
-    if session_id not in agent_sessions:
-        logger.info(f"为 Session {session_id} 创建新的 Agent 实例 (V1.1.1 Multi-LLM & Configurable)...") # 版本更新
-        if AGENT_AVAILABLE: 
+    """返回会话的 Agent 实例；会话不在内存中时创建 Agent 并从会话存储恢复其记忆。"""
+    return await session_cache.get(session_id)
+
+@app.post("/api/sessions/{session_id}/netlists")
+async def upload_spice_netlist(session_id: str, file_name: str, request: Request) -> Dict[str, Any]:
+    """
+    上传 SPICE 网表并直接导入到会话的电路中 (不经过 LLM)。
+    请求体是网表文件的原始内容: 边接收边写入会话的网表目录 (文件操作都在线程中执行)，写完后在后台线程中逐行流式导入，
+    因此数百 MB 的网表也只占用常数内存，且不会阻塞事件循环。
+    """
+    if not AGENT_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Agent核心代码未加载,无法导入网表。")
+    async with session_cache.use(session_id) as agent_instance: # 上传与导入期间会话不会被移出内存
+        try:
+            netlist_path = await asyncio.to_thread(resolve_netlist_path, agent_instance, os.path.basename(file_name))
+        except ValueError as e_path:
+            raise HTTPException(status_code=400, detail=str(e_path))
+        max_upload_bytes = int(agent_instance.config_loader.get_config("agent_settings.tools.max_netlist_upload_mb", 512)) * 1024 * 1024
+
+        partial_path = f"{netlist_path}.part"
+        received_bytes = 0
+        try:
+            # 打开、写入、改名与清理都是阻塞的磁盘操作，放到线程中执行，避免大文件上传期间卡住其它会话
+            partial_file = await asyncio.to_thread(open, partial_path, "wb")
             try:
-                config_yaml_file_path = "config.yaml" 
-                dotenv_file_path = ".env" 
-                
-                new_agent = CircuitAgent(
-                    config_yaml_path=config_yaml_file_path,
-                    dotenv_path=dotenv_file_path
-                )
-                
-                agent_sessions[session_id] = new_agent
-                agent_locks[session_id] = asyncio.Lock() 
-                logger.info(f"Agent 实例为 Session {session_id} 创建成功 (V1.1.1).") # 版本更新
-            except ValueError as ve: 
-                logger.error(f"创建真实的 Agent 实例因配置问题失败 (Session {session_id}): {ve}", exc_info=True)
-                raise RuntimeError(f"无法为会话 {session_id} 创建真实的 Agent 实例: {ve}") from ve
-            except Exception as e: 
-                logger.error(f"创建真实的 Agent 实例发生未知错误 (Session {session_id}): {e}", exc_info=True)
-                raise RuntimeError(f"无法为会话 {session_id} 创建真实的 Agent 实例: {e}") from e
-        else: 
-             logger.warning(f"Agent 核心代码不可用,为 Session {session_id} 创建了一个假的 Agent 实例 (get_agent_instance).")
-             agent_sessions[session_id] = CircuitAgent(config_yaml_path="dummy_config.yaml", dotenv_path=None) 
-             agent_locks[session_id] = asyncio.Lock()
-    return agent_sessions[session_id]
-
-async def get_session_lock(session_id: str) -> asyncio.Lock:
-    if session_id not in agent_locks:
-        logger.debug(f"锁在 get_session_lock 中为 Session {session_id} 创建。")
-        agent_locks[session_id] = asyncio.Lock()
-    return agent_locks[session_id]
+                async for chunk in request.stream():
+                    received_bytes += len(chunk)
+                    if received_bytes > max_upload_bytes:
+                        raise HTTPException(status_code=413, detail=f"网表文件超过 {max_upload_bytes // (1024 * 1024)}MB 的上传上限。")
+                    await asyncio.to_thread(partial_file.write, chunk)
+            finally:
+                await asyncio.to_thread(partial_file.close)
+            await asyncio.to_thread(os.replace, partial_path, netlist_path)
+        finally:
+            if await asyncio.to_thread(os.path.exists, partial_path):
+                await asyncio.to_thread(os.remove, partial_path)
+        logger.info(f"Session {session_id} 上传了网表 '{os.path.basename(netlist_path)}' ({received_bytes} 字节)，开始导入...")
+
+        # 导入会修改电路: 与会修改电路的聊天请求依次执行，并与工具批次、快照写回互斥
+        async with agent_instance.mutation_lock, agent_instance.state_lock:
+            try:
+                summary = await asyncio.to_thread(import_spice_file, agent_instance, netlist_path)
+            except CircuitBatchError as e_batch:
+                raise HTTPException(status_code=409, detail=f"网表导入未生效 (电路未被修改): {e_batch}")
+            except Exception as e_import:
+                logger.error(f"Session {session_id} 导入网表 '{netlist_path}' 失败: {e_import}", exc_info=True)
+                raise HTTPException(status_code=500, detail=f"导入网表时发生内部错误: {str(e_import)[:200]}")
+            session_cache.mark_dirty(session_id)
+    logger.info(f"Session {session_id} 网表导入完成: {summary['element_count']} 个元件, {summary['net_count']} 个网络, 耗时 {summary['elapsed_ms']} ms。")
+    return {"status": "success", "data": summary}
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request) -> HTMLResponse:
@@ -162,6 +235,9 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
     
     session_id: Optional[str] = None 
     agent_instance: Optional[CircuitAgent] = None 
+    pinned_session_id: Optional[str] = None 
+    pending_request_tasks: Set[asyncio.Task] = set() # 本连接上正在处理的用户消息 (连接断开时取消)
+    send_lock = asyncio.Lock() # 多个请求任务并发发送状态更新，逐条写入连接
 
     try:
         async def send_status_update_to_client(status_data: Dict[str, Any]) -> None:
@@ -170,7 +246,8 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
                 try:
                     log_preview = json.dumps(status_data, ensure_ascii=False, default=str) 
                     logger.debug(f"SERVER SENDING TO CLIENT (Session {session_id or 'N/A'}, WS: {websocket.scope.get('path', '')}): {log_preview[:500]}{'...' if len(log_preview) > 500 else ''}")
-                    await websocket.send_json(status_data)
+                    async with send_lock:
+                        await websocket.send_json(status_data)
                 except WebSocketDisconnect: 
                     logger.warning(f"尝试发送状态更新到 Session {session_id or 'N/A'} 时WebSocket已断开 (send_status_update).")
                     raise asyncio.CancelledError("WebSocket connection lost during status update.")
@@ -178,6 +255,52 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
                     logger.error(f"通过WebSocket发送状态更新失败 (Session {session_id or 'N/A'}): {e_send_status}", exc_info=True)
             else:
                 logger.warning(f"尝试发送状态更新到 Session {session_id or 'N/A'} 但WebSocket状态为 {websocket.client_state.name}。")
+
+        async def run_user_request(request_session_id: str, request_id: str, user_message_content: str,
+                                   selected_llm_from_fe: Optional[str], enable_chinese_thinking_from_fe: Optional[bool]) -> None:
+            """在独立任务中处理一条用户消息 (连接断开时被取消)。"""
+            logger.info(f"Session {request_session_id} (ReqID: {request_id}) 开始处理用户消息 (模型: {selected_llm_from_fe or 'Agent默认'}, 中文思考: {enable_chinese_thinking_from_fe if enable_chinese_thinking_from_fe is not None else 'Agent默认'})...")
+            start_time_process = time.monotonic()
+            try:
+                async with session_cache.use(request_session_id) as request_agent: # 请求期间会话不会被移出内存 (即使连接已切换到其它会话)
+                    await request_agent.process_user_request(
+                        user_request=user_message_content, 
+                        status_callback=send_status_update_to_client,
+                        selected_llm_identifier_from_frontend=selected_llm_from_fe,
+                        enable_chinese_thinking_from_frontend=enable_chinese_thinking_from_fe,
+                        request_id=request_id
+                    )
+                duration_process = time.monotonic() - start_time_process
+                logger.info(f"Session {request_session_id} (ReqID: {request_id}) 消息处理流程调用完成,耗时: {duration_process:.3f} 秒.")
+            except asyncio.CancelledError: 
+                 logger.warning(f"Session {request_session_id} (ReqID: {request_id}) Agent消息处理任务被取消 (可能由于WebSocket断开).")
+            except Exception as e_process: 
+                logger.error(f"Session {request_session_id} (ReqID: {request_id}) Agent消息处理时发生内部顶层错误: {e_process}", exc_info=True)
+                error_details_str = str(e_process)
+                current_req_id_for_error = request_id
+                try:
+                    await send_status_update_to_client({
+                        "type": "general_status", 
+                        "request_id": current_req_id_for_error,
+                        "stage": "fatal_processing_error", 
+                        "status": "error", 
+                        "message": "处理您的消息时服务器内部发生了严重错误.", 
+                        "details": {"error_type": type(e_process).__name__, "error_message": error_details_str}
+                    })
+                    await send_status_update_to_client({
+                        "type": "final_response", 
+                        "request_id": current_req_id_for_error,
+                        "llm_interaction_id": f"fatal_err_llm_id_{str(uuid.uuid4())[:6]}",
+                        "content": f"抱歉,处理您的消息时服务器内部发生了严重错误: {error_details_str[:100]}...",
+                        "final_camelcase_json_if_success": None
+                    })
+                except asyncio.CancelledError: 
+                    logger.warning(f"Session {request_session_id} 发送顶层处理错误回调时WebSocket已断开。")
+                except Exception as e_send_fatal:
+                    logger.error(f"Session {request_session_id} 发送顶层处理错误回调本身失败: {e_send_fatal}")
+            finally:
+                 session_cache.mark_dirty(request_session_id) # 由会话缓存的后台任务写回存储
+                 logger.info(f"Session {request_session_id} (ReqID: {request_id}) 处理完毕.")
         
         while True:
             data = await websocket.receive_text() 
@@ -197,7 +320,11 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
                     active_websockets[session_id] = websocket
                     
                     try:
-                        agent_instance = await get_agent_instance(session_id)
+                        if pinned_session_id is not None: # 同一连接重新初始化为另一个会话时，解除对旧会话的占用
+                            session_cache.release(pinned_session_id)
+                            pinned_session_id = None
+                        agent_instance = await session_cache.acquire(session_id) # 连接期间会话不会被移出内存
+                        pinned_session_id = session_id
                         
                         # 【修改】在 init_success 中发送更详细的模型可用性信息
                         agent_defaults_for_frontend = {
@@ -244,50 +371,17 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
                     
                     if not user_message_content or not isinstance(user_message_content, str) or not user_message_content.strip():
                          logger.warning(f"Session {session_id} 收到空消息内容或非字符串内容.")
-                         await send_status_update_to_client({"type": "error", "message": "收到空消息或无效消息内容,已忽略.", "request_id": agent_instance.current_request_id or f"err_req_{str(uuid.uuid4())[:6]}"})
+                         await send_status_update_to_client({"type": "error", "message": "收到空消息或无效消息内容,已忽略.", "request_id": f"err_req_{str(uuid.uuid4())[:6]}"})
                          continue
 
-                    lock = await get_session_lock(session_id) 
-                    async with lock: 
-                        logger.info(f"Session {session_id} 获取到锁,开始处理用户消息 (模型: {selected_llm_from_fe or 'Agent默认'}, 中文思考: {enable_chinese_thinking_from_fe if enable_chinese_thinking_from_fe is not None else 'Agent默认'})...")
-                        start_time_process = time.monotonic()
-                        try:
-                            await agent_instance.process_user_request(
-                                user_request=user_message_content, 
-                                status_callback=send_status_update_to_client,
-                                selected_llm_identifier_from_frontend=selected_llm_from_fe,
-                                enable_chinese_thinking_from_frontend=enable_chinese_thinking_from_fe
-                            )
-                            duration_process = time.monotonic() - start_time_process
-                            logger.info(f"Session {session_id} (ReqID: {agent_instance.current_request_id or 'N/A'}) 消息处理流程调用完成,耗时: {duration_process:.3f} 秒.")
-                        except asyncio.CancelledError: 
-                             logger.warning(f"Session {session_id} (ReqID: {agent_instance.current_request_id or 'N/A'}) Agent消息处理任务被取消 (可能由于WebSocket断开).")
-                        except Exception as e_process: 
-                            logger.error(f"Session {session_id} (ReqID: {agent_instance.current_request_id or 'N/A'}) Agent消息处理时发生内部顶层错误: {e_process}", exc_info=True)
-                            error_details_str = str(e_process)
-                            current_req_id_for_error = agent_instance.current_request_id if agent_instance and agent_instance.current_request_id else f"error_req_{str(uuid.uuid4())[:6]}"
-                            try:
-                                await send_status_update_to_client({
-                                    "type": "general_status", 
-                                    "request_id": current_req_id_for_error,
-                                    "stage": "fatal_processing_error", 
-                                    "status": "error", 
-                                    "message": "处理您的消息时服务器内部发生了严重错误.", 
-                                    "details": {"error_type": type(e_process).__name__, "error_message": error_details_str}
-                                })
-                                await send_status_update_to_client({
-                                    "type": "final_response", 
-                                    "request_id": current_req_id_for_error,
-                                    "llm_interaction_id": f"fatal_err_llm_id_{str(uuid.uuid4())[:6]}",
-                                    "content": f"抱歉,处理您的消息时服务器内部发生了严重错误: {error_details_str[:100]}...",
-                                    "final_camelcase_json_if_success": None
-                                })
-                            except asyncio.CancelledError: 
-                                logger.warning(f"Session {session_id} 发送顶层处理错误回调时WebSocket已断开。")
-                            except Exception as e_send_fatal:
-                                logger.error(f"Session {session_id} 发送顶层处理错误回调本身失败: {e_send_fatal}")
-                        finally:
-                             logger.info(f"Session {session_id} (ReqID: {agent_instance.current_request_id if agent_instance else 'N/A'}) 处理完毕,释放锁.")
+                    # 请求状态随 RequestContext 传递，不再用会话锁串行化整个请求: 每条消息在独立的任务中处理，
+                    # 接收循环不等待其结束。只读请求可与同一连接/会话的其它请求并发，修改电路的请求由 Agent 的修改锁依次执行
+                    request_id = f"req_{str(uuid.uuid4())[:12]}"
+                    request_task = asyncio.create_task(run_user_request(
+                        session_id, request_id, user_message_content, selected_llm_from_fe, enable_chinese_thinking_from_fe
+                    ))
+                    pending_request_tasks.add(request_task)
+                    request_task.add_done_callback(pending_request_tasks.discard)
                 
                 elif not session_id or not agent_instance: 
                     logger.warning(f"收到消息 (type: {msg_type}) 但 session_id ('{session_id}') 或 agent_instance ({'存在' if agent_instance else '不存在'}) 未完全初始化。忽略。")
@@ -330,8 +424,15 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
                 await websocket.close(code=1011)
             except Exception: pass 
     finally:
+        if pending_request_tasks: # 连接已断开: 取消仍在处理的请求，并等待其完成清理 (回滚、释放修改锁、写入本轮对话)
+            logger.info(f"Session {session_id or '未知'} 连接关闭,取消 {len(pending_request_tasks)} 个仍在处理的请求。")
+            for request_task in list(pending_request_tasks):
+                request_task.cancel()
+            await asyncio.gather(*pending_request_tasks, return_exceptions=True)
+        if pinned_session_id is not None:
+            session_cache.release(pinned_session_id)
         if session_id:
-            if session_id in active_websockets:
+            if active_websockets.get(session_id) is websocket: # 同一会话可能已有更新的连接
                 del active_websockets[session_id]
                 logger.info(f"Session {session_id} 的WebSocket连接已从活动列表中移除.")
         
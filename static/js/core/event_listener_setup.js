@@ -12,7 +12,7 @@ import { openSettingsModal, closeSettingsModal, collectAndSaveSettings, resetToD
 // 【老板，修改！】从 session_handler.js 导入的函数现在包含 showHistoricalLogsForRequest
 import { createNewSession, handleEditSessionName, saveSessions, renderSessionList, addMessageToCurrentSession, showHistoricalLogsForRequest } from '../modules/session_handler.js';
 import { updateSidebarState, updateSessionManagerState, updateInputAreaHeightVar, applyFixedLogSidebarLayout, toggleProcessLogSidebarCollapse, hideProcessLogSidebar, showProcessLogSidebar } from '../modules/layout_handler.js';
-import { handleFileSelection, closeFilePreview } from '../modules/file_handler.js';
+import { handleFileSelection, closeFilePreview, isSpiceNetlistFile, uploadSpiceNetlist } from '../modules/file_handler.js';
 import { toggleThreeBlackHoleVisibility, handleComponentMouseDown } from '../modules/three_visuals.js';
 import { handleChatBoxMouseOver, handleChatBoxMouseOut } from '../modules/copy_handler.js';
 import { generateClientRequestId, getThemeDisplayName, getModeDisplayName, APP_PREFIX } from '../utils/helpers.js';
@@ -149,7 +149,7 @@ export function setupEventListeners() {
     });
 }
 
-function handleSendMessage() {
+async function handleSendMessage() {
     if (state.isLoading) {
         showToast("Lumina核心正在处理上一指令. 请稍候...", "warning");
         return;
@@ -227,8 +227,23 @@ function handleSendMessage() {
     showProcessLogSidebar(true); // 显示并展开实时日志
 
     let backendMessageContent = messageText;
-    if (filesToSend.length > 0) {
-        backendMessageContent += `\n[用户已附加数据模块: ${filesToSend.map(f => f.name).join(', ')}. 请基于这些模块名称处理指令.]`;
+    // SPICE 网表直接上传到服务器导入电路 (不经过 LLM)，只把导入结果告知 Agent
+    const netlistFiles = filesToSend.filter(isSpiceNetlistFile);
+    const otherFiles = filesToSend.filter(f => !isSpiceNetlistFile(f));
+    for (const netlistFile of netlistFiles) {
+        try {
+            showToast(`正在导入网表 "${netlistFile.name}"...`, 'info');
+            const summary = await uploadSpiceNetlist(netlistFile, state.currentSessionId);
+            showToast(`网表 "${netlistFile.name}" 已导入: ${summary.element_count} 个元件, ${summary.net_count} 个网络.`, 'success');
+            backendMessageContent += `\n[系统已将用户上传的 SPICE 网表 "${summary.file_name}" 导入当前电路: ${summary.element_count} 个元件, ${summary.net_count} 个网络节点, ${summary.connection_count} 个连接.]`;
+        } catch (error) {
+            console.error(`导入网表 "${netlistFile.name}" 失败:`, error);
+            showToast(`网表 "${netlistFile.name}" 导入失败: ${error.message}`, 'error');
+            backendMessageContent += `\n[用户上传的 SPICE 网表 "${netlistFile.name}" 导入失败: ${error.message}]`;
+        }
+    }
+    if (otherFiles.length > 0) {
+        backendMessageContent += `\n[用户已附加数据模块: ${otherFiles.map(f => f.name).join(', ')}. 请基于这些模块名称处理指令.]`;
     }
 
     sendWebSocketMessage({
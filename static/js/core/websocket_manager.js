@@ -214,6 +214,7 @@ function handleWebSocketMessage(message) {
             case 'general_status': handleGeneralStatus(message); break;
             case 'llm_communication_status': handleLlmCommStatus(message); break;
             case 'thinking_log': handleThinkingLog(message); break;
+            case 'thinking_stream': handleThinkingStream(message); break;
             case 'plan_details': handlePlanDetails(message); break;
             case 'tool_status_update': handleToolStatusUpdate(message); break;
             case 'interim_response': handleInterimResponse(message); break;
@@ -287,8 +288,64 @@ function handleLlmCommStatus(msg) {
     if (!state.isProcessLogSidebarVisible) showProcessLogSidebar(false);
 }
 
+// 正在流式接收的思考过程日志项: stream_id -> { element, bubble, requestId, stage }
+const streamingThinkingItems = new Map();
+
+function handleThinkingStream(msg) {
+    const { stream_id, stage, content, request_id } = msg;
+    if (!stream_id || !content || !dom.processLogSidebarContent) return;
+    let streamItem = streamingThinkingItems.get(stream_id);
+    if (!streamItem) {
+        // 流式日志项只用于实时展示，不写入请求日志集合；完整的 thinking_log 到达后会替换它
+        const element = document.createElement('div');
+        element.className = `log-item type-thinking_log stage-${stage} streaming`;
+        const iconEl = document.createElement('i');
+        iconEl.className = 'fas fa-lightbulb log-think';
+        const contentArea = document.createElement('div');
+        contentArea.classList.add('log-item-content-area');
+        const messageEl = document.createElement('span');
+        messageEl.className = 'log-item-message';
+        messageEl.textContent = `AI思维墨迹 (${stage.replace(/_/g, ' ').toUpperCase()}) - 生成中...`;
+        const thinkDiv = document.createElement('div');
+        thinkDiv.classList.add('log-think-content');
+        const bubble = document.createElement('div');
+        bubble.className = 'think-bubble';
+        bubble.style.whiteSpace = 'pre-wrap';
+        thinkDiv.appendChild(bubble);
+        contentArea.append(messageEl, thinkDiv);
+        element.append(iconEl, contentArea);
+        dom.processLogSidebarContent.appendChild(element);
+        streamItem = { element, messageEl, bubble, requestId: request_id, stage };
+        streamingThinkingItems.set(stream_id, streamItem);
+    }
+    streamItem.bubble.appendChild(document.createTextNode(content));
+    if (state.showLogBubblesThink) state.lastResponseThinking = streamItem.bubble.textContent;
+    dom.processLogSidebarContent.scrollTop = dom.processLogSidebarContent.scrollHeight;
+}
+
+function removeStreamingThinkingItems(requestId, stage) {
+    streamingThinkingItems.forEach((streamItem, streamId) => {
+        if (streamItem.requestId === requestId && streamItem.stage === stage) {
+            streamItem.element.remove();
+            streamingThinkingItems.delete(streamId);
+        }
+    });
+}
+
+function finishStreamingThinkingItems(requestId) {
+    // 没有被完整 thinking_log 替换的流式日志项 (例如该次响应解析失败) 保留原文，只去掉"生成中"标记
+    streamingThinkingItems.forEach((streamItem, streamId) => {
+        if (streamItem.requestId === requestId) {
+            streamItem.element.classList.remove('streaming');
+            streamItem.messageEl.textContent = `AI思维墨迹 (${streamItem.stage.replace(/_/g, ' ').toUpperCase()})`;
+            streamingThinkingItems.delete(streamId);
+        }
+    });
+}
+
 function handleThinkingLog(msg) {
     const { stage, content, llm_interaction_id, request_id } = msg; // 【老板，新增！】获取 request_id
+    removeStreamingThinkingItems(request_id, stage);
     if (content) {
         state.lastResponseThinking = content;
     }
@@ -496,6 +553,7 @@ function handleFinalResponse(msg) {
     setLoadingState(false);
     
     const { content, llm_interaction_id, request_id } = msg; // 【老板，新增！】获取 request_id (这通常是Agent后端的 request_id)
+    finishStreamingThinkingItems(request_id);
     const finalCamelCaseJson = msg.final_camelcase_json_if_success || msg.final_v1_3_2_camelcase_json_if_success;
 
 
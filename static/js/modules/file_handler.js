@@ -1,6 +1,6 @@
 // ==========================================================================
 // [ START OF FILE modules/file_handler.js ]
-// File Handling - Selection, Preview, Removal
+// File Handling - Selection, Preview, Removal, SPICE Netlist Upload
 // ==========================================================================
 
 import dom from '../utils/dom_elements.js';
@@ -8,6 +8,8 @@ import state from '../core/state.js';
 import { showToast } from '../core/ui_updater.js';
 import { getFileIconClass } from '../utils/helpers.js';
 
+const SPICE_NETLIST_EXTENSIONS = ['.cir', '.net', '.sp', '.spice', '.ckt'];
+
 /**
  * Handles file selection from the input element.
  * @param {Event} event - The file input change event.
@@ -18,14 +20,16 @@ export function handleFileSelection(event) {
 
     const MAX_FILES = 5;
     const MAX_SIZE_MB = 2;
+    const MAX_NETLIST_SIZE_MB = 512; // SPICE 网表直接流式上传到服务器导入，上限与 config.yaml 中 max_netlist_upload_mb 一致
 
     files.forEach(file => {
         if (state.uploadedFiles.length >= MAX_FILES) {
             showToast(`每次传输最多允许 ${MAX_FILES} 个数据卷轴.`, 'warning');
             return; // Exits forEach iteration for this file, but continues for others if any
         }
-        if (file.size > MAX_SIZE_MB * 1024 * 1024) {
-            showToast(`数据卷轴 "${file.name}" 大小超过 ${MAX_SIZE_MB}MB 限制.`, 'warning');
+        const sizeLimitMB = isSpiceNetlistFile(file) ? MAX_NETLIST_SIZE_MB : MAX_SIZE_MB;
+        if (file.size > sizeLimitMB * 1024 * 1024) {
+            showToast(`数据卷轴 "${file.name}" 大小超过 ${sizeLimitMB}MB 限制.`, 'warning');
             return; // Skip this file
         }
         if (!state.uploadedFiles.find(f => f.name === file.name && f.size === file.size)) {
@@ -42,6 +46,43 @@ export function handleFileSelection(event) {
     dom.fileInput.value = ''; // Reset file input to allow selecting the same file again
 }
 
+/**
+ * Checks whether a file is a SPICE netlist (imported directly into the circuit on send).
+ * @param {File} file - The file object to check.
+ * @returns {boolean}
+ */
+export function isSpiceNetlistFile(file) {
+    const ext = file.name.slice(file.name.lastIndexOf('.')).toLowerCase();
+    return SPICE_NETLIST_EXTENSIONS.includes(ext);
+}
+
+/**
+ * Uploads a SPICE netlist to the server, which streams it to disk and imports it into the session's circuit.
+ * The request body is the raw file (streamed by the browser), so large netlists are never read into page memory.
+ * @param {File} file - The netlist file.
+ * @param {string} sessionId - The current session ID.
+ * @returns {Promise<object>} The import summary returned by the server.
+ * @throws {Error} If the upload or import fails.
+ */
+export async function uploadSpiceNetlist(file, sessionId) {
+    const url = `/api/sessions/${encodeURIComponent(sessionId)}/netlists?file_name=${encodeURIComponent(file.name)}`;
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/octet-stream' },
+        body: file
+    });
+    let payload = null;
+    try {
+        payload = await response.json();
+    } catch (e) {
+        payload = null;
+    }
+    if (!response.ok) {
+        throw new Error((payload && payload.detail) || `HTTP ${response.status}`);
+    }
+    return payload.data;
+}
+
 /**
  * Adds a file to the UI preview area.
  * @param {File} file - The file object to add.
@@ -0,0 +1,33 @@
+# IDT_AGENT_Pro/tests/test_circuit_tools.py
+from circuitmanus.circuit_domain.circuit import Circuit
+from circuitmanus.circuit_domain.components import CircuitComponent
+
+def test_batch_auto_id_skips_explicit_id_staged_earlier():
+    circuit = Circuit()
+    batch = circuit.batch()
+    explicit_id = batch.add_component("resistor", component_id="R1")
+    auto_id = batch.add_component("resistor")
+    assert explicit_id == "R1"
+    assert auto_id != explicit_id
+
+    summary = batch.commit()
+    assert [component["id"] for component in summary["added"]] == ["R1", auto_id]
+    assert set(circuit.components) == {"R1", auto_id}
+    assert circuit.generate_component_id("resistor") not in circuit.components
+
+def test_sorted_views_after_remove_and_re_add():
+    circuit = Circuit()
+    for component_id in ("R3", "R1", "R2"):
+        circuit.add_component(CircuitComponent(component_id, "resistor"))
+    circuit.connect_components("R1", "R2")
+    circuit.connect_components("R2", "R3")
+    circuit.get_state_description()
+
+    circuit.remove_component("R2")
+    circuit.add_component(CircuitComponent("R2", "resistor"))
+    circuit.connect_components("R2", "R3")
+    circuit.disconnect_components("R2", "R3")
+    circuit.connect_components("R1", "R2")
+
+    assert [row[0] for row in circuit.iter_sorted_component_rows()] == ["R1", "R2", "R3"]
+    assert circuit.get_sorted_connections() == [("R1", "R2")]
@@ -0,0 +1,70 @@
+# IDT_AGENT_Pro/tests/test_connectivity.py
+import random
+from collections import defaultdict, deque
+
+import pytest
+
+from circuitmanus.circuit_domain.circuit import Circuit
+from circuitmanus.circuit_domain.components import CircuitComponent
+from circuitmanus.circuit_domain.storage import STORAGE_BACKENDS
+
+def _bfs_groups(circuit):
+    """不依赖连通性索引，直接按连接做广度优先搜索得到的连通分组 (排序规则与 get_connected_groups 相同)。"""
+    adjacency = defaultdict(set)
+    for id1, id2 in circuit.connections:
+        adjacency[id1].add(id2)
+        adjacency[id2].add(id1)
+    visited, groups = set(), []
+    for component_id in circuit.components:
+        if component_id in visited:
+            continue
+        visited.add(component_id)
+        group, queue = [], deque([component_id])
+        while queue:
+            current_id = queue.popleft()
+            group.append(current_id)
+            for neighbor_id in adjacency[current_id] - visited:
+                visited.add(neighbor_id)
+                queue.append(neighbor_id)
+        groups.append(sorted(group))
+    groups.sort(key=lambda group: (-len(group), group[0]))
+    return groups
+
+def _assert_matches_bfs(circuit, rng):
+    groups = _bfs_groups(circuit)
+    assert circuit.get_connected_groups() == groups
+    assert circuit.get_connected_group_count() == len(groups)
+    group_of = {component_id: group for group in groups for component_id in group}
+    component_ids = list(circuit.components)
+    for _ in range(min(10, len(component_ids))):
+        id1, id2 = rng.choice(component_ids), rng.choice(component_ids)
+        assert circuit.are_components_connected(id1, id2) == (id2 in group_of[id1])
+        assert circuit.get_connected_group(id1) == group_of[id1]
+    grounded_ids = {component_id for ground_id in circuit.get_ground_component_ids() for component_id in group_of[ground_id]}
+    assert circuit.get_floating_component_ids() == sorted(set(component_ids) - grounded_ids)
+
+@pytest.mark.parametrize("storage_backend", STORAGE_BACKENDS)
+def test_union_find_matches_bfs_under_random_edits(storage_backend):
+    rng = random.Random(20261016)
+    circuit = Circuit(storage_backend=storage_backend)
+    next_number = 0
+    for _ in range(1500):
+        component_ids = list(circuit.components)
+        operation = rng.random()
+        if operation < 0.25 or len(component_ids) < 2:
+            next_number += 1
+            component_type = "ground" if rng.random() < 0.1 else "resistor"
+            circuit.add_component(CircuitComponent(f"{'G' if component_type == 'ground' else 'R'}{next_number}", component_type))
+        elif operation < 0.55:
+            circuit.connect_components(*rng.sample(component_ids, 2))
+        elif operation < 0.68 and circuit.connections:
+            circuit.disconnect_components(*rng.choice(list(circuit.connections)))
+        elif operation < 0.76:
+            circuit.remove_component(rng.choice(component_ids))
+        elif operation < 0.88:
+            circuit.undo(rng.randint(1, 3))
+        elif operation < 0.98:
+            circuit.redo(rng.randint(1, 3))
+        else:
+            circuit.clear()
+        _assert_matches_bfs(circuit, rng)
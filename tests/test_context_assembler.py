@@ -0,0 +1,68 @@
+# IDT_AGENT_Pro/tests/test_context_assembler.py
+import copy
+import json
+
+from circuitmanus.memory import ContextAssembler
+from circuitmanus.memory import context as context_module
+from circuitmanus.memory.context import estimate_message_tokens
+
+def _turn(index, tool_payload_size=20):
+    return [
+        {"role": "user", "content": f"第 {index} 轮: 请添加一个 {index}k 的电阻并连接到 LED。"},
+        {"role": "assistant", "content": json.dumps({"plan": f"add R{index}", "steps": ["add", "connect"]})},
+        {"role": "tool", "tool_call_id": f"t{index}", "name": "add_component_tool",
+         "content": json.dumps({"status": "success", "message": f"已添加 R{index}", "data": {"log": "x" * tool_payload_size}})},
+        {"role": "assistant", "content": f"已完成第 {index} 轮。"},
+    ]
+
+def _tokens(messages):
+    return sum(estimate_message_tokens(message) for message in messages)
+
+def test_unlimited_budget_keeps_every_message_in_order():
+    short_term = [message for index in range(5) for message in _turn(index)]
+    assembled = ContextAssembler().assemble("系统提示", short_term, 0)
+    assert assembled.messages[0] == {"role": "system", "content": "系统提示"}
+    assert assembled.messages[1:] == short_term
+    assert assembled.dropped_message_count == 0
+    assert assembled.truncated_message_count == 0
+    assert assembled.token_breakdown["total"] == _tokens(assembled.messages)
+
+def test_tight_budget_keeps_current_turn_and_a_contiguous_recent_history():
+    turns = [_turn(index) for index in range(8)]
+    short_term = [message for turn in turns for message in turn]
+    system_tokens = estimate_message_tokens({"role": "system", "content": "系统提示"}, use_cache=False)
+    # 预算只够本轮、完整的上一轮和再上一轮的精简形式 (用户消息 + 最后的回复)
+    budget = system_tokens + _tokens(turns[7]) + _tokens(turns[6]) + _tokens([turns[5][0], turns[5][-1]])
+    assembled = ContextAssembler().assemble("系统提示", short_term, budget)
+
+    assert assembled.messages[1:] == [turns[5][0], turns[5][-1]] + turns[6] + turns[7]
+    assert assembled.dropped_message_count == len(short_term) - (len(assembled.messages) - 1)
+    assert assembled.token_breakdown["total"] <= budget
+    assert assembled.token_breakdown["total"] == _tokens(assembled.messages)
+
+def test_explicit_current_turn_follows_the_whole_short_term_history():
+    short_term = [message for index in range(3) for message in _turn(index)]
+    current_turn = [{"role": "user", "content": "现在的请求"}]
+    assembled = ContextAssembler().assemble("系统提示", short_term, 0, current_turn=current_turn)
+    assert assembled.messages[1:] == short_term + current_turn
+    assert assembled.token_breakdown["current_turn"] == _tokens(current_turn)
+    assert assembled.token_breakdown["current_turn_tool_results"] == 0
+
+def test_oversized_tool_results_are_truncated_without_touching_short_term():
+    short_term = _turn(0) + _turn(1, tool_payload_size=20000)
+    short_term_before = copy.deepcopy(short_term)
+    assembled = ContextAssembler(max_tool_message_tokens=200).assemble("系统提示", short_term, 0)
+
+    truncated_tool_message = assembled.messages[-2]
+    assert truncated_tool_message["tool_call_id"] == "t1"
+    assert estimate_message_tokens(truncated_tool_message) < estimate_message_tokens(short_term[-2])
+    truncated_payload = json.loads(truncated_tool_message["content"])
+    assert truncated_payload["status"] == "success" and truncated_payload["message"] == "已添加 R1"
+    assert "context_truncation" in truncated_payload
+    assert assembled.truncated_message_count == 1
+    assert short_term == short_term_before
+
+def test_system_prompt_is_not_cached():
+    system_prompt = "每次都不同的系统提示 (请求ID: req_unique_20261017)"
+    ContextAssembler().assemble(system_prompt, _turn(0), 0)
+    assert system_prompt not in context_module._token_estimate_cache
@@ -0,0 +1,38 @@
+# IDT_AGENT_Pro/tests/test_dc_analysis.py
+import pytest
+
+pytest.importorskip("numpy")
+
+from circuitmanus.analysis import DCOperatingPointSolver
+from circuitmanus.circuit_domain.circuit import Circuit
+from circuitmanus.circuit_domain.components import CircuitComponent
+
+def _voltage_divider():
+    circuit = Circuit()
+    for component_id, component_type, value in [("V1", "battery", "10V"), ("GND", "ground", None),
+                                                 ("R1", "resistor", "1k"), ("R2", "resistor", "1k"), ("N1", "node", None)]:
+        circuit.add_component(CircuitComponent(component_id, component_type, value))
+    for id1, id2 in [("V1", "GND"), ("V1", "R1"), ("R1", "N1"), ("N1", "R2"), ("R2", "GND")]:
+        circuit.connect_components(id1, id2)
+    return circuit
+
+def test_voltage_divider_midpoint():
+    circuit = _voltage_divider()
+    result = DCOperatingPointSolver().solve(circuit)
+    assert result["node_voltages"]["N1"] == pytest.approx(5.0, abs=1e-6)
+    assert result["rebuilt"]
+    assert result["warnings"] == []
+
+def test_value_change_reuses_structure():
+    circuit = _voltage_divider()
+    solver = DCOperatingPointSolver()
+    solver.solve(circuit)
+
+    circuit.update_component_value("R2", "3k")
+    result = solver.solve(circuit)
+    assert result["node_voltages"]["N1"] == pytest.approx(7.5, abs=1e-6)
+    assert not result["rebuilt"]
+    assert not result["from_cache"]
+    assert solver.stats["builds"] == 1
+
+    assert solver.solve(circuit)["from_cache"] # 电路未变化时直接复用上次结果
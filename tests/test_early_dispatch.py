@@ -0,0 +1,96 @@
+# IDT_AGENT_Pro/tests/test_early_dispatch.py
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("duckduckgo_search") # 工具模块 (web_search) 依赖它
+
+from circuitmanus.agent import CircuitAgent
+from circuitmanus.request_context import RequestContext, set_request_context, reset_request_context
+from circuitmanus.runtime import AgentRuntime
+from circuitmanus.tools.base import register_tool
+from circuitmanus.tools.early_dispatch import EarlyToolDispatcher
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.yaml")
+
+def _tool_request(tool_call_id, tool_name, **tool_arguments):
+    return {"toolCallId": tool_call_id, "toolName": tool_name, "toolArguments": tool_arguments}
+
+def _new_agent():
+    return CircuitAgent(runtime=AgentRuntime(CONFIG_PATH))
+
+async def _dispatch(agent, request_id, planned_requests):
+    """模拟规划阶段: 把计划中的工具调用逐个提交给调度器，返回调度器与收到的状态更新。"""
+    request_context = RequestContext(request_id, "zhipu-ai", False)
+    token = set_request_context(request_context)
+    status_updates = []
+    async def status_callback(status_update):
+        status_updates.append(status_update)
+    dispatcher = EarlyToolDispatcher(agent, request_context, status_callback)
+    try:
+        for tool_request in planned_requests:
+            dispatcher.submit(tool_request)
+        await asyncio.sleep(0.05) # 让后台任务执行已提交的工具
+    finally:
+        reset_request_context(token)
+    return dispatcher, request_context, status_updates
+
+def test_rejected_plan_restores_circuit_memory_and_discards_statuses():
+    async def scenario():
+        agent = _new_agent()
+        circuit = agent.memory_manager.circuit
+        await agent.tool_executor.execute_tool_call(
+            "setup", 0, 1, _tool_request("t0", "add_component_tool", component_type="resistor", component_id="R1", value="1k"), None
+        )
+        components_before = set(circuit.components)
+        long_term_before = list(agent.memory_manager.long_term)
+
+        dispatcher, request_context, status_updates = await _dispatch(agent, "req_rejected", [
+            _tool_request("t1", "add_component_tool", component_type="capacitor", component_id="C1", value="1u"),
+            _tool_request("t2", "connect_components_tool", comp1_id="R1", comp2_id="C1"),
+        ])
+        assert dispatcher.submitted_count == 2
+        assert "C1" in circuit.components
+        assert any("(请求ID: req_rejected)" in entry for entry in agent.memory_manager.long_term)
+
+        assert await dispatcher.commit([_tool_request("t9", "clear_circuit_tool")]) is None
+        assert set(circuit.components) == components_before
+        assert set(circuit.connections) == set()
+        assert agent.memory_manager.long_term == long_term_before
+        assert status_updates == []
+        if request_context.holds_mutation_lock:
+            agent.mutation_lock.release()
+    asyncio.run(scenario())
+
+def test_unsafe_tool_is_held_back_until_commit():
+    async def scenario():
+        agent = _new_agent()
+        executed_tools = []
+
+        @register_tool(description="测试用: 有外部副作用的工具。", parameters={"type": "object", "properties": {}})
+        def side_effect_tool(self, arguments):
+            executed_tools.append("side_effect_tool")
+            return {"status": "success", "message": "ok"}
+        agent.runtime.register_tool_function("side_effect_tool", side_effect_tool)
+        assert not agent.runtime.is_speculative_safe_tool(_tool_request("t0", "side_effect_tool"))
+        assert not agent.runtime.is_speculative_safe_tool(_tool_request("t0", "export_spice_netlist_tool"))
+
+        planned_requests = [
+            _tool_request("t1", "add_component_tool", component_type="resistor", component_id="R1", value="1k"),
+            _tool_request("t2", "side_effect_tool"),
+            _tool_request("t3", "add_component_tool", component_type="resistor", component_id="R2", value="2k"),
+        ]
+        dispatcher, request_context, status_updates = await _dispatch(agent, "req_held_back", planned_requests)
+        assert dispatcher.submitted_count == 1 # 不可推测执行的工具及其后的请求都没有提前执行
+        assert executed_tools == []
+        assert set(agent.memory_manager.circuit.components) == {"R1"}
+
+        results = await dispatcher.commit(planned_requests)
+        assert [result["tool_call_id"] for result in results] == ["t1", "t2", "t3"]
+        assert executed_tools == ["side_effect_tool"]
+        assert set(agent.memory_manager.circuit.components) == {"R1", "R2"}
+        assert status_updates
+        if request_context.holds_mutation_lock:
+            agent.mutation_lock.release()
+    asyncio.run(scenario())
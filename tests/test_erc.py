@@ -0,0 +1,42 @@
+# IDT_AGENT_Pro/tests/test_erc.py
+from circuitmanus.analysis import ElectricalRuleChecker
+from circuitmanus.circuit_domain.circuit import Circuit
+from circuitmanus.circuit_domain.components import CircuitComponent
+
+def _voltage_divider():
+    circuit = Circuit()
+    for component_id, component_type, value in [("V1", "battery", "10V"), ("GND", "ground", None),
+                                                 ("R1", "resistor", "1k"), ("R2", "resistor", "1k"), ("N1", "node", None)]:
+        circuit.add_component(CircuitComponent(component_id, component_type, value))
+    for id1, id2 in [("V1", "GND"), ("V1", "R1"), ("R1", "N1"), ("N1", "R2"), ("R2", "GND")]:
+        circuit.connect_components(id1, id2)
+    return circuit
+
+def test_incremental_check_reports_and_resolves_dangling_pin():
+    circuit = _voltage_divider()
+    checker = ElectricalRuleChecker()
+    assert checker.check_all(circuit)["open_violation_count"] == 0
+
+    snapshot, revision = circuit.create_snapshot(), circuit.revision
+    circuit.add_component(CircuitComponent("R3", "resistor", "2k"))
+    circuit.connect_components("N1", "R3")
+    result = checker.check_changes(circuit, snapshot, revision)
+    assert result["mode"] == "incremental"
+    assert [(violation["rule"], violation["component_ids"]) for violation in result["new_violations"]] == [("dangling_pin", ["R3"])]
+    assert result["open_violation_count"] == 1
+
+    snapshot, revision = circuit.create_snapshot(), circuit.revision
+    circuit.connect_components("R3", "GND")
+    result = checker.check_changes(circuit, snapshot, revision)
+    assert result["mode"] == "incremental"
+    assert result["new_violations"] == []
+    assert result["resolved_count"] == 1
+    assert checker.get_open_violations() == []
+
+def test_unchanged_circuit_skips_the_check():
+    circuit = _voltage_divider()
+    checker = ElectricalRuleChecker()
+    checker.check_all(circuit)
+    result = checker.check_changes(circuit, circuit.create_snapshot(), circuit.revision)
+    assert result["mode"] == "unchanged"
+    assert result["checked_component_count"] == 0
@@ -0,0 +1,69 @@
+# IDT_AGENT_Pro/tests/test_response_parser.py
+import asyncio
+import json
+import types
+
+import pytest
+
+from circuitmanus.llm.parser import OutputParser
+
+_TOOLS_REGISTRY = {
+    "add_component_tool": {"description": "添加元件", "parameters": {"type": "object", "properties": {
+        "component_type": {"type": "string"}, "component_id": {"type": "string"}, "value": {"type": "string"}}, "required": ["component_type"]}},
+    "connect_components_tool": {"description": "连接元件", "parameters": {"type": "object", "properties": {
+        "comp1_id": {"type": "string"}, "comp2_id": {"type": "string"}}, "required": ["comp1_id", "comp2_id"]}},
+}
+_TOOL_REQUESTS = [
+    {"toolCallId": "t1", "toolName": "add_component_tool", "toolArguments": {"component_type": "resistor", "component_id": "R1", "value": "1k \"q\" {x} \\"}},
+    {"toolCallId": "t2", "toolName": "add_component_tool", "toolArguments": {"component_type": "led", "component_id": "D1"}},
+    {"toolCallId": "t3", "toolName": "connect_components_tool", "toolArguments": {"comp1_id": "R1", "comp2_id": "D1"}},
+]
+_PLAN = {
+    "requestId": "req_1", "llmInteractionId": "llm_1", "timestampUtc": "2026-01-01T00:00:00Z", "status": "success",
+    "executionPhase": "planning", "thoughtProcess": "先添加元件再连接。",
+    "decision": {"isCallTools": True, "toolCallRequests": _TOOL_REQUESTS,
+                 "responseToUser": {"contentType": "text/plain", "content": "括号 } { 与 [ 不影响解析"}},
+}
+_THINKING = "用户要一个 LED 电路 </thin 不是结束标签\n第二行"
+# (响应文本, 是否能在流中提前转发工具调用请求)
+_RESPONSES = [
+    (f"<think>{_THINKING}</think>\n```json\n{json.dumps(_PLAN, ensure_ascii=False, indent=1)}\n```\n之后的多余文字", True),
+    (f"  <THINK>{_THINKING}</Think>{json.dumps(_PLAN)}", True),
+    # JSON 之前的说明文字里有括号: 提前解析失败，退回到流结束后的整体解析
+    (f"<think>{_THINKING}</think>\n说明文字 {{不是 JSON}} 之后才是 ```json\n{json.dumps(_PLAN, ensure_ascii=False)}\n```", False),
+]
+
+async def _parse_in_chunks(output_parser, response_text, chunk_size):
+    thinking_deltas, tool_requests = [], []
+    async def thinking_callback(thinking_delta):
+        thinking_deltas.append(thinking_delta)
+    parser = output_parser.create_incremental_parser("planning", thinking_callback, 0.0, tool_requests.append)
+    for start in range(0, len(response_text), chunk_size):
+        if await parser.feed(response_text[start:start + chunk_size]):
+            break
+    return await parser.finish(), "".join(thinking_deltas), tool_requests
+
+@pytest.mark.parametrize("response_text, forwards_early", _RESPONSES, ids=["fenced_json", "bare_json", "braces_before_json"])
+def test_incremental_parse_matches_full_parse_for_any_chunk_size(response_text, forwards_early):
+    output_parser = OutputParser(_TOOLS_REGISTRY)
+    expected = output_parser.parse_llm_response_to_structured_json(types.SimpleNamespace(content=response_text), "planning")
+    assert expected[0] is not None and expected[1] == ""
+
+    for chunk_size in range(1, 51):
+        result, thinking_text, tool_requests = asyncio.run(_parse_in_chunks(output_parser, response_text, chunk_size))
+        assert result == expected, chunk_size
+        assert thinking_text == _THINKING, chunk_size
+        assert tool_requests == (_TOOL_REQUESTS if forwards_early else []), chunk_size
+
+def test_invalid_tool_request_stops_forwarding():
+    output_parser = OutputParser(_TOOLS_REGISTRY)
+    plan = json.loads(json.dumps(_PLAN))
+    plan["decision"]["toolCallRequests"][1]["toolName"] = "unknown_tool"
+    response_text = f"<think>{_THINKING}</think>{json.dumps(plan)}"
+    expected = output_parser.parse_llm_response_to_structured_json(types.SimpleNamespace(content=response_text), "planning")
+    assert expected[1] and expected[2] # 整个计划无法通过校验
+
+    for chunk_size in (1, 7, 50):
+        result, _, tool_requests = asyncio.run(_parse_in_chunks(output_parser, response_text, chunk_size))
+        assert tool_requests == _TOOL_REQUESTS[:1] # 未通过校验的请求及其之后的请求都不转发
+        assert result == expected
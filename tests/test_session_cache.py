@@ -0,0 +1,64 @@
+# IDT_AGENT_Pro/tests/test_session_cache.py
+import asyncio
+import types
+
+import pytest
+
+from circuitmanus.memory.manager import MemoryManager
+from circuitmanus.sessions import SessionCache, SQLiteSessionStore, FileSessionStore
+
+def _new_agent(session_id):
+    return types.SimpleNamespace(session_id=session_id, memory_manager=MemoryManager())
+
+def _create_store(backend, tmp_path):
+    return SQLiteSessionStore(str(tmp_path / "sessions.db")) if backend == "sqlite" else FileSessionStore(str(tmp_path / "snapshots"))
+
+@pytest.mark.parametrize("backend", ["sqlite", "file"])
+def test_corrupt_snapshot_is_quarantined_before_being_overwritten(backend, tmp_path):
+    store = _create_store(backend, tmp_path)
+    store.save("s1", b"not a session snapshot")
+
+    async def scenario():
+        cache = SessionCache(_new_agent, store)
+        agent = await cache.get("s1")
+        assert agent.memory_manager.long_term == []
+        assert cache.get_stats()["quarantined"] == 1
+        assert store.load("s1") is None # 损坏的快照已移出，不会再被读到
+
+        agent.memory_manager.add_to_long_term("新的记忆")
+        cache.mark_dirty("s1")
+        assert await cache.flush("s1")
+        await cache.stop()
+
+    asyncio.run(scenario())
+    reopened_store = _create_store(backend, tmp_path)
+    restored = MemoryManager()
+    restored.restore_snapshot(reopened_store.load("s1"))
+    assert restored.long_term == ["新的记忆"]
+    reopened_store.close()
+
+def test_unreadable_snapshot_is_never_overwritten(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    original = MemoryManager()
+    original.add_to_long_term("已保存的记忆")
+    store.save("s1", original.dump_snapshot_bytes())
+
+    class FailingLoadStore(SQLiteSessionStore):
+        def load(self, session_id):
+            raise OSError("磁盘暂时不可读")
+
+    failing_store = FailingLoadStore(str(tmp_path / "sessions.db"))
+
+    async def scenario():
+        cache = SessionCache(_new_agent, failing_store)
+        agent = await cache.get("s1")
+        agent.memory_manager.add_to_long_term("空会话中的记忆")
+        cache.mark_dirty("s1")
+        assert not await cache.flush("s1")
+        await cache.stop()
+
+    asyncio.run(scenario())
+    restored = MemoryManager()
+    restored.restore_snapshot(store.load("s1"))
+    assert restored.long_term == ["已保存的记忆"]
+    store.close()
@@ -0,0 +1,57 @@
+# IDT_AGENT_Pro/tests/test_snapshot.py
+import pytest
+
+from circuitmanus.circuit_domain.components import CircuitComponent
+from circuitmanus.circuit_domain.storage import STORAGE_BACKENDS
+from circuitmanus.memory import MemoryManager, MemorySnapshot
+from circuitmanus.sessions import SQLiteSessionStore, FileSessionStore
+
+def _populated_memory_manager(storage_backend):
+    memory_manager = MemoryManager(circuit_storage_backend=storage_backend)
+    circuit = memory_manager.circuit
+    for component_id, component_type, value in [("V1", "battery", "9V"), ("R1", "resistor", "4.7k"), ("R2", "resistor", "4.7k"),
+                                                 ("C1", "capacitor", "100nF"), ("GND", "ground", None)]:
+        circuit.add_component(CircuitComponent(component_id, component_type, value))
+    for id1, id2 in [("V1", "R1"), ("R1", "R2"), ("R2", "GND"), ("C1", "R2"), ("V1", "GND")]:
+        circuit.connect_components(id1, id2)
+    memory_manager.add_to_short_term({"role": "user", "content": "搭一个分压电路"})
+    memory_manager.add_to_short_term({"role": "assistant", "content": "已添加 V1、R1、R2、C1 与地线。"})
+    memory_manager.add_to_long_term("添加了分压电路 (请求ID: req_1)")
+    return memory_manager
+
+def _circuit_state(circuit):
+    components = sorted((component_id, component.type, component.value) for component_id, component in circuit.components.items())
+    return components, sorted(circuit.connections)
+
+def _create_store(store_kind, tmp_path):
+    return SQLiteSessionStore(str(tmp_path / "sessions.db")) if store_kind == "sqlite" else FileSessionStore(str(tmp_path / "snapshots"))
+
+@pytest.mark.parametrize("storage_backend", STORAGE_BACKENDS)
+@pytest.mark.parametrize("store_kind", ["sqlite", "file"])
+def test_snapshot_round_trip_through_store(storage_backend, store_kind, tmp_path):
+    original = _populated_memory_manager(storage_backend)
+    store = _create_store(store_kind, tmp_path)
+    store.save("session_1", original.dump_snapshot_bytes())
+
+    restored = MemoryManager(circuit_storage_backend=storage_backend)
+    summary = restored.restore_snapshot(store.load("session_1"))
+    assert summary["component_count"] == 5
+    assert summary["connection_count"] == 5
+    assert not restored.is_circuit_materialized # 电路在首次访问时才物化
+    assert restored.short_term == original.short_term
+    assert restored.long_term == original.long_term
+    assert _circuit_state(restored.circuit) == _circuit_state(original.circuit)
+    assert restored.circuit.generate_component_id("resistor") == original.circuit.generate_component_id("resistor")
+    store.close()
+
+@pytest.mark.parametrize("cut", [0.25, 0.5, 0.99])
+def test_truncated_snapshot_raises_value_error(cut, tmp_path):
+    payload = _populated_memory_manager(STORAGE_BACKENDS[0]).dump_snapshot_bytes()
+    truncated = payload[:int(len(payload) * cut)]
+    with pytest.raises(ValueError):
+        MemorySnapshot(truncated)
+
+    store = FileSessionStore(str(tmp_path / "snapshots"))
+    store.save("session_1", truncated)
+    with pytest.raises(ValueError):
+        store.load("session_1")